@@ -3,6 +3,13 @@ import sys
 import argparse
 import subprocess
 import contextlib
+
+from kohya_gui.class_startup_profiler import startup_profiler
+
+# Start timing imports before the GUI modules are imported
+if "--profile-startup" in sys.argv:
+    startup_profiler.enable()
+
 import gradio as gr
 
 from kohya_gui.class_gui_config import KohyaSSGUIConfig
@@ -12,6 +19,8 @@ from kohya_gui.class_gui_config import KohyaSSGUIConfig
 # from kohya_gui.utilities import utilities_tab # Removed: No longer needed, LoRA tools moved
 from kohya_gui.lora_gui import lora_tab # Keep: Main LoRA training tab
 from kohya_gui.class_lora_tab import LoRATools # Keep: LoRA specific tools
+from kohya_gui.class_lazy_tab import LazyTab
+from kohya_gui.class_background_tasks import BackgroundTasksView, background_tasks
 from kohya_gui.custom_logging import setup_logging
 from kohya_gui.localization_ext import add_javascript
 
@@ -70,7 +79,7 @@ def initialize_ui_interface(config, headless, use_shell, release_info, readme_co
         # ---------------------------
 
         # --- KEEP LoRA Tab (Renamed for clarity) ---
-        with gr.Tab("LoRA Training"):
+        with gr.Tab("LoRA Training"), startup_profiler.measure("Tab: LoRA Training"):
             lora_tab(headless=headless, config=config, use_shell_flag=use_shell)
         # -------------------------------------------
 
@@ -103,11 +112,17 @@ def initialize_ui_interface(config, headless, use_shell, release_info, readme_co
 
         # --- CREATE New LoRA Tools Tab ---
         # Moved from the original Utilities tab to be a top-level tab
-        with gr.Tab("LoRA Tools"):
-             # Pass config as LoRATools might potentially use it
-             _ = LoRATools(headless=headless)
+        # Built on first open, the tools import their modules only then
+        LazyTab("LoRA Tools", lambda: LoRATools(headless=headless))
         # -------------------------------
 
+        # --- Background Tasks Tab ---
+        # Status and cancellation of the tool commands of every tab (LoRA tools,
+        # captioning, dataset preparation...), they share a single runner
+        with gr.Tab("Background Tasks"), startup_profiler.measure("Tab: Background Tasks"):
+            BackgroundTasksView(background_tasks, headless=headless)
+        # ----------------------------
+
         # --- KEEP About Tab (Optional) ---
         with gr.Tab("About"):
             # About tab to display release information and README content
@@ -145,7 +160,9 @@ def UI(**kwargs):
         log.info("Using shell=True when running external commands...")
 
     # Initialize the Gradio UI interface (using the modified function above)
-    ui_interface = initialize_ui_interface(config, kwargs.get("headless", False), use_shell, release_info, readme_content)
+    with startup_profiler.measure("Build UI"):
+        ui_interface = initialize_ui_interface(config, kwargs.get("headless", False), use_shell, release_info, readme_content)
+    startup_profiler.print_report()
 
     # Construct launch parameters using dictionary comprehension
     launch_params = {
@@ -184,6 +201,7 @@ def initialize_arg_parser():
     parser.add_argument("--requirements", type=str, default=None, help="requirements file to use for validation")
     parser.add_argument("--root_path", type=str, default=None, help="`root_path` for Gradio to enable reverse proxy support. e.g. /kohya_ss")
     parser.add_argument("--noverify", action="store_true", help="Disable requirements verification")
+    parser.add_argument("--profile-startup", action="store_true", help="Print a per-module import and UI construction timing table at startup")
     return parser
 
 if __name__ == "__main__":
@@ -204,7 +222,8 @@ if __name__ == "__main__":
         if args.requirements is not None:
             validation_command.append(f"--requirements={args.requirements}")
 
-        subprocess.run(validation_command, check=True)
+        with startup_profiler.measure("Requirements verification"):
+            subprocess.run(validation_command, check=True)
 
     # Launch the UI with the provided arguments
     UI(**vars(args))
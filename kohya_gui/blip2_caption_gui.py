@@ -1,34 +1,55 @@
 from PIL import Image
-from transformers import Blip2Processor, Blip2ForConditionalGeneration
-import torch
 import gradio as gr
 import os
 
 from .common_gui import get_folder_path, scriptdir, list_dirs
+from .class_model_cache import model_cache
 from .custom_logging import setup_logging
 
 # Set up logging
 log = setup_logging()
 
+BLIP2_MODEL_ID = "Salesforce/blip2-opt-2.7b"
+
 
 def load_model():
+    # torch and transformers are slow to import, only load them when captioning
+    import torch
+    from transformers import Blip2Processor, Blip2ForConditionalGeneration
+
     # Set the device to GPU if available, otherwise use CPU
     device = "cuda" if torch.cuda.is_available() else "cpu"
 
-    # Initialize the BLIP2 processor
-    processor = Blip2Processor.from_pretrained("Salesforce/blip2-opt-2.7b")
+    def loader():
+        # Initialize the BLIP2 processor
+        processor = Blip2Processor.from_pretrained(BLIP2_MODEL_ID)
 
-    # Initialize the BLIP2 model
-    model = Blip2ForConditionalGeneration.from_pretrained(
-        "Salesforce/blip2-opt-2.7b", torch_dtype=torch.float16
-    )
+        # Initialize the BLIP2 model
+        model = Blip2ForConditionalGeneration.from_pretrained(
+            BLIP2_MODEL_ID, torch_dtype=torch.float16
+        )
 
-    # Move the model to the specified device
-    model.to(device)
+        # Move the model to the specified device
+        model.to(device)
+
+        return processor, model
+
+    # Reuse the processor and model loaded by a previous captioning run if possible
+    processor, model = model_cache.get(
+        BLIP2_MODEL_ID, loader, dtype=torch.float16, device=device
+    )
 
     return processor, model, device
 
 
+def unload_model():
+    """
+    Unload the BLIP2 model from the model cache.
+    """
+    if model_cache.unload(model_id=BLIP2_MODEL_ID) == 0:
+        log.info("BLIP2 model is not loaded.")
+
+
 def get_images_in_directory(directory_path):
     """
     Returns a list of image file paths found in the provided directory path.
@@ -88,6 +109,8 @@ def generate_caption(
     - max_new_tokens: Maximum number of new tokens to generate. Default: 40.
     - min_new_tokens: Minimum number of new tokens to generate. Default: 20.
     """
+    import torch
+
     for file_path in file_list:
         image = Image.open(file_path)
 
@@ -355,3 +378,7 @@ def gradio_blip2_caption_gui_tab(headless=False, directory_path=None):
                         caption_file_ext,
                     ],
                 )
+
+        with gr.Row():
+            unload_model_button = gr.Button(value="Unload model", interactive=True)
+            unload_model_button.click(unload_model, show_progress=False)
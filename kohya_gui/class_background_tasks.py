@@ -0,0 +1,273 @@
+import os
+import time
+import itertools
+from threading import BoundedSemaphore, RLock, Thread
+
+import gradio as gr
+
+from .class_process_supervisor import ProcessSupervisor
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+TASK_PENDING = "pending"
+TASK_RUNNING = "running"
+TASK_COMPLETED = "completed"
+TASK_FAILED = "failed"
+TASK_CANCELLED = "cancelled"
+
+BACKGROUND_TASKS_HEADERS = [
+    "ID",
+    "Name",
+    "Status",
+    "Elapsed",
+    "Return code",
+    "Last output",
+]
+
+DEFAULT_MAX_BACKGROUND_TASKS = 2
+MAX_FINISHED_TASKS = 50
+
+
+def format_elapsed(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+class BackgroundTaskRunner:
+    """
+    Run tool commands (merge, resize, extract, caption...) in the background.
+
+    At most `max_concurrent` commands run at the same time, the others wait for a free
+    slot. Each task keeps the tail of its output and can be cancelled while pending or running.
+    """
+
+    def __init__(self, max_concurrent: int = None):
+        """
+        Initialize the BackgroundTaskRunner.
+
+        Parameters:
+        - max_concurrent (int): The number of commands running at the same time. Defaults
+          to the KOHYA_GUI_MAX_BACKGROUND_TASKS environment variable or DEFAULT_MAX_BACKGROUND_TASKS.
+        """
+        if max_concurrent is None:
+            max_concurrent = int(
+                os.environ.get(
+                    "KOHYA_GUI_MAX_BACKGROUND_TASKS", DEFAULT_MAX_BACKGROUND_TASKS
+                )
+            )
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.slots = BoundedSemaphore(self.max_concurrent)
+        self.tasks = []
+        self.ids = itertools.count(1)
+        self.lock = RLock()
+
+    def submit(self, name: str, run_cmd: list, on_done=None, **kwargs) -> int:
+        """
+        Queue a command to run in the background.
+
+        Parameters:
+        - name (str): The task name shown in the status panel.
+        - run_cmd (list): The command to run.
+        - on_done (callable): Optional function called with the return code once the command ended.
+        - **kwargs: Additional keyword arguments to pass to subprocess.Popen.
+
+        Returns:
+        - int: The task id.
+        """
+        with self.lock:
+            task = {
+                "id": next(self.ids),
+                "name": name,
+                "status": TASK_PENDING,
+                "created": time.time(),
+                "started": None,
+                "ended": None,
+                "returncode": None,
+                "supervisor": ProcessSupervisor(run_cmd, **kwargs),
+                "on_done": on_done,
+            }
+            self.tasks.append(task)
+            self._prune()
+
+        log.info(f"Queued background task {task['id']} '{name}'")
+        Thread(target=self._run, args=(task,), daemon=True).start()
+        return task["id"]
+
+    def get_task(self, task_id: int) -> dict:
+        with self.lock:
+            return next((task for task in self.tasks if task["id"] == task_id), None)
+
+    def cancel(self, task_id: int) -> bool:
+        """
+        Cancel a pending task or kill a running one.
+        """
+        with self.lock:
+            task = self.get_task(task_id)
+            if task is None or task["status"] not in [TASK_PENDING, TASK_RUNNING]:
+                log.info(f"Background task {task_id} is not pending or running.")
+                return False
+            was_running = task["status"] == TASK_RUNNING
+            task.update(status=TASK_CANCELLED, ended=time.time())
+
+        if was_running:
+            task["supervisor"].kill()
+        log.info(f"Cancelled background task {task_id} '{task['name']}'")
+        return True
+
+    def tail(self, task_id: int, count: int = 50) -> str:
+        task = self.get_task(task_id)
+        return task["supervisor"].tail(count) if task is not None else ""
+
+    def list_tasks(self) -> list:
+        """
+        List the tasks, most recent first, as rows matching BACKGROUND_TASKS_HEADERS.
+        """
+        now = time.time()
+        rows = []
+        with self.lock:
+            tasks = list(reversed(self.tasks))
+
+        for task in tasks:
+            elapsed = ""
+            if task["started"] is not None:
+                elapsed = format_elapsed((task["ended"] or now) - task["started"])
+            last_output = task["supervisor"].tail(1)
+            rows.append(
+                [
+                    task["id"],
+                    task["name"],
+                    task["status"],
+                    elapsed,
+                    "" if task["returncode"] is None else task["returncode"],
+                    last_output[-200:],
+                ]
+            )
+        return rows
+
+    def _run(self, task: dict) -> None:
+        # Wait for a free slot, giving up if the task is cancelled meanwhile
+        while not self.slots.acquire(timeout=0.5):
+            if task["status"] == TASK_CANCELLED:
+                return
+
+        try:
+            with self.lock:
+                if task["status"] == TASK_CANCELLED:
+                    return
+                log.info(f"Starting background task {task['id']} '{task['name']}'...")
+                log.info(f"Executing command: {' '.join(task['supervisor'].run_cmd)}")
+                try:
+                    task["supervisor"].start()
+                except OSError as e:
+                    log.error(f"Failed to start background task {task['id']}: {e}")
+                    task.update(status=TASK_FAILED, started=time.time(), ended=time.time())
+                    return
+                task.update(status=TASK_RUNNING, started=time.time())
+
+            returncode = task["supervisor"].wait()
+
+            with self.lock:
+                task["returncode"] = returncode
+                if task["status"] == TASK_RUNNING:
+                    task.update(
+                        status=TASK_COMPLETED if returncode == 0 else TASK_FAILED,
+                        ended=time.time(),
+                    )
+            log.info(
+                f"Background task {task['id']} '{task['name']}' {task['status']} with return code {returncode}"
+            )
+
+            if task["on_done"] is not None and task["status"] != TASK_CANCELLED:
+                try:
+                    task["on_done"](returncode)
+                except Exception as e:
+                    log.error(f"Background task {task['id']} post-processing failed: {e}")
+        finally:
+            self.slots.release()
+
+    def _prune(self) -> None:
+        finished = [
+            task
+            for task in self.tasks
+            if task["status"] in [TASK_COMPLETED, TASK_FAILED, TASK_CANCELLED]
+        ]
+        for task in finished[: max(0, len(finished) - MAX_FINISHED_TASKS)]:
+            self.tasks.remove(task)
+
+
+# Shared runner for the tools of the whole GUI process
+background_tasks = BackgroundTaskRunner()
+
+
+class BackgroundTasksView:
+    """
+    Gradio status panel of a BackgroundTaskRunner.
+    """
+
+    def __init__(self, runner: BackgroundTaskRunner, headless: bool = False):
+        self.runner = runner
+        self.headless = headless
+
+        self.gradio_interface()
+
+    def refresh(self, task_id):
+        return (
+            gr.Dataframe(value=self.runner.list_tasks()),
+            self.runner.tail(int(task_id or 0)),
+        )
+
+    def gradio_interface(self) -> None:
+        gr.Markdown(
+            f"Tool commands run in the background, {self.runner.max_concurrent} at a time."
+        )
+        self.tasks = gr.Dataframe(
+            headers=BACKGROUND_TASKS_HEADERS,
+            value=self.runner.list_tasks(),
+            interactive=False,
+            wrap=True,
+        )
+
+        with gr.Row():
+            self.task_id = gr.Number(label="Task ID", value=0, step=1, precision=0)
+            button_cancel = gr.Button("Cancel task", variant="stop")
+            button_refresh = gr.Button("Refresh")
+
+        self.output = gr.Textbox(
+            label="Task output",
+            lines=5,
+            max_lines=20,
+            interactive=False,
+            autoscroll=True,
+        )
+
+        def cancel(task_id):
+            self.runner.cancel(int(task_id or 0))
+            return self.refresh(task_id)
+
+        button_cancel.click(
+            cancel,
+            inputs=[self.task_id],
+            outputs=[self.tasks, self.output],
+            show_progress=False,
+        )
+        button_refresh.click(
+            self.refresh,
+            inputs=[self.task_id],
+            outputs=[self.tasks, self.output],
+            show_progress=False,
+        )
+        self.task_id.change(
+            self.refresh,
+            inputs=[self.task_id],
+            outputs=[self.tasks, self.output],
+            show_progress=False,
+        )
+        gr.Timer(2).tick(
+            self.refresh,
+            inputs=[self.task_id],
+            outputs=[self.tasks, self.output],
+            show_progress=False,
+        )
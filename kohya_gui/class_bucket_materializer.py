@@ -0,0 +1,211 @@
+import os
+import sys
+
+import gradio as gr
+
+from .class_background_tasks import background_tasks
+from .common_gui import (
+    function_arguments,
+    get_folder_path,
+    scriptdir,
+    setup_environment,
+)
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+PYTHON = sys.executable
+
+folder_symbol = "\U0001f4c2"  # 📂
+
+
+def materialize_buckets(
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    max_resolution: str = "512,512",
+    enable_bucket: bool = True,
+    min_bucket_reso: int = 256,
+    max_bucket_reso: int = 2048,
+    bucket_reso_steps: int = 64,
+    bucket_no_upscale: bool = False,
+    output_dir: str = "",
+    reg_output_dir: str = "",
+    image_format: str = "jpg",
+    quality: int = 95,
+    mask_dir: str = "",
+    mask_output_dir: str = "",
+) -> None:
+    """
+    Run tools/materialize_buckets.py in the background on the training and regularization
+    images, with the bucket settings of the training tab. The regularization images go
+    to reg_output_dir, or to the output folder name followed by _reg.
+    """
+    if not train_data_dir or not os.path.isdir(train_data_dir):
+        log.info("Image folder is missing...")
+        return
+    if not output_dir:
+        log.info("Please provide an output folder.")
+        return
+    if mask_dir and not mask_output_dir:
+        log.info("Please provide a mask output folder.")
+        return
+
+    options = [
+        "--resolution",
+        str(max_resolution or "512,512"),
+        "--min_bucket_reso",
+        str(int(min_bucket_reso)),
+        "--max_bucket_reso",
+        str(int(max_bucket_reso)),
+        "--bucket_reso_steps",
+        str(int(bucket_reso_steps)),
+        "--format",
+        image_format,
+        "--quality",
+        str(int(quality)),
+    ]
+
+    if not enable_bucket:
+        options.append("--disable_bucket")
+
+    if bucket_no_upscale:
+        options.append("--bucket_no_upscale")
+
+    tasks = [
+        (
+            "Materialize buckets",
+            train_data_dir,
+            output_dir,
+            ["--mask_dir", rf"{mask_dir}", "--mask_output_dir", rf"{mask_output_dir}"]
+            if mask_dir
+            else [],
+        )
+    ]
+    if reg_data_dir and os.path.isdir(reg_data_dir):
+        reg_output_dir = reg_output_dir or f"{os.path.normpath(output_dir)}_reg"
+        tasks.append(("Materialize regularization buckets", reg_data_dir, reg_output_dir, []))
+
+    env = setup_environment()
+
+    for name, source, output, mask_options in tasks:
+        run_cmd = [
+            rf"{PYTHON}",
+            rf"{scriptdir}/tools/materialize_buckets.py",
+            rf"{source}",
+            rf"{output}",
+        ] + options + mask_options
+
+        # Reconstruct the safe command string for display
+        command_to_run = " ".join(run_cmd)
+        log.info(f"Executing command: {command_to_run}")
+
+        background_tasks.submit(name, run_cmd, env=env)
+
+
+class BucketMaterializer:
+    """
+    Panel writing a copy of the training images resized and cropped to their buckets.
+    """
+
+    def __init__(self, components: dict, headless: bool = False):
+        """
+        Initialize the BucketMaterializer panel.
+
+        Parameters:
+        - components (dict): The components of the training tab, by setting name.
+        - headless (bool): Whether to run in headless mode.
+        """
+        self.components = function_arguments(materialize_buckets, components)
+        self.headless = headless
+
+        with gr.Accordion("Materialize buckets", open=False):
+            gr.Markdown(
+                "Write a copy of the image and regularization folders where every image is already "
+                "resized and cropped to its bucket, with its captions and masks. Train on the copies with the "
+                "same resolution and bucket settings to skip decoding the originals. Run it again "
+                "after changing the images, only new or changed images are processed."
+            )
+            with gr.Row():
+                self.output_dir = gr.Textbox(
+                    label="Output folder",
+                    placeholder="Folder of the materialized images",
+                    interactive=True,
+                )
+                self.output_dir_folder = gr.Button(
+                    folder_symbol,
+                    elem_id="open_folder_small",
+                    elem_classes=["tool"],
+                    visible=(not headless),
+                )
+                self.output_dir_folder.click(
+                    get_folder_path,
+                    outputs=self.output_dir,
+                    show_progress=False,
+                )
+                self.reg_output_dir = gr.Textbox(
+                    label="Regularization output folder",
+                    placeholder="(Optional) defaults to the output folder followed by _reg",
+                    interactive=True,
+                )
+                self.image_format = gr.Dropdown(
+                    label="Format",
+                    choices=["jpg", "webp", "png"],
+                    value="jpg",
+                    interactive=True,
+                )
+                self.quality = gr.Slider(
+                    label="Quality",
+                    info="JPEG and WebP quality",
+                    value=95,
+                    minimum=50,
+                    maximum=100,
+                    step=1,
+                    interactive=True,
+                )
+            with gr.Row():
+                self.mask_dir = gr.Textbox(
+                    label="Mask folder",
+                    placeholder="(Optional) masks named like their image",
+                    interactive=True,
+                )
+                self.mask_output_dir = gr.Textbox(
+                    label="Mask output folder",
+                    placeholder="(Optional) folder of the materialized masks",
+                    interactive=True,
+                )
+            self.button_materialize = gr.Button("Materialize buckets")
+
+        self.button_materialize.click(
+            self.materialize,
+            inputs=list(self.components.values())
+            + [
+                self.output_dir,
+                self.reg_output_dir,
+                self.image_format,
+                self.quality,
+                self.mask_dir,
+                self.mask_output_dir,
+            ],
+            show_progress=False,
+        )
+
+    def materialize(self, *values):
+        settings = dict(zip(self.components, values))
+        (
+            output_dir,
+            reg_output_dir,
+            image_format,
+            quality,
+            mask_dir,
+            mask_output_dir,
+        ) = values[len(self.components) :]
+        materialize_buckets(
+            output_dir=output_dir,
+            reg_output_dir=reg_output_dir,
+            image_format=image_format,
+            quality=quality,
+            mask_dir=mask_dir,
+            mask_output_dir=mask_output_dir,
+            **settings,
+        )
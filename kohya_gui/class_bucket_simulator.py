@@ -0,0 +1,233 @@
+import math
+
+import gradio as gr
+import toml
+
+from .class_training_estimator import (
+    bucket_items,
+    subset_images,
+    training_datasets,
+)
+from .common_gui import function_arguments
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+BUCKET_HEADERS = [
+    "Dataset",
+    "Bucket",
+    "Aspect",
+    "Images",
+    "Items",
+    "Batches",
+    "Last batch",
+    "Wasted slots",
+]
+
+# Bucket settings tried for the suggestions, the train batch size is kept
+SUGGESTED_RESO_STEPS = [32, 64, 128, 256]
+
+# Smallest improvement of the waste + crop score worth suggesting, in percent
+MIN_SUGGESTION_GAIN = 1.0
+
+MAX_SUGGESTIONS = 3
+
+
+def bucket_crop(size: tuple, reso: tuple) -> float:
+    """
+    Fraction of an image cropped away when it is resized to cover its bucket.
+    """
+    width, height = size
+    if width <= 0 or height <= 0:
+        return 0.0
+    scale = max(reso[0] / width, reso[1] / height)
+    return max(0.0, 1 - (reso[0] * reso[1]) / (width * height * scale * scale))
+
+
+def simulate_buckets(datasets: list) -> dict:
+    """
+    Simulate the bucket assignment of the datasets and measure how full their batches are.
+
+    Every bucket ends an epoch with its own batch, the empty slots of the partially
+    filled batches are GPU capacity left unused.
+
+    Returns:
+    - dict: The bucket rows, the items, batches, partial batches, batch slots, wasted
+      slots, waste and mean crop in percent.
+    """
+    rows = []
+    report = {"items": 0, "batches": 0, "partial_batches": 0, "slots": 0, "wasted": 0}
+    crops = []
+
+    for index, dataset in enumerate(datasets, start=1):
+        batch_size = max(1, dataset["batch_size"])
+        counts = bucket_items(dataset)
+        for reso, items in sorted(counts["buckets"].items()):
+            batches = math.ceil(items / batch_size)
+            wasted = batches * batch_size - items
+            rows.append(
+                [
+                    index,
+                    f"{reso[0]}x{reso[1]}",
+                    round(reso[0] / reso[1], 2),
+                    counts["bucket_images"].get(reso, 0),
+                    items,
+                    batches,
+                    f"{items - (batches - 1) * batch_size}/{batch_size}",
+                    wasted,
+                ]
+            )
+            report["items"] += items
+            report["batches"] += batches
+            report["partial_batches"] += 1 if wasted else 0
+            report["slots"] += batches * batch_size
+            report["wasted"] += wasted
+
+        for subset in dataset["subsets"]:
+            if not subset["is_reg"]:
+                crops.extend(
+                    bucket_crop(size, reso)
+                    for size, reso in subset_images(subset, dataset["bucket"])
+                )
+
+    report["rows"] = rows
+    report["buckets"] = len(rows)
+    report["waste"] = 100 * report["wasted"] / report["slots"] if report["slots"] else 0.0
+    report["crop"] = 100 * sum(crops) / len(crops) if crops else 0.0
+    return report
+
+
+def simulation_score(report: dict) -> float:
+    # Wasted batch slots and cropped pixels both lose training signal
+    return report["waste"] + report["crop"]
+
+
+def suggest_settings(settings: dict, current: dict) -> list:
+    """
+    Simulate other bucket settings at the same train batch size and return the ones
+    with a better waste + crop score than the current settings, best first.
+    """
+    current_steps = int(settings.get("bucket_reso_steps") or 64)
+    current_no_upscale = bool(settings.get("bucket_no_upscale"))
+    suggestions = []
+    for reso_steps in sorted(set(SUGGESTED_RESO_STEPS + [current_steps])):
+        for no_upscale in [current_no_upscale, not current_no_upscale]:
+            if reso_steps == current_steps and no_upscale == current_no_upscale:
+                continue
+            candidate = {
+                **settings,
+                "bucket_reso_steps": reso_steps,
+                "bucket_no_upscale": no_upscale,
+            }
+            report = simulate_buckets(training_datasets(**candidate))
+            gain = simulation_score(current) - simulation_score(report)
+            if gain >= MIN_SUGGESTION_GAIN:
+                suggestions.append(
+                    {
+                        "bucket_reso_steps": reso_steps,
+                        "bucket_no_upscale": no_upscale,
+                        "gain": gain,
+                        **{
+                            key: report[key]
+                            for key in ["buckets", "batches", "waste", "crop"]
+                        },
+                    }
+                )
+    suggestions.sort(key=lambda suggestion: -suggestion["gain"])
+    return suggestions[:MAX_SUGGESTIONS]
+
+
+def simulate_from_settings(
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    dataset_config: str = "",
+    train_batch_size: int = 1,
+    max_resolution: str = "512,512",
+    enable_bucket: bool = True,
+    min_bucket_reso: int = 256,
+    max_bucket_reso: int = 2048,
+    bucket_reso_steps: int = 64,
+    bucket_no_upscale: bool = False,
+) -> dict:
+    """
+    Simulate the buckets of a training tab and suggest bucket settings with less waste.
+    Settings set in a dataset config TOML file take precedence over the suggested ones.
+
+    Returns:
+    - dict: The simulate_buckets result with the suggestions.
+    """
+    settings = dict(locals())
+    report = simulate_buckets(training_datasets(**settings))
+    report["suggestions"] = (
+        suggest_settings(settings, report) if enable_bucket and report["items"] else []
+    )
+    return report
+
+
+def format_simulation(report: dict) -> str:
+    lines = [
+        f"- Buckets: {report['buckets']}, items per epoch: {report['items']}",
+        f"- Batches per epoch: {report['batches']}, {report['partial_batches']} partially filled",
+        f"- Wasted batch slots: {report['wasted']} of {report['slots']} ({report['waste']:.1f}%)",
+        f"- Mean crop of the train images: {report['crop']:.1f}%",
+    ]
+    if report["suggestions"]:
+        lines.append("")
+        lines.append("Settings with less waste + crop at the same batch size:")
+        for suggestion in report["suggestions"]:
+            lines.append(
+                f"- Bucket resolution steps {suggestion['bucket_reso_steps']}, "
+                f"don't upscale bucket resolution {'on' if suggestion['bucket_no_upscale'] else 'off'}: "
+                f"{suggestion['buckets']} buckets, {suggestion['batches']} batches, "
+                f"{suggestion['waste']:.1f}% wasted, {suggestion['crop']:.1f}% cropped"
+            )
+    elif report["items"]:
+        lines.append("")
+        lines.append("No other bucket settings do noticeably better.")
+    return "\n".join(lines)
+
+
+class BucketSimulator:
+    """
+    Panel simulating the aspect ratio buckets of a dataset before training.
+    """
+
+    def __init__(self, components: dict, headless: bool = False):
+        """
+        Initialize the BucketSimulator panel.
+
+        Parameters:
+        - components (dict): The components of the training tab, by setting name.
+        - headless (bool): Whether to run in headless mode.
+        """
+        self.components = function_arguments(simulate_from_settings, components)
+        self.headless = headless
+
+        with gr.Accordion("Bucket simulator", open=False):
+            gr.Markdown(
+                "Simulate how the images are distributed in aspect ratio buckets, how full "
+                "the batches are at the train batch size, and which bucket settings waste less."
+            )
+            self.button_simulate = gr.Button("Simulate buckets")
+            self.summary = gr.Markdown()
+            self.buckets = gr.Dataframe(
+                headers=BUCKET_HEADERS,
+                interactive=False,
+                wrap=True,
+            )
+
+        self.button_simulate.click(
+            self.simulate,
+            inputs=list(self.components.values()),
+            outputs=[self.summary, self.buckets],
+            show_progress=False,
+        )
+
+    def simulate(self, *values):
+        settings = dict(zip(self.components, values))
+        try:
+            report = simulate_from_settings(**settings)
+        except (OSError, ValueError, IndexError, TypeError, toml.TomlDecodeError) as e:
+            return f"Could not simulate the buckets: {e}", gr.Dataframe(value=[])
+        return format_simulation(report), gr.Dataframe(value=report["rows"])
@@ -0,0 +1,472 @@
+import gzip
+import html
+import importlib.util
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+import gradio as gr
+
+from .class_json_cache import JsonCache
+from .common_gui import IMAGE_EXTENSIONS, function_arguments, scriptdir
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+try:
+    import regex
+
+    # The CLIP pre-tokenization pattern
+    CLIP_PATTERN = regex.compile(
+        r"""<\|startoftext\|>|<\|endoftext\|>|'s|'t|'re|'ve|'m|'ll|'d|[\p{L}]+|[\p{N}]|[^\s\p{L}\p{N}]+""",
+        regex.IGNORECASE,
+    )
+except ImportError:
+    # Same pattern with the re module: letters, single digits, other symbol runs
+    CLIP_PATTERN = re.compile(
+        r"""<\|startoftext\|>|<\|endoftext\|>|'s|'t|'re|'ve|'m|'ll|'d|[^\W\d_]+|\d|[^\s\w]+|_+""",
+        re.IGNORECASE,
+    )
+
+try:
+    import ftfy
+except ImportError:
+    ftfy = None
+
+DEFAULT_CAPTION_CACHE_FILE = os.path.join(scriptdir, "logs", "caption_token_counts.json")
+
+# The CLIP vocabulary is shipped with open_clip, a requirement of the GUI
+CLIP_VOCAB_FILE = "bpe_simple_vocab_16e6.txt.gz"
+CLIP_MERGES = 49152 - 256 - 2
+
+# max_token_length options of the training tabs, without the BOS and EOS tokens
+MAX_TOKEN_LENGTHS = [75, 150, 225]
+
+HISTOGRAM_BIN = 25
+TOP_TAGS = 30
+
+
+@lru_cache()
+def bytes_to_unicode() -> dict:
+    """
+    The CLIP mapping of bytes to printable unicode characters.
+    """
+    codes = (
+        list(range(ord("!"), ord("~") + 1))
+        + list(range(ord("¡"), ord("¬") + 1))
+        + list(range(ord("®"), ord("ÿ") + 1))
+    )
+    characters = codes[:]
+    extra = 0
+    for code in range(256):
+        if code not in codes:
+            codes.append(code)
+            characters.append(256 + extra)
+            extra += 1
+    return dict(zip(codes, [chr(character) for character in characters]))
+
+
+def find_clip_vocab() -> str:
+    """
+    Locate the CLIP BPE vocabulary bundled with open_clip without importing it.
+    """
+    spec = importlib.util.find_spec("open_clip")
+    for location in (spec.submodule_search_locations or []) if spec else []:
+        path = os.path.join(location, CLIP_VOCAB_FILE)
+        if os.path.isfile(path):
+            return path
+    return ""
+
+
+def clean_caption(text: str) -> str:
+    if ftfy is not None and not text.isascii():
+        text = ftfy.fix_text(text)
+    text = html.unescape(html.unescape(text))
+    return " ".join(text.split()).lower()
+
+
+class CLIPBPETokenizer:
+    """
+    Offline implementation of the CLIP byte pair encoding used by the SD, SDXL, SD3 and
+    FLUX CLIP text encoders. Only the token count is computed, cached per word since tag
+    captions repeat the same words.
+    """
+
+    name = "clip"
+
+    def __init__(self, vocab_file: str = ""):
+        vocab_file = vocab_file or find_clip_vocab()
+        if not vocab_file:
+            raise FileNotFoundError(
+                f"{CLIP_VOCAB_FILE} not found, install open-clip-torch or use the whitespace tokenizer"
+            )
+        with gzip.open(vocab_file, "rt", encoding="utf-8") as f:
+            merges = f.read().split("\n")[1 : CLIP_MERGES + 1]
+        self.ranks = {
+            tuple(merge.split()): rank for rank, merge in enumerate(merges)
+        }
+        self.byte_encoder = bytes_to_unicode()
+        self.word_counts = {}
+
+    def bpe_count(self, token: str) -> int:
+        word = list(token[:-1]) + [token[-1] + "</w>"]
+        while len(word) > 1:
+            pairs = [(word[i], word[i + 1]) for i in range(len(word) - 1)]
+            best = min(pairs, key=lambda pair: self.ranks.get(pair, math.inf))
+            if best not in self.ranks:
+                break
+            merged = []
+            i = 0
+            while i < len(word):
+                if i < len(word) - 1 and (word[i], word[i + 1]) == best:
+                    merged.append(word[i] + word[i + 1])
+                    i += 2
+                else:
+                    merged.append(word[i])
+                    i += 1
+            word = merged
+        return len(word)
+
+    def count(self, text: str) -> int:
+        total = 0
+        for word in CLIP_PATTERN.findall(clean_caption(text)):
+            count = self.word_counts.get(word)
+            if count is None:
+                token = "".join(self.byte_encoder[b] for b in word.encode("utf-8"))
+                count = self.word_counts[word] = self.bpe_count(token)
+            total += count
+        return total
+
+
+class WhitespaceTokenizer:
+    """
+    Fast approximation of the CLIP token count: one token per word, number or symbol
+    run, plus one per 7 letters of long words which BPE splits.
+    """
+
+    name = "whitespace"
+
+    def count(self, text: str) -> int:
+        return sum(
+            1 + (len(word) - 1) // 7 if word[0].isalpha() else 1
+            for word in CLIP_PATTERN.findall(clean_caption(text))
+        )
+
+
+class TransformersTokenizer:
+    """
+    Token counts of a Hugging Face tokenizer available in the local cache.
+    """
+
+    def __init__(self, model_name: str):
+        from transformers import AutoTokenizer
+
+        self.name = f"transformers:{model_name}"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+# Tokenizer factories by name, "transformers:<model>" loads a cached Hugging Face tokenizer
+TOKENIZERS = {
+    "clip": CLIPBPETokenizer,
+    "whitespace": WhitespaceTokenizer,
+}
+
+
+def register_tokenizer(name: str, factory) -> None:
+    """
+    Register a tokenizer factory, called without arguments, whose instances have a name
+    and a count(text) method.
+    """
+    TOKENIZERS[name] = factory
+
+
+_tokenizers = {}
+
+
+def get_tokenizer(name: str):
+    if name not in _tokenizers:
+        if name.startswith("transformers:"):
+            _tokenizers[name] = TransformersTokenizer(name.split(":", 1)[1])
+        elif name in TOKENIZERS:
+            _tokenizers[name] = TOKENIZERS[name]()
+        else:
+            raise ValueError(f"Unknown tokenizer {name}")
+    return _tokenizers[name]
+
+
+def list_captions(folders: list, caption_extension: str) -> tuple:
+    """
+    Return the caption files of the images of folders and their subfolders, and the
+    number of images without caption.
+    """
+    captions, missing = [], 0
+    for folder in folders:
+        if not folder or not os.path.isdir(folder):
+            continue
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            names = set(files)
+            for name in files:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                caption = os.path.splitext(name)[0] + caption_extension
+                if caption in names:
+                    captions.append(os.path.abspath(os.path.join(root, caption)))
+                else:
+                    missing += 1
+    return sorted(captions), missing
+
+
+def split_tags(text: str) -> list:
+    return [tag.strip() for tag in text.replace("\n", ",").split(",") if tag.strip()]
+
+
+class CaptionTokenCounts(JsonCache):
+    """
+    Token counts of caption files, cached on disk by (path, size, mtime) and tokenizer,
+    so only new or modified captions are tokenized again.
+    """
+
+    description = "caption token cache"
+
+    def __init__(self, cache_file: str = DEFAULT_CAPTION_CACHE_FILE):
+        super().__init__(cache_file)
+
+    def analyze(self, paths: list, tokenizer, folders: list = None) -> tuple:
+        """
+        Read the captions and count their tokens.
+
+        Parameters:
+        - paths (list): The caption files.
+        - tokenizer: The tokenizer counting the tokens.
+        - folders (list): The scanned folders, cached captions under them not in paths are forgotten.
+
+        Returns:
+        - tuple: The token count of each caption and the tags of each caption.
+        """
+        counts, tags = [], []
+        dirty = False
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                    with open(path, "r", encoding="utf-8", errors="replace") as f:
+                        text = f.read()
+                except OSError as e:
+                    log.warning(f"Could not read {path}: {e}")
+                    continue
+                key = [stat.st_size, stat.st_mtime_ns]
+                entry = self.entries.get(path)
+                if entry is None or entry["key"] != key:
+                    entry = self.entries[path] = {"key": key, "tokens": {}}
+                if tokenizer.name not in entry["tokens"]:
+                    entry["tokens"][tokenizer.name] = tokenizer.count(text)
+                    dirty = True
+                counts.append(entry["tokens"][tokenizer.name])
+                tags.append(split_tags(text))
+
+            prefixes = tuple(
+                os.path.join(os.path.abspath(folder), "")
+                for folder in folders or []
+                if folder and os.path.isdir(folder)
+            )
+            known = set(paths)
+            removed = [
+                path
+                for path in self.entries
+                if path.startswith(prefixes) and path not in known
+            ]
+            for path in removed:
+                del self.entries[path]
+            if dirty or removed:
+                self.save()
+        return counts, tags
+
+
+# Shared cache for the whole GUI process
+caption_token_counts = CaptionTokenCounts()
+
+
+def percentile(values: list, fraction: float) -> int:
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def analyze_captions(
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    caption_extension: str = ".txt",
+    max_token_length: int = 75,
+    keep_tokens: int = 0,
+    shuffle_caption: bool = False,
+    tokenizer: str = "clip",
+) -> dict:
+    """
+    Analyze the captions of the training images: token length distribution, truncation
+    per max_token_length option and tag frequencies.
+
+    Returns:
+    - dict: The caption counts, the sorted token counts, the truncation by max_token_length,
+      the histogram rows, the top tags and the first tag frequency.
+    """
+    caption_extension = caption_extension or ".txt"
+    folders = [train_data_dir, reg_data_dir]
+    paths, missing = list_captions(folders, caption_extension)
+    counts, tags = caption_token_counts.analyze(paths, get_tokenizer(tokenizer), folders)
+    counts_sorted = sorted(counts)
+
+    truncation = {}
+    for length in sorted(set(MAX_TOKEN_LENGTHS + [int(max_token_length or 75)])):
+        over = [count - length for count in counts if count > length]
+        truncation[length] = {"captions": len(over), "tokens": sum(over)}
+
+    histogram = Counter(count // HISTOGRAM_BIN for count in counts)
+    tag_counts = Counter(tag for caption_tags in tags for tag in caption_tags)
+    first_tags = Counter(caption_tags[0] for caption_tags in tags if caption_tags)
+
+    return {
+        "tokenizer": tokenizer,
+        "captions": len(counts),
+        "missing": missing,
+        "counts": counts_sorted,
+        "max_token_length": int(max_token_length or 75),
+        "keep_tokens": int(keep_tokens or 0),
+        "shuffle_caption": bool(shuffle_caption),
+        "truncation": truncation,
+        "histogram": [
+            [
+                f"{bin * HISTOGRAM_BIN}-{(bin + 1) * HISTOGRAM_BIN - 1}",
+                histogram[bin],
+            ]
+            for bin in range(max(histogram) + 1 if histogram else 0)
+        ],
+        "mean_tags": sum(len(caption_tags) for caption_tags in tags) / len(tags)
+        if tags
+        else 0,
+        "top_tags": tag_counts.most_common(TOP_TAGS),
+        "first_tag": first_tags.most_common(1)[0] if first_tags else None,
+    }
+
+
+def format_caption_report(report: dict) -> str:
+    if not report["captions"]:
+        return f"No captions found, {report['missing']} images without caption."
+
+    counts = report["counts"]
+    lines = [
+        f"- Captions: {report['captions']} ({report['missing']} images without caption), "
+        f"{report['mean_tags']:.1f} tags on average, tokenizer {report['tokenizer']}",
+        f"- Tokens: median {percentile(counts, 0.5)}, 90% {percentile(counts, 0.9)}, "
+        f"99% {percentile(counts, 0.99)}, max {counts[-1]}",
+    ]
+    for length, truncated in report["truncation"].items():
+        marker = " (current)" if length == report["max_token_length"] else ""
+        lines.append(
+            f"- Max token length {length}{marker}: {truncated['captions']} captions truncated "
+            f"({100 * truncated['captions'] / report['captions']:.1f}%), {truncated['tokens']} tokens lost"
+        )
+
+    covering = next(
+        (
+            length
+            for length in MAX_TOKEN_LENGTHS
+            if report["truncation"][length]["captions"] <= 0.01 * report["captions"]
+        ),
+        None,
+    )
+    if covering is None:
+        lines.append(
+            f"- Even {MAX_TOKEN_LENGTHS[-1]} tokens truncate more than 1% of the captions, consider shortening them."
+        )
+    elif covering != report["max_token_length"]:
+        lines.append(
+            f"- Suggested max token length: {covering}, the smallest option fitting 99% of the captions."
+        )
+
+    if report["shuffle_caption"] and report["truncation"][report["max_token_length"]]["captions"]:
+        kept = (
+            f"only the first {report['keep_tokens']} tags stay in front"
+            if report["keep_tokens"]
+            else "no tag stays in front"
+        )
+        lines.append(
+            "- Shuffle caption is on: truncated captions lose different tags every epoch, "
+            f"{kept}."
+        )
+    if report["first_tag"]:
+        tag, count = report["first_tag"]
+        if count >= 0.8 * report["captions"] and report["keep_tokens"] == 0:
+            lines.append(
+                f"- '{tag}' starts {100 * count / report['captions']:.0f}% of the captions, "
+                "consider keep n tokens 1 to keep it in front when shuffling."
+            )
+
+    lines.append("")
+    lines.append(
+        "Top tags: "
+        + ", ".join(f"{tag} ({count})" for tag, count in report["top_tags"])
+    )
+    return "\n".join(lines)
+
+
+class CaptionAnalyzer:
+    """
+    Panel analyzing the captions of a training tab before training.
+    """
+
+    def __init__(self, components: dict, headless: bool = False):
+        """
+        Initialize the CaptionAnalyzer panel.
+
+        Parameters:
+        - components (dict): The components of the training tab, by setting name.
+        - headless (bool): Whether to run in headless mode.
+        """
+        self.components = function_arguments(analyze_captions, components)
+        self.headless = headless
+
+        with gr.Accordion("Caption analyzer", open=False):
+            gr.Markdown(
+                "Count the tokens of every caption to check they fit the max token length, "
+                "captions over it are truncated during training."
+            )
+            with gr.Row():
+                self.tokenizer = gr.Dropdown(
+                    label="Tokenizer",
+                    info="clip is exact for CLIP text encoders, whitespace is a fast approximation, "
+                    "transformers:<model> uses a cached Hugging Face tokenizer",
+                    choices=list(TOKENIZERS),
+                    value="clip",
+                    allow_custom_value=True,
+                    interactive=True,
+                )
+                self.button_analyze = gr.Button("Analyze captions")
+            self.summary = gr.Markdown()
+            self.histogram = gr.Dataframe(
+                headers=["Tokens", "Captions"],
+                interactive=False,
+            )
+
+        self.button_analyze.click(
+            self.analyze,
+            inputs=list(self.components.values()) + [self.tokenizer],
+            outputs=[self.summary, self.histogram],
+            show_progress=False,
+        )
+
+    def analyze(self, *values):
+        settings = dict(zip(self.components, values[:-1]))
+        try:
+            report = analyze_captions(tokenizer=values[-1], **settings)
+        except (OSError, ValueError, ImportError) as e:
+            return f"Could not analyze the captions: {e}", gr.Dataframe(value=[])
+        return format_caption_report(report), gr.Dataframe(value=report["histogram"])
@@ -1,13 +1,18 @@
-import subprocess
-import psutil
+import os
 import time
+import psutil
 import gradio as gr
 
+from .class_process_supervisor import ProcessSupervisor, format_progress
+from .class_training_estimator import throughput_profiles
 from .custom_logging import setup_logging
 
 # Set up logging
 log = setup_logging()
 
+# Steps to run before the measured it/s is stable enough to be recorded
+MIN_PROFILED_STEPS = 10
+
 
 class CommandExecutor:
     """
@@ -20,7 +25,9 @@ class CommandExecutor:
         """
         self.headless = headless
         self.process = None
-        
+        self.supervisor = None
+        self.throughput_key = None
+
         with gr.Row():
             self.button_run = gr.Button("Start training", variant="primary")
 
@@ -28,12 +35,26 @@ class CommandExecutor:
                 "Stop training", visible=self.process is not None or headless, variant="stop"
             )
 
-    def execute_command(self, run_cmd: str, **kwargs):
+        with gr.Accordion("Training output", open=False):
+            self.progress = gr.Markdown()
+            self.output = gr.Textbox(
+                label="Output",
+                lines=10,
+                max_lines=20,
+                interactive=False,
+                autoscroll=True,
+            )
+
+    def execute_command(
+        self, run_cmd: str, log_dir: str = None, throughput_key: str = None, **kwargs
+    ):
         """
         Execute a command if no other command is currently running.
 
         Parameters:
         - run_cmd (str): The command to execute.
+        - log_dir (str): Optional folder where the command output is written to a rotating log file.
+        - throughput_key (str): Optional throughput profile the measured it/s is recorded to.
         - **kwargs: Additional keyword arguments to pass to subprocess.Popen.
         """
         if self.process and self.process.poll() is None:
@@ -46,8 +67,14 @@ class CommandExecutor:
             command_to_run = " ".join(run_cmd)
             log.info(f"Executing command: {command_to_run}")
 
-            # Execute the command securely
-            self.process = subprocess.Popen(run_cmd, **kwargs)
+            log_file = (
+                os.path.join(log_dir, "training_output.log") if log_dir else None
+            )
+
+            # Execute the command securely, capturing its output
+            self.supervisor = ProcessSupervisor(run_cmd, log_file=log_file, **kwargs)
+            self.process = self.supervisor.start()
+            self.throughput_key = throughput_key
             log.debug("Command executed.")
 
     def kill_command(self):
@@ -77,12 +104,48 @@ class CommandExecutor:
         return gr.Button(visible=True), gr.Button(visible=False or self.headless)
 
     def wait_for_training_to_end(self):
-        while self.is_running():
-            time.sleep(1)
+        if self.supervisor is not None:
             log.debug("Waiting for training to end...")
+            self.supervisor.wait()
+            self.record_throughput()
         log.info("Training has ended.")
         return gr.Button(visible=True), gr.Button(visible=False or self.headless)
 
+    def record_throughput(self):
+        """
+        Record the it/s measured during the training to its throughput profile, so the next
+        estimates for the same settings use it.
+        """
+        if self.throughput_key is None:
+            return
+        metrics = self.supervisor.get_metrics()
+        if (metrics.get("step") or 0) >= MIN_PROFILED_STEPS and metrics.get("it_per_sec"):
+            throughput_profiles.record(self.throughput_key, metrics["it_per_sec"])
+        self.throughput_key = None
+
+    def stream_output(self, tail_lines: int = 50, min_interval: float = 0.5):
+        """
+        Stream the training progress and the tail of the output to the UI while the command runs.
+
+        Yields:
+        - tuple: The progress markdown and the output tail.
+        """
+        supervisor = self.supervisor
+        if supervisor is None:
+            return
+
+        version = -1
+        while True:
+            version = supervisor.wait_for_update(version, timeout=5)
+            yield (
+                format_progress(supervisor.get_metrics()),
+                supervisor.tail(tail_lines),
+            )
+            if not supervisor.is_running() and not supervisor.thread.is_alive():
+                break
+            # Throttle UI updates, tqdm can print many lines per second
+            time.sleep(min_interval)
+
     def is_running(self):
         """
         Check if the command is currently running.
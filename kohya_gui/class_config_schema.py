@@ -0,0 +1,244 @@
+import inspect
+
+import gradio as gr
+
+from .common_gui import update_my_data
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+# Keys renamed over time, old name -> current name
+LEGACY_ALIASES = {
+    "lora_network_weights": "network_weights",
+}
+
+# Leading arguments of save_configuration which are not settings
+SAVE_CONFIGURATION_ARGUMENTS = ["save_as_bool", "file_path"]
+
+# Types of the settings whose component does not tell them, like gr.Number fields
+# without precision=0 which sd-scripts reads as integers
+PARAMETER_TYPES = {
+    "caption_dropout_every_n_epochs": "int",
+    "clip_skip": "int",
+    "epoch": "int",
+    "gradient_accumulation_steps": "int",
+    "keep_tokens": "int",
+    "lr_scheduler_num_cycles": "int",
+    "lr_warmup": "int",
+    "max_data_loader_n_workers": "int",
+    "max_token_length": "int",
+    "max_train_epochs": "int",
+    "max_train_steps": "int",
+    "save_every_n_epochs": "int",
+    "seed": "int",
+    "adaptive_noise_scale": "float",
+    "learning_rate": "float",
+    "lr_scheduler_power": "float",
+    "noise_offset": "float",
+    "text_encoder_lr": "float",
+    "unet_lr": "float",
+}
+
+
+def parameter_type(component) -> str:
+    """
+    Infer the type of a setting from its Gradio component and initial value.
+
+    Returns:
+    - str: One of "bool", "int", "float", "str", "list" or "any".
+    """
+    value = getattr(component, "value", None)
+    if isinstance(component, gr.Checkbox):
+        return "bool"
+    if isinstance(component, gr.Number):
+        return "int" if component.precision == 0 else "float"
+    if isinstance(component, gr.Slider):
+        return "int" if float(component.step).is_integer() else "float"
+    if isinstance(component, gr.Textbox):
+        return "str"
+    if isinstance(component, gr.Dropdown) and component.multiselect:
+        return "list"
+    # Dropdowns and radios keep their choice type, coerce numbers read back as strings
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    return "any"
+
+
+class ConfigSchema:
+    """
+    Declarative description of the settings of a training tab: name, type, default and
+    legacy aliases of each parameter, in the positional order of the tab settings list.
+
+    The schema drives saving (every setting is written, coerced to its type, so a saved
+    config loads the same on any machine and after a default changes), loading (one pass
+    migrating, validating and coercing the values) and the UI update (only the values
+    which changed are pushed back to the components).
+    """
+
+    def __init__(self, names: list, components: list, config=None):
+        """
+        Initialize the ConfigSchema.
+
+        Parameters:
+        - names (list): The parameter names, in the order of the components.
+        - components (list): The Gradio components of the settings.
+        - config (KohyaSSGUIConfig): Optional GUI configuration. Components initialized from
+          config.toml use the code default as schema default, so settings missing from a
+          loaded file do not depend on the local config.toml.
+        """
+        if len(names) != len(components):
+            raise ValueError(
+                f"{len(names)} parameter names for {len(components)} components"
+            )
+
+        code_default = getattr(config, "code_default", None)
+        self.parameters = {}
+        for name, component in zip(names, components):
+            default = getattr(component, "value", None)
+            if code_default is not None:
+                default = code_default(name, default)
+
+            parameter = {
+                "type": PARAMETER_TYPES.get(name) or parameter_type(component),
+                "default": None,
+            }
+            # Defaults which cannot be known are left as None, missing settings then
+            # keep their current value
+            if default is not None and not callable(default):
+                try:
+                    parameter["default"] = self.coerce_value(parameter, default)
+                except (TypeError, ValueError):
+                    pass
+            self.parameters[name] = parameter
+
+    @classmethod
+    def from_save_configuration(cls, function, components: list, config=None):
+        """
+        Build the schema of a tab from the signature of its save_configuration function,
+        whose arguments after SAVE_CONFIGURATION_ARGUMENTS match the settings list.
+        """
+        names = [
+            name
+            for name in inspect.signature(function).parameters
+            if name not in SAVE_CONFIGURATION_ARGUMENTS
+        ]
+        return cls(names, components, config=config)
+
+    @staticmethod
+    def coerce_value(parameter: dict, value):
+        """
+        Convert a value to the type of a parameter, raising ValueError or TypeError if it cannot.
+        """
+        kind = parameter["type"]
+        if kind == "bool":
+            if isinstance(value, str):
+                return value.strip().lower() in ["true", "1", "yes"]
+            return bool(value)
+        if kind == "int":
+            return int(float(value))
+        if kind == "float":
+            return float(value)
+        if kind == "str":
+            return value if isinstance(value, str) else str(value)
+        if kind == "list":
+            return list(value) if isinstance(value, (list, tuple)) else [value]
+        return value
+
+    def defaults(self) -> dict:
+        """
+        Return the known defaults of the settings, to complete a config saved without them.
+        """
+        return {
+            name: parameter["default"]
+            for name, parameter in self.parameters.items()
+            if parameter["default"] is not None
+        }
+
+    def coerce(self, name: str, value):
+        """
+        Convert a value to the type of a parameter, falling back to its default.
+        """
+        parameter = self.parameters[name]
+        try:
+            return self.coerce_value(parameter, value)
+        except (TypeError, ValueError):
+            log.warning(
+                f"Invalid value {value!r} for {name}, using the default {parameter['default']!r}"
+            )
+            return parameter["default"]
+
+    def normalize(self, data: dict) -> dict:
+        """
+        Migrate and validate loaded settings in one pass: legacy keys are renamed, legacy
+        values updated and known values coerced to their type. Unknown keys are kept as is.
+        """
+        for old_name, name in LEGACY_ALIASES.items():
+            if old_name in data:
+                data.setdefault(name, data[old_name])
+                del data[old_name]
+
+        data = update_my_data(data)
+
+        settings = {}
+        for name, value in data.items():
+            if value is None:
+                continue
+            if name not in self.parameters:
+                settings[name] = value
+                continue
+            settings[name] = self.coerce(name, value)
+        return settings
+
+    def dump(self, parameters: list) -> dict:
+        """
+        Return the settings to save, coerced to their type.
+
+        Parameters:
+        - parameters (list): (name, value) pairs, as collected from locals() in save_configuration.
+
+        Returns:
+        - dict: The settings to save, in schema order.
+        """
+        values = dict(parameters)
+        settings = {}
+        for name in self.parameters:
+            if name not in values:
+                continue
+            if values[name] is None:
+                settings[name] = None
+            else:
+                settings[name] = self.coerce(name, values[name])
+        return settings
+
+    def updates(self, settings: dict, parameters: list, keep_missing: bool) -> list:
+        """
+        Compute the UI values after loading settings, only pushing the values which changed.
+
+        Parameters:
+        - settings (dict): The normalized settings read from a file.
+        - parameters (list): (name, current value) pairs of the components, in output order.
+        - keep_missing (bool): Whether settings missing from the file keep their current value,
+          for presets applied on top of the current settings, or reset to their default.
+
+        Returns:
+        - list: A value or gr.update() per parameter.
+        """
+        updates = []
+        for name, current in parameters:
+            if name not in self.parameters:
+                updates.append(settings.get(name, current))
+                continue
+
+            if name in settings:
+                value = settings[name]
+            elif keep_missing or self.parameters[name]["default"] is None:
+                value = current
+            else:
+                value = self.parameters[name]["default"]
+            updates.append(gr.update() if value == current else value)
+        return updates
@@ -1,6 +1,7 @@
 import gradio as gr
 import os
 from .common_gui import list_files, scriptdir, create_refresh_button
+from .class_preset_index import preset_index
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -27,6 +28,10 @@ class ConfigurationFile:
 
         self.config = config
 
+        # Settings defaults of the training tab, set once its settings schema is built.
+        # Presets saved without some settings are searched with these values.
+        self.defaults = {}
+
         # Sets the directory for storing configuration files, defaults to a 'presets' folder within the script directory.
         self.current_config_dir = self.config.get(
             "config_dir", os.path.join(scriptdir, "presets")
@@ -49,6 +54,33 @@ class ConfigurationFile:
         # Lists all .json files in the current configuration directory, used for populating dropdown choices.
         return list(list_files(self.current_config_dir, exts=[".json"], all=True))
 
+    def search_config_dir(self, query: str) -> list:
+        """
+        Search the configuration files of the current directory and its subdirectories.
+
+        Parameters:
+        - query (str): Full-text terms and field filters like "optimizer:adamw8bit" or "dim>=64".
+          An empty query lists the current directory.
+
+        Returns:
+        - list: The dropdown choices, labelled with the model, optimizer, dim and learning rate.
+        """
+        if not query or not query.strip():
+            return self.list_config_dir(self.current_config_dir)
+
+        directory = self.current_config_dir
+        if not os.path.isdir(directory):
+            directory = os.path.dirname(directory) or "."
+        return preset_index.choices(directory, query, self.defaults)
+
+    def on_config_file_change(self, path: str):
+        # Only list the folder again when navigating to another folder, selecting a
+        # file keeps the current choices
+        if path and not os.path.isdir(path):
+            self.current_config_dir = os.path.dirname(path) or "."
+            return gr.Dropdown()
+        return gr.Dropdown(choices=[""] + self.list_config_dir(path))
+
     def create_config_gui(self) -> None:
         """
         Create the GUI for configuration file operations.
@@ -94,10 +126,24 @@ class ConfigurationFile:
                     elem_classes=["tool"],
                 )
 
+            # Full-text and field search over the indexed configuration files.
+            self.config_search = gr.Textbox(
+                label="Search configs",
+                placeholder="Text or filters, e.g. sdxl optimizer:adamw8bit dim>=64 lr<=1e-4 (press Enter)",
+                interactive=True,
+            )
+
             # Handler for change events on the configuration file dropdown, allowing dynamic update of choices.
             self.config_file_name.change(
-                fn=lambda path: gr.Dropdown(choices=[""] + self.list_config_dir(path)),
+                fn=self.on_config_file_change,
                 inputs=self.config_file_name,
                 outputs=self.config_file_name,
                 show_progress=False,
             )
+
+            self.config_search.submit(
+                fn=lambda query: gr.Dropdown(choices=[""] + self.search_config_dir(query)),
+                inputs=self.config_search,
+                outputs=self.config_file_name,
+                show_progress=False,
+            )
@@ -0,0 +1,365 @@
+import math
+from collections import Counter
+
+import gradio as gr
+
+from .class_training_estimator import (
+    bucket_items,
+    bucket_settings,
+    config_datasets,
+    folder_subsets,
+    parse_resolution,
+    write_dataset_config,
+)
+from .common_gui import function_arguments, get_saveasfilename_path
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+document_symbol = "\U0001f4c4"  # 📄
+
+SUBSET_HEADERS = [
+    "Image folder",
+    "Regularization",
+    "Repeats",
+    "Class tokens",
+    "Resolution",
+    "Caption extension",
+    "Keep tokens",
+]
+SUBSET_DATATYPES = ["str", "bool", "number", "str", "str", "str", "str"]
+
+SHARD_HEADERS = ["Rank", "Batches", "Padding batches", "Expected items"]
+SHARD_BUCKET_HEADERS = [
+    "Dataset",
+    "Bucket",
+    "Items",
+    "Batches",
+    "Partial batches",
+    "Share of the batches",
+]
+
+
+def scan_subsets(
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    caption_extension: str = ".txt",
+    keep_tokens: int = 0,
+) -> list:
+    """
+    List the <repeats>_<class tokens> folders of the train and regularization folders
+    as subset rows. The resolution is left empty to use the one of the training tab.
+    """
+    return [
+        [
+            subset["image_dir"],
+            subset["is_reg"],
+            subset["num_repeats"],
+            subset["class_tokens"],
+            "",
+            caption_extension or ".txt",
+            str(int(keep_tokens or 0)),
+        ]
+        for subset in folder_subsets(train_data_dir, reg_data_dir)
+    ]
+
+
+def table_rows(rows) -> list:
+    # Gradio may hand the table over as a pandas DataFrame
+    if rows is not None and hasattr(rows, "values"):
+        rows = rows.values.tolist()
+    return [row for row in rows or [] if row and str(row[0]).strip()]
+
+
+def build_dataset_config(rows) -> dict:
+    """
+    Build a sd-scripts dataset config from subset rows.
+
+    The resolution is a dataset setting in sd-scripts, subsets are grouped into one
+    dataset per resolution. Settings left empty fall back to the training tab
+    arguments when training.
+
+    Returns:
+    - dict: The dataset config, ready to be written with write_dataset_config.
+    """
+    datasets = {}
+    for image_dir, is_reg, repeats, class_tokens, resolution, caption_extension, keep_tokens in table_rows(rows):
+        subset = {"image_dir": str(image_dir).strip(), "num_repeats": int(float(repeats or 1))}
+        if str(is_reg).lower() in ["true", "1"]:
+            subset["is_reg"] = True
+        if class_tokens:
+            subset["class_tokens"] = str(class_tokens)
+        if caption_extension:
+            subset["caption_extension"] = str(caption_extension)
+        if str(keep_tokens).strip():
+            subset["keep_tokens"] = int(float(keep_tokens))
+
+        resolution = list(parse_resolution(resolution)) if str(resolution or "").strip() else None
+        key = tuple(resolution) if resolution else None
+        if key not in datasets:
+            datasets[key] = {"resolution": resolution} if resolution else {}
+            datasets[key]["subsets"] = []
+        datasets[key]["subsets"].append(subset)
+
+    return {"datasets": list(datasets.values())}
+
+
+def shard_datasets(datasets: list, num_processes: int) -> dict:
+    """
+    Model how the batches of the datasets spread across the ranks of a multi GPU training.
+
+    sd-scripts does not assign buckets to ranks: every dataset cuts its buckets into
+    batches, the batches of all datasets are shuffled together every epoch, and accelerate
+    deals them to the ranks by stride. The ranks run their steps in lockstep, so a step
+    where they train batches of different resolutions makes the faster ones wait, and
+    when the batches do not divide evenly the first batches of the epoch are trained
+    again to give every rank the same number of steps. With the shuffle, the resolution
+    mismatch is only known as an expectation: the chance that the batches of a step all
+    come from buckets of the same resolution.
+
+    Returns:
+    - dict: The rank rows, the bucket rows, the steps per epoch, the padding batches, the
+      partial batches and the expected steps mixing resolutions.
+    """
+    num_processes = max(1, int(num_processes))
+    bucket_rows = []
+    batches_by_reso = Counter()
+    items = 0
+    partial = 0
+
+    for index, dataset in enumerate(datasets, start=1):
+        batch_size = max(1, dataset["batch_size"])
+        counts = bucket_items(dataset)
+        for reso, bucket_count in sorted(counts["buckets"].items(), key=lambda bucket: -bucket[1]):
+            batches = math.ceil(bucket_count / batch_size)
+            batches_by_reso[reso] += batches
+            items += bucket_count
+            partial += 1 if bucket_count % batch_size else 0
+            bucket_rows.append(
+                [
+                    index,
+                    f"{reso[0]}x{reso[1]}",
+                    bucket_count,
+                    batches,
+                    1 if bucket_count % batch_size else 0,
+                ]
+            )
+
+    total = sum(batches_by_reso.values())
+    steps = math.ceil(total / num_processes)
+    padding = steps * num_processes - total
+    bucket_rows = [row + [f"{row[3] / total:.1%}"] for row in bucket_rows]
+
+    # Chance that the batches drawn by the ranks for one step, without replacement, all
+    # have the same resolution
+    draws = min(num_processes, total)
+    same = 0.0
+    for batches in batches_by_reso.values():
+        chance = 1.0
+        for k in range(draws):
+            chance *= max(0, batches - k) / (total - k)
+        same += chance
+    mixed = steps * (1 - same) if num_processes > 1 and total else 0.0
+
+    # Ranks past the remainder of the last round train a padding batch
+    remainder = total % num_processes
+    ranks = []
+    for number in range(num_processes):
+        rank_padding = 1 if remainder and number >= remainder else 0
+        ranks.append(
+            [
+                number,
+                steps,
+                rank_padding,
+                round(steps * items / total, 1) if total else 0,
+            ]
+        )
+
+    return {
+        "ranks": ranks,
+        "buckets": bucket_rows,
+        "steps": steps,
+        "padding": padding,
+        "partial": partial,
+        "mixed": mixed,
+        "num_processes": num_processes,
+    }
+
+
+def shard_from_settings(
+    rows,
+    train_batch_size: int = 1,
+    num_processes: int = 1,
+    max_resolution: str = "512,512",
+    enable_bucket: bool = True,
+    min_bucket_reso: int = 256,
+    max_bucket_reso: int = 2048,
+    bucket_reso_steps: int = 64,
+    bucket_no_upscale: bool = False,
+) -> dict:
+    """
+    Shard the datasets of the subset rows, with the training tab settings for what the
+    rows leave empty.
+    """
+    bucket_defaults = {
+        "resolution": max_resolution or "512,512",
+        "enable_bucket": enable_bucket,
+        "min_bucket_reso": min_bucket_reso or 256,
+        "max_bucket_reso": max_bucket_reso or 2048,
+        "bucket_reso_steps": bucket_reso_steps or 64,
+        "bucket_no_upscale": bucket_no_upscale,
+    }
+    # Validate the defaults before walking the folders
+    bucket_settings(**bucket_defaults)
+    datasets = config_datasets(
+        build_dataset_config(rows), int(train_batch_size or 1), bucket_defaults
+    )
+    return shard_datasets(datasets, int(num_processes or 1))
+
+
+def format_shards(report: dict) -> str:
+    steps = report["steps"]
+    lines = [
+        f"- Ranks: {report['num_processes']}, steps per epoch: {steps}",
+        f"- Padding batches (first batches of the epoch trained again to even out the ranks): {report['padding']}",
+        f"- Partial batches (last batch of a bucket, smaller than the batch size): {report['partial']}",
+    ]
+    if report["num_processes"] > 1:
+        lines.append(
+            f"- Expected steps where the ranks train different resolutions: {report['mixed']:.1f}"
+            + (f" ({report['mixed'] / steps:.0%})" if steps else "")
+        )
+        lines.append(
+            "- The batches are shuffled across buckets every epoch, fewer and fuller buckets "
+            "(coarser bucket steps, a narrower bucket range) make mixed steps rarer."
+        )
+    return "\n".join(lines)
+
+
+class DatasetConfigGenerator:
+    """
+    Panel generating a dataset config TOML file from the folders of a training tab, with
+    a view of how the buckets shard across the ranks of a multi GPU training.
+    """
+
+    def __init__(self, components: dict, headless: bool = False):
+        """
+        Initialize the DatasetConfigGenerator panel.
+
+        Parameters:
+        - components (dict): The components of the training tab, by setting name. The
+          dataset_config component receives the generated file.
+        - headless (bool): Whether to run in headless mode.
+        """
+        self.scan_components = function_arguments(scan_subsets, components)
+        self.shard_components = function_arguments(shard_from_settings, components)
+        self.dataset_config = components.get("dataset_config")
+        self.headless = headless
+
+        with gr.Accordion("Dataset config generator", open=False):
+            gr.Markdown(
+                "Build a dataset config TOML file from the <repeats>_<class tokens> folders. "
+                "Edit the repeats, resolution, caption extension and keep tokens of each subset, "
+                "empty values use the settings of this tab. Subsets are grouped in one dataset "
+                "per resolution."
+            )
+            self.button_scan = gr.Button("Scan folders")
+            self.subsets = gr.Dataframe(
+                headers=SUBSET_HEADERS,
+                datatype=SUBSET_DATATYPES,
+                interactive=True,
+                type="array",
+                wrap=True,
+            )
+            with gr.Row():
+                self.config_file = gr.Textbox(
+                    label="Dataset config file",
+                    placeholder="Path of the TOML file to write",
+                    interactive=True,
+                )
+                self.config_file_button = gr.Button(
+                    document_symbol,
+                    elem_id="open_folder_small",
+                    elem_classes=["tool"],
+                    visible=(not headless),
+                )
+                self.config_file_button.click(
+                    lambda path: get_saveasfilename_path(path, "*.toml", "TOML files"),
+                    inputs=self.config_file,
+                    outputs=self.config_file,
+                    show_progress=False,
+                )
+                self.button_write = gr.Button("Write dataset config")
+            self.write_status = gr.Markdown()
+
+            gr.Markdown(
+                "Shard view: how the shuffled batches of the buckets spread across the GPUs "
+                "(number of processes) at the train batch size, the padding batches and the "
+                "expected steps where the GPUs train different resolutions."
+            )
+            self.button_shard = gr.Button("Shard by rank")
+            self.shard_summary = gr.Markdown()
+            self.shard_ranks = gr.Dataframe(headers=SHARD_HEADERS, interactive=False)
+            self.shard_buckets = gr.Dataframe(
+                headers=SHARD_BUCKET_HEADERS, interactive=False, wrap=True
+            )
+
+        self.button_scan.click(
+            self.scan,
+            inputs=list(self.scan_components.values()),
+            outputs=[self.subsets],
+            show_progress=False,
+        )
+        write_outputs = [self.write_status]
+        if self.dataset_config is not None:
+            write_outputs.append(self.dataset_config)
+        self.button_write.click(
+            self.write,
+            inputs=[self.subsets, self.config_file],
+            outputs=write_outputs,
+            show_progress=False,
+        )
+        self.button_shard.click(
+            self.shard,
+            inputs=[self.subsets] + list(self.shard_components.values()),
+            outputs=[self.shard_summary, self.shard_ranks, self.shard_buckets],
+            show_progress=False,
+        )
+
+    def scan(self, *values):
+        settings = dict(zip(self.scan_components, values))
+        return gr.Dataframe(value=scan_subsets(**settings))
+
+    def write(self, rows, config_file):
+        unchanged = [gr.update()] if self.dataset_config is not None else []
+        if not table_rows(rows):
+            return ["Scan the folders first."] + unchanged
+        if not config_file:
+            return ["Please provide a dataset config file."] + unchanged
+        try:
+            config = build_dataset_config(rows)
+            write_dataset_config(config, config_file)
+        except (OSError, ValueError, TypeError) as e:
+            return [f"Could not write the dataset config: {e}"] + unchanged
+        message = (
+            f"Wrote {len(config['datasets'])} datasets to {config_file}"
+            + (", it is now the dataset config of this tab." if unchanged else ".")
+        )
+        return [message] + ([config_file] if unchanged else [])
+
+    def shard(self, rows, *values):
+        settings = dict(zip(self.shard_components, values))
+        try:
+            report = shard_from_settings(rows, **settings)
+        except (OSError, ValueError, IndexError, TypeError) as e:
+            return (
+                f"Could not shard the datasets: {e}",
+                gr.Dataframe(value=[]),
+                gr.Dataframe(value=[]),
+            )
+        return (
+            format_shards(report),
+            gr.Dataframe(value=report["ranks"]),
+            gr.Dataframe(value=report["buckets"]),
+        )
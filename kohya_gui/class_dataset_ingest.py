@@ -0,0 +1,285 @@
+import os
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from .common_gui import IMAGE_EXTENSIONS
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+INGEST_OK = "ok"
+INGEST_DOWNSCALED = "downscaled"
+INGEST_CORRUPT = "corrupt"
+# The image decodes but its downscaled copy could not be written, it is kept as is
+INGEST_DOWNSCALE_FAILED = "downscale_failed"
+
+# Quality of the downscaled lossy images, well above the Pillow default
+LOSSY_SAVE_OPTIONS = {"JPEG": {"quality": 95}, "WEBP": {"quality": 95}}
+
+# Buffer size used to stream zip members and uploaded files to their final name
+COPY_BUFFER_SIZE = 1024 * 1024
+
+DEFAULT_MAX_INGEST_WORKERS = 8
+
+
+def check_image(path: str, max_side: int = 0) -> tuple:
+    """
+    Verify and fully decode an image, downscaling it when its longest side is larger
+    than max_side. The downscaled image replaces the original only once fully written.
+    Runs in the ingest worker processes.
+
+    Returns:
+    - tuple: The path, its status (INGEST_OK, INGEST_DOWNSCALED, INGEST_DOWNSCALE_FAILED
+      or INGEST_CORRUPT) and an error message.
+    """
+    try:
+        # verify() checks the file structure but leaves the image unusable,
+        # the image is opened again to decode the pixel data
+        with Image.open(path) as image:
+            image.verify()
+        with Image.open(path) as image:
+            image.load()
+            if not max_side or max(image.size) <= max_side:
+                return path, INGEST_OK, ""
+            image_format = image.format
+            resized = image.copy()
+    except Exception as e:
+        return path, INGEST_CORRUPT, str(e)
+
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    try:
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_format == "JPEG" and resized.mode not in ["RGB", "L"]:
+            resized = resized.convert("RGB")
+        resized.save(tmp_path, format=image_format, **LOSSY_SAVE_OPTIONS.get(image_format, {}))
+        os.replace(tmp_path, path)
+        return path, INGEST_DOWNSCALED, ""
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return path, INGEST_DOWNSCALE_FAILED, str(e)
+
+
+def is_ingestible(name: str) -> bool:
+    """
+    Whether a file or zip member name is an image worth ingesting, skipping folders,
+    hidden files and macOS resource forks.
+    """
+    if name.endswith("/") or "__MACOSX" in name.split("/"):
+        return False
+    filename = os.path.basename(name)
+    return (
+        bool(filename)
+        and not filename.startswith(".")
+        and filename.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+class DatasetIngestor:
+    """
+    Ingest uploaded images and zip files into a dataset folder.
+
+    Zip members are streamed straight to their final, deduplicated name. Each written
+    image is then verified, decoded and optionally downscaled in a process pool while
+    the next files are written, corrupt images are removed.
+    """
+
+    def __init__(self, target_dir: str, max_side: int = 0, max_workers: int = None):
+        """
+        Initialize the DatasetIngestor.
+
+        Parameters:
+        - target_dir (str): The folder the images are written to.
+        - max_side (int): Downscale images whose longest side is larger, 0 to keep them as is.
+        - max_workers (int): The number of image checking processes, defaults to the CPU count.
+        """
+        self.target_dir = target_dir
+        self.max_side = int(max_side or 0)
+        self.max_workers = max_workers or min(
+            DEFAULT_MAX_INGEST_WORKERS, os.cpu_count() or 1
+        )
+        os.makedirs(target_dir, exist_ok=True)
+        # Lower case names, so deduplication also holds on case insensitive file systems
+        self.names = {name.lower() for name in os.listdir(target_dir)}
+        self.stats = {
+            "images": 0,
+            "renamed": 0,
+            INGEST_DOWNSCALED: 0,
+            INGEST_CORRUPT: 0,
+            INGEST_DOWNSCALE_FAILED: 0,
+            "skipped": 0,
+        }
+        self.messages = []
+
+    def unique_name(self, filename: str) -> str:
+        """
+        Reserve a file name in the target folder, appending a counter on collision.
+        """
+        base, ext = os.path.splitext(filename)
+        name = filename
+        counter = 1
+        while name.lower() in self.names:
+            name = f"{base}_{counter}{ext}"
+            counter += 1
+        self.names.add(name.lower())
+        if name != filename:
+            self.stats["renamed"] += 1
+        return name
+
+    def plan(self, paths: list) -> list:
+        """
+        List the images to ingest from uploaded files, without extracting anything.
+
+        Returns:
+        - list: (source path, zip member or None, file name) of each image.
+        """
+        items = []
+        for path in paths:
+            filename = os.path.basename(path)
+            if filename.lower().endswith(".zip"):
+                try:
+                    with zipfile.ZipFile(path, "r") as zip_ref:
+                        members = [
+                            info
+                            for info in zip_ref.infolist()
+                            if not info.is_dir() and is_ingestible(info.filename)
+                        ]
+                except zipfile.BadZipFile:
+                    log.error(f"Uploaded file {filename} is not a valid zip file.")
+                    self.messages.append(f"Error: {filename} is not a valid zip file.")
+                    continue
+                items.extend(
+                    (path, info.filename, os.path.basename(info.filename))
+                    for info in members
+                )
+                self.messages.append(f"Found {len(members)} images in {filename}.")
+            elif is_ingestible(filename):
+                items.append((path, None, filename))
+            else:
+                log.warning(f"Skipping unsupported file type: {filename}")
+                self.messages.append(f"Skipped unsupported file: {filename}.")
+                self.stats["skipped"] += 1
+        return items
+
+    def write(self, zip_ref, source: str, member: str, filename: str) -> str:
+        target_path = os.path.join(self.target_dir, self.unique_name(filename))
+        if member is None:
+            shutil.copyfile(source, target_path)
+        else:
+            with zip_ref.open(member) as src, open(target_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+        return target_path
+
+    def collect(self, path: str, future, report) -> None:
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # A worker died, on a decoder crash for instance, check the image inline
+            log.warning(f"Ingest process failed on {os.path.basename(path)}: {e}")
+            result = check_image(path, self.max_side)
+        report(result)
+
+    def ingest(self, paths: list, progress=None) -> dict:
+        """
+        Ingest uploaded images and zip files.
+
+        Parameters:
+        - paths (list): The uploaded file paths.
+        - progress (callable): Optional progress(done, total, description) callback,
+          called for each checked image.
+
+        Returns:
+        - dict: The number of images added, renamed, downscaled, corrupt and skipped.
+        """
+        items = self.plan(paths)
+        total = len(items)
+        done = 0
+
+        def report(result):
+            nonlocal done
+            path, status, error = result
+            done += 1
+            if status == INGEST_CORRUPT:
+                log.warning(f"Removing corrupt image {os.path.basename(path)}: {error}")
+                self.messages.append(
+                    f"Removed corrupt image {os.path.basename(path)}: {error}"
+                )
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                self.stats[INGEST_CORRUPT] += 1
+            else:
+                self.stats["images"] += 1
+                if status == INGEST_DOWNSCALED:
+                    self.stats[INGEST_DOWNSCALED] += 1
+                elif status == INGEST_DOWNSCALE_FAILED:
+                    log.warning(f"Could not downscale {os.path.basename(path)}, keeping it as is: {error}")
+                    self.messages.append(
+                        f"Kept {os.path.basename(path)} at its original size, it could not be downscaled: {error}"
+                    )
+                    self.stats[INGEST_DOWNSCALE_FAILED] += 1
+            if progress is not None:
+                progress(done, total, os.path.basename(path))
+
+        try:
+            pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        except (OSError, NotImplementedError) as e:
+            log.warning(f"Could not start the ingest processes, checking inline: {e}")
+            pool = None
+
+        pending = []
+        zip_ref, zip_path = None, None
+        try:
+            for source, member, filename in items:
+                # Members of a zip are contiguous, keep it open while they are written
+                if member is not None and source != zip_path:
+                    if zip_ref is not None:
+                        zip_ref.close()
+                    zip_ref, zip_path = zipfile.ZipFile(source, "r"), source
+                try:
+                    target_path = self.write(zip_ref, source, member, filename)
+                except (OSError, zipfile.BadZipFile, RuntimeError) as e:
+                    log.error(f"Error writing {member or filename}: {e}")
+                    self.messages.append(f"Error writing {member or filename}: {e}")
+                    done += 1
+                    continue
+
+                if pool is not None:
+                    try:
+                        future = pool.submit(check_image, target_path, self.max_side)
+                    except BrokenProcessPool as e:
+                        log.warning(f"Ingest processes failed, checking inline: {e}")
+                        pool.shutdown(wait=False)
+                        pool = None
+                if pool is None:
+                    report(check_image(target_path, self.max_side))
+                    continue
+                pending.append((target_path, future))
+                # Report the checks finished while writing, keeping the order of the others
+                while pending and pending[0][1].done():
+                    self.collect(*pending.pop(0), report)
+
+            for target_path, future in pending:
+                self.collect(target_path, future, report)
+        finally:
+            if zip_ref is not None:
+                zip_ref.close()
+            if pool is not None:
+                pool.shutdown()
+
+        self.messages.append(
+            f"Added {self.stats['images']} images, renamed {self.stats['renamed']}, "
+            f"downscaled {self.stats[INGEST_DOWNSCALED]}, removed {self.stats[INGEST_CORRUPT]} corrupt."
+            + (
+                f" {self.stats[INGEST_DOWNSCALE_FAILED]} could not be downscaled and were kept as is."
+                if self.stats[INGEST_DOWNSCALE_FAILED]
+                else ""
+            )
+        )
+        return self.stats
@@ -16,6 +16,9 @@ class KohyaSSGUIConfig:
         Initialize the KohyaSSGUIConfig class.
         """
         self.config = self.load_config(config_file_path=config_file_path)
+        # Code defaults of the keys found in the configuration, by full dotted key, so
+        # training configs are completed with the defaults of the code
+        self.overridden_defaults = {}
 
     def load_config(self, config_file_path: str = "./config.toml") -> dict:
         """
@@ -77,10 +80,44 @@ class KohyaSSGUIConfig:
             # Update `data` to the value associated with the current key
             data = data.get(k)
 
+        self.overridden_defaults[key] = default
+
         # Return the final value
         log.debug(f"Returned {data}")
         return data
 
+    def code_default(self, name: str, value):
+        """
+        Return the code default of a setting whose component was initialized with `value`.
+
+        Settings are named after their key, with the section for some (sd3.clip_l is
+        sd3_clip_l) and without it for others (advanced.seed is seed). A key only matches
+        when its configured value is the value of the component, so keys of the same name
+        in other sections are not mixed up.
+
+        Parameters:
+        - name (str): The setting name.
+        - value: The initial value of its component.
+
+        Returns:
+        The code default of the key the component was initialized from, or `value` if
+        it did not come from the configuration.
+        """
+        candidates = [
+            key
+            for key in self.overridden_defaults
+            if key.replace(".", "_") == name or key.split(".")[-1] == name
+        ]
+        # Keys named after the full setting name first, sd3.clip_l before flux1.clip_l
+        candidates.sort(key=lambda key: key.replace(".", "_") != name)
+        for key in candidates:
+            data = self.config
+            for k in key.split("."):
+                data = data.get(k) if isinstance(data, dict) else None
+            if data == value:
+                return self.overridden_defaults[key]
+        return value
+
     def is_config_loaded(self) -> bool:
         """
         Checks if the configuration was loaded from a file.
@@ -0,0 +1,244 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import toml
+from PIL import Image
+
+from .class_json_cache import JsonCache
+from .common_gui import IMAGE_EXTENSIONS, output_message, scriptdir
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+DEFAULT_PREFLIGHT_CACHE_FILE = os.path.join(scriptdir, "logs", "image_preflight.json")
+
+PREFLIGHT_OK = "ok"
+PREFLIGHT_WARNING = "warning"
+PREFLIGHT_ERROR = "error"
+
+# EXIF tag of the orientation, sd-scripts loads the raw pixels without applying it
+EXIF_ORIENTATION = 0x0112
+
+# Modes sd-scripts converts to RGB without loss
+RGB_MODES = ["RGB", "L"]
+
+# Files checked per worker call
+PREFLIGHT_CHUNK_SIZE = 64
+# Problem files listed in the log report
+MAX_REPORTED_FILES = 20
+
+
+def verify_image(path: str) -> dict:
+    """
+    Check that an image can be trained on: structure verification, a decode at reduced
+    scale which still reads the whole stream, EXIF orientation and mode checks. Runs in
+    the preflight worker processes.
+
+    Returns:
+    - dict: The status (ok, warning or error) and the issues found.
+    """
+    issues = []
+    try:
+        if os.path.getsize(path) == 0:
+            return {"status": PREFLIGHT_ERROR, "issues": ["empty file"]}
+        with Image.open(path) as image:
+            image.verify()
+        with Image.open(path) as image:
+            mode = image.mode
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+            # A reduced scale decode still walks all the compressed data, so truncated
+            # files fail here at a fraction of the cost of a full decode
+            image.draft("RGB", (image.width // 8 or 1, image.height // 8 or 1))
+            image.load()
+    except Exception as e:
+        return {"status": PREFLIGHT_ERROR, "issues": [f"cannot decode: {e}"]}
+
+    if orientation not in [None, 1]:
+        issues.append(
+            f"EXIF orientation {orientation} is ignored by the training, the image is trained rotated"
+        )
+    if mode not in RGB_MODES:
+        if "A" in mode or mode == "P":
+            issues.append(f"mode {mode}, transparency is flattened to black")
+        else:
+            issues.append(f"mode {mode} is converted to RGB")
+    return {"status": PREFLIGHT_WARNING if issues else PREFLIGHT_OK, "issues": issues}
+
+
+def verify_images(paths: list) -> list:
+    return [verify_image(path) for path in paths]
+
+
+def dataset_config_folders(dataset_config: str) -> list:
+    """
+    List the image folders of the subsets of a dataset config TOML file.
+    """
+    try:
+        config = toml.load(dataset_config)
+    except (OSError, toml.TomlDecodeError) as e:
+        log.warning(f"Could not read the dataset config {dataset_config}: {e}")
+        return []
+    return [
+        subset["image_dir"]
+        for dataset in config.get("datasets", [])
+        for subset in dataset.get("subsets", [])
+        if subset.get("image_dir")
+    ]
+
+
+def list_images(folders: list) -> list:
+    images = set()
+    for folder in folders:
+        if not folder or not os.path.isdir(folder):
+            continue
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.add(os.path.abspath(os.path.join(root, name)))
+    return sorted(images)
+
+
+class ImagePreflight(JsonCache):
+    """
+    Verify the images of a training before launching it.
+
+    Results are cached on disk by (path, size, mtime), so only new or modified images
+    are checked again on the next launch. The others are checked in a process pool.
+    """
+
+    description = "image preflight cache"
+
+    def __init__(self, cache_file: str = DEFAULT_PREFLIGHT_CACHE_FILE):
+        super().__init__(cache_file)
+
+    def scan(self, folders: list, max_workers: int = None) -> dict:
+        """
+        Verify the images of folders and their subfolders.
+
+        Parameters:
+        - folders (list): The image folders.
+        - max_workers (int): The number of verifying processes, defaults to the CPU count.
+
+        Returns:
+        - dict: The number of images, of checked (not cached) images, and the errors and
+          warnings by path.
+        """
+        paths = list_images(folders)
+        report = {"images": len(paths), "checked": 0, "errors": {}, "warnings": {}}
+
+        with self.lock:
+            if self.entries is None:
+                self.load()
+
+            stale = []
+            keys = {}
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                except OSError as e:
+                    report["errors"][path] = [str(e)]
+                    continue
+                keys[path] = [stat.st_size, stat.st_mtime_ns]
+                cached = self.entries.get(path)
+                if cached is None or cached["key"] != keys[path]:
+                    stale.append(path)
+
+            # Forget the images removed from the scanned folders
+            prefixes = tuple(
+                os.path.join(os.path.abspath(folder), "")
+                for folder in folders
+                if folder and os.path.isdir(folder)
+            )
+            removed = [
+                path
+                for path in self.entries
+                if path.startswith(prefixes) and path not in keys
+            ]
+            for path in removed:
+                del self.entries[path]
+
+            if stale:
+                log.info(
+                    f"Verifying {len(stale)} new or modified images out of {len(paths)}..."
+                )
+                chunks = [
+                    stale[start : start + PREFLIGHT_CHUNK_SIZE]
+                    for start in range(0, len(stale), PREFLIGHT_CHUNK_SIZE)
+                ]
+                if len(chunks) == 1:
+                    results = [verify_images(chunks[0])]
+                else:
+                    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                        results = list(pool.map(verify_images, chunks))
+                for chunk, chunk_results in zip(chunks, results):
+                    for path, result in zip(chunk, chunk_results):
+                        self.entries[path] = {"key": keys[path], **result}
+                report["checked"] = len(stale)
+            if stale or removed:
+                self.save()
+
+            for path in keys:
+                result = self.entries[path]
+                if result["status"] == PREFLIGHT_ERROR:
+                    report["errors"][path] = result["issues"]
+                elif result["status"] == PREFLIGHT_WARNING:
+                    report["warnings"][path] = result["issues"]
+        return report
+
+
+def format_preflight_report(report: dict) -> str:
+    lines = [
+        f"Image preflight: {report['images']} images, {report['checked']} verified, "
+        f"{len(report['errors'])} errors, {len(report['warnings'])} warnings"
+    ]
+    for label, problems in [("Error", report["errors"]), ("Warning", report["warnings"])]:
+        for path, issues in list(problems.items())[:MAX_REPORTED_FILES]:
+            lines.append(f"  {label}: {path}: {'; '.join(issues)}")
+        if len(problems) > MAX_REPORTED_FILES:
+            lines.append(f"  ... and {len(problems) - MAX_REPORTED_FILES} more")
+    return "\n".join(lines)
+
+
+def preflight_training_images(
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    dataset_config: str = "",
+    headless: bool = False,
+) -> bool:
+    """
+    Verify the training and regularization images before a training is launched.
+
+    Parameters:
+    - train_data_dir (str): The training images folder.
+    - reg_data_dir (str): The regularization images folder.
+    - dataset_config (str): The dataset config TOML file, its subset folders are verified.
+    - headless (bool): Whether to run in headless mode.
+
+    Returns:
+    - bool: False if an image cannot be decoded and the training should not start.
+    """
+    folders = [train_data_dir, reg_data_dir]
+    if dataset_config:
+        folders += dataset_config_folders(dataset_config)
+
+    report = image_preflight.scan(folders)
+    message = format_preflight_report(report)
+    if report["errors"]:
+        log.error(message)
+        output_message(
+            msg=f"{len(report['errors'])} images cannot be decoded and would stop the training, "
+            "see the log for the list. Fix or remove them before training.",
+            headless=headless,
+        )
+        return False
+    if report["warnings"]:
+        log.warning(message)
+    else:
+        log.info(message)
+    return True
+
+
+# Shared preflight cache for the whole GUI process
+image_preflight = ImagePreflight()
@@ -0,0 +1,548 @@
+import json
+import os
+from datetime import datetime
+from threading import Event, RLock, Thread
+
+import gradio as gr
+
+from .class_json_cache import write_json
+from .class_latent_cache import preflight_latent_cache
+from .class_process_supervisor import ProcessSupervisor, format_progress
+from .common_gui import scriptdir, setup_environment
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_INTERRUPTED = "interrupted"
+
+JOB_QUEUE_HEADERS = [
+    "ID",
+    "Name",
+    "Priority",
+    "GPU IDs",
+    "Status",
+    "Created",
+    "Started",
+    "Ended",
+    "Return code",
+    "Progress",
+]
+
+DEFAULT_JOB_QUEUE_JOURNAL = os.path.join(scriptdir, "logs", "job_queue.json")
+
+
+def parse_gpu_ids(gpu_ids: str) -> set:
+    """
+    Parse the accelerate `gpu_ids` field into a set of GPU ids.
+
+    An empty value means the job may use every GPU of the host.
+    """
+    return {
+        gpu_id.strip() for gpu_id in str(gpu_ids or "").split(",") if gpu_id.strip()
+    }
+
+
+class JobQueue:
+    """
+    A persistent queue of training jobs.
+
+    Each job is a generated TOML config file plus the command that trains with it.
+    Jobs are started by priority (highest first, then oldest first) as soon as the
+    GPUs they use are free, and the queue state is journaled to a JSON file so it
+    survives a GUI restart.
+    """
+
+    def __init__(
+        self,
+        journal_file: str = DEFAULT_JOB_QUEUE_JOURNAL,
+        max_concurrent_jobs: int = 1,
+        max_jobs_per_gpu: int = 1,
+        poll_interval: float = 2.0,
+        is_busy=None,
+    ):
+        """
+        Initialize the JobQueue.
+
+        Parameters:
+        - journal_file (str): The JSON file used to persist the queue.
+        - max_concurrent_jobs (int): The maximum number of jobs running at the same time on this host.
+        - max_jobs_per_gpu (int): The maximum number of jobs sharing a GPU, e.g. to pack small-dim runs.
+        - poll_interval (float): Seconds between two checks of the running jobs.
+        - is_busy (callable): Optional function returning True when jobs must not be started,
+          e.g. while a training started from the "Start training" button is running.
+        """
+        self.journal_file = journal_file
+        self.max_concurrent_jobs = max(1, int(max_concurrent_jobs))
+        self.max_jobs_per_gpu = max(1, int(max_jobs_per_gpu))
+        self.poll_interval = poll_interval
+        self.is_busy = is_busy
+        self.lock = RLock()
+        self.jobs = []
+        self.next_id = 1
+        self.processes = {}
+        self.thread = None
+        self.stop_event = Event()
+        self.wake_event = Event()
+
+        self.load()
+
+    #
+    # Journal
+    #
+
+    def load(self) -> None:
+        """
+        Load the queue from the journal file.
+
+        Jobs that were running when the GUI stopped are marked as interrupted. They
+        are not restarted automatically to avoid overwriting partial outputs; use
+        `retry_job` to queue them again.
+        """
+        if not os.path.isfile(self.journal_file):
+            return
+
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error(f"Could not read job queue journal {self.journal_file}: {e}")
+            return
+
+        with self.lock:
+            self.jobs = data.get("jobs", [])
+            self.next_id = data.get("next_id", len(self.jobs) + 1)
+            for job in self.jobs:
+                if job["status"] == JOB_RUNNING:
+                    job["status"] = JOB_INTERRUPTED
+                    job["ended"] = self._now()
+            self.save()
+
+        log.info(f"Loaded {len(self.jobs)} jobs from {self.journal_file}")
+
+    def save(self) -> None:
+        """
+        Write the queue to the journal file atomically.
+        """
+        with self.lock:
+            data = {"next_id": self.next_id, "jobs": self.jobs}
+            write_json(self.journal_file, data, indent=2)
+
+    #
+    # Job management
+    #
+
+    def add_job(
+        self,
+        name: str,
+        run_cmd: list,
+        toml_file: str = "",
+        priority: int = 0,
+        gpu_ids: str = "",
+        metadata: dict = None,
+    ) -> int:
+        """
+        Add a job to the queue.
+
+        Parameters:
+        - name (str): A name for the job, usually the output name.
+        - run_cmd (list): The command to run.
+        - toml_file (str): The TOML config file used by the command.
+        - priority (int): Jobs with a higher priority start first.
+        - gpu_ids (str): The accelerate `gpu_ids` the job runs on. Empty means all GPUs.
+        - metadata (dict): Optional JSON serializable data attached to the job, e.g. sweep parameters.
+
+        Returns:
+        - int: The id of the new job.
+        """
+        with self.lock:
+            job = {
+                "id": self.next_id,
+                "name": name,
+                "run_cmd": [str(arg) for arg in run_cmd],
+                "toml_file": toml_file,
+                "priority": int(priority),
+                "gpu_ids": str(gpu_ids or ""),
+                "status": JOB_PENDING,
+                "created": self._now(),
+                "started": "",
+                "ended": "",
+                "returncode": None,
+                "log_file": os.path.join(
+                    os.path.dirname(self.journal_file) or ".",
+                    "job_queue",
+                    f"job_{self.next_id}.log",
+                ),
+                "metadata": metadata or {},
+            }
+            self.next_id += 1
+            self.jobs.append(job)
+            self.save()
+
+        log.info(f"Added job {job['id']} '{name}' to the queue with priority {job['priority']}")
+        self.wake_event.set()
+        return job["id"]
+
+    def get_job(self, job_id: int) -> dict:
+        with self.lock:
+            return next((job for job in self.jobs if job["id"] == int(job_id)), None)
+
+    def remove_job(self, job_id: int) -> bool:
+        """
+        Remove a job which is not running from the queue.
+        """
+        with self.lock:
+            job = self.get_job(job_id)
+            if job is None:
+                log.info(f"Job {job_id} does not exist.")
+                return False
+            if job["status"] == JOB_RUNNING:
+                log.info(f"Job {job_id} is running. Cancel it before removing it.")
+                return False
+            self.jobs.remove(job)
+            self.save()
+
+        log.info(f"Removed job {job_id} from the queue")
+        return True
+
+    def set_priority(self, job_id: int, priority: int) -> bool:
+        with self.lock:
+            job = self.get_job(job_id)
+            if job is None:
+                log.info(f"Job {job_id} does not exist.")
+                return False
+            job["priority"] = int(priority)
+            self.save()
+
+        self.wake_event.set()
+        return True
+
+    def retry_job(self, job_id: int) -> bool:
+        """
+        Queue a finished, failed, cancelled or interrupted job again.
+        """
+        with self.lock:
+            job = self.get_job(job_id)
+            if job is None:
+                log.info(f"Job {job_id} does not exist.")
+                return False
+            if job["status"] in [JOB_PENDING, JOB_RUNNING]:
+                log.info(f"Job {job_id} is already {job['status']}.")
+                return False
+            job.update(status=JOB_PENDING, started="", ended="", returncode=None)
+            self.save()
+
+        self.wake_event.set()
+        return True
+
+    def cancel_job(self, job_id: int) -> bool:
+        """
+        Cancel a pending job or kill a running job and its child processes.
+        """
+        with self.lock:
+            job = self.get_job(job_id)
+            if job is None:
+                log.info(f"Job {job_id} does not exist.")
+                return False
+
+            if job["status"] == JOB_PENDING:
+                job.update(status=JOB_CANCELLED, ended=self._now())
+            elif job["status"] == JOB_RUNNING:
+                supervisor = self.processes.pop(job["id"], None)
+                if supervisor is not None:
+                    supervisor.kill()
+                job.update(status=JOB_CANCELLED, ended=self._now())
+            else:
+                log.info(f"Job {job_id} is not pending or running.")
+                return False
+            self.save()
+
+        log.info(f"Cancelled job {job_id}")
+        self.wake_event.set()
+        return True
+
+    def set_limits(self, max_concurrent_jobs: int, max_jobs_per_gpu: int) -> None:
+        """
+        Change the number of jobs allowed to run at the same time on the host and per GPU.
+        """
+        with self.lock:
+            self.max_concurrent_jobs = max(1, int(max_concurrent_jobs))
+            self.max_jobs_per_gpu = max(1, int(max_jobs_per_gpu))
+
+        log.info(
+            f"Job queue limits: {self.max_concurrent_jobs} concurrent jobs, {self.max_jobs_per_gpu} jobs per GPU"
+        )
+        self.wake_event.set()
+
+    def is_running(self) -> bool:
+        with self.lock:
+            return any(job["status"] == JOB_RUNNING for job in self.jobs)
+
+    def list_jobs(self) -> list:
+        """
+        List the jobs in scheduling order, as rows matching JOB_QUEUE_HEADERS.
+        """
+        with self.lock:
+            return [
+                [
+                    job["id"],
+                    job["name"],
+                    job["priority"],
+                    job["gpu_ids"],
+                    job["status"],
+                    job["created"],
+                    job["started"],
+                    job["ended"],
+                    "" if job["returncode"] is None else job["returncode"],
+                    self._progress(job["id"]),
+                ]
+                for job in sorted(self.jobs, key=self._sort_key)
+            ]
+
+    #
+    # Scheduler
+    #
+
+    def start(self) -> None:
+        """
+        Start the scheduler thread.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the scheduler thread. Running jobs are left running.
+        """
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def schedule(self) -> None:
+        """
+        Update the state of the running jobs and start the next pending jobs.
+        """
+        with self.lock:
+            self._reap_finished_jobs()
+
+            if self.is_busy is not None and self.is_busy():
+                return
+
+            # GPUs reserved by higher priority jobs which could not start yet, so
+            # lower priority jobs only fill GPUs nobody above them is waiting for
+            reserved = []
+            for job in sorted(self.jobs, key=self._sort_key):
+                if job["status"] != JOB_PENDING:
+                    continue
+                if self._can_start(job, reserved):
+                    self._start_job(job)
+                else:
+                    reserved.append(parse_gpu_ids(job["gpu_ids"]))
+
+    def _run(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                self.schedule()
+            except Exception as e:
+                log.error(f"Job queue scheduler error: {e}")
+            self.wake_event.wait(self.poll_interval)
+            self.wake_event.clear()
+
+    def _running_jobs(self) -> list:
+        return [job for job in self.jobs if job["status"] == JOB_RUNNING]
+
+    def _can_start(self, job: dict, reserved: list) -> bool:
+        running_jobs = self._running_jobs()
+        if len(running_jobs) >= self.max_concurrent_jobs:
+            return False
+
+        # An empty gpu_ids field means the job uses every GPU, which is tracked as
+        # the "*" pseudo GPU and never shared with jobs pinned to specific GPUs
+        gpu_ids = parse_gpu_ids(job["gpu_ids"]) or {"*"}
+
+        usage = {}
+        for running_job in running_jobs:
+            for gpu_id in parse_gpu_ids(running_job["gpu_ids"]) or {"*"}:
+                usage[gpu_id] = usage.get(gpu_id, 0) + 1
+        for reserved_gpu_ids in reserved:
+            for gpu_id in reserved_gpu_ids or {"*"}:
+                usage[gpu_id] = self.max_jobs_per_gpu
+
+        if "*" in gpu_ids:
+            if any(gpu_id != "*" for gpu_id in usage):
+                return False
+        elif "*" in usage:
+            return False
+
+        return all(usage.get(gpu_id, 0) < self.max_jobs_per_gpu for gpu_id in gpu_ids)
+
+    def _start_job(self, job: dict) -> None:
+        log.info(f"Starting queued job {job['id']} '{job['name']}'...")
+        log.info(f"Executing command: {' '.join(job['run_cmd'])}")
+        # The latent caches are checked when the job starts, not when it is queued:
+        # earlier jobs may have written them in the meantime
+        preflight_latent_cache(job.get("metadata", {}).get("latent_cache"))
+        supervisor = ProcessSupervisor(
+            job["run_cmd"],
+            log_file=job.get("log_file"),
+            echo=False,
+            env=setup_environment(),
+        )
+        try:
+            process = supervisor.start()
+        except OSError as e:
+            log.error(f"Failed to start job {job['id']}: {e}")
+            job.update(status=JOB_FAILED, started=self._now(), ended=self._now())
+            self.save()
+            return
+
+        self.processes[job["id"]] = supervisor
+        job.update(status=JOB_RUNNING, started=self._now(), pid=process.pid)
+        self.save()
+
+    def _reap_finished_jobs(self) -> None:
+        changed = False
+        for job_id, process in list(self.processes.items()):
+            returncode = process.poll()
+            if returncode is None:
+                continue
+
+            del self.processes[job_id]
+            job = self.get_job(job_id)
+            if job is None:
+                continue
+            job.update(
+                status=JOB_COMPLETED if returncode == 0 else JOB_FAILED,
+                ended=self._now(),
+                returncode=returncode,
+            )
+            log.info(f"Job {job_id} '{job['name']}' {job['status']} with return code {returncode}")
+            changed = True
+
+        if changed:
+            self.save()
+
+    def _progress(self, job_id: int) -> str:
+        supervisor = self.processes.get(job_id)
+        if supervisor is None:
+            return ""
+        return format_progress(supervisor.get_metrics())
+
+    @staticmethod
+    def _sort_key(job: dict) -> tuple:
+        return (-job["priority"], job["id"])
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class JobQueueView:
+    """
+    Gradio view of a JobQueue.
+    """
+
+    def __init__(self, job_queue: JobQueue, headless: bool = False):
+        self.job_queue = job_queue
+        self.headless = headless
+
+        self.gradio_interface()
+
+    def refresh(self):
+        return gr.Dataframe(value=self.job_queue.list_jobs())
+
+    def gradio_interface(self) -> None:
+        with gr.Row():
+            self.priority = gr.Number(
+                label="Priority",
+                value=0,
+                step=1,
+                precision=0,
+                info="Priority of the jobs added to the queue. Higher priority jobs start first.",
+            )
+            self.button_add_to_queue = gr.Button("Add to queue")
+            max_concurrent_jobs = gr.Number(
+                label="Max concurrent jobs",
+                value=self.job_queue.max_concurrent_jobs,
+                step=1,
+                precision=0,
+                minimum=1,
+                info="Maximum number of queued jobs running at the same time on this host.",
+            )
+            max_jobs_per_gpu = gr.Number(
+                label="Max jobs per GPU",
+                value=self.job_queue.max_jobs_per_gpu,
+                step=1,
+                precision=0,
+                minimum=1,
+                info="Allow small runs to share a GPU.",
+            )
+
+        self.jobs = gr.Dataframe(
+            headers=JOB_QUEUE_HEADERS,
+            value=self.job_queue.list_jobs(),
+            interactive=False,
+            wrap=True,
+        )
+
+        with gr.Row():
+            self.job_id = gr.Number(label="Job ID", value=0, step=1, precision=0)
+            button_cancel = gr.Button("Cancel job", variant="stop")
+            button_retry = gr.Button("Retry job")
+            button_remove = gr.Button("Remove job")
+            button_set_priority = gr.Button("Set priority")
+            button_refresh = gr.Button("Refresh")
+
+        def run_action(action):
+            def handler(job_id, *args):
+                action(int(job_id), *args)
+                self.job_queue.wake_event.set()
+                return self.refresh()
+
+            return handler
+
+        button_cancel.click(
+            run_action(self.job_queue.cancel_job),
+            inputs=[self.job_id],
+            outputs=[self.jobs],
+            show_progress=False,
+        )
+        button_retry.click(
+            run_action(self.job_queue.retry_job),
+            inputs=[self.job_id],
+            outputs=[self.jobs],
+            show_progress=False,
+        )
+        button_remove.click(
+            run_action(self.job_queue.remove_job),
+            inputs=[self.job_id],
+            outputs=[self.jobs],
+            show_progress=False,
+        )
+        button_set_priority.click(
+            run_action(self.job_queue.set_priority),
+            inputs=[self.job_id, self.priority],
+            outputs=[self.jobs],
+            show_progress=False,
+        )
+        button_refresh.click(self.refresh, outputs=[self.jobs], show_progress=False)
+
+        for limit in [max_concurrent_jobs, max_jobs_per_gpu]:
+            limit.change(
+                self.job_queue.set_limits,
+                inputs=[max_concurrent_jobs, max_jobs_per_gpu],
+                show_progress=False,
+            )
+
+        # Keep the view in sync with the scheduler
+        gr.Timer(5).tick(self.refresh, outputs=[self.jobs], show_progress=False)
@@ -0,0 +1,62 @@
+import json
+import os
+from threading import RLock
+
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+
+def read_json(path: str, default=None):
+    """
+    Read a JSON file.
+
+    Returns:
+    - The decoded data, or default when the file is missing or not valid JSON.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path: str, data, indent: int = None) -> None:
+    """
+    Write a JSON file atomically, through a temporary file replacing it, so a reader
+    never sees a partial file. Raises OSError when the file cannot be written.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_file, path)
+
+
+class JsonCache:
+    """
+    Dict of entries stored in a JSON file, loaded on first use and saved atomically.
+    A missing or unreadable file loads as an empty cache, a failed save only logs a
+    warning since the entries can be computed again.
+    """
+
+    # Name of the cache in the warnings, and indentation of the file
+    description = "cache"
+    indent = None
+
+    def __init__(self, file: str):
+        self.file = file
+        self.entries = None
+        self.dirty = False
+        self.lock = RLock()
+
+    def load(self) -> None:
+        self.entries = read_json(self.file, {})
+
+    def save(self) -> None:
+        self.dirty = False
+        try:
+            write_json(self.file, self.entries, self.indent)
+        except OSError as e:
+            log.warning(f"Could not save the {self.description}: {e}")
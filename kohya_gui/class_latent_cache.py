@@ -0,0 +1,661 @@
+import hashlib
+import os
+import re
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import gradio as gr
+import numpy as np
+import toml
+
+from .class_json_cache import JsonCache, read_json, write_json
+from .class_training_estimator import (
+    image_size,
+    list_images,
+    model_family,
+    select_bucket,
+    training_datasets,
+)
+from .common_gui import function_arguments, get_folder_path, scriptdir
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+folder_symbol = "\U0001f4c2"  # 📂
+
+DEFAULT_LATENT_CACHE_INDEX_FILE = os.path.join(scriptdir, "logs", "latent_cache_index.json")
+RELOCATION_MANIFEST_FILE = "latent_cache_manifest.json"
+
+# Latent cache suffixes of sd-scripts by model family, after _<width>x<height> of the
+# original image. Caches named <image stem>.npz are the older format, still read first.
+LATENT_SUFFIXES = {
+    "SD1": "_sd.npz",
+    "SD2": "_sd.npz",
+    "SDXL": "_sdxl.npz",
+    "FLUX1": "_flux.npz",
+    "SD3": "_sd3.npz",
+}
+TEXT_ENCODER_SUFFIXES = ("_te_outputs.npz", "_flux_te.npz", "_sd3_te.npz")
+LATENT_PATTERN = re.compile(r"^(?P<stem>.+)_(?P<width>\d{4,})x(?P<height>\d{4,})(?P<suffix>_sd|_sdxl|_flux|_sd3)\.npz$")
+
+# The VAE downscales the bucket resolution by 8
+LATENT_STRIDE = 8
+
+CACHE_HIT = "hit"
+CACHE_UNVERIFIED = "unverified"
+CACHE_MISS = "miss"
+# sd-scripts reuses stale caches as they are, they have to be removed
+CACHE_STALE = "stale"
+# sd-scripts detects outdated caches and caches the image again
+CACHE_OUTDATED = "outdated"
+
+MAX_REPORTED_FILES = 20
+
+
+def file_key(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def image_hash(path: str, hashes: dict) -> str:
+    if path not in hashes:
+        hashes[path] = file_hash(path)
+    return hashes[path]
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def npz_shapes(path: str) -> dict:
+    """
+    Read the array shapes of a npz file from the array headers, without loading the arrays.
+    """
+    shapes = {}
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            with archive.open(name) as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, _, _ = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, _, _ = np.lib.format.read_array_header_2_0(f)
+            shapes[name[:-4] if name.endswith(".npy") else name] = shape
+    return shapes
+
+
+def latent_cache_path(image_path: str, size: tuple, family: str) -> str:
+    """
+    Return the latent cache file sd-scripts reads for an image: the older <stem>.npz when
+    it exists, <stem>_<width>x<height><suffix> otherwise.
+    """
+    stem = os.path.splitext(image_path)[0]
+    old_path = stem + ".npz"
+    if os.path.exists(old_path):
+        return old_path
+    return f"{stem}_{size[0]:04d}x{size[1]:04d}{LATENT_SUFFIXES[family]}"
+
+
+def check_latents(path: str, size: tuple, reso: tuple, flip_aug: bool) -> tuple:
+    """
+    Check that a latent cache has the latents of the bucket of its image, and that an
+    older format cache was made from an image of the same size.
+
+    Returns:
+    - tuple: The status, stale or outdated, and the problem found. An empty status when
+      the cache fits.
+    """
+    try:
+        shapes = npz_shapes(path)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        return CACHE_OUTDATED, f"unreadable: {e}"
+    latent_size = (reso[1] // LATENT_STRIDE, reso[0] // LATENT_STRIDE)
+    suffix = f"_{latent_size[0]}x{latent_size[1]}"
+    if f"latents{suffix}" not in shapes:
+        suffix = ""
+        if tuple(shapes.get("latents", ())[-2:]) != latent_size:
+            return CACHE_OUTDATED, f"no latents for bucket {reso[0]}x{reso[1]}"
+    if flip_aug and f"latents_flipped{suffix}" not in shapes:
+        return CACHE_OUTDATED, "no flipped latents for flip augmentation"
+    # The newer format names the cache after the image size, the older one does not
+    if f"original_size{suffix}" in shapes and not LATENT_PATTERN.match(path) and size[0] > 0:
+        with np.load(path) as npz:
+            original_size = tuple(int(value) for value in npz[f"original_size{suffix}"])
+        if original_size != tuple(size):
+            return (
+                CACHE_STALE,
+                f"made from a {original_size[0]}x{original_size[1]} image, now {size[0]}x{size[1]}",
+            )
+    return "", ""
+
+
+def dataset_images(datasets: list) -> list:
+    """
+    Return the path, size and bucket of every image of the datasets.
+    """
+    images = []
+    for dataset in datasets:
+        for subset in dataset["subsets"]:
+            for path in list_images(subset.get("image_dir", "")):
+                size = image_size(path)
+                images.append((os.path.abspath(path), size, select_bucket(*size, dataset["bucket"])))
+    return images
+
+
+def dataset_folders(datasets: list) -> list:
+    return sorted(
+        {
+            os.path.abspath(subset["image_dir"])
+            for dataset in datasets
+            for subset in dataset["subsets"]
+            if subset.get("image_dir") and os.path.isdir(subset["image_dir"])
+        }
+    )
+
+
+def cache_files(folders: list) -> list:
+    return [
+        os.path.join(folder, name)
+        for folder in folders
+        for name in sorted(os.listdir(folder))
+        if name.endswith(".npz")
+    ]
+
+
+def remove_cache_file(path: str) -> None:
+    # A relocated cache is a symbolic link to the scratch volume, remove both
+    if os.path.islink(path):
+        target = os.path.realpath(path)
+        if os.path.isfile(target):
+            os.remove(target)
+    if os.path.lexists(path):
+        os.remove(path)
+
+
+class LatentCacheIndex(JsonCache):
+    """
+    Index of the latent caches written to disk by sd-scripts.
+
+    sd-scripts reuses a latent cache as long as it holds latents of the right bucket size,
+    it does not know which VAE made it nor whether the image changed since. The index
+    records for every cache the VAE of the training launched while it was missing, and
+    the hash of its image, so caches of another VAE or of a modified image are detected.
+    Stored on disk by cache path.
+    """
+
+    description = "latent cache index"
+
+    def __init__(self, index_file: str = DEFAULT_LATENT_CACHE_INDEX_FILE):
+        super().__init__(index_file)
+
+    def classify(self, cache: str, image: str, vae: str, hashes: dict) -> tuple:
+        """
+        Classify an existing latent cache against the index.
+
+        Returns:
+        - tuple: The status (hit, unverified or stale) and the reason of a stale status.
+        """
+        entry = self.entries.get(cache)
+        if entry is None:
+            return CACHE_UNVERIFIED, ""
+        cache_key = file_key(cache)
+        image_key = file_key(image)
+        if entry["cache"] is None:
+            # Written by the training launched while it was missing
+            if image_key != entry["image"]:
+                del self.entries[cache]
+                return CACHE_UNVERIFIED, ""
+            entry["cache"] = cache_key
+            entry["hash"] = image_hash(image, hashes)
+        elif entry["cache"] != cache_key:
+            # Written again outside of a training launched from the GUI
+            del self.entries[cache]
+            return CACHE_UNVERIFIED, ""
+
+        if entry["vae"] != vae:
+            return CACHE_STALE, f"made with {entry['vae']}"
+        if image_key != entry["image"]:
+            if image_hash(image, hashes) != entry["hash"]:
+                return CACHE_STALE, "image modified since caching"
+            entry["image"] = image_key
+        return CACHE_HIT, ""
+
+    def expect(self, cache: str, image: str, vae: str) -> None:
+        """
+        Record that the cache about to be written by a training comes from vae.
+        """
+        self.entries[cache] = {
+            "cache": None,
+            "image": file_key(image),
+            "hash": None,
+            "vae": vae,
+        }
+
+    def trust(self, cache: str, image: str, vae: str) -> None:
+        """
+        Record an existing cache as made by vae from the image as it is now.
+        """
+        self.entries[cache] = {
+            "cache": file_key(cache),
+            "image": file_key(image),
+            "hash": file_hash(image),
+            "vae": vae,
+        }
+
+
+def scan_latent_cache(
+    datasets: list, family: str, vae: str, flip_aug: bool = False, max_workers: int = None
+) -> dict:
+    """
+    Inventory the latent and text encoder caches of the datasets.
+
+    Parameters:
+    - datasets (list): The datasets, as described by training_datasets.
+    - family (str): The model family, which names the latent caches.
+    - vae (str): The VAE (or model) the training encodes the images with.
+    - flip_aug (bool): Whether the training needs flipped latents.
+    - max_workers (int): The number of threads hashing images, defaults to the CPU count.
+
+    Returns:
+    - dict: The caches by status, with the image of each cache and the reason of stale
+      and outdated ones, the orphan caches, the text encoder caches and the stale ones.
+    """
+    images = dataset_images(datasets)
+    folders = dataset_folders(datasets)
+    report = {
+        CACHE_HIT: {},
+        CACHE_UNVERIFIED: {},
+        CACHE_MISS: {},
+        CACHE_STALE: {},
+        CACHE_OUTDATED: {},
+        "orphans": [],
+        "text_encoder": 0,
+        "text_encoder_stale": [],
+        "other_models": 0,
+    }
+    with latent_cache_index.lock:
+        if latent_cache_index.entries is None:
+            latent_cache_index.load()
+
+        # Hash the images whose caches need it in parallel, hashing releases the GIL
+        hashes = {}
+        candidates = []
+        for path, size, reso in images:
+            cache = latent_cache_path(path, size, family)
+            entry = latent_cache_index.entries.get(cache)
+            if entry is not None and os.path.exists(cache):
+                if entry["cache"] is None or entry["image"] != file_key(path):
+                    candidates.append(path)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            hashes.update(zip(candidates, pool.map(file_hash, candidates)))
+
+        used = set()
+        for path, size, reso in images:
+            cache = latent_cache_path(path, size, family)
+            used.add(cache)
+            if not os.path.exists(cache):
+                report[CACHE_MISS][cache] = (path, "")
+                continue
+            status, problem = check_latents(cache, size, reso, flip_aug)
+            if status:
+                report[status][cache] = (path, problem)
+                continue
+            status, reason = latent_cache_index.classify(cache, path, vae, hashes)
+            report[status][cache] = (path, reason)
+
+        stems = {os.path.splitext(path)[0]: path for path, _, _ in images}
+        for cache in cache_files(folders):
+            if cache in used:
+                continue
+            name = os.path.basename(cache)
+            if name.endswith(TEXT_ENCODER_SUFFIXES):
+                report["text_encoder"] += 1
+                stem = cache[: -len(next(s for s in TEXT_ENCODER_SUFFIXES if name.endswith(s)))]
+                if stem not in stems:
+                    report["orphans"].append(cache)
+                    continue
+                # sd-scripts does not check the caption of a text encoder cache either
+                captions = [
+                    stem + extension
+                    for extension in [".txt", ".caption", ".cap"]
+                    if os.path.isfile(stem + extension)
+                ]
+                if any(os.path.getmtime(caption) > os.path.getmtime(cache) for caption in captions):
+                    report["text_encoder_stale"].append(cache)
+                continue
+
+            match = LATENT_PATTERN.match(cache)
+            stem = match.group("stem") if match else os.path.splitext(cache)[0]
+            if stem not in stems:
+                report["orphans"].append(cache)
+            elif match and match.group("suffix") + ".npz" != LATENT_SUFFIXES[family]:
+                report["other_models"] += 1
+            else:
+                # Made for an earlier size of the image
+                report["orphans"].append(cache)
+
+        # Forget the index entries of caches which no longer exist
+        prefixes = tuple(os.path.join(folder, "") for folder in folders)
+        removed = [
+            cache
+            for cache, entry in latent_cache_index.entries.items()
+            if cache.startswith(prefixes)
+            and entry["cache"] is not None
+            and not os.path.exists(cache)
+        ]
+        for cache in removed:
+            del latent_cache_index.entries[cache]
+        latent_cache_index.save()
+    return report
+
+
+def prune_latent_cache(report: dict, outdated: bool = True) -> int:
+    """
+    Remove the stale caches, and optionally the outdated, orphan and stale text encoder
+    caches, of a scan_latent_cache report.
+
+    Returns:
+    - int: The number of removed caches.
+    """
+    caches = list(report[CACHE_STALE])
+    if outdated:
+        caches += list(report[CACHE_OUTDATED]) + report["orphans"] + report["text_encoder_stale"]
+    with latent_cache_index.lock:
+        for cache in caches:
+            try:
+                remove_cache_file(cache)
+            except OSError as e:
+                log.warning(f"Could not remove {cache}: {e}")
+                continue
+            latent_cache_index.entries.pop(cache, None)
+        latent_cache_index.save()
+    return len(caches)
+
+
+def format_latent_cache_report(report: dict) -> str:
+    lines = [
+        f"Latent cache: {len(report[CACHE_HIT])} hits, {len(report[CACHE_UNVERIFIED])} unverified "
+        f"(VAE unknown), {len(report[CACHE_MISS])} misses, {len(report[CACHE_STALE])} stale, "
+        f"{len(report[CACHE_OUTDATED])} outdated, {len(report['orphans'])} orphans, "
+        f"{report['other_models']} of other model families",
+        f"Text encoder cache: {report['text_encoder']} files, {len(report['text_encoder_stale'])} "
+        "older than their caption",
+    ]
+    for status in [CACHE_STALE, CACHE_OUTDATED]:
+        problems = list(report[status].items())
+        for cache, (_, reason) in problems[:MAX_REPORTED_FILES]:
+            lines.append(f"  {status.capitalize()}: {cache}: {reason}")
+        if len(problems) > MAX_REPORTED_FILES:
+            lines.append(f"  ... and {len(problems) - MAX_REPORTED_FILES} more")
+    return "\n".join(lines)
+
+
+def latent_cache_settings(
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    dataset_config: str = "",
+    max_resolution: str = "512,512",
+    enable_bucket: bool = True,
+    min_bucket_reso: int = 256,
+    max_bucket_reso: int = 2048,
+    bucket_reso_steps: int = 64,
+    bucket_no_upscale: bool = False,
+    sdxl: bool = False,
+    flux1_checkbox: bool = False,
+    sd3_checkbox: bool = False,
+    v2: bool = False,
+    pretrained_model_name_or_path: str = "",
+    vae: str = "",
+    flip_aug: bool = False,
+) -> dict:
+    """
+    Describe the latent caches a training tab uses: its datasets, model family, VAE and
+    flip augmentation. The VAE is the model's own one unless a VAE is set.
+    """
+    return {
+        "datasets": training_datasets(
+            train_data_dir,
+            reg_data_dir,
+            dataset_config,
+            1,
+            max_resolution,
+            enable_bucket,
+            min_bucket_reso,
+            max_bucket_reso,
+            bucket_reso_steps,
+            bucket_no_upscale,
+        ),
+        "family": model_family(sdxl, flux1_checkbox, sd3_checkbox, v2),
+        "vae": vae or pretrained_model_name_or_path,
+        "flip_aug": bool(flip_aug),
+    }
+
+
+def latent_cache_arguments(parameters: list) -> dict:
+    """
+    Pick the latent_cache_settings arguments out of the parameters of a train_model
+    function. They are plain GUI values, kept in the metadata of queued jobs.
+
+    Parameters:
+    - parameters (list): The (name, value) parameters of a train_model function.
+
+    Returns:
+    - dict: The arguments, empty if the training does not cache latents to disk.
+    """
+    values = dict(parameters)
+    if not values.get("cache_latents_to_disk"):
+        return {}
+    return function_arguments(latent_cache_settings, values)
+
+
+def preflight_latent_cache(arguments: dict) -> None:
+    """
+    Check the latent caches on disk when a training caching latents to disk starts.
+    Stale caches, which sd-scripts would reuse as they are, are removed, and the caches
+    the training writes are recorded with its VAE.
+
+    Parameters:
+    - arguments (dict): The latent_cache_settings arguments, see latent_cache_arguments.
+    """
+    if not arguments:
+        return
+    try:
+        settings = latent_cache_settings(**arguments)
+        report = scan_latent_cache(
+            settings["datasets"], settings["family"], settings["vae"], settings["flip_aug"]
+        )
+    except (OSError, ValueError, IndexError, TypeError, toml.TomlDecodeError) as e:
+        log.warning(f"Could not check the latent cache: {e}")
+        return
+
+    log.info(format_latent_cache_report(report))
+    if report[CACHE_STALE]:
+        removed = prune_latent_cache(report, outdated=False)
+        log.info(f"Removed {removed} stale latent caches, they are cached again by the training.")
+
+    with latent_cache_index.lock:
+        for status in [CACHE_MISS, CACHE_STALE, CACHE_OUTDATED]:
+            for cache, (image, _) in report[status].items():
+                latent_cache_index.expect(cache, image, settings["vae"])
+        latent_cache_index.save()
+
+
+def relocate_latent_cache(datasets: list, scratch_dir: str) -> int:
+    """
+    Move the cache files of the datasets to a scratch folder, on a faster volume, and
+    leave symbolic links in their place. sd-scripts reads and writes the caches through
+    the links. The scratch folder manifest lists the moved caches for restore_latent_cache.
+
+    Returns:
+    - int: The number of moved caches.
+    """
+    os.makedirs(scratch_dir, exist_ok=True)
+    manifest_file = os.path.join(scratch_dir, RELOCATION_MANIFEST_FILE)
+    manifest = load_relocation_manifest(scratch_dir)
+    moved = 0
+    try:
+        for folder in dataset_folders(datasets):
+            target_dir = os.path.join(
+                scratch_dir, hashlib.sha1(folder.encode("utf-8")).hexdigest()[:16]
+            )
+            for cache in cache_files([folder]):
+                if os.path.islink(cache):
+                    continue
+                os.makedirs(target_dir, exist_ok=True)
+                target = os.path.join(target_dir, os.path.basename(cache))
+                shutil.move(cache, target)
+                try:
+                    os.symlink(target, cache)
+                except OSError:
+                    shutil.move(target, cache)
+                    raise
+                manifest[cache] = target
+                moved += 1
+    finally:
+        write_json(manifest_file, manifest)
+    return moved
+
+
+def load_relocation_manifest(scratch_dir: str) -> dict:
+    return read_json(os.path.join(scratch_dir, RELOCATION_MANIFEST_FILE), {})
+
+
+def restore_latent_cache(scratch_dir: str) -> int:
+    """
+    Move the caches relocated to a scratch folder back next to their images.
+
+    Returns:
+    - int: The number of restored caches.
+    """
+    manifest = load_relocation_manifest(scratch_dir)
+    restored = 0
+    for cache, target in list(manifest.items()):
+        if os.path.islink(cache) and os.path.realpath(cache) == os.path.realpath(target):
+            os.remove(cache)
+            if os.path.isfile(target):
+                shutil.move(target, cache)
+                restored += 1
+        del manifest[cache]
+    manifest_file = os.path.join(scratch_dir, RELOCATION_MANIFEST_FILE)
+    if manifest:
+        write_json(manifest_file, manifest)
+    elif os.path.exists(manifest_file):
+        os.remove(manifest_file)
+    return restored
+
+
+# Shared latent cache index for the whole GUI process
+latent_cache_index = LatentCacheIndex()
+
+
+class LatentCacheManager:
+    """
+    Panel inventorying the latent caches of a training tab.
+    """
+
+    def __init__(self, components: dict, headless: bool = False):
+        """
+        Initialize the LatentCacheManager panel.
+
+        Parameters:
+        - components (dict): The components of the training tab, by setting name.
+        - headless (bool): Whether to run in headless mode.
+        """
+        self.components = function_arguments(latent_cache_settings, components)
+        self.headless = headless
+
+        with gr.Accordion("Latent cache manager", open=False):
+            gr.Markdown(
+                "Inventory the latents cached to disk next to the images: hits, misses, caches "
+                "of another VAE or of a modified image (stale, sd-scripts would reuse them), "
+                "caches sd-scripts recomputes (outdated) and caches without image (orphans). "
+                "Stale caches are also removed when a training caching latents to disk starts."
+            )
+            with gr.Row():
+                self.button_scan = gr.Button("Scan caches")
+                self.button_prune = gr.Button("Prune stale, outdated and orphan caches")
+                self.button_trust = gr.Button("Trust unverified caches")
+            with gr.Row():
+                self.scratch_dir = gr.Textbox(
+                    label="Scratch folder",
+                    placeholder="Folder on a fast volume the caches are moved to",
+                    interactive=True,
+                )
+                self.scratch_dir_folder = gr.Button(
+                    folder_symbol,
+                    elem_id="open_folder_small",
+                    elem_classes=["tool"],
+                    visible=(not headless),
+                )
+                self.scratch_dir_folder.click(
+                    get_folder_path,
+                    outputs=self.scratch_dir,
+                    show_progress=False,
+                )
+                self.button_relocate = gr.Button("Relocate caches")
+                self.button_restore = gr.Button("Restore caches")
+            self.summary = gr.Markdown()
+
+        inputs = list(self.components.values())
+        for button, action in [
+            (self.button_scan, "scan"),
+            (self.button_prune, "prune"),
+            (self.button_trust, "trust"),
+        ]:
+            button.click(
+                lambda *values, action=action: self.run(action, *values),
+                inputs=inputs,
+                outputs=[self.summary],
+                show_progress=False,
+            )
+        self.button_relocate.click(
+            lambda *values: self.run("relocate", *values),
+            inputs=inputs + [self.scratch_dir],
+            outputs=[self.summary],
+            show_progress=False,
+        )
+        self.button_restore.click(
+            self.restore,
+            inputs=[self.scratch_dir],
+            outputs=[self.summary],
+            show_progress=False,
+        )
+
+    def run(self, action: str, *values):
+        settings = dict(zip(self.components, values))
+        try:
+            cache = latent_cache_settings(**settings)
+            if action == "relocate":
+                if not values[-1]:
+                    return "Please provide a scratch folder."
+                moved = relocate_latent_cache(cache["datasets"], values[-1])
+                return f"Moved {moved} caches to {values[-1]}."
+            report = scan_latent_cache(
+                cache["datasets"], cache["family"], cache["vae"], cache["flip_aug"]
+            )
+            message = format_latent_cache_report(report)
+            if action == "prune":
+                message += f"\n\nRemoved {prune_latent_cache(report)} caches."
+            elif action == "trust":
+                with latent_cache_index.lock:
+                    for cache_path, (image, _) in report[CACHE_UNVERIFIED].items():
+                        latent_cache_index.trust(cache_path, image, cache["vae"])
+                    latent_cache_index.save()
+                message += f"\n\nRecorded {len(report[CACHE_UNVERIFIED])} caches as made with {cache['vae']}."
+        except (OSError, ValueError, IndexError, TypeError, toml.TomlDecodeError) as e:
+            return f"Could not {action} the latent cache: {e}"
+        return message.replace("\n  ", "\n- ")
+
+    def restore(self, scratch_dir):
+        if not scratch_dir:
+            return "Please provide a scratch folder."
+        try:
+            return f"Restored {restore_latent_cache(scratch_dir)} caches next to their images."
+        except OSError as e:
+            return f"Could not restore the latent cache: {e}"
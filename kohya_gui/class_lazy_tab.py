@@ -0,0 +1,67 @@
+import importlib
+
+import gradio as gr
+
+from .class_startup_profiler import startup_profiler
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+
+def import_builder(module_name: str, attribute: str):
+    """
+    Import a tab builder (function or class) from a kohya_gui module on demand.
+
+    Parameters:
+    - module_name (str): The module name, relative to the kohya_gui package.
+    - attribute (str): The builder name in the module.
+
+    Returns:
+    - The builder.
+    """
+    module = importlib.import_module(f".{module_name}", package=__package__)
+    return getattr(module, attribute)
+
+
+class LazyTab:
+    """
+    A tab whose content is only built the first time it is selected.
+
+    The builder runs inside a gr.render block triggered by a session state flag
+    flipped on the first selection of the tab, so the heavy modules the builder
+    imports are only loaded by users who open the tab.
+    """
+
+    def __init__(self, label: str, builder, **kwargs):
+        """
+        Initialize the LazyTab.
+
+        Parameters:
+        - label (str): The tab label.
+        - builder (callable): A function without arguments building the tab content.
+        - **kwargs: Additional keyword arguments to pass to gr.Tab.
+        """
+        self.label = label
+        self.builder = builder
+
+        with gr.Tab(label, **kwargs) as self.tab:
+            self.loaded = gr.State(False)
+
+            @gr.render(inputs=[self.loaded], triggers=[self.loaded.change])
+            def render(loaded):
+                if not loaded:
+                    return
+                self.build()
+
+        self.tab.select(
+            lambda: True,
+            outputs=[self.loaded],
+            show_progress=False,
+        )
+
+    def build(self) -> None:
+        log.info(f"Building the '{self.label}' tab...")
+        with startup_profiler.measure(f"Tab: {self.label}"):
+            self.builder()
+        startup_profiler.print_report()
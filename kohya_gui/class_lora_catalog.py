@@ -0,0 +1,251 @@
+import os
+from collections import Counter
+
+from .class_json_cache import JsonCache
+from .common_gui import scriptdir
+from .custom_logging import setup_logging
+from .sd_modeltype import read_safetensors_header
+
+# Set up logging
+log = setup_logging()
+
+DEFAULT_LORA_CATALOG_FILE = os.path.join(scriptdir, "logs", "lora_catalog.json")
+
+LORA_CATALOG_HEADERS = ["Property", "Value"]
+
+# ss_base_model_version prefixes written by sd-scripts
+BASE_MODEL_VERSIONS = [
+    ("sdxl", "SDXL"),
+    ("sd_v1", "SD1"),
+    ("sd_v2", "SD2"),
+    ("sd3", "SD3"),
+    ("flux1", "FLUX1"),
+]
+
+# Key prefixes of the kohya LoRA naming, most specific first
+TARGET_KEY_PREFIXES = [
+    ("lora_unet_double_blocks", "FLUX1"),
+    ("lora_unet_single_blocks", "FLUX1"),
+    ("lora_unet_joint_blocks", "SD3"),
+    ("lora_te1_", "SDXL"),
+    ("lora_te2_", "SDXL"),
+    ("lora_unet_input_blocks", "SDXL"),
+    ("lora_unet_down_blocks", "SD1"),
+    ("lora_te_", "SD1"),
+]
+
+
+def detect_target_model(keys: list, metadata: dict) -> str:
+    """
+    Detect the base model family a LoRA was trained for, from its metadata or its key names.
+    """
+    base_model_version = metadata.get("ss_base_model_version", "")
+    for prefix, target in BASE_MODEL_VERSIONS:
+        if base_model_version.startswith(prefix):
+            return target
+
+    for prefix, target in TARGET_KEY_PREFIXES:
+        if any(key.startswith(prefix) for key in keys):
+            if target == "SD1" and metadata.get("ss_v2") == "True":
+                return "SD2"
+            return target
+    return ""
+
+
+def detect_network_module(keys: list, metadata: dict) -> str:
+    if metadata.get("ss_network_module"):
+        return metadata["ss_network_module"]
+    if any(".hada_" in key for key in keys):
+        return "lycoris (LoHa)"
+    if any(".lokr_" in key for key in keys):
+        return "lycoris (LoKr)"
+    if any(".lora_down." in key for key in keys):
+        return "networks.lora"
+    return ""
+
+
+def inspect_lora(path: str) -> dict:
+    """
+    Describe a LoRA from its safetensors header and ss_* metadata, without loading any tensor.
+
+    Parameters:
+    - path (str): The LoRA safetensors file.
+
+    Returns:
+    - dict: The catalog entry of the LoRA.
+    """
+    header = read_safetensors_header(path)
+    metadata = header.pop("__metadata__", None) or {}
+    keys = list(header)
+
+    parameters = 0
+    for info in header.values():
+        count = 1
+        for dim in info.get("shape", []):
+            count *= dim
+        parameters += count
+
+    # The rank is the output size of the down projections, use the most common one
+    # as layers can have different ranks with dynamic or block dims
+    ranks = Counter(
+        info["shape"][0]
+        for key, info in header.items()
+        if key.endswith(".lora_down.weight") and info.get("shape")
+    )
+    network_dim = metadata.get("ss_network_dim") or (
+        ranks.most_common(1)[0][0] if ranks else ""
+    )
+
+    return {
+        "target": detect_target_model(keys, metadata),
+        "network_module": detect_network_module(keys, metadata),
+        "network_dim": str(network_dim),
+        "network_alpha": metadata.get("ss_network_alpha", ""),
+        "network_args": metadata.get("ss_network_args", ""),
+        "key_count": len(keys),
+        "parameters": parameters,
+        "base_model_version": metadata.get("ss_base_model_version", ""),
+        "sd_model_name": metadata.get("ss_sd_model_name", ""),
+        "output_name": metadata.get("ss_output_name", ""),
+        "training_comment": metadata.get("ss_training_comment", ""),
+        "sshs_model_hash": metadata.get("sshs_model_hash", ""),
+        "sshs_legacy_hash": metadata.get("sshs_legacy_hash", ""),
+    }
+
+
+class LoRACatalog(JsonCache):
+    """
+    Catalog of the LoRA files found in model folders, cached on disk and keyed by
+    (path, size, mtime) so only new or modified files have their header read.
+    """
+
+    description = "LoRA catalog"
+
+    def __init__(self, catalog_file: str = DEFAULT_LORA_CATALOG_FILE):
+        super().__init__(catalog_file)
+
+    def get(self, path: str, save: bool = True) -> dict:
+        """
+        Return the catalog entry of a LoRA file, or None if it is not a readable safetensors file.
+
+        Parameters:
+        - path (str): The LoRA file.
+        - save (bool): Whether to write the catalog file after reading a new header.
+        """
+        if not path or not path.lower().endswith(".safetensors") or not os.path.isfile(path):
+            return None
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+
+        with self.lock:
+            if self.entries is None:
+                self.load()
+
+            entry = self.entries.get(path)
+            if (
+                entry is None
+                or entry["size"] != stat.st_size
+                or entry["mtime"] != stat.st_mtime_ns
+            ):
+                try:
+                    entry = inspect_lora(path)
+                except (OSError, ValueError, AttributeError, TypeError) as e:
+                    log.debug(f"Could not read the header of {path}: {e}")
+                    entry = {"error": str(e)}
+                entry.update(path=path, size=stat.st_size, mtime=stat.st_mtime_ns)
+                self.entries[path] = entry
+                self.dirty = True
+                if save:
+                    self.save()
+
+        return None if "error" in entry else entry
+
+    def index(self, directory: str) -> list:
+        """
+        Index the safetensors files of a folder, reading only the new or modified ones and
+        forgetting the files which were removed.
+
+        Parameters:
+        - directory (str): The folder, or a file of the folder as selected in a dropdown.
+
+        Returns:
+        - list: The catalog entries of the folder.
+        """
+        if directory and os.path.isfile(directory):
+            directory = os.path.dirname(directory)
+        if not directory or not os.path.isdir(directory):
+            return []
+
+        directory = os.path.abspath(directory)
+        entries = []
+        with self.lock:
+            for name in sorted(os.listdir(directory)):
+                entry = self.get(os.path.join(directory, name), save=False)
+                if entry is not None:
+                    entries.append(entry)
+
+            for path in list(self.entries):
+                if os.path.dirname(path) == directory and not os.path.isfile(path):
+                    del self.entries[path]
+                    self.dirty = True
+
+            self.flush()
+        return entries
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.dirty:
+                self.save()
+
+    def choices(self, paths: list, target: str = None) -> list:
+        """
+        Turn LoRA paths into dropdown choices labelled with their target model, dim and alpha.
+
+        Parameters:
+        - paths (list): The paths, as listed by list_files.
+        - target (str): Optional model family (SD1, SDXL, ...). LoRAs detected for another
+          family are left out. SD1 and SD2 LoRAs are considered compatible.
+
+        Returns:
+        - list: The choices, values are the paths.
+        """
+        choices = []
+        for path in paths:
+            entry = self.get(path, save=False)
+            if entry is None:
+                choices.append(path)
+                continue
+
+            if target and entry["target"] and not is_compatible(entry["target"], target):
+                continue
+
+            details = [entry["target"] or "unknown model"]
+            if entry["network_dim"]:
+                details.append(f"dim {entry['network_dim']}")
+            if entry["network_alpha"]:
+                details.append(f"alpha {entry['network_alpha']}")
+            choices.append((f"{path} [{', '.join(details)}]", path))
+
+        self.flush()
+        return choices
+
+    def details(self, path: str) -> list:
+        """
+        Return the catalog entry of a LoRA as rows matching LORA_CATALOG_HEADERS.
+        """
+        entry = self.get(path)
+        if entry is None:
+            return []
+        return [[key, entry[key]] for key in entry if key not in ["path", "mtime"]]
+
+
+def is_compatible(lora_target: str, model_target: str) -> bool:
+    families = [{"SD1", "SD2"}]
+    if lora_target == model_target:
+        return True
+    return any(lora_target in family and model_target in family for family in families)
+
+
+# Shared catalog for the whole GUI process
+lora_catalog = LoRACatalog()
@@ -1,15 +1,22 @@
 import gradio as gr
-from .merge_lora_gui import GradioMergeLoRaTab
-from .svd_merge_lora_gui import gradio_svd_merge_lora_tab
-from .verify_lora_gui import gradio_verify_lora_tab
-from .resize_lora_gui import gradio_resize_lora_tab
-from .extract_lora_gui import gradio_extract_lora_tab
-from .flux_extract_lora_gui import gradio_flux_extract_lora_tab
-from .convert_lcm_gui import gradio_convert_lcm_tab
-from .extract_lycoris_locon_gui import gradio_extract_lycoris_locon_tab
-from .extract_lora_from_dylora_gui import gradio_extract_dylora_tab
-from .merge_lycoris_gui import gradio_merge_lycoris_tab
-from .flux_merge_lora_gui import GradioFluxMergeLoRaTab
+from .class_lazy_tab import import_builder
+from .class_startup_profiler import startup_profiler
+
+# (module, builder, pass headless) of each tool tab, in display order. The modules
+# are only imported when the LoRA tools are built.
+LORA_TOOLS = [
+    ("extract_lora_from_dylora_gui", "gradio_extract_dylora_tab", True),
+    ("convert_lcm_gui", "gradio_convert_lcm_tab", True),
+    ("extract_lora_gui", "gradio_extract_lora_tab", True),
+    ("flux_extract_lora_gui", "gradio_flux_extract_lora_tab", True),
+    ("extract_lycoris_locon_gui", "gradio_extract_lycoris_locon_tab", True),
+    ("merge_lora_gui", "GradioMergeLoRaTab", False),
+    ("merge_lycoris_gui", "gradio_merge_lycoris_tab", True),
+    ("svd_merge_lora_gui", "gradio_svd_merge_lora_tab", True),
+    ("resize_lora_gui", "gradio_resize_lora_tab", True),
+    ("verify_lora_gui", "gradio_verify_lora_tab", True),
+    ("flux_merge_lora_gui", "GradioFluxMergeLoRaTab", True),
+]
 
 
 class LoRATools:
@@ -17,15 +24,14 @@ class LoRATools:
         self,
         headless: bool = False,
     ):
-        gr.Markdown("This section provide various LoRA tools...")
-        gradio_extract_dylora_tab(headless=headless)
-        gradio_convert_lcm_tab(headless=headless)
-        gradio_extract_lora_tab(headless=headless)
-        gradio_flux_extract_lora_tab(headless=headless)
-        gradio_extract_lycoris_locon_tab(headless=headless)
-        gradio_merge_lora_tab = GradioMergeLoRaTab()
-        gradio_merge_lycoris_tab(headless=headless)
-        gradio_svd_merge_lora_tab(headless=headless)
-        gradio_resize_lora_tab(headless=headless)
-        gradio_verify_lora_tab(headless=headless)
-        GradioFluxMergeLoRaTab(headless=headless)
+        gr.Markdown(
+            "This section provide various LoRA tools... They run in the background, "
+            "follow them in the Background Tasks tab."
+        )
+        for module_name, builder_name, pass_headless in LORA_TOOLS:
+            with startup_profiler.measure(f"LoRA tool: {builder_name}"):
+                builder = import_builder(module_name, builder_name)
+                if pass_headless:
+                    builder(headless=headless)
+                else:
+                    builder()
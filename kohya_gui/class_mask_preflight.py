@@ -0,0 +1,186 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import toml
+from PIL import Image
+
+from .common_gui import IMAGE_EXTENSIONS, output_message
+from .custom_logging import setup_logging
+from .mask_pairing import pair_masks
+
+# Set up logging
+log = setup_logging()
+
+# Problem files listed in the log report
+MAX_REPORTED_FILES = 20
+
+
+def mask_subsets(dataset_config: str) -> list:
+    """
+    List the (image_dir, conditioning_data_dir) of the subsets of a dataset config TOML
+    file which have masks. Subsets masked by the alpha channel of their images have an
+    empty conditioning_data_dir, sd-scripts prefers the conditioning images when a subset
+    has both.
+    """
+    config = toml.load(dataset_config)
+    general = config.get("general", {})
+    subsets = []
+    for dataset in config.get("datasets", []):
+        for subset in dataset.get("subsets", []):
+            subset = {**general, **dataset, **subset}
+            if subset.get("image_dir") and subset.get("conditioning_data_dir"):
+                subsets.append((subset["image_dir"], subset["conditioning_data_dir"]))
+            elif subset.get("image_dir") and subset.get("alpha_mask"):
+                subsets.append((subset["image_dir"], ""))
+    return subsets
+
+
+def check_mask(pair: tuple) -> str:
+    """
+    Compare the size of a mask with the size of its image, from the file headers.
+
+    Returns:
+    - str: The problem found, empty when the mask fits its image.
+    """
+    image, mask = pair
+    try:
+        with Image.open(image) as f:
+            image_size = f.size
+        with Image.open(mask) as f:
+            mask_size = f.size
+    except Exception as e:
+        return f"cannot read: {e}"
+    if mask_size != image_size:
+        return (
+            f"mask {mask_size[0]}x{mask_size[1]} does not match the image "
+            f"{image_size[0]}x{image_size[1]}"
+        )
+    return ""
+
+
+def check_alpha(image: str) -> str:
+    """
+    Check that an image has an alpha channel, from its header. sd-scripts gives the
+    images without one an opaque alpha mask, so all of the image counts in the loss.
+
+    Returns:
+    - str: The problem found, empty when the image has an alpha channel.
+    """
+    try:
+        with Image.open(image) as f:
+            if "A" in f.mode or "transparency" in f.info:
+                return ""
+            return f"no alpha channel ({f.mode}), alpha_mask masks nothing"
+    except Exception as e:
+        return f"cannot read: {e}"
+
+
+def validate_masks(subsets: list, max_workers: int = None) -> dict:
+    """
+    Validate the masks of subsets: every image has a mask named like it, of its size, or
+    an alpha channel for the subsets masked by alpha.
+
+    Parameters:
+    - subsets (list): The (image_dir, mask_dir) of the subsets, mask_dir is empty for the
+      alpha_mask subsets.
+    - max_workers (int): The number of threads reading the file headers.
+
+    Returns:
+    - dict: The number of pairs and of alpha masked images, the errors by image, the
+      misnamed masks and the masks without image.
+    """
+    report = {"pairs": 0, "alpha": 0, "errors": {}, "misnamed": {}, "orphans": []}
+    pairs, alpha_images = [], []
+    for image_dir, mask_dir in subsets:
+        if not os.path.isdir(image_dir):
+            continue
+        if not mask_dir:
+            alpha_images += [
+                os.path.join(image_dir, name)
+                for name in sorted(os.listdir(image_dir))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            continue
+        if not os.path.isdir(mask_dir):
+            report["errors"][image_dir] = [f"mask folder {mask_dir} does not exist"]
+            continue
+        paired = pair_masks(image_dir, mask_dir)
+        pairs += paired["pairs"]
+        for image in paired["missing"]:
+            report["errors"][image] = ["no mask"]
+        for image, mask in paired["misnamed"].items():
+            report["errors"][image] = [f"mask {os.path.basename(mask)} is not named like the image"]
+        report["misnamed"].update(paired["misnamed"])
+        report["orphans"] += paired["orphans"]
+
+    report["pairs"] = len(pairs)
+    report["alpha"] = len(alpha_images)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for (image, _), problem in zip(pairs, pool.map(check_mask, pairs)):
+            if problem:
+                report["errors"][image] = [problem]
+        for image, problem in zip(alpha_images, pool.map(check_alpha, alpha_images)):
+            if problem:
+                report["errors"][image] = [problem]
+    return report
+
+
+def format_mask_report(report: dict) -> str:
+    lines = [
+        f"Mask preflight: {report['pairs']} masks, {report['alpha']} alpha masked images, {len(report['errors'])} errors, "
+        f"{len(report['orphans'])} masks without image"
+    ]
+    for path, issues in list(report["errors"].items())[:MAX_REPORTED_FILES]:
+        lines.append(f"  Error: {path}: {'; '.join(issues)}")
+    if len(report["errors"]) > MAX_REPORTED_FILES:
+        lines.append(f"  ... and {len(report['errors']) - MAX_REPORTED_FILES} more")
+    if report["misnamed"]:
+        lines.append(
+            "  Rename the misnamed masks with tools/rename_depth_mask.py and give them an image "
+            "extension, or write named masks with the Prepare masks utility."
+        )
+    return "\n".join(lines)
+
+
+def preflight_masks(
+    dataset_config: str = "", masked_loss: bool = False, headless: bool = False
+) -> bool:
+    """
+    Validate the masks of a masked loss training before it is launched. Masks are the
+    conditioning_data_dir images of the dataset config subsets, or the alpha channel of
+    the images of their alpha_mask subsets.
+
+    Parameters:
+    - dataset_config (str): The dataset config TOML file.
+    - masked_loss (bool): Whether the training uses masked loss.
+    - headless (bool): Whether to run in headless mode.
+
+    Returns:
+    - bool: False if a mask is missing or does not match its image, which would stop the
+      training in its data loader, or if an alpha masked image has no alpha channel.
+    """
+    if not masked_loss:
+        return True
+    if not dataset_config:
+        log.warning(
+            "Masked loss needs masks, set them with conditioning_data_dir or alpha_mask in a dataset config file."
+        )
+        return True
+    try:
+        subsets = mask_subsets(dataset_config)
+    except (OSError, toml.TomlDecodeError) as e:
+        log.warning(f"Could not read the dataset config {dataset_config}: {e}")
+        return True
+
+    report = validate_masks(subsets)
+    message = format_mask_report(report)
+    if report["errors"]:
+        log.error(message)
+        output_message(
+            msg=f"{len(report['errors'])} images have a missing or mismatched mask, or no alpha "
+            "channel, see the log for the list.",
+            headless=headless,
+        )
+        return False
+    log.info(message)
+    return True
@@ -0,0 +1,431 @@
+import os
+import struct
+from threading import RLock
+
+import gradio as gr
+import pandas as pd
+
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+EVENT_FILE_MARKER = "tfevents"
+
+# TFRecord framing: uint64 length, uint32 masked crc of the length, data, uint32 masked crc of the data
+RECORD_HEADER_SIZE = 12
+RECORD_FOOTER_SIZE = 4
+MAX_RECORD_SIZE = 64 * 1024 * 1024
+
+# Protobuf wire types
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH_DELIMITED = 2
+WIRE_FIXED32 = 5
+
+# TensorProto dtypes
+DT_FLOAT = 1
+DT_DOUBLE = 2
+
+
+def _read_varint(buffer: bytes, pos: int) -> tuple:
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _iter_fields(buffer: bytes):
+    """
+    Iterate over the (field number, wire type, value) of a serialized protobuf message.
+    """
+    pos = 0
+    end = len(buffer)
+    while pos < end:
+        key, pos = _read_varint(buffer, pos)
+        field_number, wire_type = key >> 3, key & 0x07
+        if wire_type == WIRE_VARINT:
+            value, pos = _read_varint(buffer, pos)
+        elif wire_type == WIRE_FIXED64:
+            value = buffer[pos : pos + 8]
+            pos += 8
+        elif wire_type == WIRE_LENGTH_DELIMITED:
+            size, pos = _read_varint(buffer, pos)
+            value = buffer[pos : pos + size]
+            pos += size
+        elif wire_type == WIRE_FIXED32:
+            value = buffer[pos : pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield field_number, wire_type, value
+
+
+def _decode_tensor(buffer: bytes):
+    """
+    Decode the scalar value of a TensorProto, or None if it is not a float scalar.
+    """
+    dtype = None
+    values = {}
+    for field_number, wire_type, value in _iter_fields(buffer):
+        if field_number == 1 and wire_type == WIRE_VARINT:
+            dtype = value
+        elif field_number in (4, 5, 6):
+            values[field_number] = (wire_type, value)
+
+    if dtype == DT_FLOAT:
+        wire_type, value = values.get(5) or values.get(4, (None, b""))
+        return struct.unpack_from("<f", value)[0] if len(value) >= 4 else None
+    if dtype == DT_DOUBLE:
+        wire_type, value = values.get(6) or values.get(4, (None, b""))
+        return struct.unpack_from("<d", value)[0] if len(value) >= 8 else None
+    return None
+
+
+def parse_event(buffer: bytes) -> tuple:
+    """
+    Decode the scalars of a serialized tensorflow Event.
+
+    Parameters:
+    - buffer (bytes): The serialized Event.
+
+    Returns:
+    - tuple: The step, wall time and a list of (tag, value) scalars.
+    """
+    step = 0
+    wall_time = 0.0
+    scalars = []
+    for field_number, wire_type, value in _iter_fields(buffer):
+        if field_number == 1 and wire_type == WIRE_FIXED64:
+            wall_time = struct.unpack("<d", value)[0]
+        elif field_number == 2 and wire_type == WIRE_VARINT:
+            step = value
+        elif field_number == 5 and wire_type == WIRE_LENGTH_DELIMITED:
+            # Summary: repeated Value value = 1
+            for summary_field, _, summary_value in _iter_fields(value):
+                if summary_field != 1:
+                    continue
+                tag = None
+                scalar = None
+                for value_field, value_wire_type, field_value in _iter_fields(summary_value):
+                    if value_field == 1:
+                        tag = field_value.decode("utf-8", errors="replace")
+                    elif value_field == 2 and value_wire_type == WIRE_FIXED32:
+                        scalar = struct.unpack("<f", field_value)[0]
+                    elif value_field == 8 and scalar is None:
+                        scalar = _decode_tensor(field_value)
+                if tag is not None and scalar is not None:
+                    scalars.append((tag, scalar))
+    return step, wall_time, scalars
+
+
+def lttb(points: list, threshold: int) -> list:
+    """
+    Downsample a series with the Largest-Triangle-Three-Buckets algorithm, which keeps
+    the visual shape of the curve (peaks and drops) with far fewer points.
+
+    Parameters:
+    - points (list): The (x, y) points, sorted by x.
+    - threshold (int): The number of points to keep.
+
+    Returns:
+    - list: The downsampled points.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average point of the next bucket
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, len(points))
+        next_bucket = points[next_start:next_end]
+        avg_x = sum(point[0] for point in next_bucket) / len(next_bucket)
+        avg_y = sum(point[1] for point in next_bucket) / len(next_bucket)
+
+        # Point of the current bucket forming the largest triangle with the
+        # previously selected point and the average of the next bucket
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[a]
+        max_area = -1.0
+        selected = start
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                selected = j
+
+        sampled.append(points[selected])
+        a = selected
+
+    sampled.append(points[-1])
+    return sampled
+
+
+class EventFileReader:
+    """
+    Incrementally read the scalars of a TFEvents file.
+
+    Only the bytes appended since the last update are read. An incomplete record at
+    the end of the file (the trainer is still writing it) is left for the next update.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.series = {}
+
+    def update(self) -> int:
+        """
+        Read the records appended since the last update.
+
+        Returns:
+        - int: The number of new scalar values.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+        if size < self.offset:
+            log.info(f"Event file {self.path} was truncated, reading it again")
+            self.offset = 0
+            self.series = {}
+        if size == self.offset:
+            return 0
+
+        count = 0
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+
+        pos = 0
+        while pos + RECORD_HEADER_SIZE <= len(data):
+            length = struct.unpack_from("<Q", data, pos)[0]
+            if length > MAX_RECORD_SIZE:
+                log.warning(f"Invalid record in event file {self.path}, skipping the rest of the file")
+                pos = len(data)
+                break
+
+            record_end = pos + RECORD_HEADER_SIZE + length + RECORD_FOOTER_SIZE
+            if record_end > len(data):
+                break
+
+            record = data[pos + RECORD_HEADER_SIZE : pos + RECORD_HEADER_SIZE + length]
+            pos = record_end
+            try:
+                step, wall_time, scalars = parse_event(record)
+            except (IndexError, ValueError, struct.error, UnicodeDecodeError):
+                log.debug(f"Skipping undecodable record in event file {self.path}")
+                continue
+
+            for tag, value in scalars:
+                self.series.setdefault(tag, []).append((step, value, wall_time))
+                count += 1
+
+        self.offset += pos
+        return count
+
+
+class MetricsStore:
+    """
+    Cache of the event files read under logging folders, keyed by file path.
+    """
+
+    def __init__(self):
+        self.readers = {}
+        self.lock = RLock()
+
+    @staticmethod
+    def find_event_files(logging_dir: str) -> list:
+        event_files = []
+        if not logging_dir or not os.path.isdir(logging_dir):
+            return event_files
+        for root, _, files in os.walk(logging_dir):
+            for file in files:
+                if EVENT_FILE_MARKER in file:
+                    event_files.append(os.path.join(root, file))
+        return event_files
+
+    def update(self, logging_dir: str) -> dict:
+        """
+        Read the new records of every event file under the logging folder.
+
+        Returns:
+        - dict: The event file readers grouped by run (folder relative to the logging folder).
+        """
+        runs = {}
+        with self.lock:
+            for path in self.find_event_files(logging_dir):
+                reader = self.readers.get(path)
+                if reader is None:
+                    reader = self.readers[path] = EventFileReader(path)
+                reader.update()
+
+                run = os.path.relpath(os.path.dirname(path), logging_dir)
+                runs.setdefault(run, []).append(reader)
+        return runs
+
+    def list_runs(self, logging_dir: str) -> list:
+        """
+        List the runs under the logging folder, most recently updated first.
+        """
+        runs = self.update(logging_dir)
+        return sorted(
+            runs,
+            key=lambda run: max(os.path.getmtime(reader.path) for reader in runs[run]),
+            reverse=True,
+        )
+
+    def get_series(self, logging_dir: str, run: str) -> dict:
+        """
+        Return the points of every tag of a run, merged across its event files and sorted by step.
+
+        Returns:
+        - dict: A list of (step, value, wall time) points per tag.
+        """
+        runs = self.update(logging_dir)
+        series = {}
+        with self.lock:
+            for reader in runs.get(run, []):
+                for tag, points in reader.series.items():
+                    series.setdefault(tag, []).extend(points)
+        for points in series.values():
+            points.sort(key=lambda point: point[0])
+        return series
+
+
+# Shared cache for the whole GUI process
+metrics_store = MetricsStore()
+
+
+def series_to_dataframe(series: dict, tags: list, max_points: int) -> pd.DataFrame:
+    """
+    Build a long-format dataframe (step, value, tag) of the selected tags, downsampled for plotting.
+    """
+    rows = []
+    for tag in tags or []:
+        points = [(step, value) for step, value, _ in series.get(tag, [])]
+        for step, value in lttb(points, int(max_points)):
+            rows.append((step, value, tag))
+    return pd.DataFrame(rows, columns=["step", "value", "tag"])
+
+
+class MetricsViewer:
+    """
+    Gradio panel plotting the loss and learning rate curves of the event files under a logging folder.
+    """
+
+    def __init__(self, logging_dir, headless: bool = False):
+        """
+        Initialize the MetricsViewer.
+
+        Parameters:
+        - logging_dir (gr.Textbox): The logging folder component of the training tab.
+        - headless (bool): Whether the GUI runs in headless mode.
+        """
+        self.logging_dir = logging_dir
+        self.headless = headless
+
+        self.gradio_interface()
+
+    def refresh(self, logging_dir: str, run: str, loss_tags: list, lr_tags: list, max_points: int):
+        runs = metrics_store.list_runs(logging_dir)
+        if run not in runs:
+            run = runs[0] if runs else None
+
+        series = metrics_store.get_series(logging_dir, run) if run else {}
+        tags = sorted(series)
+        loss_tags = [tag for tag in loss_tags or [] if tag in tags] or [
+            tag for tag in tags if tag.startswith("loss")
+        ]
+        lr_tags = [tag for tag in lr_tags or [] if tag in tags] or [
+            tag for tag in tags if tag.startswith("lr")
+        ]
+
+        return (
+            gr.Dropdown(choices=runs, value=run),
+            gr.Dropdown(choices=tags, value=loss_tags),
+            gr.Dropdown(choices=tags, value=lr_tags),
+            series_to_dataframe(series, loss_tags, max_points),
+            series_to_dataframe(series, lr_tags, max_points),
+        )
+
+    def gradio_interface(self) -> None:
+        with gr.Row():
+            run = gr.Dropdown(label="Run", choices=[], interactive=True)
+            loss_tags = gr.Dropdown(
+                label="Loss tags", choices=[], multiselect=True, interactive=True
+            )
+            lr_tags = gr.Dropdown(
+                label="Learning rate tags",
+                choices=[],
+                multiselect=True,
+                interactive=True,
+            )
+        with gr.Row():
+            max_points = gr.Slider(
+                label="Max points per curve",
+                value=500,
+                minimum=50,
+                maximum=5000,
+                step=50,
+                info="Curves are downsampled (LTTB) to keep plotting fast on long runs",
+            )
+            auto_refresh = gr.Checkbox(label="Auto refresh", value=False)
+            button_refresh = gr.Button("Refresh metrics")
+
+        with gr.Row():
+            loss_plot = gr.LinePlot(
+                x="step", y="value", color="tag", title="Loss", height=300
+            )
+            lr_plot = gr.LinePlot(
+                x="step", y="value", color="tag", title="Learning rate", height=300
+            )
+
+        timer = gr.Timer(10, active=False)
+
+        refresh_inputs = [self.logging_dir, run, loss_tags, lr_tags, max_points]
+        refresh_outputs = [run, loss_tags, lr_tags, loss_plot, lr_plot]
+
+        button_refresh.click(
+            self.refresh,
+            inputs=refresh_inputs,
+            outputs=refresh_outputs,
+            show_progress=False,
+        )
+        timer.tick(
+            self.refresh,
+            inputs=refresh_inputs,
+            outputs=refresh_outputs,
+            show_progress=False,
+        )
+        for component in [run, loss_tags, lr_tags]:
+            component.input(
+                self.refresh,
+                inputs=refresh_inputs,
+                outputs=refresh_outputs,
+                show_progress=False,
+            )
+        max_points.release(
+            self.refresh,
+            inputs=refresh_inputs,
+            outputs=refresh_outputs,
+            show_progress=False,
+        )
+        auto_refresh.change(
+            lambda active: gr.Timer(active=active),
+            inputs=[auto_refresh],
+            outputs=[timer],
+            show_progress=False,
+        )
@@ -0,0 +1,205 @@
+import gc
+import os
+import sys
+import time
+from collections import OrderedDict
+from threading import RLock
+
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+DEFAULT_MODEL_CACHE_MB = 16384
+
+
+def estimate_object_size(obj) -> int:
+    """
+    Estimate the memory footprint of a cached object in bytes.
+
+    Torch modules are measured from their parameters and buffers, tensors from
+    their storage and containers (tuple, list, dict) are measured recursively.
+    Anything else (processors, tokenizers, ...) is considered negligible.
+
+    Parameters:
+    - obj: The object to measure.
+
+    Returns:
+    - int: The estimated size in bytes.
+    """
+    if obj is None:
+        return 0
+
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_object_size(item) for item in obj)
+
+    if isinstance(obj, dict):
+        return sum(estimate_object_size(item) for item in obj.values())
+
+    # torch.nn.Module
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        size = 0
+        for tensor in list(obj.parameters()) + list(obj.buffers()):
+            size += tensor.numel() * tensor.element_size()
+        return size
+
+    # torch.Tensor
+    if hasattr(obj, "numel") and hasattr(obj, "element_size"):
+        return obj.numel() * obj.element_size()
+
+    return 0
+
+
+class ModelCache:
+    """
+    An in-process, LRU cache for models loaded by the GUI.
+
+    Entries are keyed by model id, dtype and device. When the estimated memory
+    used by the cached entries goes above the memory budget, the least recently
+    used entries are unloaded until the cache fits again.
+    """
+
+    def __init__(self, max_memory_mb: int = None):
+        """
+        Initialize the ModelCache.
+
+        Parameters:
+        - max_memory_mb (int): Memory budget in MB. Defaults to the KOHYA_GUI_MODEL_CACHE_MB
+          environment variable or DEFAULT_MODEL_CACHE_MB.
+        """
+        if max_memory_mb is None:
+            max_memory_mb = int(
+                os.environ.get("KOHYA_GUI_MODEL_CACHE_MB", DEFAULT_MODEL_CACHE_MB)
+            )
+        self.max_memory_bytes = int(max_memory_mb) * 1024 * 1024
+        self.entries = OrderedDict()
+        self.lock = RLock()
+
+    @staticmethod
+    def make_key(model_id: str, dtype=None, device: str = "cpu") -> tuple:
+        return (str(model_id), str(dtype), str(device))
+
+    def get(self, model_id: str, loader, dtype=None, device: str = "cpu"):
+        """
+        Return the cached value for the key, loading it with `loader` on a miss.
+
+        Parameters:
+        - model_id (str): The model identifier (Hugging Face repo id or local path).
+        - loader (callable): A function without arguments returning the value to cache.
+        - dtype: The dtype the model is loaded with.
+        - device (str): The device the model is loaded on.
+
+        Returns:
+        - The cached value.
+        """
+        key = self.make_key(model_id, dtype, device)
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                entry = self.entries[key]
+                entry["last_used"] = time.time()
+                log.info(f"Using cached model {model_id} ({entry['dtype']}, {entry['device']})")
+                return entry["value"]
+
+            log.info(f"Loading model {model_id} ({dtype}, {device}) into the model cache...")
+            start_time = time.time()
+            value = loader()
+            size = estimate_object_size(value)
+            log.info(
+                f"...model {model_id} loaded in {time.time() - start_time:.1f}s ({size / 1024 / 1024:.0f} MB)"
+            )
+
+            self.entries[key] = {
+                "model_id": str(model_id),
+                "dtype": str(dtype),
+                "device": str(device),
+                "value": value,
+                "size": size,
+                "last_used": time.time(),
+            }
+            self._evict(keep=key)
+
+            return value
+
+    def unload(self, model_id: str = None, dtype=None, device: str = None) -> int:
+        """
+        Unload the cached entries matching the given fields. Fields left to None match anything.
+
+        Returns:
+        - int: The number of unloaded entries.
+        """
+        with self.lock:
+            keys = [
+                key
+                for key in self.entries
+                if (model_id is None or key[0] == str(model_id))
+                and (dtype is None or key[1] == str(dtype))
+                and (device is None or key[2] == str(device))
+            ]
+            for key in keys:
+                self._remove(key)
+
+        if keys:
+            self._release_memory()
+        return len(keys)
+
+    def clear(self) -> int:
+        """
+        Unload every cached entry.
+        """
+        return self.unload()
+
+    def memory_used(self) -> int:
+        with self.lock:
+            return sum(entry["size"] for entry in self.entries.values())
+
+    def list_entries(self) -> list:
+        """
+        List the cached entries from the least to the most recently used.
+
+        Returns:
+        - list: A list of [model id, dtype, device, size in MB] rows.
+        """
+        with self.lock:
+            return [
+                [
+                    entry["model_id"],
+                    entry["dtype"],
+                    entry["device"],
+                    round(entry["size"] / 1024 / 1024),
+                ]
+                for entry in self.entries.values()
+            ]
+
+    def _remove(self, key: tuple) -> None:
+        entry = self.entries.pop(key)
+        log.info(f"Unloading model {entry['model_id']} ({entry['dtype']}, {entry['device']}) from the model cache")
+        entry["value"] = None
+
+    def _evict(self, keep: tuple) -> None:
+        evicted = False
+        while self.memory_used() > self.max_memory_bytes:
+            key = next((k for k in self.entries if k != keep), None)
+            if key is None:
+                log.warning(
+                    f"Model {keep[0]} alone is above the model cache budget of {self.max_memory_bytes / 1024 / 1024:.0f} MB"
+                )
+                break
+            self._remove(key)
+            evicted = True
+
+        if evicted:
+            self._release_memory()
+
+    @staticmethod
+    def _release_memory() -> None:
+        gc.collect()
+        # Only touch torch if something already imported it
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+# Shared cache for the whole GUI process
+model_cache = ModelCache()
@@ -0,0 +1,261 @@
+import json
+import os
+import re
+
+from .class_json_cache import JsonCache
+from .common_gui import scriptdir
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+DEFAULT_PRESET_INDEX_FILE = os.path.join(scriptdir, "logs", "preset_index.json")
+
+# Searchable summary fields and the config keys they are read from, first found wins
+PRESET_FIELDS = [
+    ("network", ["LoRA_type", "network_module"]),
+    ("optimizer", ["optimizer", "optimizer_type"]),
+    ("dim", ["network_dim"]),
+    ("alpha", ["network_alpha"]),
+    ("lr", ["learning_rate"]),
+    ("unet_lr", ["unet_lr"]),
+    ("te_lr", ["text_encoder_lr"]),
+    ("scheduler", ["lr_scheduler"]),
+    ("resolution", ["max_resolution", "resolution"]),
+    ("batch", ["train_batch_size"]),
+    ("epochs", ["epoch", "max_train_epochs"]),
+]
+
+# Config keys the model family is detected from
+MODEL_KEYS = ["flux1_checkbox", "sd3_checkbox", "sdxl", "sdxl_no_half_vae", "no_half_vae", "v2"]
+
+# Config keys read by the summary, the only ones kept in the index
+SUMMARY_KEYS = MODEL_KEYS + [key for _, keys in PRESET_FIELDS for key in keys]
+
+# Fields shown next to the file name in the dropdown
+PRESET_LABEL_FIELDS = ["model", "optimizer", "dim", "lr"]
+
+MAX_SEARCH_RESULTS = 500
+
+FILTER_PATTERN = re.compile(r"^(\w+)(:|>=|<=|>|<)(.+)$")
+
+
+def detect_preset_model(data: dict) -> str:
+    """
+    Detect the model family a config is for, from the model checkboxes or SDXL only options.
+    """
+    if data.get("flux1_checkbox"):
+        return "FLUX1"
+    if data.get("sd3_checkbox"):
+        return "SD3"
+    if data.get("sdxl") or data.get("sdxl_no_half_vae") or data.get("no_half_vae"):
+        return "SDXL"
+    if data.get("v2"):
+        return "SD2"
+    if "sdxl" in data or "v2" in data:
+        return "SD1"
+    return ""
+
+
+def summarize_preset(data: dict, defaults: dict = None) -> dict:
+    """
+    Summarize a config on the searchable fields.
+
+    Parameters:
+    - data (dict): The config.
+    - defaults (dict): Optional settings defaults of the training tab. Configs are saved
+      without some settings (older sparse saves, hand written presets), those take the
+      default value the tab would load them with.
+    """
+    if defaults:
+        data = {**{key: defaults[key] for key in SUMMARY_KEYS if key in defaults}, **data}
+    summary = {"model": detect_preset_model(data)}
+    for field, keys in PRESET_FIELDS:
+        summary[field] = next(
+            (data[key] for key in keys if data.get(key) not in [None, ""]), ""
+        )
+    return summary
+
+
+def searchable_text(path: str, data: dict) -> str:
+    values = [os.path.basename(path)]
+    for key, value in data.items():
+        if value not in [None, "", False]:
+            values.append(f"{key}={value}")
+    return " ".join(values).lower()
+
+
+def matches_filter(value, operator: str, expected: str) -> bool:
+    if operator == ":":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            try:
+                return float(value) == float(expected)
+            except ValueError:
+                return False
+        return expected.lower() in str(value).lower()
+
+    try:
+        value, expected = float(value), float(expected)
+    except (TypeError, ValueError):
+        return False
+    return {
+        ">": value > expected,
+        "<": value < expected,
+        ">=": value >= expected,
+        "<=": value <= expected,
+    }[operator]
+
+
+def parse_query(query: str) -> tuple:
+    """
+    Split a search query into full-text terms and field filters.
+
+    Terms like "optimizer:adamw8bit", "dim>=64" or "lr<1e-4" on a known field are
+    filters, the other terms must appear in the config file.
+
+    Returns:
+    - tuple: The list of terms and the list of (field, operator, value) filters.
+    """
+    fields = {"model"} | {field for field, _ in PRESET_FIELDS}
+    terms, filters = [], []
+    for term in (query or "").split():
+        match = FILTER_PATTERN.match(term)
+        if match and match.group(1) in fields:
+            filters.append(match.groups())
+        else:
+            terms.append(term.lower())
+    return terms, filters
+
+
+class PresetIndex(JsonCache):
+    """
+    Index of the JSON configs of preset folders, cached on disk and keyed by (path, size, mtime)
+    so only new or modified configs are parsed again.
+    """
+
+    description = "preset index"
+
+    def __init__(self, index_file: str = DEFAULT_PRESET_INDEX_FILE):
+        super().__init__(index_file)
+
+    def refresh(self, directory: str) -> list:
+        """
+        Index the JSON configs of a folder and its subfolders, parsing only the new or
+        modified ones and forgetting the removed ones.
+
+        Returns:
+        - list: The index entries of the folder.
+        """
+        if not directory or not os.path.isdir(directory):
+            return []
+
+        directory = os.path.abspath(directory)
+        found = {}
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in files:
+                if name.lower().endswith(".json") and not name.startswith("."):
+                    path = os.path.join(root, name)
+                    try:
+                        found[path] = os.stat(path)
+                    except OSError:
+                        continue
+
+        with self.lock:
+            if self.entries is None:
+                self.load()
+
+            for path, stat in found.items():
+                entry = self.entries.get(path)
+                if (
+                    entry is not None
+                    and entry["size"] == stat.st_size
+                    and entry["mtime"] == stat.st_mtime_ns
+                    and ("fields" in entry or "error" in entry)
+                ):
+                    continue
+                self.entries[path] = self.parse(path, stat)
+                self.dirty = True
+
+            prefix = os.path.join(directory, "")
+            for path in list(self.entries):
+                if path.startswith(prefix) and path not in found:
+                    del self.entries[path]
+                    self.dirty = True
+
+            if self.dirty:
+                self.save()
+            return [self.entries[path] for path in found]
+
+    def parse(self, path: str, stat) -> dict:
+        entry = {"path": path, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("not a configuration object")
+        except (OSError, ValueError) as e:
+            log.debug(f"Could not index {path}: {e}")
+            entry["error"] = str(e)
+            return entry
+
+        # The summary depends on the defaults of the tab searching, it is made at search time
+        entry["fields"] = {key: data[key] for key in SUMMARY_KEYS if key in data}
+        entry["text"] = searchable_text(path, data)
+        return entry
+
+    def search(self, directory: str, query: str = "", defaults: dict = None) -> list:
+        """
+        Search the configs of a folder and its subfolders.
+
+        Parameters:
+        - directory (str): The preset folder.
+        - query (str): Full-text terms and field filters, see parse_query.
+        - defaults (dict): Optional settings defaults of the training tab, for the fields
+          missing from the configs.
+
+        Returns:
+        - list: The matching entries with their summary, sorted by path.
+        """
+        terms, filters = parse_query(query)
+        results = []
+        for entry in self.refresh(directory):
+            if "error" in entry:
+                continue
+            if not all(term in entry["text"] for term in terms):
+                continue
+            summary = summarize_preset(entry["fields"], defaults)
+            if not all(
+                matches_filter(summary.get(field, ""), operator, value)
+                for field, operator, value in filters
+            ):
+                continue
+            results.append({**entry, "summary": summary})
+        return sorted(results, key=lambda entry: entry["path"].lower())
+
+    def label(self, entry: dict, directory: str) -> str:
+        path = os.path.relpath(entry["path"], directory)
+        details = []
+        for field in PRESET_LABEL_FIELDS:
+            value = entry["summary"].get(field)
+            if value in [None, ""]:
+                continue
+            details.append(f"{field} {value}" if field in ["dim", "lr"] else str(value))
+        return f"{path} [{', '.join(details)}]" if details else path
+
+    def choices(self, directory: str, query: str, defaults: dict = None) -> list:
+        """
+        Dropdown choices of the configs matching a query, labelled with their summary.
+        Values stay the config paths.
+        """
+        results = self.search(directory, query, defaults)
+        if len(results) > MAX_SEARCH_RESULTS:
+            log.info(
+                f"{len(results)} presets match '{query}', showing the first {MAX_SEARCH_RESULTS}"
+            )
+            results = results[:MAX_SEARCH_RESULTS]
+        return [(self.label(entry, directory), entry["path"]) for entry in results]
+
+
+# Shared index for the whole GUI process
+preset_index = PresetIndex()
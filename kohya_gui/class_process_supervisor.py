@@ -0,0 +1,300 @@
+import codecs
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from threading import Condition, Thread
+
+import psutil
+
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+# tqdm / accelerate progress line, e.g.
+# steps:  10%|█         | 100/1000 [01:40<15:00,  1.00it/s, avr_loss=0.0856]
+PROGRESS_PATTERN = re.compile(
+    r"(?P<step>\d+)/(?P<total>\d+)\s*\[(?P<elapsed>[\d:]+)<(?P<eta>[\d:?]+),\s*"
+    r"(?P<rate>[\d.]+|\?)\s*(?P<unit>it/s|s/it)(?:,\s*(?P<postfix>[^\]]*))?\]"
+)
+EPOCH_PATTERN = re.compile(r"\bepoch (?P<epoch>\d+)/(?P<epochs>\d+)")
+LINE_SPLIT_PATTERN = re.compile(r"[\r\n]+")
+
+
+def parse_progress_line(line: str) -> dict:
+    """
+    Parse a tqdm/accelerate progress or epoch line into structured metrics.
+
+    Parameters:
+    - line (str): A line of training output.
+
+    Returns:
+    - dict: The metrics found in the line (step, total, percent, elapsed, eta,
+      it_per_sec, loss, epoch, epochs and any other postfix values). Empty if
+      the line is not a progress line.
+    """
+    metrics = {}
+
+    match = EPOCH_PATTERN.search(line)
+    if match:
+        metrics["epoch"] = int(match.group("epoch"))
+        metrics["epochs"] = int(match.group("epochs"))
+
+    match = PROGRESS_PATTERN.search(line)
+    if match is None:
+        return metrics
+
+    step = int(match.group("step"))
+    total = int(match.group("total"))
+    metrics.update(
+        step=step,
+        total=total,
+        percent=round(100.0 * step / total, 1) if total else 0.0,
+        elapsed=match.group("elapsed"),
+        eta=match.group("eta"),
+    )
+
+    rate = match.group("rate")
+    if rate != "?" and float(rate) > 0:
+        rate = float(rate)
+        metrics["it_per_sec"] = rate if match.group("unit") == "it/s" else round(1.0 / rate, 4)
+
+    for item in (match.group("postfix") or "").split(","):
+        if "=" not in item:
+            continue
+        key, value = [part.strip() for part in item.split("=", 1)]
+        try:
+            metrics[key] = float(value)
+        except ValueError:
+            metrics[key] = value
+
+    if "avr_loss" in metrics:
+        metrics["loss"] = metrics["avr_loss"]
+
+    return metrics
+
+
+def format_progress(metrics: dict) -> str:
+    """
+    Format progress metrics as a short, human readable line.
+    """
+    if not metrics:
+        return ""
+
+    parts = []
+    if "epoch" in metrics:
+        parts.append(f"epoch {metrics['epoch']}/{metrics['epochs']}")
+    if "step" in metrics:
+        parts.append(f"step {metrics['step']}/{metrics['total']} ({metrics['percent']}%)")
+    if "loss" in metrics:
+        parts.append(f"loss {metrics['loss']}")
+    if "it_per_sec" in metrics:
+        parts.append(f"{metrics['it_per_sec']} it/s")
+    if "eta" in metrics:
+        parts.append(f"ETA {metrics['eta']}")
+    return " | ".join(parts)
+
+
+class ProcessSupervisor:
+    """
+    Run a command with its output captured through a pipe.
+
+    A reader thread keeps the last lines in a ring buffer, parses training progress
+    into metrics, optionally echoes the output to the console and writes it to a
+    rotating log file.
+    """
+
+    def __init__(
+        self,
+        run_cmd: list,
+        log_file: str = None,
+        ring_size: int = 1000,
+        echo: bool = True,
+        **kwargs,
+    ):
+        """
+        Initialize the ProcessSupervisor.
+
+        Parameters:
+        - run_cmd (list): The command to run.
+        - log_file (str): Optional file the output is written to, rotated every 10 MB.
+        - ring_size (int): The number of output lines kept in memory.
+        - echo (bool): Whether to echo the output to the console.
+        - **kwargs: Additional keyword arguments to pass to subprocess.Popen.
+        """
+        self.run_cmd = run_cmd
+        self.log_file = log_file
+        self.echo = echo
+        self.popen_kwargs = kwargs
+        self.lines = deque(maxlen=ring_size)
+        self.metrics = {}
+        self.process = None
+        self.thread = None
+        self.started = None
+        self.updated = Condition()
+        self.version = 0
+        self.file_logger = None
+
+    def start(self):
+        """
+        Start the command and the output reader thread.
+
+        Returns:
+        - subprocess.Popen: The started process.
+        """
+        self.file_logger = self._create_file_logger()
+        self.started = time.time()
+        self.process = subprocess.Popen(
+            self.run_cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            **self.popen_kwargs,
+        )
+        self.thread = Thread(target=self._read_output, daemon=True)
+        self.thread.start()
+        return self.process
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def poll(self):
+        return self.process.poll() if self.process is not None else None
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def kill(self) -> None:
+        """
+        Kill the process and its child processes.
+        """
+        if self.process is None:
+            return
+        try:
+            parent = psutil.Process(self.process.pid)
+            for child in parent.children(recursive=True):
+                child.kill()
+            parent.kill()
+        except psutil.NoSuchProcess:
+            log.info("The process does not exist. It might have terminated before it was killed.")
+
+    def wait(self, timeout: float = None):
+        """
+        Wait for the process to end and for its output to be fully read.
+
+        Returns:
+        - int: The return code of the process.
+        """
+        returncode = self.process.wait(timeout=timeout)
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+        return returncode
+
+    def wait_for_update(self, version: int, timeout: float = None) -> int:
+        """
+        Block until new output arrives after `version`, the process ends or the timeout expires.
+
+        Returns:
+        - int: The current output version, to pass to the next call.
+        """
+        with self.updated:
+            self.updated.wait_for(
+                lambda: self.version != version or not self._reader_alive(),
+                timeout=timeout,
+            )
+            return self.version
+
+    def tail(self, count: int = 50) -> str:
+        """
+        Return the last `count` lines of output.
+        """
+        with self.updated:
+            lines = list(self.lines)[-count:]
+        return "\n".join(lines)
+
+    def get_metrics(self) -> dict:
+        with self.updated:
+            return dict(self.metrics)
+
+    def _reader_alive(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def _create_file_logger(self):
+        if not self.log_file:
+            return None
+
+        os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+        handler = RotatingFileHandler(
+            self.log_file,
+            maxBytes=LOG_FILE_MAX_BYTES,
+            backupCount=LOG_FILE_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        file_logger = logging.getLogger(f"sd.process.{id(self)}")
+        file_logger.setLevel(logging.INFO)
+        file_logger.propagate = False
+        file_logger.addHandler(handler)
+        log.info(f"Writing process output to {self.log_file}")
+        return file_logger
+
+    def _close_file_logger(self) -> None:
+        if self.file_logger is None:
+            return
+        for handler in list(self.file_logger.handlers):
+            handler.close()
+            self.file_logger.removeHandler(handler)
+
+    def _read_output(self) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        stream = self.process.stdout
+
+        try:
+            while True:
+                chunk = stream.read1(65536) if hasattr(stream, "read1") else stream.read(4096)
+                if not chunk:
+                    break
+                text = decoder.decode(chunk)
+
+                if self.echo:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+
+                parts = LINE_SPLIT_PATTERN.split(pending + text)
+                pending = parts.pop()
+                self._add_lines([part for part in parts if part.strip()], pending)
+
+            pending += decoder.decode(b"", final=True)
+            self._add_lines([pending] if pending.strip() else [], "")
+        except (OSError, ValueError) as e:
+            log.debug(f"Stopped reading process output: {e}")
+        finally:
+            stream.close()
+            self._close_file_logger()
+            with self.updated:
+                self.version += 1
+                self.updated.notify_all()
+
+    def _add_lines(self, lines: list, pending: str) -> None:
+        with self.updated:
+            for line in lines:
+                self.lines.append(line)
+                self.metrics.update(parse_progress_line(line))
+                if self.file_logger is not None:
+                    self.file_logger.info(line)
+
+            # tqdm rewrites its line with "\r", parse the line being written for fresh metrics
+            if pending:
+                self.metrics.update(parse_progress_line(pending))
+
+            self.version += 1
+            self.updated.notify_all()
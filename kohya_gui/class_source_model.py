@@ -11,6 +11,7 @@ from .common_gui import (
     create_refresh_button,
 )
 from .class_gui_config import KohyaSSGUIConfig
+from .sd_modeltype import label_model_choices
 
 folder_symbol = "\U0001f4c2"  # 📂
 refresh_symbol = "\U0001f504"  # 🔄
@@ -65,9 +66,12 @@ class SourceModel:
             "model.dataset_config", os.path.join(scriptdir, "dataset_config")
         )
 
-        model_checkpoints = list(
-            list_files(
-                self.current_models_dir, exts=[".ckpt", ".safetensors"], all=True
+        # Show the detected model type next to each checkpoint
+        model_checkpoints = label_model_choices(
+            list(
+                list_files(
+                    self.current_models_dir, exts=[".ckpt", ".safetensors"], all=True
+                )
             )
         )
 
@@ -75,8 +79,8 @@ class SourceModel:
             self.current_models_dir = (
                 path if os.path.isdir(path) else os.path.dirname(path)
             )
-            return default_models + list(
-                list_files(path, exts=[".ckpt", ".safetensors"], all=True)
+            return default_models + label_model_choices(
+                list(list_files(path, exts=[".ckpt", ".safetensors"], all=True))
             )
 
         def list_train_data_dirs(path):
@@ -0,0 +1,158 @@
+import importlib.abc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# This module is imported before anything else when profiling startup, so it must
+# only depend on the standard library at import time.
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Meta path finder timing the execution of every module imported after it is installed.
+
+    It never finds modules itself: it asks the other finders for the spec and wraps the
+    `exec_module` method of the loader instance, so module types and loaders are unchanged.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self.local, "finding", False):
+            return None
+
+        self.local.finding = True
+        try:
+            spec = None
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            self.local.finding = False
+
+        loader = getattr(spec, "loader", None)
+        # Built-in and frozen modules use class level loaders shared by every module
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return spec
+
+        exec_module = loader.exec_module
+
+        def timed_exec_module(module):
+            with self.profiler.measure_import(fullname):
+                exec_module(module)
+
+        loader.exec_module = timed_exec_module
+        return spec
+
+
+class StartupProfiler:
+    """
+    Collect the import time of each module and the construction time of the GUI sections.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.imports = {}
+        self.sections = []
+        self.local = threading.local()
+        self.finder = None
+        self.lock = threading.RLock()
+
+    def enable(self) -> None:
+        """
+        Start timing imports. Modules already imported are not measured, so this
+        should be called as early as possible.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.perf_counter()
+        self.finder = _ImportTimer(self)
+        sys.meta_path.insert(0, self.finder)
+
+    def disable(self) -> None:
+        if self.finder in sys.meta_path:
+            sys.meta_path.remove(self.finder)
+        self.finder = None
+        self.enabled = False
+
+    @contextmanager
+    def measure_import(self, name: str):
+        # Imports nest, the time of a module without its own imports is its self time
+        stack = self.local.__dict__.setdefault("import_stack", [])
+        frame = {"children": 0.0}
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1]["children"] += elapsed
+            with self.lock:
+                self.imports[name] = (elapsed, elapsed - frame["children"])
+
+    @contextmanager
+    def measure(self, name: str):
+        """
+        Measure the time spent building a section of the GUI.
+
+        Parameters:
+        - name (str): The section name shown in the report.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                with self.lock:
+                    self.sections.append((name, time.perf_counter() - start))
+
+    def print_report(self, top: int = 30) -> None:
+        """
+        Print the slowest imports and the construction time of each GUI section.
+
+        Parameters:
+        - top (int): The number of imports shown, slowest cumulative time first.
+        """
+        if not self.enabled:
+            return
+
+        from rich.console import Console
+        from rich.table import Table
+
+        with self.lock:
+            imports = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+            sections = list(self.sections)
+
+        table = Table(title=f"Slowest imports ({len(imports)} modules imported)")
+        table.add_column("Module")
+        table.add_column("Cumulative (s)", justify="right")
+        table.add_column("Self (s)", justify="right")
+        for name, (cumulative, own) in imports[:top]:
+            table.add_row(name, f"{cumulative:.3f}", f"{own:.3f}")
+
+        section_table = Table(title="GUI construction")
+        section_table.add_column("Section")
+        section_table.add_column("Time (s)", justify="right")
+        for name, elapsed in sections:
+            section_table.add_row(name, f"{elapsed:.3f}")
+        section_table.add_row(
+            "Total since start", f"{time.perf_counter() - self.started:.3f}"
+        )
+
+        console = Console()
+        console.print(table)
+        console.print(section_table)
+
+
+# Shared profiler for the whole GUI process
+startup_profiler = StartupProfiler()
@@ -0,0 +1,235 @@
+import itertools
+import os
+import re
+
+import gradio as gr
+
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+SWEEP_AXES_PLACEHOLDER = """learning_rate = 1e-4, 5e-5
+network_dim = range(8, 33, 8)
+network_alpha = linspace(1, 16, 3)
+optimizer = AdamW8bit, Prodigy"""
+
+LOSS_PATTERN = re.compile(r"avr_loss=([-+0-9.eE]+)")
+
+
+def parse_sweep_value(value: str):
+    """
+    Convert a sweep value to bool, int or float when possible, otherwise keep it as a string.
+    """
+    value = value.strip().strip("\"'")
+    if value.lower() in ["true", "false"]:
+        return value.lower() == "true"
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_sweep_axis(values: str) -> list:
+    """
+    Parse the values of one sweep axis.
+
+    Supported forms:
+    - a comma separated list: `1e-4, 5e-5`
+    - a range, stop excluded as with Python's range: `range(8, 33, 8)`
+    - evenly spaced values, stop included: `linspace(1, 16, 3)`
+    """
+    values = values.strip()
+
+    match = re.fullmatch(r"(range|linspace)\((.*)\)", values)
+    if match is None:
+        return [parse_sweep_value(value) for value in values.split(",") if value.strip()]
+
+    function, arguments = match.groups()
+    arguments = [parse_sweep_value(argument) for argument in arguments.split(",")]
+    if not all(
+        isinstance(argument, (int, float)) and not isinstance(argument, bool)
+        for argument in arguments
+    ):
+        raise ValueError(f"{function}() takes numeric arguments: {values}")
+
+    if function == "range":
+        if not 1 <= len(arguments) <= 3:
+            raise ValueError(f"range() takes 1 to 3 arguments: {values}")
+        if len(arguments) == 1:
+            start, stop, step = 0, arguments[0], 1
+        elif len(arguments) == 2:
+            start, stop, step = arguments[0], arguments[1], 1
+        else:
+            start, stop, step = arguments
+        if step == 0:
+            raise ValueError(f"range() step can't be 0: {values}")
+        result = []
+        value = start
+        while (step > 0 and value < stop) or (step < 0 and value > stop):
+            result.append(value)
+            value = round(value + step, 12)
+        return result
+
+    if len(arguments) != 3:
+        raise ValueError(f"linspace() takes 3 arguments: {values}")
+    start, stop, num = arguments
+    num = int(num)
+    if num == 1:
+        return [start]
+    result = [start + (stop - start) * i / (num - 1) for i in range(num)]
+    if all(isinstance(argument, int) for argument in [start, stop]):
+        result = [int(value) if float(value).is_integer() else value for value in result]
+    return result
+
+
+def parse_sweep_axes(text: str, allowed_names: list = None) -> dict:
+    """
+    Parse sweep axes, one `name = values` line per parameter. Empty lines and lines
+    starting with `#` are ignored.
+
+    Parameters:
+    - text (str): The axes definition.
+    - allowed_names (list): Optional list of valid parameter names.
+
+    Returns:
+    - dict: The values of each axis, in definition order.
+    """
+    axes = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if "=" not in line:
+            raise ValueError(f"Invalid sweep axis '{line}', expected 'name = values'")
+
+        name, values = [part.strip() for part in line.split("=", 1)]
+        if allowed_names is not None and name not in allowed_names:
+            raise ValueError(f"Unknown training parameter '{name}'")
+
+        axis = parse_sweep_axis(values)
+        if not axis:
+            raise ValueError(f"Sweep axis '{name}' has no values")
+        axes[name] = axis
+    return axes
+
+
+def expand_sweep(axes: dict) -> list:
+    """
+    Expand sweep axes into the list of parameter overrides of every run (cartesian product).
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def sweep_run_name(output_name: str, overrides: dict) -> str:
+    """
+    Build a unique, filesystem safe output name for a sweep run.
+    """
+    parts = [output_name]
+    for name, value in overrides.items():
+        parts.append(f"{name}-{value}")
+    return re.sub(r"[^\w.\-]+", "_", "_".join(parts))
+
+
+def read_final_loss(log_file: str, tail_size: int = 65536):
+    """
+    Return the last average loss reported in a training log, or None.
+    """
+    if not log_file or not os.path.isfile(log_file):
+        return None
+
+    with open(log_file, "rb") as f:
+        f.seek(max(0, os.path.getsize(log_file) - tail_size))
+        tail = f.read().decode("utf-8", errors="ignore")
+
+    matches = LOSS_PATTERN.findall(tail)
+    if not matches:
+        return None
+    try:
+        return float(matches[-1])
+    except ValueError:
+        return None
+
+
+def sweep_summary(job_queue, sweep_name: str) -> list:
+    """
+    Summarize the runs of a sweep: one row per run with its status, parameters and final loss.
+    """
+    rows = []
+    with job_queue.lock:
+        jobs = [
+            dict(job)
+            for job in job_queue.jobs
+            if job.get("metadata", {}).get("sweep") == sweep_name
+        ]
+
+    for job in jobs:
+        overrides = job["metadata"].get("overrides", {})
+        final_loss = read_final_loss(job.get("log_file"))
+        rows.append(
+            [
+                job["id"],
+                job["name"],
+                job["status"],
+                job["gpu_ids"],
+                ", ".join(f"{name}={value}" for name, value in overrides.items()),
+                "" if final_loss is None else final_loss,
+            ]
+        )
+    return rows
+
+
+class Sweep:
+    """
+    Gradio interface to queue a hyperparameter sweep over the current training settings.
+    """
+
+    def __init__(self, job_queue, headless: bool = False):
+        self.job_queue = job_queue
+        self.headless = headless
+
+        self.gradio_interface()
+
+    def refresh_summary(self, sweep_name: str):
+        return gr.Dataframe(value=sweep_summary(self.job_queue, sweep_name))
+
+    def gradio_interface(self) -> None:
+        with gr.Row():
+            self.axes = gr.Textbox(
+                label="Sweep axes",
+                placeholder=SWEEP_AXES_PLACEHOLDER,
+                lines=4,
+                info="One training parameter per line: a comma separated list, range(start, stop, step) or linspace(start, stop, num). Every combination is queued as one run.",
+            )
+            with gr.Column():
+                self.gpu_ids = gr.Textbox(
+                    label="Sweep GPU IDs",
+                    placeholder="(Optional) e.g. 0,1",
+                    info="Runs are assigned to these GPUs round-robin. Leave empty to use the gpu_ids of the accelerate launch settings.",
+                )
+                self.button_queue_sweep = gr.Button("Queue sweep")
+
+        with gr.Row():
+            self.sweep_name = gr.Textbox(
+                label="Sweep name",
+                info="Filled in when a sweep is queued",
+            )
+            button_refresh_summary = gr.Button("Refresh summary")
+
+        self.summary = gr.Dataframe(
+            headers=["ID", "Name", "Status", "GPU IDs", "Parameters", "Final loss"],
+            interactive=False,
+            wrap=True,
+        )
+
+        button_refresh_summary.click(
+            self.refresh_summary,
+            inputs=[self.sweep_name],
+            outputs=[self.summary],
+            show_progress=False,
+        )
@@ -1,21 +1,23 @@
 import os
 import gradio as gr
+import importlib.util
+import shutil
 import subprocess
 import time
 import webbrowser
 
-try:
-    os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
-    import tensorflow  # Attempt to import tensorflow to check if it is installed
+os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 
-    visibility = True
-except ImportError:
-    visibility = False
+# Only check that the tensorboard server is installed, importing tensorflow takes seconds
+visibility = (
+    shutil.which("tensorboard") is not None
+    or importlib.util.find_spec("tensorboard") is not None
+)
 
-from easygui import msgbox
 from threading import Thread, Event
+from .class_metrics_viewer import MetricsViewer
 from .custom_logging import setup_logging
-from .common_gui import setup_environment
+from .common_gui import msgbox, setup_environment
 
 
 class TensorboardManager:
@@ -141,3 +143,6 @@ class TensorboardManager:
                 outputs=[button_start_tensorboard, button_stop_tensorboard],
                 show_progress=False,
             )
+
+        with gr.Accordion("Training metrics", open=False):
+            MetricsViewer(self.logging_dir, headless=self.headless)
@@ -0,0 +1,708 @@
+import json
+import math
+import os
+import time
+from collections import Counter
+
+import gradio as gr
+import imagesize
+import toml
+
+from .class_json_cache import JsonCache
+from .common_gui import function_arguments, scriptdir
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+DEFAULT_THROUGHPUT_PROFILES_FILE = os.path.join(
+    scriptdir, "logs", "throughput_profiles.json"
+)
+
+# Weight of a new measurement in the stored it/s average
+THROUGHPUT_SMOOTHING = 0.5
+
+# Image sizes by (path, mtime), headers are only read once per file version
+_image_sizes = {}
+
+
+def image_size(path: str) -> tuple:
+    """
+    Return the (width, height) of an image from its header, or (-1, -1) if unreadable.
+    """
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return (-1, -1)
+    if key not in _image_sizes:
+        try:
+            _image_sizes[key] = tuple(imagesize.get(path))
+        except (OSError, ValueError):
+            _image_sizes[key] = (-1, -1)
+    return _image_sizes[key]
+
+
+def list_images(directory: str) -> list:
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def parse_resolution(value) -> tuple:
+    """
+    Parse a resolution given as "512", "1024,1024", 512 or [1024, 1024] into (width, height).
+    """
+    if isinstance(value, (list, tuple)):
+        return int(value[0]), int(value[-1])
+    parts = [int(part) for part in str(value).replace("x", ",").split(",") if part.strip()]
+    return parts[0], parts[-1]
+
+
+def make_bucket_resolutions(
+    max_reso: tuple, min_size: int = 256, max_size: int = 1024, divisible: int = 64
+) -> list:
+    """
+    Bucket resolutions for a maximum area, as computed by sd-scripts.
+    """
+    max_width, max_height = max_reso
+    max_area = max_width * max_height
+
+    resos = set()
+    width = int(math.sqrt(max_area) // divisible) * divisible
+    resos.add((width, width))
+
+    width = min_size
+    while width <= max_size:
+        height = min(max_size, int((max_area // width) // divisible) * divisible)
+        if height >= min_size:
+            resos.add((width, height))
+            resos.add((height, width))
+        width += divisible
+
+    return sorted(resos)
+
+
+def bucket_settings(
+    resolution,
+    enable_bucket: bool = True,
+    min_bucket_reso: int = 256,
+    max_bucket_reso: int = 2048,
+    bucket_reso_steps: int = 64,
+    bucket_no_upscale: bool = False,
+) -> dict:
+    settings = {
+        "resolution": parse_resolution(resolution),
+        "enable_bucket": bool(enable_bucket),
+        "reso_steps": int(bucket_reso_steps) or 64,
+        "no_upscale": bool(bucket_no_upscale),
+    }
+    settings["buckets"] = make_bucket_resolutions(
+        settings["resolution"],
+        int(min_bucket_reso),
+        int(max_bucket_reso),
+        settings["reso_steps"],
+    )
+    return settings
+
+
+def select_bucket(width: int, height: int, settings: dict) -> tuple:
+    """
+    Select the bucket of an image the way the sd-scripts BucketManager does.
+    """
+    if width <= 0 or height <= 0 or not settings["enable_bucket"]:
+        return settings["resolution"]
+
+    aspect_ratio = width / height
+    if not settings["no_upscale"]:
+        return min(
+            settings["buckets"],
+            key=lambda reso: abs(reso[0] / reso[1] - aspect_ratio),
+        )
+
+    steps = settings["reso_steps"]
+    max_area = settings["resolution"][0] * settings["resolution"][1]
+
+    def round_to_steps(x):
+        x = int(x + 0.5)
+        return x - x % steps
+
+    if width * height > max_area:
+        # Downscale to the maximum area, keeping the rounding with the lowest aspect error
+        resized_width = math.sqrt(max_area * aspect_ratio)
+        resized_height = max_area / resized_width
+        width_rounded = round_to_steps(resized_width)
+        height_in_width_rounded = round_to_steps(width_rounded / aspect_ratio)
+        height_rounded = round_to_steps(resized_height)
+        width_in_height_rounded = round_to_steps(height_rounded * aspect_ratio)
+        width_error = abs(width_rounded / max(height_in_width_rounded, 1) - aspect_ratio)
+        height_error = abs(width_in_height_rounded / max(height_rounded, 1) - aspect_ratio)
+        if width_error < height_error:
+            width, height = width_rounded, int(width_rounded / aspect_ratio + 0.5)
+        else:
+            width, height = int(height_rounded * aspect_ratio + 0.5), height_rounded
+
+    return (width - width % steps, height - height % steps)
+
+
+def folder_subsets(train_data_dir: str, reg_data_dir: str) -> list:
+    """
+    List the <repeats>_<class tokens> subfolders of the train and regularization folders
+    as subsets, the way sd-scripts reads a DreamBooth style folder layout.
+    """
+    subsets = []
+    for data_dir, is_reg in [(train_data_dir, False), (reg_data_dir, True)]:
+        if not data_dir or not os.path.isdir(data_dir):
+            continue
+        for folder in sorted(os.listdir(data_dir)):
+            image_dir = os.path.join(data_dir, folder)
+            if not os.path.isdir(image_dir):
+                continue
+            tokens = folder.split("_")
+            try:
+                repeats = int(tokens[0])
+            except ValueError:
+                log.info(f"Error: '{folder}' does not contain an underscore, skipping...")
+                continue
+            subsets.append(
+                {
+                    "image_dir": image_dir,
+                    "num_repeats": repeats,
+                    "is_reg": is_reg,
+                    "class_tokens": "_".join(tokens[1:]),
+                }
+            )
+    return subsets
+
+
+def folder_datasets(
+    train_data_dir: str, reg_data_dir: str, batch_size: int, bucket: dict
+) -> list:
+    """
+    Describe a DreamBooth style folder layout (<repeats>_<name> subfolders) as one dataset.
+    """
+    subsets = folder_subsets(train_data_dir, reg_data_dir)
+    return [{"batch_size": int(batch_size), "bucket": bucket, "subsets": subsets}]
+
+
+def load_dataset_config(path: str, batch_size: int, bucket_defaults: dict) -> list:
+    """
+    Describe the datasets and subsets of a sd-scripts dataset_config TOML file.
+
+    Parameters:
+    - path (str): The TOML file.
+    - batch_size (int): The train batch size, used when a dataset does not set one.
+    - bucket_defaults (dict): The bucket_settings arguments used when a dataset does not set them.
+
+    Returns:
+    - list: The datasets, each with its batch size, bucket settings and subsets.
+    """
+    return config_datasets(toml.load(path), batch_size, bucket_defaults)
+
+
+def write_dataset_config(config: dict, config_file: str) -> None:
+    """
+    Write a sd-scripts dataset config TOML file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(config_file)), exist_ok=True)
+    with open(config_file, "w", encoding="utf-8") as f:
+        toml.dump(config, f)
+    log.info(
+        f"Dataset config with {sum(len(dataset.get('subsets', [])) for dataset in config.get('datasets', []))} subsets written to {config_file}"
+    )
+
+
+def config_datasets(config: dict, batch_size: int, bucket_defaults: dict) -> list:
+    """
+    Describe the datasets and subsets of a parsed dataset config, see load_dataset_config.
+    """
+    general = config.get("general", {})
+
+    datasets = []
+    for dataset in config.get("datasets", []):
+        options = {**general, **dataset}
+        bucket = bucket_settings(
+            **{
+                key: options.get(key, value)
+                for key, value in bucket_defaults.items()
+            }
+        )
+        subsets = []
+        for subset in dataset.get("subsets", []):
+            subset = {**general, **subset}
+            subsets.append(
+                {
+                    "image_dir": subset.get("image_dir", ""),
+                    "metadata_file": subset.get("metadata_file", ""),
+                    "num_repeats": int(subset.get("num_repeats", 1)),
+                    "is_reg": bool(subset.get("is_reg", False)),
+                }
+            )
+        datasets.append(
+            {
+                "batch_size": int(options.get("batch_size", batch_size)),
+                "bucket": bucket,
+                "subsets": subsets,
+            }
+        )
+    return datasets
+
+
+def subset_images(subset: dict, bucket: dict) -> list:
+    """
+    Return the (width, height) and the bucket of every image of a subset. The size is
+    (-1, -1) when unknown.
+    """
+    metadata_file = subset.get("metadata_file")
+    if metadata_file and os.path.isfile(metadata_file):
+        # Fine tuning metadata, train_resolution is the bucket found by prepare_buckets_latents
+        with open(metadata_file, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        images = []
+        for image_key, info in metadata.items():
+            size = image_size(image_key)
+            if info.get("train_resolution"):
+                images.append((size, tuple(info["train_resolution"])))
+            else:
+                images.append((size, select_bucket(*size, bucket)))
+        return images
+
+    images = []
+    for path in list_images(subset.get("image_dir", "")):
+        size = image_size(path)
+        images.append((size, select_bucket(*size, bucket)))
+    return images
+
+
+def subset_buckets(subset: dict, bucket: dict) -> list:
+    """
+    Return the bucket of every image of a subset.
+    """
+    return [reso for _, reso in subset_images(subset, bucket)]
+
+
+def bucket_items(dataset: dict) -> dict:
+    """
+    Count the items of each bucket of a dataset for one epoch.
+
+    Regularization images are balanced against the train images as sd-scripts does: they
+    are registered with their repeats, then cycled until they match the train items.
+
+    Returns:
+    - dict: The items by bucket, the train images by bucket, the number of train and
+      regularization images and of train and regularization items.
+    """
+    bucket = dataset["bucket"]
+    buckets = Counter()
+    images = Counter()
+    items = 0
+    reg_images = []
+
+    for subset in dataset["subsets"]:
+        for reso in subset_buckets(subset, bucket):
+            if subset["is_reg"]:
+                reg_images.append([reso, subset["num_repeats"]])
+            else:
+                images[reso] += 1
+                items += subset["num_repeats"]
+                buckets[reso] += subset["num_repeats"]
+
+    reg_items = 0
+    if reg_images and items:
+        registered = 0
+        first_loop = True
+        while reg_items < items:
+            for reg_image in reg_images:
+                if first_loop:
+                    registered += 1
+                    reg_items += reg_image[1]
+                else:
+                    reg_image[1] += 1
+                    reg_items += 1
+                if reg_items >= items:
+                    break
+            first_loop = False
+        for reso, repeats in reg_images[:registered]:
+            buckets[reso] += repeats
+
+    return {
+        "buckets": buckets,
+        "bucket_images": images,
+        "images": sum(images.values()),
+        "reg_images": len(reg_images),
+        "items": items,
+        "reg_items": reg_items,
+    }
+
+
+def estimate_dataset(dataset: dict) -> dict:
+    """
+    Count the items of a dataset for one epoch and the resulting batches, bucket by bucket.
+    """
+    counts = bucket_items(dataset)
+    items = counts["items"] + counts["reg_items"]
+    batch_size = max(1, dataset["batch_size"])
+    return {
+        "images": counts["images"],
+        "reg_images": counts["reg_images"],
+        "items": items,
+        "buckets": len(counts["buckets"]),
+        "batches": sum(
+            math.ceil(count / batch_size) for count in counts["buckets"].values()
+        ),
+        "unbucketed_batches": math.ceil(items / batch_size),
+    }
+
+
+def estimate_training(
+    datasets: list,
+    epochs: int,
+    max_train_steps: int = 0,
+    gradient_accumulation_steps: int = 1,
+    num_processes: int = 1,
+) -> dict:
+    """
+    Estimate the optimizer steps of a training run, bucket by bucket.
+
+    Each bucket ends an epoch with a partial batch, so a fragmented dataset runs more
+    steps than items / batch size.
+
+    Returns:
+    - dict: Image, item, bucket and batch counts, extra batches, steps per epoch,
+      total steps and epochs.
+    """
+    estimate = Counter()
+    for dataset in datasets:
+        estimate.update(estimate_dataset(dataset))
+    estimate = dict(estimate)
+    for key in [
+        "images",
+        "reg_images",
+        "items",
+        "buckets",
+        "batches",
+        "unbucketed_batches",
+    ]:
+        estimate.setdefault(key, 0)
+
+    estimate["extra_batches"] = estimate["batches"] - estimate["unbucketed_batches"]
+    estimate["steps_per_epoch"] = math.ceil(
+        estimate["batches"]
+        / max(1, int(num_processes))
+        / max(1, int(gradient_accumulation_steps))
+    )
+    if int(max_train_steps) > 0:
+        estimate["total_steps"] = int(max_train_steps)
+        estimate["epochs"] = (
+            math.ceil(estimate["total_steps"] / estimate["steps_per_epoch"])
+            if estimate["steps_per_epoch"]
+            else 0
+        )
+    else:
+        estimate["epochs"] = int(epochs)
+        estimate["total_steps"] = estimate["steps_per_epoch"] * int(epochs)
+    return estimate
+
+
+def model_family(sdxl=False, flux1=False, sd3=False, v2=False) -> str:
+    if flux1:
+        return "FLUX1"
+    if sd3:
+        return "SD3"
+    if sdxl:
+        return "SDXL"
+    return "SD2" if v2 else "SD1"
+
+
+def throughput_key(
+    kind: str,
+    family: str,
+    resolution,
+    batch_size: int,
+    mixed_precision: str,
+    network_dim=None,
+) -> str:
+    """
+    Key of the throughput profile of a training setup, it/s mostly depend on these settings.
+    """
+    width, height = parse_resolution(resolution)
+    parts = [kind, family, f"{width}x{height}", f"bs{int(batch_size)}", str(mixed_precision)]
+    if network_dim:
+        parts.append(f"dim{int(network_dim)}")
+    return "|".join(parts)
+
+
+def profile_key(
+    kind: str,
+    max_resolution: str = "512,512",
+    train_batch_size: int = 1,
+    mixed_precision: str = "fp16",
+    sdxl: bool = False,
+    flux1_checkbox: bool = False,
+    sd3_checkbox: bool = False,
+    v2: bool = False,
+    network_dim=None,
+    **kwargs,
+) -> str:
+    """
+    Throughput profile key from the settings of a training tab.
+    """
+    return throughput_key(
+        kind,
+        model_family(sdxl, flux1_checkbox, sd3_checkbox, v2),
+        max_resolution or "512,512",
+        train_batch_size or 1,
+        mixed_precision,
+        network_dim,
+    )
+
+
+class ThroughputProfiles(JsonCache):
+    """
+    Measured it/s by training setup, stored on disk and updated when a training ends.
+    """
+
+    description = "throughput profiles"
+    indent = 2
+
+    def __init__(self, profiles_file: str = DEFAULT_THROUGHPUT_PROFILES_FILE):
+        super().__init__(profiles_file)
+
+    def get(self, key: str) -> float:
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            profile = self.entries.get(key)
+            return profile["it_per_sec"] if profile else None
+
+    def record(self, key: str, it_per_sec: float) -> None:
+        """
+        Blend a measured it/s into the profile of a training setup.
+        """
+        if not key or not it_per_sec or it_per_sec <= 0:
+            return
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            profile = self.entries.get(key)
+            if profile:
+                it_per_sec = (
+                    THROUGHPUT_SMOOTHING * it_per_sec
+                    + (1 - THROUGHPUT_SMOOTHING) * profile["it_per_sec"]
+                )
+            self.entries[key] = {
+                "it_per_sec": round(it_per_sec, 4),
+                "samples": (profile["samples"] if profile else 0) + 1,
+                "updated": time.time(),
+            }
+            self.save()
+        log.info(f"Recorded {it_per_sec:.2f} it/s for {key}")
+
+
+# Shared profiles for the whole GUI process
+throughput_profiles = ThroughputProfiles()
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
+
+
+def training_datasets(
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    dataset_config: str = "",
+    train_batch_size: int = 1,
+    max_resolution: str = "512,512",
+    enable_bucket: bool = True,
+    min_bucket_reso: int = 256,
+    max_bucket_reso: int = 2048,
+    bucket_reso_steps: int = 64,
+    bucket_no_upscale: bool = False,
+) -> list:
+    """
+    Describe the datasets of a training tab: from the dataset_config TOML file when set,
+    from the train and regularization folders otherwise.
+    """
+    bucket_defaults = {
+        "resolution": max_resolution or "512,512",
+        "enable_bucket": enable_bucket,
+        "min_bucket_reso": min_bucket_reso or 256,
+        "max_bucket_reso": max_bucket_reso or 2048,
+        "bucket_reso_steps": bucket_reso_steps or 64,
+        "bucket_no_upscale": bucket_no_upscale,
+    }
+    train_batch_size = int(train_batch_size or 1)
+    if dataset_config:
+        return load_dataset_config(dataset_config, train_batch_size, bucket_defaults)
+    return folder_datasets(
+        train_data_dir,
+        reg_data_dir,
+        train_batch_size,
+        bucket_settings(**bucket_defaults),
+    )
+
+
+def estimate_from_settings(
+    kind: str,
+    train_data_dir: str = "",
+    reg_data_dir: str = "",
+    dataset_config: str = "",
+    train_batch_size: int = 1,
+    epoch: int = 1,
+    max_train_steps: int = 0,
+    gradient_accumulation_steps: int = 1,
+    num_processes: int = 1,
+    max_resolution: str = "512,512",
+    enable_bucket: bool = True,
+    min_bucket_reso: int = 256,
+    max_bucket_reso: int = 2048,
+    bucket_reso_steps: int = 64,
+    bucket_no_upscale: bool = False,
+    mixed_precision: str = "fp16",
+    sdxl: bool = False,
+    flux1_checkbox: bool = False,
+    sd3_checkbox: bool = False,
+    v2: bool = False,
+    network_dim=None,
+    it_per_sec: float = 0,
+) -> dict:
+    """
+    Estimate the steps and wall time of a training from the settings of a training tab.
+
+    The datasets are described by training_datasets. The it/s is the given one, or the
+    stored profile of the same training setup.
+
+    Returns:
+    - dict: The estimate_training result with the it/s used, its source and the wall time in seconds.
+    """
+    train_batch_size = int(train_batch_size or 1)
+    datasets = training_datasets(
+        train_data_dir,
+        reg_data_dir,
+        dataset_config,
+        train_batch_size,
+        max_resolution,
+        enable_bucket,
+        min_bucket_reso,
+        max_bucket_reso,
+        bucket_reso_steps,
+        bucket_no_upscale,
+    )
+
+    estimate = estimate_training(
+        datasets,
+        epochs=int(epoch or 1),
+        max_train_steps=int(max_train_steps or 0),
+        gradient_accumulation_steps=int(gradient_accumulation_steps or 1),
+        num_processes=int(num_processes or 1),
+    )
+
+    estimate["profile"] = profile_key(
+        kind,
+        max_resolution=max_resolution,
+        train_batch_size=train_batch_size,
+        mixed_precision=mixed_precision,
+        sdxl=sdxl,
+        flux1_checkbox=flux1_checkbox,
+        sd3_checkbox=sd3_checkbox,
+        v2=v2,
+        network_dim=network_dim,
+    )
+    estimate["it_per_sec_source"] = "measured"
+    if not it_per_sec:
+        it_per_sec = throughput_profiles.get(estimate["profile"])
+        estimate["it_per_sec_source"] = "stored profile"
+    estimate["it_per_sec"] = it_per_sec
+    estimate["seconds"] = (
+        estimate["total_steps"] / it_per_sec if it_per_sec else None
+    )
+    return estimate
+
+
+def training_settings(parameters: list) -> dict:
+    """
+    Pick the estimate_from_settings arguments out of the (name, value) parameters of a
+    train_model function.
+    """
+    settings = function_arguments(estimate_from_settings, dict(parameters))
+    settings.pop("kind", None)
+    settings.pop("it_per_sec", None)
+    return settings
+
+
+def format_estimate(estimate: dict) -> str:
+    """
+    Format an estimate as markdown for the estimate panel and the training log.
+    """
+    lines = [
+        f"- Images: {estimate['images']} train, {estimate['reg_images']} regularization",
+        f"- Items per epoch (with repeats): {estimate['items']} in {estimate['buckets']} buckets",
+        f"- Batches per epoch: {estimate['batches']} ({estimate['extra_batches']} more than without bucket fragmentation)",
+        f"- Steps per epoch: {estimate['steps_per_epoch']}",
+        f"- Total steps: {estimate['total_steps']} over {estimate['epochs']} epochs",
+    ]
+    if estimate.get("seconds") is not None:
+        lines.append(
+            f"- Wall time: {format_duration(estimate['seconds'])} at {estimate['it_per_sec']:.2f} it/s ({estimate['it_per_sec_source']})"
+        )
+    elif "profile" in estimate:
+        lines.append(
+            f"- Wall time: unknown, no throughput profile for {estimate['profile']} yet. Enter a measured it/s."
+        )
+    return "\n".join(lines)
+
+
+class TrainingEstimate:
+    """
+    Panel estimating the steps and wall time of a training before launching it.
+    """
+
+    def __init__(self, kind: str, components: dict, headless: bool = False):
+        """
+        Initialize the TrainingEstimate panel.
+
+        Parameters:
+        - kind (str): The training kind (lora, dreambooth, ti), part of the throughput profile key.
+        - components (dict): The components of the training tab, by setting name.
+        - headless (bool): Whether to run in headless mode.
+        """
+        self.kind = kind
+        self.components = function_arguments(estimate_from_settings, components)
+        self.headless = headless
+
+        with gr.Accordion("Training estimate", open=False):
+            with gr.Row():
+                self.it_per_sec = gr.Number(
+                    label="Measured it/s (0 to use the stored profile)",
+                    value=0,
+                    minimum=0,
+                    interactive=True,
+                )
+                self.button_estimate = gr.Button("Estimate steps and time")
+            self.estimate = gr.Markdown()
+
+        self.button_estimate.click(
+            self.estimate_markdown,
+            inputs=list(self.components.values()) + [self.it_per_sec],
+            outputs=[self.estimate],
+            show_progress=False,
+        )
+
+    def estimate_markdown(self, *values):
+        settings = dict(zip(self.components, values[:-1]))
+        try:
+            estimate = estimate_from_settings(
+                self.kind, it_per_sec=values[-1], **settings
+            )
+        except (OSError, ValueError, IndexError, TypeError, toml.TomlDecodeError) as e:
+            return f"Could not estimate the training: {e}"
+        return format_estimate(estimate)
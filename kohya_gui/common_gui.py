@@ -2,11 +2,11 @@ try:
     from tkinter import filedialog, Tk
 except ImportError:
     pass
-from easygui import msgbox, ynbox
 from typing import Optional
 from .custom_logging import setup_logging
 from .sd_modeltype import SDModelType
 
+import inspect
 import os
 import re
 import gradio as gr
@@ -20,6 +20,25 @@ import toml
 # Set up logging
 log = setup_logging()
 
+
+# easygui dialogs are imported when first shown rather than at GUI startup
+def msgbox(*args, **kwargs):
+    import easygui
+
+    return easygui.msgbox(*args, **kwargs)
+
+
+def ynbox(*args, **kwargs):
+    import easygui
+
+    return easygui.ynbox(*args, **kwargs)
+
+
+def boolbox(*args, **kwargs):
+    import easygui
+
+    return easygui.boolbox(*args, **kwargs)
+
 folder_symbol = "\U0001f4c2"  # 📂
 refresh_symbol = "\U0001f504"  # 🔄
 save_style_symbol = "\U0001f4be"  # 💾
@@ -322,93 +341,21 @@ def list_files(path, exts=None, all=False):
 
 
 def update_my_data(my_data):
-    # Update the optimizer based on the use_8bit_adam flag
-    use_8bit_adam = my_data.get("use_8bit_adam", False)
-    my_data.setdefault("optimizer", "AdamW8bit" if use_8bit_adam else "AdamW")
+    """
+    Migrate the deprecated options of a loaded configuration. The values are validated
+    and converted to their type by ConfigSchema.normalize.
+    """
+    # Update the optimizer based on the deprecated use_8bit_adam flag
+    if "use_8bit_adam" in my_data:
+        use_8bit_adam = my_data.pop("use_8bit_adam")
+        my_data.setdefault("optimizer", "AdamW8bit" if use_8bit_adam else "AdamW")
 
     # Update model_list to custom if empty or pretrained_model_name_or_path is not a preset model
-    model_list = my_data.get("model_list", [])
-    pretrained_model_name_or_path = my_data.get("pretrained_model_name_or_path", "")
-    if not model_list or pretrained_model_name_or_path not in ALL_PRESET_MODELS:
-        my_data["model_list"] = "custom"
-
-    # Convert values to int if they are strings
-    for key in [
-        "clip_skip",
-        "epoch",
-        "gradient_accumulation_steps",
-        "keep_tokens",
-        "lr_warmup",
-        "max_data_loader_n_workers",
-        "max_train_epochs",
-        "save_every_n_epochs",
-        "seed",
-    ]:
-        value = my_data.get(key)
-        if value is not None:
-            try:
-                my_data[key] = int(value)
-            except ValueError:
-                # Handle the case where the string is not a valid float
-                my_data[key] = int(0)
-
-    # Convert values to int if they are strings
-    for key in ["lr_scheduler_num_cycles"]:
-        value = my_data.get(key)
-        if value is not None:
-            try:
-                my_data[key] = int(value)
-            except ValueError:
-                # Handle the case where the string is not a valid float
-                my_data[key] = int(1)
-
-    for key in [
-        "max_train_steps",
-        "caption_dropout_every_n_epochs"
-    ]:
-        value = my_data.get(key)
-        if value is not None:
-            try:
-                my_data[key] = int(value)
-            except ValueError:
-                # Handle the case where the string is not a valid float
-                my_data[key] = int(0)
-
-    # Convert values to int if they are strings
-    for key in ["max_token_length"]:
-        value = my_data.get(key)
-        if value is not None:
-            try:
-                my_data[key] = int(value)
-            except ValueError:
-                # Handle the case where the string is not a valid float
-                my_data[key] = int(75)
-
-    # Convert values to float if they are strings, correctly handling float representations
-    for key in [
-        "adaptive_noise_scale",
-        "noise_offset",
-        "learning_rate",
-        "text_encoder_lr",
-        "unet_lr",
-    ]:
-        value = my_data.get(key)
-        if value is not None:
-            try:
-                my_data[key] = float(value)
-            except ValueError:
-                # Handle the case where the string is not a valid float
-                my_data[key] = float(0.0)
-
-    # Convert values to float if they are strings, correctly handling float representations
-    for key in ["lr_scheduler_power"]:
-        value = my_data.get(key)
-        if value is not None:
-            try:
-                my_data[key] = float(value)
-            except ValueError:
-                # Handle the case where the string is not a valid float
-                my_data[key] = float(1.0)
+    if "pretrained_model_name_or_path" in my_data:
+        model_list = my_data.get("model_list", [])
+        pretrained_model_name_or_path = my_data["pretrained_model_name_or_path"]
+        if not model_list or pretrained_model_name_or_path not in ALL_PRESET_MODELS:
+            my_data["model_list"] = "custom"
 
     # Update LoRA_type if it is set to LoCon
     if my_data.get("LoRA_type", "Standard") == "LoCon":
@@ -447,13 +394,6 @@ def update_my_data(my_data):
 
         my_data.pop(key, None)
 
-    # Replace the lora_network_weights key with network_weights keeping the original value
-    for key in ["lora_network_weights"]:
-        value = my_data.get(key)  # Get original value
-        if value is not None:  # Check if the key exists in the dictionary
-            my_data["network_weights"] = value
-            my_data.pop(key, None)
-
     return my_data
 
 
@@ -1070,6 +1010,25 @@ def set_pretrained_model_name_or_path_input(
 ###
 
 
+def function_arguments(function, values: dict) -> dict:
+    """
+    Keep the values named like an argument of a function.
+
+    The panels of a training tab receive all its components by setting name and use
+    this to pick the ones their function takes, the same function then receives the
+    values of these components by name.
+
+    Parameters:
+    - function: The function.
+    - values (dict): The values or components, by name.
+
+    Returns:
+    - dict: The values whose name is an argument of the function.
+    """
+    names = inspect.signature(function).parameters
+    return {name: value for name, value in values.items() if name in names}
+
+
 def get_int_or_default(kwargs, key, default_value=0):
     """
     Retrieves an integer value from the provided kwargs dictionary based on the given key. If the key is not found,
@@ -1274,6 +1233,7 @@ def SaveConfigFile(
     parameters,
     file_path: str,
     exclusion: list = ["file_path", "save_as", "headless", "print_only"],
+    schema=None,
 ) -> None:
     """
     Saves the configuration parameters to a JSON file, excluding specified keys.
@@ -1286,13 +1246,18 @@ def SaveConfigFile(
         parameters (dict): Dictionary containing the configuration parameters.
         file_path (str): Path to the file where the filtered parameters should be saved.
         exclusion (list): List of keys to exclude from saving. Defaults to ["file_path", "save_as", "headless", "print_only"].
+        schema (ConfigSchema): Optional settings schema. When provided, the settings of the
+            schema are saved coerced to their type, in schema order, and `exclusion` is not used.
     """
-    # Return the values of the variables as a dictionary
-    variables = {
-        name: value
-        for name, value in sorted(parameters, key=lambda x: x[0])
-        if name not in exclusion
-    }
+    if schema is not None:
+        variables = schema.dump(parameters)
+    else:
+        # Return the values of the variables as a dictionary
+        variables = {
+            name: value
+            for name, value in sorted(parameters, key=lambda x: x[0])
+            if name not in exclusion
+        }
 
     # Check if the folder path for the file_path is valid
     # Extrach folder path
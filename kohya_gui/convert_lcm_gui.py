@@ -1,6 +1,5 @@
 import gradio as gr
 import os
-import subprocess
 import sys
 from .common_gui import (
     get_saveasfilename_path,
@@ -9,6 +8,7 @@ from .common_gui import (
     list_files,
     create_refresh_button, setup_environment
 )
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -69,10 +69,7 @@ def convert_lcm(
     log.info(f"Executing command: {command_to_run}")
 
     # Run the command in the sd-scripts folder context
-    subprocess.run(run_cmd, env=env, shell=False)
-
-    # Return a success message
-    log.info("Done extracting...")
+    background_tasks.submit("Convert LCM", run_cmd, env=env)
 
 
 def gradio_convert_lcm_tab(headless=False):
@@ -1,100 +1,312 @@
+import math
 import os
 import re
+
 import gradio as gr
-from easygui import msgbox, boolbox
-from .common_gui import get_folder_path, scriptdir, list_dirs, create_refresh_button
+import imagesize
 
+from .class_training_estimator import write_dataset_config
+from .common_gui import (
+    IMAGE_EXTENSIONS,
+    boolbox,
+    create_refresh_button,
+    get_folder_path,
+    list_dirs,
+    output_message,
+    scriptdir,
+)
 from .custom_logging import setup_logging
 
 # Set up logging
 log = setup_logging()
 
+# Concept folders: an optional {weight} prefix, the repeats and the class tokens
+CONCEPT_PATTERN = re.compile(r"^(?:\{(\d+\.?\d*)\})?(?:(\d+)_)?(.*)$")
+KOHYA_FOLDER_PATTERN = re.compile(r"^\d+_.+$")
 
-import os
-import re
-import logging as log
-from easygui import msgbox
+BALANCE_ON = ["All images", "Captioned images", "Images at least min resolution"]
 
-def dataset_balancing(concept_repeats, folder, insecure):
+PLAN_HEADERS = [
+    "Concept",
+    "Images",
+    "Captioned",
+    "Balanced on",
+    "Weight",
+    "Repeats",
+    "Items per epoch",
+    "Share %",
+]
+WEIGHT_COLUMN = PLAN_HEADERS.index("Weight")
 
-    if not concept_repeats > 0:
-        # Display an error message if the total number of repeats is not a valid integer
-        msgbox("Please enter a valid integer for the total number of repeats.")
-        return
 
-    concept_repeats = int(concept_repeats)
+def scan_concepts(
+    folder: str,
+    caption_extension: str = ".txt",
+    balance_on: str = "All images",
+    min_resolution: int = 0,
+) -> list:
+    """
+    List the concept folders of a dataset folder with their image counts.
 
-    # Check if folder exist
-    if folder == "" or not os.path.isdir(folder):
-        msgbox("Please enter a valid folder for balancing.")
-        return
-
-    pattern = re.compile(r"^\d+_.+$")
-
-    # Iterate over the subdirectories in the selected folder
-    for subdir in os.listdir(folder):
-        if pattern.match(subdir) or insecure:
-            # Calculate the number of repeats for the current subdirectory
-            # Get a list of all the files in the folder
-            files = os.listdir(os.path.join(folder, subdir))
-
-            # Filter the list to include only image files
-            image_files = [
-                f
-                for f in files
-                if f.endswith((".jpg", ".jpeg", ".png", ".gif", ".webp"))
-            ]
-
-            # Count the number of image files
-            images = len(image_files)
-
-            if images == 0:
-                log.info(
-                    f"No images of type .jpg, .jpeg, .png, .gif, .webp were found in {os.listdir(os.path.join(folder, subdir))}"
-                )
+    Parameters:
+    - folder (str): The folder containing the concept folders.
+    - caption_extension (str): The caption extension counted as caption coverage.
+    - balance_on (str): Which images a concept is balanced on, one of BALANCE_ON.
+    - min_resolution (int): The shorter side under which images are not counted when
+      balancing on images at least min resolution.
+
+    Returns:
+    - list: A dict per concept folder with its name, path, class tokens, weight from the
+      {weight} prefix, image count, captioned count and the count balanced on.
+    """
+    concepts = []
+    with os.scandir(folder) as entries:
+        subdirs = sorted(
+            (entry for entry in entries if entry.is_dir() and not entry.name.startswith(".")),
+            key=lambda entry: entry.name,
+        )
+    for subdir in subdirs:
+        with os.scandir(subdir.path) as entries:
+            names = {entry.name for entry in entries if entry.is_file()}
+        images = sorted(name for name in names if name.lower().endswith(IMAGE_EXTENSIONS))
+        captioned = [
+            name
+            for name in images
+            if os.path.splitext(name)[0] + caption_extension in names
+        ]
 
-            # Check if the subdirectory name starts with a number inside braces,
-            # indicating that the repeats value should be multiplied
-            match = re.match(r"^\{(\d+\.?\d*)\}", subdir)
-            if match:
-                # Multiply the repeats value by the number inside the braces
-                if not images == 0:
-                    repeats = max(
-                        1,
-                        round(concept_repeats / images * float(match.group(1))),
-                    )
-                else:
-                    repeats = 0
-                subdir = subdir[match.end() :]
-            else:
-                if not images == 0:
-                    repeats = max(1, round(concept_repeats / images))
-                else:
-                    repeats = 0
-
-            # Check if the subdirectory name already has a number at the beginning
-            match = re.match(r"^\d+_", subdir)
-            if match:
-                # Replace the existing number with the new number
-                old_name = os.path.join(folder, subdir)
-                new_name = os.path.join(folder, f"{repeats}_{subdir[match.end():]}")
-            else:
-                # Add the new number at the beginning of the name
-                old_name = os.path.join(folder, subdir)
-                new_name = os.path.join(folder, f"{repeats}_{subdir}")
-
-            # Check if the new folder name already exists
-            if os.path.exists(new_name):
-                log.warning(f"Destination folder {new_name} already exists. Skipping...")
-            else:
-                os.rename(old_name, new_name)
+        if balance_on == "Captioned images":
+            counted = len(captioned)
+        elif balance_on == "Images at least min resolution" and min_resolution:
+            counted = 0
+            for name in images:
+                try:
+                    width, height = imagesize.get(os.path.join(subdir.path, name))
+                except (OSError, ValueError):
+                    continue
+                if min(width, height) >= min_resolution:
+                    counted += 1
         else:
+            counted = len(images)
+
+        weight, _, class_tokens = CONCEPT_PATTERN.match(subdir.name).groups()
+        concepts.append(
+            {
+                "name": subdir.name,
+                "path": subdir.path,
+                "class_tokens": class_tokens,
+                "kohya_folder": bool(KOHYA_FOLDER_PATTERN.match(subdir.name)),
+                "weight": float(weight) if weight else 1.0,
+                "images": len(images),
+                "captioned": len(captioned),
+                "counted": counted,
+            }
+        )
+    return concepts
+
+
+def plan_repeats(concepts: list, budget: int) -> list:
+    """
+    Compute the repeats of all concepts together so that every concept gets a share of
+    the epoch proportional to its weight, spread over the images it is balanced on, and
+    the epoch has as close to budget items as integer repeats allow.
+
+    The real repeats are scaled to the budget, concepts below 1 repeat are set to 1 and
+    the others scaled again to the budget left. They are rounded down and the items left
+    are handed out one repeat at a time by largest remainder, to concepts whose image
+    count still fits in the budget.
+
+    Returns:
+    - list: The repeats of each concept, 0 for concepts without images to balance on.
+    """
+    trained = [
+        index
+        for index, concept in enumerate(concepts)
+        if concept["counted"] and concept["weight"] > 0
+    ]
+    ideal = [0.0] * len(concepts)
+    clamped = set()
+    while True:
+        scaled_budget = budget - sum(concepts[index]["images"] for index in clamped)
+        scaled = sum(
+            concepts[index]["weight"] * concepts[index]["images"] / concepts[index]["counted"]
+            for index in trained
+            if index not in clamped
+        )
+        for index in trained:
+            if index not in clamped:
+                concept = concepts[index]
+                ideal[index] = (
+                    max(0, scaled_budget) * concept["weight"] / concept["counted"] / scaled
+                )
+        below = {index for index in trained if index not in clamped and ideal[index] < 1}
+        if not below:
+            break
+        for index in below:
+            ideal[index] = 1.0
+        clamped |= below
+    repeats = [math.floor(value) for value in ideal]
+
+    remaining = budget - sum(
+        count * concept["images"] for count, concept in zip(repeats, concepts)
+    )
+    for index in sorted(
+        range(len(concepts)),
+        key=lambda index: ideal[index] - repeats[index],
+        reverse=True,
+    ):
+        if ideal[index] > repeats[index] and concepts[index]["images"] <= remaining:
+            repeats[index] += 1
+            remaining -= concepts[index]["images"]
+    return repeats
+
+
+def plan_rows(concepts: list, repeats: list) -> list:
+    total = sum(count * concept["images"] for count, concept in zip(repeats, concepts))
+    return [
+        [
+            concept["name"],
+            concept["images"],
+            concept["captioned"],
+            concept["counted"],
+            concept["weight"],
+            count,
+            count * concept["images"],
+            round(100 * count * concept["images"] / total, 1) if total else 0.0,
+        ]
+        for count, concept in zip(repeats, concepts)
+    ]
+
+
+def format_plan(concepts: list, repeats: list, steps: int, batch_size: int) -> str:
+    items = sum(count * concept["images"] for count, concept in zip(repeats, concepts))
+    lines = [
+        f"- Concepts: {len(concepts)}, items per epoch: {items} for a target of {steps * batch_size}",
+        f"- Steps per epoch at batch size {batch_size}: {math.ceil(items / batch_size)} "
+        f"for a target of {steps} (without bucket fragmentation, see the bucket simulator of the training tabs)",
+    ]
+    skipped = [concept["name"] for count, concept in zip(repeats, concepts) if not count]
+    if skipped:
+        lines.append(f"- Not trained, no images to balance on or weight 0: {', '.join(skipped)}")
+    return "\n".join(lines)
+
+
+def write_balanced_config(
+    concepts: list, repeats: list, config_file: str, caption_extension: str
+) -> None:
+    """
+    Write a dataset config TOML file training the concept folders with the planned
+    repeats, without renaming them.
+    """
+    subsets = []
+    for count, concept in zip(repeats, concepts):
+        if not count:
+            continue
+        subset = {"image_dir": concept["path"], "num_repeats": count}
+        if concept["class_tokens"]:
+            subset["class_tokens"] = concept["class_tokens"]
+        subsets.append(subset)
+
+    config = {
+        "general": {"caption_extension": caption_extension},
+        "datasets": [{"subsets": subsets}],
+    }
+    write_dataset_config(config, config_file)
+
+
+def rename_concept_folders(concepts: list, repeats: list, insecure: bool) -> None:
+    """
+    Rename the concept folders to {repeats}_{class tokens}, as sd-scripts reads the
+    repeats of a folder from its name. The names and paths of the renamed concepts are
+    updated.
+    """
+    for count, concept in zip(repeats, concepts):
+        if not (concept["kohya_folder"] or insecure):
             log.info(
-                f"Skipping folder {subdir} because it does not match kohya_ss expected syntax..."
+                f"Skipping folder {concept['name']} because it does not match kohya_ss expected syntax..."
             )
+            continue
+        new_name = os.path.join(
+            os.path.dirname(concept["path"]), f"{count}_{concept['class_tokens']}"
+        )
+        if new_name == concept["path"]:
+            continue
+        if os.path.exists(new_name):
+            log.warning(f"Destination folder {new_name} already exists. Skipping...")
+        else:
+            os.rename(concept["path"], new_name)
+            concept["path"] = new_name
+            concept["name"] = os.path.basename(new_name)
 
-    msgbox("Dataset balancing completed...")
 
+def dataset_balancing(
+    folder,
+    steps,
+    batch_size,
+    caption_extension,
+    balance_on,
+    min_resolution,
+    weights=None,
+    action="plan",
+    config_file="",
+    insecure=False,
+    headless=False,
+):
+    """
+    Plan the repeats of the concept folders of a dataset folder and optionally apply them.
+
+    Parameters:
+    - folder (str): The folder containing the concept folders.
+    - steps (int): The target steps per epoch.
+    - batch_size (int): The train batch size.
+    - caption_extension (str): The caption extension.
+    - balance_on (str): Which images a concept is balanced on, one of BALANCE_ON.
+    - min_resolution (int): The shorter side of the images counted with "Images at least min resolution".
+    - weights (list): The rows of the plan table, their weights override the {weight} prefixes.
+    - action (str): plan, config to write a dataset config TOML file, or rename to rename the folders.
+    - config_file (str): The dataset config file written by the config action.
+    - insecure (bool): Whether to rename folders not named <repeats>_<name>.
+    - headless (bool): Whether to run in headless mode.
+
+    Returns:
+    - tuple: The plan summary and the plan table rows.
+    """
+    if folder == "" or not os.path.isdir(folder):
+        output_message(msg="Please enter a valid folder for balancing.", headless=headless)
+        return "", []
+    if not steps or steps <= 0 or not batch_size or batch_size <= 0:
+        output_message(
+            msg="Please enter a valid number of steps per epoch and batch size.",
+            headless=headless,
+        )
+        return "", []
+
+    steps, batch_size = int(steps), int(batch_size)
+    caption_extension = caption_extension or ".txt"
+    concepts = scan_concepts(folder, caption_extension, balance_on, int(min_resolution or 0))
+    if weights is not None and hasattr(weights, "values"):
+        weights = weights.values.tolist()
+    edited = {
+        row[0]: row[WEIGHT_COLUMN] for row in weights or [] if row and row[0] != ""
+    }
+    for concept in concepts:
+        try:
+            concept["weight"] = max(0.0, float(edited.get(concept["name"], concept["weight"])))
+        except (TypeError, ValueError):
+            pass
+
+    repeats = plan_repeats(concepts, steps * batch_size)
+    summary = format_plan(concepts, repeats, steps, batch_size)
+
+    if action == "config":
+        config_file = config_file or os.path.join(folder, "dataset_config.toml")
+        write_balanced_config(concepts, repeats, config_file, caption_extension)
+        summary += f"\n\nDataset config written to {config_file}, set it as the dataset config file of the training tab."
+    elif action == "rename":
+        rename_concept_folders(concepts, repeats, insecure)
+        summary += "\n\nConcept folders renamed."
+
+    return summary, plan_rows(concepts, repeats)
 
 
 def warning(insecure):
@@ -114,10 +326,10 @@ def gradio_dataset_balancing_tab(headless=False):
 
     with gr.Tab("Dreambooth/LoRA Dataset balancing"):
         gr.Markdown(
-            "This utility will ensure that each concept folder in the dataset folder is used equally during the training process of the dreambooth machine learning model, regardless of the number of images in each folder. It will do this by renaming the concept folders to indicate the number of times they should be repeated during training."
+            "This utility plans the repeats of every concept folder of the dataset folder together, so that each concept gets a share of every epoch proportional to its weight regardless of its number of images, within a target number of steps per epoch. Weights come from a {weight} folder name prefix and can be edited in the plan table."
         )
         gr.Markdown(
-            "WARNING! The use of this utility on the wrong folder can lead to unexpected folder renaming!!!"
+            "Write a dataset config to apply the plan without touching the folders, so latents cached on disk stay valid. Renaming the folders to <repeats>_<name> is also available, use it on the right folder only!!!"
         )
         with gr.Group(), gr.Row():
 
@@ -151,10 +363,19 @@ def gradio_dataset_balancing_tab(headless=False):
                 show_progress=False,
             )
 
-            total_repeats_number = gr.Number(
+            total_steps_number = gr.Number(
                 value=1000,
                 interactive=True,
-                label="Training steps per concept per epoch",
+                label="Target training steps per epoch",
+                minimum=1,
+                precision=0,
+            )
+            batch_size_number = gr.Number(
+                value=1,
+                interactive=True,
+                label="Train batch size",
+                minimum=1,
+                precision=0,
             )
             select_dataset_folder_input.change(
                 fn=lambda path: gr.Dropdown(choices=[""] + list_dataset_dirs(path)),
@@ -163,19 +384,81 @@ def gradio_dataset_balancing_tab(headless=False):
                 show_progress=False,
             )
 
+        with gr.Row():
+            caption_extension = gr.Dropdown(
+                label="Caption file extension",
+                choices=[".cap", ".caption", ".txt"],
+                value=".txt",
+                interactive=True,
+            )
+            balance_on = gr.Dropdown(
+                label="Balance on",
+                info="Images not counted still train, but do not enlarge the share of their concept",
+                choices=BALANCE_ON,
+                value=BALANCE_ON[0],
+                interactive=True,
+            )
+            min_resolution = gr.Number(
+                label="Min resolution",
+                info="Shorter side of the images counted with Images at least min resolution",
+                value=512,
+                minimum=0,
+                precision=0,
+                interactive=True,
+            )
+
         with gr.Accordion("Advanced options", open=False):
             insecure = gr.Checkbox(
                 value=False,
                 label="DANGER!!! -- Insecure folder renaming -- DANGER!!!",
             )
             insecure.change(warning, inputs=insecure, outputs=insecure)
-        balance_button = gr.Button("Balance dataset")
+
+        plan_button = gr.Button("Plan repeats")
+        plan_summary = gr.Markdown()
+        plan_table = gr.Dataframe(
+            headers=PLAN_HEADERS,
+            interactive=True,
+            type="array",
+            label="Plan (edit the weights and plan again)",
+        )
+        with gr.Row():
+            config_file = gr.Textbox(
+                label="Dataset config file",
+                placeholder="(Optional) defaults to dataset_config.toml in the dataset folder",
+                interactive=True,
+            )
+            config_button = gr.Button("Write dataset config")
+            balance_button = gr.Button("Rename folders")
+
+        inputs = [
+            select_dataset_folder_input,
+            total_steps_number,
+            batch_size_number,
+            caption_extension,
+            balance_on,
+            min_resolution,
+            plan_table,
+        ]
+        plan_button.click(
+            lambda *values: dataset_balancing(*values, action="plan", headless=headless),
+            inputs=inputs,
+            outputs=[plan_summary, plan_table],
+            show_progress=False,
+        )
+        config_button.click(
+            lambda *values: dataset_balancing(
+                *values[:-1], action="config", config_file=values[-1], headless=headless
+            ),
+            inputs=inputs + [config_file],
+            outputs=[plan_summary, plan_table],
+            show_progress=False,
+        )
         balance_button.click(
-            dataset_balancing,
-            inputs=[
-                total_repeats_number,
-                select_dataset_folder_input,
-                insecure,
-            ],
+            lambda *values: dataset_balancing(
+                *values[:-1], action="rename", insecure=values[-1], headless=headless
+            ),
+            inputs=inputs + [insecure],
+            outputs=[plan_summary, plan_table],
             show_progress=False,
         )
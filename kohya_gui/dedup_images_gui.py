@@ -0,0 +1,176 @@
+import gradio as gr
+import os
+import sys
+
+from .common_gui import get_folder_path, scriptdir, list_dirs, setup_environment
+from .class_background_tasks import background_tasks
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+PYTHON = sys.executable
+
+
+def dedup_images(
+    input_folder,
+    hash_method,
+    max_distance,
+    quarantine_folder,
+    report_file,
+):
+    if input_folder == "" or not os.path.isdir(input_folder):
+        log.info("Input folder is missing...")
+        return
+
+    run_cmd = [
+        rf"{PYTHON}",
+        rf"{scriptdir}/tools/dedup_images.py",
+        rf"{input_folder}",
+        "--hash",
+        hash_method,
+        "--max_distance",
+        str(int(max_distance)),
+    ]
+
+    if quarantine_folder:
+        run_cmd.append("--quarantine")
+        run_cmd.append(rf"{quarantine_folder}")
+
+    if report_file:
+        run_cmd.append("--report")
+        run_cmd.append(rf"{report_file}")
+
+    env = setup_environment()
+
+    # Reconstruct the safe command string for display
+    command_to_run = " ".join(run_cmd)
+    log.info(f"Executing command: {command_to_run}")
+
+    background_tasks.submit("Find duplicate images", run_cmd, env=env)
+
+
+def gradio_dedup_images_gui_tab(headless=False):
+    from .common_gui import create_refresh_button
+
+    current_input_folder = os.path.join(scriptdir, "data")
+    current_quarantine_folder = os.path.join(scriptdir, "data")
+
+    def list_input_dirs(path):
+        nonlocal current_input_folder
+        current_input_folder = path
+        return list(list_dirs(path))
+
+    def list_quarantine_dirs(path):
+        nonlocal current_quarantine_folder
+        current_quarantine_folder = path
+        return list(list_dirs(path))
+
+    with gr.Tab("Deduplicate Images"):
+        gr.Markdown(
+            "This utility finds byte identical and visually near identical images in a dataset. "
+            "Each group of duplicates keeps its largest image, the others are listed in a JSON "
+            "report and can be moved, with their captions, to a quarantine folder."
+        )
+
+        with gr.Group(), gr.Row():
+            input_folder = gr.Dropdown(
+                label="Dataset folder (searched recursively)",
+                interactive=True,
+                choices=[""] + list_input_dirs(current_input_folder),
+                value="",
+                allow_custom_value=True,
+            )
+            create_refresh_button(
+                input_folder,
+                lambda: None,
+                lambda: {"choices": list_input_dirs(current_input_folder)},
+                "open_folder_small",
+            )
+            button_input_folder = gr.Button(
+                "📂",
+                elem_id="open_folder_small",
+                elem_classes=["tool"],
+                visible=(not headless),
+            )
+            button_input_folder.click(
+                get_folder_path,
+                outputs=input_folder,
+                show_progress=False,
+            )
+
+            quarantine_folder = gr.Dropdown(
+                label="Quarantine folder (empty to only write the report)",
+                interactive=True,
+                choices=[""] + list_quarantine_dirs(current_quarantine_folder),
+                value="",
+                allow_custom_value=True,
+            )
+            create_refresh_button(
+                quarantine_folder,
+                lambda: None,
+                lambda: {"choices": list_quarantine_dirs(current_quarantine_folder)},
+                "open_folder_small",
+            )
+            button_quarantine_folder = gr.Button(
+                "📂",
+                elem_id="open_folder_small",
+                elem_classes=["tool"],
+                visible=(not headless),
+            )
+            button_quarantine_folder.click(
+                get_folder_path,
+                outputs=quarantine_folder,
+                show_progress=False,
+            )
+
+            input_folder.change(
+                fn=lambda path: gr.Dropdown(choices=[""] + list_input_dirs(path)),
+                inputs=input_folder,
+                outputs=input_folder,
+                show_progress=False,
+            )
+            quarantine_folder.change(
+                fn=lambda path: gr.Dropdown(choices=[""] + list_quarantine_dirs(path)),
+                inputs=quarantine_folder,
+                outputs=quarantine_folder,
+                show_progress=False,
+            )
+        with gr.Row():
+            hash_method = gr.Dropdown(
+                label="Near duplicate hash",
+                info="dhash is faster, phash is more robust to edits, none only finds exact copies",
+                choices=["dhash", "phash", "none"],
+                value="dhash",
+                interactive=True,
+            )
+
+            max_distance = gr.Slider(
+                label="Max distance",
+                info="Largest number of differing hash bits between near duplicates, above 8 the search gets slow on large datasets",
+                value=4,
+                minimum=0,
+                maximum=16,
+                step=1,
+                interactive=True,
+            )
+
+            report_file = gr.Textbox(
+                label="Report file",
+                placeholder="(Optional) defaults to dedup_report.json in the dataset folder",
+                interactive=True,
+            )
+
+        dedup_images_button = gr.Button("Find duplicates")
+
+        dedup_images_button.click(
+            dedup_images,
+            inputs=[
+                input_folder,
+                hash_method,
+                max_distance,
+                quarantine_folder,
+                report_file,
+            ],
+            show_progress=False,
+        )
@@ -1,5 +1,4 @@
 import gradio as gr
-import subprocess
 import os
 import sys
 from .common_gui import (
@@ -9,6 +8,7 @@ from .common_gui import (
     create_refresh_button, setup_environment
 )
 
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -66,9 +66,7 @@ def extract_dylora(
     log.info(f"Executing command: {command_to_run}")
 
     # Run the command in the sd-scripts folder context
-    subprocess.run(run_cmd, env=env, shell=False)
-
-    log.info("Done extracting DyLoRA...")
+    background_tasks.submit("Extract DyLoRA", run_cmd, env=env)
 
 
 ###
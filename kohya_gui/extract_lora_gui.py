@@ -1,5 +1,4 @@
 import gradio as gr
-import subprocess
 import os
 import sys
 from .common_gui import (
@@ -11,6 +10,7 @@ from .common_gui import (
     create_refresh_button, setup_environment
 )
 
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 from .sd_modeltype import SDModelType
 
@@ -117,7 +117,7 @@ def extract_lora(
     log.info(f"Executing command: {command_to_run}")
 
     # Run the command in the sd-scripts folder context
-    subprocess.run(run_cmd, env=env)
+    background_tasks.submit("Extract LoRA", run_cmd, env=env)
 
 
 ###
@@ -17,7 +17,6 @@ from .common_gui import (
     run_cmd_advanced_training,
     SaveConfigFile,
     scriptdir,
-    update_my_data,
     validate_file_path,
     validate_folder_path,
     validate_model_path,
@@ -26,6 +25,7 @@ from .common_gui import (
 )
 from .class_accelerate_launch import AccelerateLaunch
 from .class_configuration_file import ConfigurationFile
+from .class_config_schema import ConfigSchema
 from .class_source_model import SourceModel
 from .class_basic_training import BasicTraining
 from .class_advanced_training import AdvancedTraining
@@ -33,6 +33,8 @@ from .class_sd3 import sd3Training
 from .class_folders import Folders
 from .class_sdxl_parameters import SDXLParameters
 from .class_command_executor import CommandExecutor
+from .class_image_preflight import preflight_training_images
+from .class_mask_preflight import preflight_masks
 from .class_tensorboard import TensorboardManager
 from .class_sample_images import SampleImages, create_prompt_file
 from .class_huggingface import HuggingFace
@@ -48,6 +50,9 @@ log = setup_logging()
 # Setup command executor
 executor = None
 
+# Setup settings schema, shared by save and open configuration
+config_schema = None
+
 # Setup huggingface
 huggingface = None
 use_shell = False
@@ -273,6 +278,7 @@ def save_configuration(
         parameters=parameters,
         file_path=file_path,
         exclusion=["file_path", "save_as"],
+        schema=config_schema,
     )
 
     return file_path
@@ -486,18 +492,25 @@ def open_configuration(
         with open(file_path, "r", encoding="utf-8") as f:
             my_data = json.load(f)
             log.info("Loading config...")
-            # Update values to fix deprecated use_8bit_adam checkbox and set appropriate optimizer if it is set to True
-            my_data = update_my_data(my_data)
+            # Migrate deprecated options and validate the values against the settings schema
+            my_data = config_schema.normalize(my_data)
+            loaded = True
     else:
         file_path = original_file_path  # In case a file_path was provided and the user decide to cancel the open action
         my_data = {}
-
-    values = [file_path]
-    for key, value in parameters:
-        json_value = my_data.get(key)
-        # Set the value in the dictionary to the corresponding value in `my_data`, or the default value if not found
-        if not key in ["ask_for_file", "apply_preset", "file_path"]:
-            values.append(json_value if json_value is not None else value)
+        loaded = False
+
+    # Only push the values which changed. Presets are applied on top of the current
+    # settings, a loaded config resets the settings it does not contain to their default.
+    values = [file_path] + config_schema.updates(
+        my_data,
+        [
+            (key, value)
+            for key, value in parameters
+            if key not in ["ask_for_file", "apply_preset", "file_path"]
+        ],
+        keep_missing=apply_preset or not loaded,
+    )
     return tuple(values)
 
 
@@ -749,6 +762,16 @@ def train_model(
     ):
         return TRAIN_BUTTON_VISIBLE
 
+    if not print_only and not preflight_training_images(
+        image_folder, dataset_config=dataset_config, headless=headless
+    ):
+        return TRAIN_BUTTON_VISIBLE
+
+    if not print_only and not preflight_masks(
+        dataset_config, masked_loss, headless=headless
+    ):
+        return TRAIN_BUTTON_VISIBLE
+
     if dataset_config:
         log.info(
             "Dataset config toml file used, skipping caption json file, image buckets, total_steps, train_batch_size, gradient_accumulation_steps, epoch, reg_factor, max_train_steps creation..."
@@ -1187,7 +1210,7 @@ def train_model(
         env = setup_environment()
 
         # Run the command
-        executor.execute_command(run_cmd=run_cmd, env=env)
+        executor.execute_command(run_cmd=run_cmd, env=env, log_dir=logging_dir)
 
         train_state_value = time.time()
 
@@ -1520,6 +1543,7 @@ def finetune_tab(
             # SD3 Parameters
             sd3_training.sd3_cache_text_encoder_outputs,
             sd3_training.sd3_cache_text_encoder_outputs_to_disk,
+            sd3_training.sd3_fused_backward_pass,
             sd3_training.clip_g,
             sd3_training.clip_l,
             sd3_training.logit_mean,
@@ -1531,7 +1555,6 @@ def finetune_tab(
             sd3_training.t5xxl_device,
             sd3_training.t5xxl_dtype,
             sd3_training.sd3_text_encoder_batch_size,
-            sd3_training.sd3_fused_backward_pass,
             sd3_training.weighting_scheme,
             source_model.sd3_checkbox,
             # Flux1 parameters
@@ -1557,6 +1580,12 @@ def finetune_tab(
             flux1_training.apply_t5_attn_mask,
         ]
 
+        global config_schema
+        config_schema = ConfigSchema.from_save_configuration(
+            save_configuration, settings_list, config=config
+        )
+        configuration.defaults = config_schema.defaults()
+
         configuration.button_open_config.click(
             open_configuration,
             inputs=[dummy_db_true, dummy_db_false, configuration.config_file_name]
@@ -1602,6 +1631,12 @@ def finetune_tab(
             outputs=[executor.button_run, executor.button_stop_training],
         )
 
+        run_state.change(
+            fn=executor.stream_output,
+            outputs=[executor.progress, executor.output],
+            show_progress=False,
+        )
+
         executor.button_run.click(
             train_model,
             inputs=[dummy_headless] + [dummy_db_false] + settings_list,
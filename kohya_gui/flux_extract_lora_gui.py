@@ -1,5 +1,4 @@
 import gradio as gr
-import subprocess
 import os
 import sys
 from .common_gui import (
@@ -10,6 +9,7 @@ from .common_gui import (
     create_refresh_button,
     setup_environment,
 )
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -92,7 +92,7 @@ def extract_flux_lora(
     log.info(f"Executing command: {command_to_run}")
 
     # Run the command
-    subprocess.run(run_cmd, env=env)
+    background_tasks.submit("Extract Flux LoRA", run_cmd, env=env)
 
 
 def gradio_flux_extract_lora_tab(headless=False):
@@ -1,6 +1,5 @@
 # Standard library imports
 import os
-import subprocess
 import sys
 import json
 
@@ -16,6 +15,7 @@ from .common_gui import (
     create_refresh_button,
     setup_environment,
 )
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -465,6 +465,4 @@ class GradioFluxMergeLoRaTab:
         log.info(f"Executing command: {command_to_run}")
 
         # Run the command in the sd-scripts folder context
-        subprocess.run(run_cmd, env=env)
-
-        log.info("Done merging...")
\ No newline at end of file
+        background_tasks.submit("Merge Flux LoRA", run_cmd, env=env)
\ No newline at end of file
@@ -1,4 +1,5 @@
 import gradio as gr
+import inspect
 import json
 import math
 import os
@@ -21,7 +22,6 @@ from .common_gui import (
     run_cmd_advanced_training,
     SaveConfigFile,
     scriptdir,
-    update_my_data,
     validate_file_path,
     validate_folder_path,
     validate_model_path,
@@ -31,6 +31,7 @@ from .common_gui import (
 )
 from .class_accelerate_launch import AccelerateLaunch
 from .class_configuration_file import ConfigurationFile
+from .class_config_schema import ConfigSchema
 from .class_source_model import SourceModel
 from .class_basic_training import BasicTraining
 from .class_advanced_training import AdvancedTraining
@@ -38,6 +39,26 @@ from .class_sd3 import sd3Training
 from .class_sdxl_parameters import SDXLParameters
 from .class_folders import Folders
 from .class_command_executor import CommandExecutor
+from .class_image_preflight import preflight_training_images
+from .class_mask_preflight import preflight_masks
+from .class_bucket_materializer import BucketMaterializer
+from .class_bucket_simulator import BucketSimulator
+from .class_caption_analyzer import CaptionAnalyzer
+from .class_dataset_config_generator import DatasetConfigGenerator
+from .class_latent_cache import (
+    LatentCacheManager,
+    latent_cache_arguments,
+    preflight_latent_cache,
+)
+from .class_training_estimator import (
+    TrainingEstimate,
+    estimate_from_settings,
+    format_estimate,
+    profile_key,
+    training_settings,
+)
+from .class_job_queue import JobQueue, JobQueueView, DEFAULT_JOB_QUEUE_JOURNAL
+from .class_sweep import Sweep, expand_sweep, parse_sweep_axes, sweep_run_name
 from .class_tensorboard import TensorboardManager
 from .class_sample_images import SampleImages, create_prompt_file
 # from .class_lora_tab import LoRATools # This import might be redundant if LoRATools is only used in kohya_gui.py now
@@ -62,6 +83,12 @@ log = setup_logging()
 # Setup command executor
 executor = None
 
+# Setup settings schema, shared by save and open configuration
+config_schema = None
+
+# Setup training job queue
+job_queue = None
+
 # Setup huggingface
 huggingface = None
 use_shell = False
@@ -373,6 +400,7 @@ def save_configuration(
         parameters=parameters,
         file_path=file_path,
         exclusion=["file_path", "save_as"],
+        schema=config_schema,
     )
 
     # Return the file path of the saved configuration
@@ -671,20 +699,26 @@ def open_configuration(
             my_data = json.load(f)
             log.info("Loading config...")
 
-            # Update values to fix deprecated options, set appropriate optimizer if it is set to True, etc.
-            my_data = update_my_data(my_data)
+            # Migrate deprecated options and validate the values against the settings schema
+            my_data = config_schema.normalize(my_data)
+            loaded = True
     else:
         # Reset the file path to the original if the operation was cancelled or invalid
         file_path = original_file_path  # In case a file_path was provided and the user decides to cancel the open action
         my_data = {}  # Initialize an empty dict if no data was loaded
-
-    values = [file_path]
-    # Iterate over parameters to set their values from `my_data` or use default if not found
-    for key, value in parameters:
-        if not key in ["ask_for_file", "apply_preset", "file_path"]:
-            json_value = my_data.get(key)
-            # Append the value from JSON if present; otherwise, use the parameter's default value
-            values.append(json_value if json_value is not None else value)
+        loaded = False
+
+    # Only push the values which changed. Presets are applied on top of the current
+    # settings, a loaded config resets the settings it does not contain to their default.
+    values = [file_path] + config_schema.updates(
+        my_data,
+        [
+            (key, value)
+            for key, value in parameters
+            if key not in ["ask_for_file", "apply_preset", "file_path"]
+        ],
+        keep_missing=apply_preset or not loaded,
+    )
 
     # Display LoCon parameters based on the 'LoRA_type' from the loaded data
     # This section dynamically adjusts visibility of certain parameters in the UI
@@ -960,6 +994,8 @@ def train_model(
     sd3_text_encoder_batch_size,
     weighting_scheme,
     sd3_checkbox,
+    queue_priority=None,
+    queue_metadata=None,
 ):
     # ... (rest of train_model function remains unchanged) ...
     # Get list of function parameters and values
@@ -972,10 +1008,14 @@ def train_model(
         gr.Textbox(value=train_state_value),
     ]
 
-    if executor.is_running():
+    if queue_priority is None and executor.is_running():
         log.error("Training is already running. Can't start another training session.")
         return TRAIN_BUTTON_VISIBLE
 
+    if queue_priority is None and job_queue is not None and job_queue.is_running():
+        log.error("A queued training job is running. Add this training to the queue instead.")
+        return TRAIN_BUTTON_VISIBLE
+
     log.info(f"Start training LoRA {LoRA_type} ...")
 
     log.info(f"Validating lr scheduler arguments...")
@@ -1071,6 +1111,16 @@ def train_model(
     ):
         return TRAIN_BUTTON_VISIBLE
 
+    if not print_only and not preflight_training_images(
+        train_data_dir, reg_data_dir, dataset_config, headless=headless
+    ):
+        return TRAIN_BUTTON_VISIBLE
+
+    if not print_only and not preflight_masks(
+        dataset_config, masked_loss, headless=headless
+    ):
+        return TRAIN_BUTTON_VISIBLE
+
     # If string is empty set string to 0.
     # if text_encoder_lr == "":
     #     text_encoder_lr = 0
@@ -1078,9 +1128,23 @@ def train_model(
     #     unet_lr = 0
 
     if dataset_config:
-        log.info(
-            "Dataset config toml file used, skipping total_steps, train_batch_size, gradient_accumulation_steps, epoch, reg_factor, max_train_steps calculations..."
-        )
+        # Estimate the steps from the images of the dataset config subsets, with their own
+        # repeats, batch size and bucket settings
+        try:
+            estimate = estimate_from_settings("lora", **training_settings(parameters))
+            log.info(f"Training estimate:\n{format_estimate(estimate)}")
+        except (OSError, ValueError, toml.TomlDecodeError) as e:
+            log.warning(f"Could not estimate the steps of the dataset config {dataset_config}: {e}")
+            estimate = None
+
+        if max_train_steps == 0 and estimate and estimate["total_steps"] > 0:
+            max_train_steps = estimate["total_steps"]
+            max_train_steps_info = f"max_train_steps ({estimate['batches']} batches / {num_processes} processes / {gradient_accumulation_steps} * {epoch}) = {max_train_steps}"
+        elif max_train_steps == 0:
+            max_train_steps_info = f"Max train steps: 0. sd-scripts will therefore default to 1600. Please specify a different value if required."
+        else:
+            max_train_steps_info = f"Max train steps: {max_train_steps}"
+
         if max_train_steps > 0:
             # calculate stop encoder training
             if stop_text_encoder_training == 0:
@@ -1100,87 +1164,21 @@ def train_model(
             stop_text_encoder_training = 0
             lr_warmup_steps = 0
 
-        if max_train_steps == 0:
-            max_train_steps_info = f"Max train steps: 0. sd-scripts will therefore default to 1600. Please specify a different value if required."
-        else:
-            max_train_steps_info = f"Max train steps: {max_train_steps}"
-
     else:
         if train_data_dir == "":
             log.error("Train data dir is empty")
             return TRAIN_BUTTON_VISIBLE
 
-        # Get a list of all subfolders in train_data_dir
-        subfolders = [
-            f
-            for f in os.listdir(train_data_dir)
-            if os.path.isdir(os.path.join(train_data_dir, f))
-        ]
-
-        total_steps = 0
-
-        # Loop through each subfolder and extract the number of repeats
-        for folder in subfolders:
-            try:
-                # Extract the number of repeats from the folder name
-                repeats = int(folder.split("_")[0])
-                log.info(f"Folder {folder}: {repeats} repeats found")
-
-                # Count the number of images in the folder
-                num_images = len(
-                    [
-                        f
-                        for f, lower_f in (
-                            (file, file.lower())
-                            for file in os.listdir(os.path.join(train_data_dir, folder))
-                        )
-                        if lower_f.endswith((".jpg", ".jpeg", ".png", ".webp"))
-                    ]
-                )
-
-                log.info(f"Folder {folder}: {num_images} images found")
-
-                # Calculate the total number of steps for this folder
-                steps = repeats * num_images
-
-                # log.info the result
-                log.info(f"Folder {folder}: {num_images} * {repeats} = {steps} steps")
-
-                total_steps += steps
-
-            except ValueError:
-                # Handle the case where the folder name does not contain an underscore
-                log.info(
-                    f"Error: '{folder}' does not contain an underscore, skipping..."
-                )
-
-        if reg_data_dir == "":
-            reg_factor = 1
-        else:
-            log.warning(
-                "Regularization images are used... Will double the number of steps required..."
-            )
-            reg_factor = 2
-
-        log.info(f"Regularization factor: {reg_factor}")
+        # Estimate the steps from the images, bucket by bucket, including the partial
+        # batch each bucket ends an epoch with
+        estimate = estimate_from_settings("lora", **training_settings(parameters))
+        log.info(f"Training estimate:\n{format_estimate(estimate)}")
 
         if max_train_steps == 0:
-            # calculate max_train_steps
-            max_train_steps = int(
-                math.ceil(
-                    float(total_steps)
-                    / int(train_batch_size)
-                    / int(gradient_accumulation_steps)
-                    * int(epoch)
-                    * int(reg_factor)
-                )
-            )
-            max_train_steps_info = f"max_train_steps ({total_steps} / {train_batch_size} / {gradient_accumulation_steps} * {epoch} * {reg_factor}) = {max_train_steps}"
+            max_train_steps = estimate["total_steps"]
+            max_train_steps_info = f"max_train_steps ({estimate['batches']} batches / {num_processes} processes / {gradient_accumulation_steps} * {epoch}) = {max_train_steps}"
         else:
-            if max_train_steps == 0:
-                max_train_steps_info = f"Max train steps: 0. sd-scripts will therefore default to 1600. Please specify a different value if required."
-            else:
-                max_train_steps_info = f"Max train steps: {max_train_steps}"
+            max_train_steps_info = f"Max train steps: {max_train_steps}"
 
         # calculate stop encoder training
         if stop_text_encoder_training == 0:
@@ -1731,6 +1729,12 @@ def train_model(
     formatted_datetime = current_datetime.strftime("%Y%m%d-%H%M%S")
     tmpfilename = rf"{output_dir}/config_lora-{formatted_datetime}.toml"
 
+    # Queued jobs can be generated within the same second, keep each TOML file
+    index = 1
+    while queue_priority is not None and os.path.exists(tmpfilename):
+        tmpfilename = rf"{output_dir}/config_lora-{formatted_datetime}-{index}.toml"
+        index += 1
+
     # Save the updated TOML data back to the file
     with open(tmpfilename, "w", encoding="utf-8") as toml_file:
         toml.dump(config_toml_data, toml_file)
@@ -1763,15 +1767,43 @@ def train_model(
         SaveConfigFile(
             parameters=parameters,
             file_path=file_path,
-            exclusion=["file_path", "save_as", "headless", "print_only"],
+            exclusion=[
+                "file_path",
+                "save_as",
+                "headless",
+                "print_only",
+                "queue_priority",
+                "queue_metadata",
+            ],
         )
 
+        if queue_priority is not None:
+            # Queued runs return the job id, so that queue_sweep can tell them apart
+            # from runs stopped by a validation
+            return job_queue.add_job(
+                name=output_name,
+                run_cmd=run_cmd,
+                toml_file=tmpfilename,
+                priority=queue_priority,
+                gpu_ids=gpu_ids,
+                metadata=dict(
+                    queue_metadata or {}, latent_cache=latent_cache_arguments(parameters)
+                ),
+            )
+
         # log.info(run_cmd)
         env = setup_environment()
 
         # Run the command
 
-        executor.execute_command(run_cmd=run_cmd, env=env)
+        preflight_latent_cache(latent_cache_arguments(parameters))
+
+        executor.execute_command(
+            run_cmd=run_cmd,
+            env=env,
+            log_dir=logging_dir,
+            throughput_key=profile_key("lora", **training_settings(parameters)),
+        )
 
         train_state_value = time.time()
 
@@ -1782,6 +1814,64 @@ def train_model(
         )
 
 
+def queue_sweep(sweep_axes, sweep_gpu_ids, queue_priority, headless, *settings):
+    """
+    Queue one training job per combination of the sweep axes, using the current
+    settings as the base configuration.
+
+    Returns:
+    - str: The name of the queued sweep, or an empty string if nothing was queued.
+    """
+    # train_model takes (headless, print_only, *settings, queue_priority, queue_metadata)
+    setting_names = list(inspect.signature(train_model).parameters)[2:-2]
+    base_settings = dict(zip(setting_names, settings))
+
+    try:
+        axes = parse_sweep_axes(sweep_axes, allowed_names=setting_names)
+    except ValueError as e:
+        output_message(msg=f"Invalid sweep: {e}", headless=headless)
+        return ""
+
+    if not axes:
+        output_message(msg="Please define at least one sweep axis.", headless=headless)
+        return ""
+
+    runs = expand_sweep(axes)
+    gpu_ids_list = [gpu_id.strip() for gpu_id in sweep_gpu_ids.split(",") if gpu_id.strip()]
+    sweep_name = f"{base_settings['output_name']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+    log.info(f"Queueing sweep {sweep_name} with {len(runs)} runs...")
+
+    queued = 0
+    for index, overrides in enumerate(runs):
+        run_settings = dict(base_settings, **overrides)
+        run_settings["output_name"] = sweep_run_name(base_settings["output_name"], overrides)
+        if gpu_ids_list:
+            run_settings["gpu_ids"] = gpu_ids_list[index % len(gpu_ids_list)]
+
+        job_id = train_model(
+            headless,
+            False,
+            **run_settings,
+            queue_priority=queue_priority,
+            queue_metadata={"sweep": sweep_name, "overrides": overrides},
+        )
+        if isinstance(job_id, int):
+            queued += 1
+
+    if not queued:
+        output_message(
+            msg="No sweep run was queued, check the training settings in the log.",
+            headless=headless,
+        )
+        return ""
+
+    if queued < len(runs):
+        log.warning(f"Only {queued} of the {len(runs)} runs of sweep {sweep_name} were queued.")
+
+    return sweep_name
+
+
 # Removed Wizard Functions (now in lora_wizard_gui.py)
 # Removed process_uploaded_files (now in lora_wizard_gui.py)
 
@@ -2711,6 +2801,42 @@ def lora_tab(
                     ],
                 )
 
+            dataset_components = {
+                "train_data_dir": source_model.train_data_dir,
+                "reg_data_dir": folders.reg_data_dir,
+                "dataset_config": source_model.dataset_config,
+                "train_batch_size": basic_training.train_batch_size,
+                "epoch": basic_training.epoch,
+                "max_train_steps": basic_training.max_train_steps,
+                "gradient_accumulation_steps": advanced_training.gradient_accumulation_steps,
+                "num_processes": accelerate_launch.num_processes,
+                "max_resolution": basic_training.max_resolution,
+                "enable_bucket": basic_training.enable_bucket,
+                "min_bucket_reso": basic_training.min_bucket_reso,
+                "max_bucket_reso": basic_training.max_bucket_reso,
+                "bucket_reso_steps": advanced_training.bucket_reso_steps,
+                "bucket_no_upscale": advanced_training.bucket_no_upscale,
+                "mixed_precision": accelerate_launch.mixed_precision,
+                "sdxl": source_model.sdxl_checkbox,
+                "flux1_checkbox": source_model.flux1_checkbox,
+                "sd3_checkbox": source_model.sd3_checkbox,
+                "v2": source_model.v2,
+                "network_dim": network_dim,
+                "caption_extension": basic_training.caption_extension,
+                "max_token_length": advanced_training.max_token_length,
+                "keep_tokens": advanced_training.keep_tokens,
+                "shuffle_caption": advanced_training.shuffle_caption,
+                "pretrained_model_name_or_path": source_model.pretrained_model_name_or_path,
+                "vae": advanced_training.vae,
+                "flip_aug": advanced_training.flip_aug,
+            }
+            TrainingEstimate("lora", dataset_components, headless=headless)
+            BucketSimulator(dataset_components, headless=headless)
+            BucketMaterializer(dataset_components, headless=headless)
+            CaptionAnalyzer(dataset_components, headless=headless)
+            DatasetConfigGenerator(dataset_components, headless=headless)
+            LatentCacheManager(dataset_components, headless=headless)
+
             global executor
             executor = CommandExecutor(headless=headless)
 
@@ -2721,6 +2847,22 @@ def lora_tab(
             # Setup gradio tensorboard buttons
             TensorboardManager(headless=headless, logging_dir=folders.logging_dir)
 
+            with gr.Accordion("Training queue", open=False):
+                global job_queue
+                job_queue = JobQueue(
+                    journal_file=config.get(
+                        "queue.journal_file", DEFAULT_JOB_QUEUE_JOURNAL
+                    ),
+                    max_concurrent_jobs=config.get("queue.max_concurrent_jobs", 1),
+                    max_jobs_per_gpu=config.get("queue.max_jobs_per_gpu", 1),
+                    is_busy=executor.is_running,
+                )
+                job_queue.start()
+                job_queue_view = JobQueueView(job_queue, headless=headless)
+
+                with gr.Accordion("Hyperparameter sweep", open=False):
+                    sweep = Sweep(job_queue, headless=headless)
+
         # --- END OF MANUAL CONFIGURATION ACCORDION ---
 
         # --- START OF WIZARD UI PLACEHOLDER ---
@@ -2989,6 +3131,12 @@ def lora_tab(
             source_model.sd3_checkbox,
         ]
 
+        global config_schema
+        config_schema = ConfigSchema.from_save_configuration(
+            save_configuration, settings_list, config=config
+        )
+        configuration.defaults = config_schema.defaults()
+
         # --- Event Handlers for Manual Training ---
         # ... (Keep existing manual training event handlers) ...
         configuration.button_open_config.click(
@@ -3038,6 +3186,12 @@ def lora_tab(
             outputs=[executor.button_run, executor.button_stop_training],
         )
 
+        run_state.change(
+            fn=executor.stream_output,
+            outputs=[executor.progress, executor.output],
+            show_progress=False,
+        )
+
         executor.button_run.click(
             train_model,
             inputs=[dummy_headless] + [dummy_db_false] + settings_list,
@@ -3055,6 +3209,34 @@ def lora_tab(
             inputs=[dummy_headless] + [dummy_db_true] + settings_list,
             show_progress=False,
         )
+
+        def queue_training(*args):
+            train_model(*args)
+            return job_queue_view.refresh()
+
+        job_queue_view.button_add_to_queue.click(
+            queue_training,
+            inputs=[dummy_headless] + [dummy_db_false] + settings_list + [job_queue_view.priority],
+            outputs=[job_queue_view.jobs],
+            show_progress=False,
+        )
+
+        sweep.button_queue_sweep.click(
+            queue_sweep,
+            inputs=[sweep.axes, sweep.gpu_ids, job_queue_view.priority, dummy_headless]
+            + settings_list,
+            outputs=[sweep.sweep_name],
+            show_progress=False,
+        ).then(
+            sweep.refresh_summary,
+            inputs=[sweep.sweep_name],
+            outputs=[sweep.summary],
+            show_progress=False,
+        ).then(
+            job_queue_view.refresh,
+            outputs=[job_queue_view.jobs],
+            show_progress=False,
+        )
         # --- End Event Handlers for Manual Training ---
 
         # --- Event Handlers for Wizard ---
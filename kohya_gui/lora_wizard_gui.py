@@ -2,18 +2,17 @@
 import gradio as gr
 import os
 import shutil
-import zipfile
 import re
 import json
 from datetime import datetime
 from math import ceil # Import ceil for pagination calculation
 # --- ADD THIS ---
-from easygui import boolbox
 # --- END ADD ---
 
 # Import necessary functions and variables from common_gui
-from .common_gui import IMAGE_EXTENSIONS, scriptdir
+from .common_gui import IMAGE_EXTENSIONS, scriptdir, boolbox
 from .custom_logging import setup_logging
+from .class_dataset_ingest import DatasetIngestor
 # Import _get_caption_path from manual_caption_gui
 from .manual_caption_gui import _get_caption_path
 
@@ -108,6 +107,13 @@ class LoraTrainingWizard:
                 file_count="multiple",
                 file_types=["image", ".zip"],
             )
+            self.wizard_max_side = gr.Number(
+                label="Downscale images larger than (px, 0 keeps the original size)",
+                value=0,
+                minimum=0,
+                precision=0,
+                interactive=True,
+            )
 
             with gr.Row():
                 self.wizard_back_button_step2 = gr.Button("Back")
@@ -291,7 +297,7 @@ class LoraTrainingWizard:
         )
         self.wizard_next_button_step2.click(
             fn=self._process_uploaded_files,
-            inputs=[self.wizard_upload_images, self.state_lora_name, self.output_dir_component, self.state_lora_type],
+            inputs=[self.wizard_upload_images, self.state_lora_name, self.output_dir_component, self.state_lora_type, self.wizard_max_side],
             outputs=[
                 self.step1_ui, self.step2_ui, self.step3_ui,
                 self.state_dataset_base_dir,
@@ -675,7 +681,7 @@ class LoraTrainingWizard:
         log.info(f"Wizard Step 1 Data: Type={lora_type}, Name={lora_name}")
         return lora_type, lora_name, gr.update(visible=False), gr.update(visible=True), gr.update(visible=False)
 
-    def _process_uploaded_files(self, files, lora_name, output_dir_value, lora_type):
+    def _process_uploaded_files(self, files, lora_name, output_dir_value, lora_type, max_side, progress=gr.Progress()):
         # (No changes needed)
         dataset_base_dir = "" # Initialize
         if not files:
@@ -715,75 +721,15 @@ class LoraTrainingWizard:
             os.makedirs(model_dir, exist_ok=True)
             os.makedirs(log_dir, exist_ok=True)
             log.info(f"Created dataset structure in: {dataset_base_dir}")
-            image_count = 0
-            processed_files_info = []
-            for file_obj in files:
-                if file_obj is None: continue
-                original_path = file_obj.name
-                original_filename = os.path.basename(original_path)
-                log.info(f"Processing uploaded file: {original_filename}")
-                if original_filename.lower().endswith(".zip"):
-                    try:
-                        with zipfile.ZipFile(original_path, 'r') as zip_ref:
-                            log.info(f"Extracting zip file: {original_filename}")
-                            extracted_count_in_zip = 0
-                            for member in zip_ref.namelist():
-                                if member.endswith('/') or member.startswith('.') or member.startswith('__MACOSX'): continue
-                                member_filename = os.path.basename(member)
-                                if not member_filename: continue
-                                if member_filename.lower().endswith(IMAGE_EXTENSIONS):
-                                    try:
-                                        final_filename = member_filename
-                                        final_path = os.path.join(target_image_dir, final_filename)
-                                        counter = 1
-                                        base, ext = os.path.splitext(final_filename)
-                                        while os.path.exists(final_path):
-                                            final_filename = f"{base}_{counter}{ext}"
-                                            final_path = os.path.join(target_image_dir, final_filename)
-                                            counter += 1
-                                            if counter > 1000: raise Exception(f"Too many duplicate filenames for {base}{ext}")
-                                        zip_ref.extract(member, target_image_dir)
-                                        extracted_path_in_target = os.path.join(target_image_dir, member)
-                                        if extracted_path_in_target != final_path:
-                                            os.makedirs(os.path.dirname(final_path), exist_ok=True)
-                                            shutil.move(extracted_path_in_target, final_path)
-                                        member_dir_relative = os.path.dirname(member)
-                                        if member_dir_relative:
-                                            try:
-                                                created_dir_path = os.path.join(target_image_dir, member_dir_relative)
-                                                if os.path.isdir(created_dir_path): os.removedirs(created_dir_path)
-                                            except OSError: pass
-                                        image_count += 1
-                                        extracted_count_in_zip += 1
-                                    except Exception as e: log.error(f"Error processing file {member} from zip: {e}")
-                                else: log.info(f"Skipping non-image file in zip: {member}")
-                            processed_files_info.append(f"Extracted {extracted_count_in_zip} images from {original_filename}.")
-                    except zipfile.BadZipFile:
-                        log.error(f"Uploaded file {original_filename} is not a valid zip file.")
-                        processed_files_info.append(f"Error: {original_filename} is not a valid zip file.")
-                    except Exception as e:
-                        log.error(f"Error processing zip file {original_filename}: {e}")
-                        processed_files_info.append(f"Error processing {original_filename}: {e}")
-                elif original_filename.lower().endswith(IMAGE_EXTENSIONS):
-                    target_file_path = os.path.join(target_image_dir, original_filename)
-                    counter = 1
-                    base, ext = os.path.splitext(original_filename)
-                    while os.path.exists(target_file_path):
-                        target_file_path = os.path.join(target_image_dir, f"{base}_{counter}{ext}")
-                        counter += 1
-                        if counter > 1000: raise Exception(f"Too many duplicate filenames for {base}{ext}")
-                    try:
-                        shutil.copy(original_path, target_file_path)
-                        if target_file_path != os.path.join(target_image_dir, original_filename):
-                             processed_files_info.append(f"Copied and renamed {original_filename} to {os.path.basename(target_file_path)}.")
-                        else: processed_files_info.append(f"Copied {original_filename}.")
-                        image_count += 1
-                    except Exception as e:
-                        log.error(f"Error copying image {original_filename}: {e}")
-                        processed_files_info.append(f"Error copying {original_filename}: {e}")
-                else:
-                    log.warning(f"Skipping unsupported file type: {original_filename}")
-                    processed_files_info.append(f"Skipped unsupported file: {original_filename}.")
+            ingestor = DatasetIngestor(target_image_dir, max_side=max_side)
+            stats = ingestor.ingest(
+                [file_obj.name for file_obj in files if file_obj is not None],
+                progress=lambda done, total, name: progress(
+                    (done, total), desc=f"Checked {name}"
+                ),
+            )
+            image_count = stats["images"]
+            processed_files_info = ingestor.messages
             metadata = {
                 "lora_name": sanitized_lora_name, "lora_type": lora_type,
                 "timestamp": timestamp, "wizard_version": WIZARD_VERSION,
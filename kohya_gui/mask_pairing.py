@@ -0,0 +1,49 @@
+import os
+
+# Kept free of the GUI imports, the mask tools run it in their worker processes
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+# Names left by depth map tools, see tools/rename_depth_mask.py. sd-scripts only pairs
+# masks named like their image, these have to be renamed or prepared first.
+MISNAMED_MASK_SUFFIXES = ("-0000.png", ".mask")
+
+
+def pair_masks(image_dir: str, mask_dir: str) -> dict:
+    """
+    Pair the images of a folder with their masks, as sd-scripts pairs the images of a
+    subset with its conditioning_data_dir: by file name without extension, in the mask
+    folder of the image folder only. Images of subfolders pair with the masks of the
+    matching subfolders of the mask folder.
+
+    Parameters:
+    - image_dir (str): The image folder.
+    - mask_dir (str): The mask folder of the image folder, it may not exist.
+
+    Returns:
+    - dict: The (image, mask) pairs, the images without mask, the misnamed masks by
+      image and the masks without image.
+    """
+    images = {
+        os.path.splitext(name)[0]: os.path.join(image_dir, name)
+        for name in sorted(os.listdir(image_dir))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    }
+    masks, misnamed_names = {}, {}
+    for name in sorted(os.listdir(mask_dir)) if os.path.isdir(mask_dir) else []:
+        suffix = next((s for s in MISNAMED_MASK_SUFFIXES if name.endswith(s)), None)
+        if suffix:
+            misnamed_names[name[: -len(suffix)]] = os.path.join(mask_dir, name)
+        elif name.lower().endswith(IMAGE_EXTENSIONS):
+            masks[os.path.splitext(name)[0]] = os.path.join(mask_dir, name)
+
+    report = {"pairs": [], "missing": [], "misnamed": {}, "orphans": []}
+    for stem, image in images.items():
+        if stem in masks:
+            report["pairs"].append((image, masks[stem]))
+        elif stem in misnamed_names:
+            report["misnamed"][image] = misnamed_names[stem]
+        else:
+            report["missing"].append(image)
+    report["orphans"] = [mask for stem, mask in masks.items() if stem not in images]
+    return report
@@ -1,6 +1,5 @@
 # Standard library imports
 import os
-import subprocess
 import sys
 import json
 
@@ -15,8 +14,10 @@ from .common_gui import (
     list_files,
     create_refresh_button, setup_environment
 )
+from .class_lora_catalog import lora_catalog
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
-from .sd_modeltype import SDModelType
+from .sd_modeltype import ModelType, SDModelType
 
 # Set up logging
 log = setup_logging()
@@ -76,25 +77,35 @@ class GradioMergeLoRaTab:
             current_sd_model_dir = path
             return list(list_files(path, exts=[".ckpt", ".safetensors"], all=True))
 
+        # Model family the LoRA dropdowns are filtered for, detected from the selected SD model
+        lora_target = None
+
+        def list_lora_models(path):
+            lora_catalog.index(path)
+            return lora_catalog.choices(
+                list(list_files(path, exts=[".pt", ".safetensors"], all=True)),
+                target=lora_target,
+            )
+
         def list_a_models(path):
             nonlocal current_a_model_dir
             current_a_model_dir = path
-            return list(list_files(path, exts=[".pt", ".safetensors"], all=True))
+            return list_lora_models(path)
 
         def list_b_models(path):
             nonlocal current_b_model_dir
             current_b_model_dir = path
-            return list(list_files(path, exts=[".pt", ".safetensors"], all=True))
+            return list_lora_models(path)
 
         def list_c_models(path):
             nonlocal current_c_model_dir
             current_c_model_dir = path
-            return list(list_files(path, exts=[".pt", ".safetensors"], all=True))
+            return list_lora_models(path)
 
         def list_d_models(path):
             nonlocal current_d_model_dir
             current_d_model_dir = path
-            return list(list_files(path, exts=[".pt", ".safetensors"], all=True))
+            return list_lora_models(path)
 
         def list_save_to(path):
             nonlocal current_save_dir
@@ -303,6 +314,29 @@ class GradioMergeLoRaTab:
                     show_progress=False,
                 )
 
+            def filter_lora_models(path):
+                # Only offer the LoRAs compatible with the selected SD model
+                nonlocal lora_target
+                model_type = SDModelType(path).model_type if path else None
+                lora_target = (
+                    model_type.name
+                    if model_type is not None and model_type != ModelType.UNKNOWN
+                    else None
+                )
+                return (
+                    gr.Dropdown(choices=[""] + list_a_models(current_a_model_dir)),
+                    gr.Dropdown(choices=[""] + list_b_models(current_b_model_dir)),
+                    gr.Dropdown(choices=[""] + list_c_models(current_c_model_dir)),
+                    gr.Dropdown(choices=[""] + list_d_models(current_d_model_dir)),
+                )
+
+            sd_model.change(
+                filter_lora_models,
+                inputs=sd_model,
+                outputs=[lora_a_model, lora_b_model, lora_c_model, lora_d_model],
+                show_progress=False,
+            )
+
             with gr.Row():
                 ratio_c = gr.Slider(
                     label="Model C merge ratio (eg: 0.5 mean 50%)",
@@ -370,26 +404,136 @@ class GradioMergeLoRaTab:
 
             merge_button = gr.Button("Merge model")
 
+            merge_inputs = [
+                sd_model,
+                sdxl_model,
+                lora_a_model,
+                lora_b_model,
+                lora_c_model,
+                lora_d_model,
+                ratio_a,
+                ratio_b,
+                ratio_c,
+                ratio_d,
+                save_to,
+                precision,
+                save_precision,
+            ]
+
             merge_button.click(
                 self.merge_lora,
-                inputs=[
-                    sd_model,
-                    sdxl_model,
-                    lora_a_model,
-                    lora_b_model,
-                    lora_c_model,
-                    lora_d_model,
-                    ratio_a,
-                    ratio_b,
-                    ratio_c,
-                    ratio_d,
-                    save_to,
-                    precision,
-                    save_precision,
-                ],
+                inputs=merge_inputs,
                 show_progress=False,
             )
 
+            with gr.Accordion("Merge plan", open=False):
+                gr.Markdown(
+                    "Collect many merges in a JSON plan and run them in one go. Merges sharing a SD model load it only once and a report with the timing and sha256 of each output is saved next to the plan."
+                )
+                json_ext = gr.Textbox(value="*.json", visible=False)
+                json_ext_name = gr.Textbox(value="Merge plan", visible=False)
+                with gr.Group(), gr.Row():
+                    plan_file = gr.Textbox(
+                        label="Merge plan file",
+                        placeholder="Path to the JSON merge plan",
+                        interactive=True,
+                    )
+                    button_plan_file = gr.Button(
+                        document_symbol,
+                        elem_id="open_folder_small",
+                        elem_classes=["tool"],
+                        visible=(not self.headless),
+                    )
+                    button_plan_file.click(
+                        get_saveasfilename_path,
+                        inputs=[plan_file, json_ext, json_ext_name],
+                        outputs=plan_file,
+                        show_progress=False,
+                    )
+                with gr.Row():
+                    add_to_plan_button = gr.Button("Add current merge to plan")
+                    run_plan_button = gr.Button("Run merge plan")
+
+                add_to_plan_button.click(
+                    self.add_to_plan,
+                    inputs=[plan_file] + merge_inputs,
+                    show_progress=False,
+                )
+                run_plan_button.click(
+                    self.run_merge_plan,
+                    inputs=[plan_file],
+                    show_progress=False,
+                )
+
+    def add_to_plan(
+        self,
+        plan_file,
+        sd_model,
+        sdxl_model,
+        lora_a_model,
+        lora_b_model,
+        lora_c_model,
+        lora_d_model,
+        ratio_a,
+        ratio_b,
+        ratio_c,
+        ratio_d,
+        save_to,
+        precision,
+        save_precision,
+    ):
+        if not plan_file:
+            log.info("Provide a merge plan file first.")
+            return
+
+        lora_models = [lora_a_model, lora_b_model, lora_c_model, lora_d_model]
+        ratios = [ratio_a, ratio_b, ratio_c, ratio_d]
+        if not verify_conditions(sd_model, lora_models) or not save_to:
+            log.info(
+                "Warning: Either provide at least one LoRa model along with the sd_model or at least two LoRa models if no sd_model is provided, and a file to save to."
+            )
+            return
+
+        plan = {"merges": []}
+        if os.path.isfile(plan_file):
+            plan = self.load_inputs_from_json(plan_file)
+        # Plans can be a list of merges or a dict with a merges list, as merge_lora_plan reads them
+        if isinstance(plan, list):
+            plan = {"merges": plan}
+        if not isinstance(plan, dict) or not isinstance(plan.setdefault("merges", []), list):
+            log.error(f"{plan_file} is not a merge plan, the merge was not added.")
+            return
+
+        spec = {
+            "sd_model": sd_model,
+            "models": [model for model in lora_models if model],
+            "ratios": [ratios[i] for i, model in enumerate(lora_models) if model],
+            "save_to": save_to,
+            "precision": precision,
+            "save_precision": save_precision,
+        }
+        if sd_model and sdxl_model:
+            spec["model_type"] = "SDXL"
+        plan["merges"].append(spec)
+
+        self.save_inputs_to_json(plan_file, plan)
+        log.info(f"The merge plan now has {len(plan['merges'])} merges.")
+
+    def run_merge_plan(self, plan_file):
+        if not plan_file or not os.path.isfile(plan_file):
+            log.info(f"The merge plan {plan_file} is not a file")
+            return
+
+        run_cmd = [rf"{PYTHON}", rf"{scriptdir}/tools/merge_lora_plan.py", rf"{plan_file}"]
+
+        env = setup_environment()
+
+        # Reconstruct the safe command string for display
+        command_to_run = " ".join(run_cmd)
+        log.info(f"Executing command: {command_to_run}")
+
+        background_tasks.submit("Merge LoRA plan", run_cmd, env=env)
+
     def merge_lora(
         self,
         sd_model,
@@ -466,6 +610,4 @@ class GradioMergeLoRaTab:
         log.info(f"Executing command: {command_to_run}")
 
         # Run the command in the sd-scripts folder context
-        subprocess.run(run_cmd, env=env)
-
-        log.info("Done merging...")
+        background_tasks.submit("Merge LoRA", run_cmd, env=env)
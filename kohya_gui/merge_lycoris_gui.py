@@ -1,5 +1,4 @@
 import gradio as gr
-import subprocess
 import os
 import sys
 from .common_gui import (
@@ -10,6 +9,7 @@ from .common_gui import (
     create_refresh_button, setup_environment
 )
 
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -66,10 +66,7 @@ def merge_lycoris(
     log.info(f"Executing command: {command_to_run}")
             
     # Run the command in the sd-scripts folder context
-    subprocess.run(run_cmd, env=env)
-
-
-    log.info("Done merging...")
+    background_tasks.submit("Merge LyCORIS", run_cmd, env=env)
 
 
 ###
@@ -0,0 +1,152 @@
+import gradio as gr
+import os
+import sys
+
+from .common_gui import get_folder_path, scriptdir, setup_environment
+from .class_background_tasks import background_tasks
+from .custom_logging import setup_logging
+
+# Set up logging
+log = setup_logging()
+
+PYTHON = sys.executable
+
+
+def prepare_masks(
+    image_folder,
+    mask_folder,
+    output_folder,
+    bits,
+    bucket,
+    resolution,
+    min_bucket_reso,
+    max_bucket_reso,
+    bucket_reso_steps,
+    bucket_no_upscale,
+    report_file,
+):
+    if image_folder == "" or not os.path.isdir(image_folder):
+        log.info("Image folder is missing...")
+        return
+    if mask_folder == "" or not os.path.isdir(mask_folder):
+        log.info("Mask folder is missing...")
+        return
+
+    run_cmd = [
+        rf"{PYTHON}",
+        rf"{scriptdir}/tools/prepare_masks.py",
+        rf"{image_folder}",
+        rf"{mask_folder}",
+        "--bits",
+        str(int(bits)),
+    ]
+
+    if output_folder:
+        run_cmd.append("--output_dir")
+        run_cmd.append(rf"{output_folder}")
+
+        if bucket:
+            run_cmd += [
+                "--bucket",
+                "--resolution",
+                str(resolution or "512,512"),
+                "--min_bucket_reso",
+                str(int(min_bucket_reso)),
+                "--max_bucket_reso",
+                str(int(max_bucket_reso)),
+                "--bucket_reso_steps",
+                str(int(bucket_reso_steps)),
+            ]
+            if bucket_no_upscale:
+                run_cmd.append("--bucket_no_upscale")
+
+    if report_file:
+        run_cmd.append("--report")
+        run_cmd.append(rf"{report_file}")
+
+    env = setup_environment()
+
+    # Reconstruct the safe command string for display
+    command_to_run = " ".join(run_cmd)
+    log.info(f"Executing command: {command_to_run}")
+
+    background_tasks.submit(
+        "Prepare masks" if output_folder else "Validate masks", run_cmd, env=env
+    )
+
+
+def gradio_prepare_masks_gui_tab(headless=False):
+    with gr.Tab("Prepare Masks"):
+        gr.Markdown(
+            "This utility checks the masks of a masked loss dataset: every image needs a mask "
+            "named like it and of its size, or the training stops in its data loader. With an "
+            "output folder, the masks are also written as compact single channel PNGs named "
+            "like their image, to use as conditioning_data_dir in the dataset config."
+        )
+
+        with gr.Group(), gr.Row():
+            folders = {}
+            for name, label in [
+                ("image", "Image folder (searched recursively)"),
+                ("mask", "Mask folder"),
+                ("output", "Output folder (empty to only validate)"),
+            ]:
+                folders[name] = gr.Textbox(label=label, interactive=True)
+                button = gr.Button(
+                    "📂",
+                    elem_id="open_folder_small",
+                    elem_classes=["tool"],
+                    visible=(not headless),
+                )
+                button.click(
+                    get_folder_path,
+                    outputs=folders[name],
+                    show_progress=False,
+                )
+
+        with gr.Row():
+            bits = gr.Dropdown(
+                label="Mask bits",
+                info="8 bit keeps soft edges, 1 bit gives the smallest files",
+                choices=[8, 1],
+                value=8,
+                interactive=True,
+            )
+            report_file = gr.Textbox(
+                label="Report file",
+                placeholder="(Optional) JSON report of the problems found",
+                interactive=True,
+            )
+
+        with gr.Accordion("Bucket resolution", open=False):
+            gr.Markdown(
+                "Resize and crop the masks to the bucket of their image, only for images "
+                "materialized at their bucket with the same settings."
+            )
+            with gr.Row():
+                bucket = gr.Checkbox(label="Resize masks to their bucket", value=False)
+                resolution = gr.Textbox(label="Max resolution", value="512,512")
+                min_bucket_reso = gr.Number(label="Minimum bucket resolution", value=256, precision=0)
+                max_bucket_reso = gr.Number(label="Maximum bucket resolution", value=2048, precision=0)
+                bucket_reso_steps = gr.Number(label="Bucket resolution steps", value=64, precision=0)
+                bucket_no_upscale = gr.Checkbox(label="Don't upscale bucket resolution", value=False)
+
+        prepare_masks_button = gr.Button("Check and prepare masks")
+
+        prepare_masks_button.click(
+            prepare_masks,
+            inputs=[
+                folders["image"],
+                folders["mask"],
+                folders["output"],
+                bits,
+                bucket,
+                resolution,
+                min_bucket_reso,
+                max_bucket_reso,
+                bucket_reso_steps,
+                bucket_no_upscale,
+                report_file,
+            ],
+            show_progress=False,
+        )
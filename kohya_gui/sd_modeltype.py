@@ -1,9 +1,23 @@
-from os.path import isfile
-from safetensors import safe_open
+import json
+import os
+import struct
 import enum
+from os.path import isfile
+
+from .class_json_cache import JsonCache
 
 # methodology is based on https://github.com/AUTOMATIC1111/stable-diffusion-webui/blob/82a973c04367123ae98bd9abdf80d9eda9b910e2/modules/sd_models.py#L379-L403
 
+# Detection results, keyed by path and invalidated when the file size or mtime change
+MODEL_TYPE_CACHE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "logs",
+    "model_type_cache.json",
+)
+
+# Refuse absurd header sizes, which means the file is not a safetensors file
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+
 
 class ModelType(enum.Enum):
     UNKNOWN = 0
@@ -14,39 +28,212 @@ class ModelType(enum.Enum):
     FLUX1 = 5
 
 
+def read_safetensors_header(path: str) -> dict:
+    """
+    Read the JSON header of a safetensors file without loading any tensor.
+
+    Parameters:
+    - path (str): The safetensors file.
+
+    Returns:
+    - dict: The header, mapping each tensor name to its dtype, shape and offsets.
+    """
+    with open(path, "rb") as f:
+        size_bytes = f.read(8)
+        if len(size_bytes) != 8:
+            raise ValueError(f"{path} is not a safetensors file")
+        (header_size,) = struct.unpack("<Q", size_bytes)
+        if header_size > MAX_HEADER_SIZE:
+            raise ValueError(f"{path} is not a safetensors file")
+        return json.loads(f.read(header_size))
+
+
+class KeyPrefixTrie:
+    """
+    Trie of dot separated tensor names, answering prefix queries without scanning every key.
+    """
+
+    def __init__(self, keys=()):
+        self.root = {}
+        for key in keys:
+            self.add(key)
+
+    def add(self, key: str) -> None:
+        node = self.root
+        for part in key.split("."):
+            node = node.setdefault(part, {})
+
+    def has_prefix(self, prefix: str) -> bool:
+        parts = prefix.split(".")
+        # "model." ends with an empty segment, "model.diff" with a partial one
+        partial = parts.pop()
+        node = self.root
+        for part in parts:
+            node = node.get(part)
+            if node is None:
+                return False
+        if not partial:
+            return bool(node)
+        return any(child.startswith(partial) for child in node)
+
+
+def detect_model_type(keys: set, trie: KeyPrefixTrie) -> ModelType:
+    if "model.diffusion_model.x_embedder.proj.weight" in keys:
+        return ModelType.SD3
+    if (
+        "model.diffusion_model.double_blocks.0.img_attn.norm.key_norm.scale" in keys
+        or "double_blocks.0.img_attn.norm.key_norm.scale" in keys
+    ):
+        return ModelType.FLUX1
+    if trie.has_prefix("conditioner."):
+        return ModelType.SDXL
+    if trie.has_prefix("cond_stage_model.model."):
+        return ModelType.SD2
+    if trie.has_prefix("model."):
+        return ModelType.SD1
+    return ModelType.UNKNOWN
+
+
+def analyze_safetensors(path: str) -> dict:
+    """
+    Detect the model type, parameter count and dtypes of a safetensors file from its header.
+
+    Returns:
+    - dict: The model type name, the parameter count and the parameter count per dtype.
+    """
+    header = read_safetensors_header(path)
+    header.pop("__metadata__", None)
+
+    keys = set(header)
+    parameters = 0
+    dtypes = {}
+    for info in header.values():
+        count = 1
+        for dim in info.get("shape", []):
+            count *= dim
+        parameters += count
+        dtype = info.get("dtype", "unknown")
+        dtypes[dtype] = dtypes.get(dtype, 0) + count
+
+    return {
+        "model_type": detect_model_type(keys, KeyPrefixTrie(keys)).name,
+        "parameters": parameters,
+        "dtypes": dtypes,
+    }
+
+
+class ModelTypeCache(JsonCache):
+    """
+    On-disk cache of the safetensors analysis results, keyed by (path, size, mtime).
+    """
+
+    description = "model type cache"
+
+    def __init__(self, cache_file: str = MODEL_TYPE_CACHE_FILE):
+        super().__init__(cache_file)
+
+    def get(self, path: str, save: bool = True) -> dict:
+        """
+        Return the analysis of a safetensors file, from the cache when the file did not change.
+
+        Parameters:
+        - path (str): The safetensors file.
+        - save (bool): Whether to write the cache file after analyzing a new file.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+
+        with self.lock:
+            if self.entries is None:
+                self.load()
+
+            entry = self.entries.get(path)
+            if (
+                entry is not None
+                and entry["size"] == stat.st_size
+                and entry["mtime"] == stat.st_mtime_ns
+            ):
+                return entry
+
+            try:
+                entry = analyze_safetensors(path)
+            except (OSError, ValueError, AttributeError, TypeError):
+                entry = {"model_type": ModelType.UNKNOWN.name, "parameters": 0, "dtypes": {}}
+            entry.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+
+            self.entries[path] = entry
+            self.dirty = True
+            if save:
+                self.save()
+            return entry
+
+    def flush(self) -> None:
+        """
+        Write the cache file if entries were added with save=False.
+        """
+        with self.lock:
+            if self.dirty:
+                self.save()
+
+
+model_type_cache = ModelTypeCache()
+
+
+def format_parameter_count(parameters: int) -> str:
+    for unit, size in [("B", 1e9), ("M", 1e6), ("K", 1e3)]:
+        if parameters >= size:
+            return f"{parameters / size:.1f}{unit}"
+    return str(parameters)
+
+
+def describe_model(path: str, save: bool = True) -> str:
+    """
+    Short description of a safetensors model (type, parameters and main dtype) for
+    display next to its name, or an empty string if the type is unknown.
+    """
+    if not path.lower().endswith(".safetensors") or not isfile(path):
+        return ""
+
+    entry = model_type_cache.get(path, save=save)
+    if entry["model_type"] == ModelType.UNKNOWN.name:
+        return ""
+
+    description = f"{entry['model_type']}, {format_parameter_count(entry['parameters'])}"
+    if entry["dtypes"]:
+        description += f", {max(entry['dtypes'], key=entry['dtypes'].get)}"
+    return description
+
+
+def label_model_choices(paths: list) -> list:
+    """
+    Turn a list of model paths into dropdown choices showing the model type next to
+    each safetensors file. Values stay the paths.
+    """
+    choices = []
+    for path in paths:
+        description = describe_model(path, save=False)
+        choices.append((f"{path} [{description}]", path) if description else path)
+    model_type_cache.flush()
+    return choices
+
+
 class SDModelType:
     def __init__(self, safetensors_path):
         self.model_type = ModelType.UNKNOWN
+        self.parameters = 0
+        self.dtypes = {}
 
         if not isfile(safetensors_path):
             return
 
         try:
-            st = safe_open(filename=safetensors_path, framework="numpy", device="cpu")
-
-            # print(st.keys())
-
-            def hasKeyPrefix(pfx):
-                return any(k.startswith(pfx) for k in st.keys())
-
-            if "model.diffusion_model.x_embedder.proj.weight" in st.keys():
-                self.model_type = ModelType.SD3
-            elif (
-                "model.diffusion_model.double_blocks.0.img_attn.norm.key_norm.scale"
-                in st.keys()
-                or "double_blocks.0.img_attn.norm.key_norm.scale" in st.keys()
-            ):
-                # print("flux1 model detected...")
-                self.model_type = ModelType.FLUX1
-            elif hasKeyPrefix("conditioner."):
-                self.model_type = ModelType.SDXL
-            elif hasKeyPrefix("cond_stage_model.model."):
-                self.model_type = ModelType.SD2
-            elif hasKeyPrefix("model."):
-                self.model_type = ModelType.SD1
+            entry = model_type_cache.get(safetensors_path)
+            self.model_type = ModelType[entry["model_type"]]
+            self.parameters = entry["parameters"]
+            self.dtypes = entry["dtypes"]
         except:
             pass
-        
+
         # print(f"Model type: {self.model_type}")
 
     def Is_SD1(self):
@@ -1,5 +1,4 @@
 import gradio as gr
-import subprocess
 import os
 import sys
 from .common_gui import (
@@ -10,6 +9,7 @@ from .common_gui import (
     create_refresh_button, setup_environment
 )
 
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -98,7 +98,7 @@ def svd_merge_lora(
     env = setup_environment()
 
     # Run the command
-    subprocess.run(run_cmd, env=env)
+    background_tasks.submit("SVD merge LoRA", run_cmd, env=env)
 
 
 ###
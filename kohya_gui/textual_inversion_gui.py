@@ -18,18 +18,35 @@ from .common_gui import (
     run_cmd_advanced_training,
     SaveConfigFile,
     scriptdir,
-    update_my_data,
     validate_file_path, validate_folder_path, validate_model_path,
     validate_args_setting, setup_environment,
 )
 from .class_accelerate_launch import AccelerateLaunch
 from .class_configuration_file import ConfigurationFile
+from .class_config_schema import ConfigSchema
 from .class_source_model import SourceModel
 from .class_basic_training import BasicTraining
 from .class_advanced_training import AdvancedTraining
 from .class_folders import Folders
 from .class_sdxl_parameters import SDXLParameters
 from .class_command_executor import CommandExecutor
+from .class_image_preflight import preflight_training_images
+from .class_bucket_materializer import BucketMaterializer
+from .class_bucket_simulator import BucketSimulator
+from .class_caption_analyzer import CaptionAnalyzer
+from .class_dataset_config_generator import DatasetConfigGenerator
+from .class_latent_cache import (
+    LatentCacheManager,
+    latent_cache_arguments,
+    preflight_latent_cache,
+)
+from .class_training_estimator import (
+    TrainingEstimate,
+    estimate_from_settings,
+    format_estimate,
+    profile_key,
+    training_settings,
+)
 from .class_huggingface import HuggingFace
 from .class_metadata import MetaData
 from .class_tensorboard import TensorboardManager
@@ -48,6 +65,9 @@ log = setup_logging()
 # Setup command executor
 executor = None
 
+# Setup settings schema, shared by save and open configuration
+config_schema = None
+
 # Setup huggingface
 huggingface = None
 use_shell = False
@@ -216,6 +236,7 @@ def save_configuration(
         parameters=parameters,
         file_path=file_path,
         exclusion=["file_path", "save_as"],
+        schema=config_schema,
     )
 
     return file_path
@@ -367,17 +388,25 @@ def open_configuration(
         with open(file_path, "r", encoding="utf-8") as f:
             my_data = json.load(f)
             log.info("Loading config...")
-            # Update values to fix deprecated use_8bit_adam checkbox and set appropriate optimizer if it is set to True
-            my_data = update_my_data(my_data)
+            # Migrate deprecated options and validate the values against the settings schema
+            my_data = config_schema.normalize(my_data)
+            loaded = True
     else:
         file_path = original_file_path  # In case a file_path was provided and the user decide to cancel the open action
         my_data = {}
-
-    values = [file_path]
-    for key, value in parameters:
-        # Set the value in the dictionary to the corresponding value in `my_data`, or the default value if not found
-        if not key in ["ask_for_file", "file_path"]:
-            values.append(my_data.get(key, value))
+        loaded = False
+
+    # Only push the values which changed, a loaded config resets the settings it does
+    # not contain to their default.
+    values = [file_path] + config_schema.updates(
+        my_data,
+        [
+            (key, value)
+            for key, value in parameters
+            if key not in ["ask_for_file", "file_path"]
+        ],
+        keep_missing=not loaded,
+    )
     return tuple(values)
 
 
@@ -586,10 +615,29 @@ def train_model(
     ):
         return TRAIN_BUTTON_VISIBLE
 
+    if not print_only and not preflight_training_images(
+        train_data_dir, reg_data_dir, dataset_config, headless=headless
+    ):
+        return TRAIN_BUTTON_VISIBLE
+
     if dataset_config:
-        log.info(
-            "Dataset config toml file used, skipping total_steps, train_batch_size, gradient_accumulation_steps, epoch, reg_factor, max_train_steps calculations..."
-        )
+        # Estimate the steps from the images of the dataset config subsets, with their own
+        # repeats, batch size and bucket settings
+        try:
+            estimate = estimate_from_settings("ti", **training_settings(parameters))
+            log.info(f"Training estimate:\n{format_estimate(estimate)}")
+        except (OSError, ValueError, toml.TomlDecodeError) as e:
+            log.warning(f"Could not estimate the steps of the dataset config {dataset_config}: {e}")
+            estimate = None
+
+        if max_train_steps == 0 and estimate and estimate["total_steps"] > 0:
+            max_train_steps = estimate["total_steps"]
+            max_train_steps_info = f"max_train_steps ({estimate['batches']} batches / {num_processes} processes / {gradient_accumulation_steps} * {epoch}) = {max_train_steps}"
+        elif max_train_steps == 0:
+            max_train_steps_info = f"Max train steps: 0. sd-scripts will therefore default to 1600. Please specify a different value if required."
+        else:
+            max_train_steps_info = f"Max train steps: {max_train_steps}"
+
         if max_train_steps > 0:
             # calculate stop encoder training
             if stop_text_encoder_training_pct == 0:
@@ -602,87 +650,21 @@ def train_model(
             stop_text_encoder_training = 0
             lr_warmup_steps = 0
 
-        if max_train_steps == 0:
-            max_train_steps_info = f"Max train steps: 0. sd-scripts will therefore default to 1600. Please specify a different value if required."
-        else:
-            max_train_steps_info = f"Max train steps: {max_train_steps}"
-
     else:
         if train_data_dir == "":
             log.error("Train data dir is empty")
             return TRAIN_BUTTON_VISIBLE
 
-        # Get a list of all subfolders in train_data_dir
-        subfolders = [
-            f
-            for f in os.listdir(train_data_dir)
-            if os.path.isdir(os.path.join(train_data_dir, f))
-        ]
-
-        total_steps = 0
-
-        # Loop through each subfolder and extract the number of repeats
-        for folder in subfolders:
-            try:
-                # Extract the number of repeats from the folder name
-                repeats = int(folder.split("_")[0])
-                log.info(f"Folder {folder}: {repeats} repeats found")
-
-                # Count the number of images in the folder
-                num_images = len(
-                    [
-                        f
-                        for f, lower_f in (
-                            (file, file.lower())
-                            for file in os.listdir(os.path.join(train_data_dir, folder))
-                        )
-                        if lower_f.endswith((".jpg", ".jpeg", ".png", ".webp"))
-                    ]
-                )
-
-                log.info(f"Folder {folder}: {num_images} images found")
-
-                # Calculate the total number of steps for this folder
-                steps = repeats * num_images
-
-                # log.info the result
-                log.info(f"Folder {folder}: {num_images} * {repeats} = {steps} steps")
-
-                total_steps += steps
-
-            except ValueError:
-                # Handle the case where the folder name does not contain an underscore
-                log.info(
-                    f"Error: '{folder}' does not contain an underscore, skipping..."
-                )
-
-        if reg_data_dir == "":
-            reg_factor = 1
-        else:
-            log.warning(
-                "Regularization images are used... Will double the number of steps required..."
-            )
-            reg_factor = 2
-
-        log.info(f"Regularization factor: {reg_factor}")
+        # Estimate the steps from the images, bucket by bucket, including the partial
+        # batch each bucket ends an epoch with
+        estimate = estimate_from_settings("ti", **training_settings(parameters))
+        log.info(f"Training estimate:\n{format_estimate(estimate)}")
 
         if max_train_steps == 0:
-            # calculate max_train_steps
-            max_train_steps = int(
-                math.ceil(
-                    float(total_steps)
-                    / int(train_batch_size)
-                    / int(gradient_accumulation_steps)
-                    * int(epoch)
-                    * int(reg_factor)
-                )
-            )
-            max_train_steps_info = f"max_train_steps ({total_steps} / {train_batch_size} / {gradient_accumulation_steps} * {epoch} * {reg_factor}) = {max_train_steps}"
+            max_train_steps = estimate["total_steps"]
+            max_train_steps_info = f"max_train_steps ({estimate['batches']} batches / {num_processes} processes / {gradient_accumulation_steps} * {epoch}) = {max_train_steps}"
         else:
-            if max_train_steps == 0:
-                max_train_steps_info = f"Max train steps: 0. sd-scripts will therefore default to 1600. Please specify a different value if required."
-            else:
-                max_train_steps_info = f"Max train steps: {max_train_steps}"
+            max_train_steps_info = f"Max train steps: {max_train_steps}"
 
         # calculate stop encoder training
         if stop_text_encoder_training_pct == 0:
@@ -692,7 +674,6 @@ def train_model(
                 float(max_train_steps) / 100 * int(stop_text_encoder_training_pct)
             )
 
-        log.info(f"Total steps: {total_steps}")
 
     # Calculate lr_warmup_steps
     if lr_warmup_steps > 0:
@@ -942,7 +923,14 @@ def train_model(
 
         # Run the command
 
-        executor.execute_command(run_cmd=run_cmd, env=env)
+        preflight_latent_cache(latent_cache_arguments(parameters))
+
+        executor.execute_command(
+            run_cmd=run_cmd,
+            env=env,
+            log_dir=logging_dir,
+            throughput_key=profile_key("ti", **training_settings(parameters)),
+        )
         
         train_state_value = time.time()
 
@@ -1123,6 +1111,39 @@ def ti_tab(
             with gr.Accordion("HuggingFace", open=False):
                 huggingface = HuggingFace(config=config)
 
+        dataset_components = {
+            "train_data_dir": source_model.train_data_dir,
+            "reg_data_dir": folders.reg_data_dir,
+            "dataset_config": source_model.dataset_config,
+            "train_batch_size": basic_training.train_batch_size,
+            "epoch": basic_training.epoch,
+            "max_train_steps": basic_training.max_train_steps,
+            "gradient_accumulation_steps": advanced_training.gradient_accumulation_steps,
+            "num_processes": accelerate_launch.num_processes,
+            "max_resolution": basic_training.max_resolution,
+            "enable_bucket": basic_training.enable_bucket,
+            "min_bucket_reso": basic_training.min_bucket_reso,
+            "max_bucket_reso": basic_training.max_bucket_reso,
+            "bucket_reso_steps": advanced_training.bucket_reso_steps,
+            "bucket_no_upscale": advanced_training.bucket_no_upscale,
+            "mixed_precision": accelerate_launch.mixed_precision,
+            "sdxl": source_model.sdxl_checkbox,
+            "v2": source_model.v2,
+            "caption_extension": basic_training.caption_extension,
+            "max_token_length": advanced_training.max_token_length,
+            "keep_tokens": advanced_training.keep_tokens,
+            "shuffle_caption": advanced_training.shuffle_caption,
+            "pretrained_model_name_or_path": source_model.pretrained_model_name_or_path,
+            "vae": advanced_training.vae,
+            "flip_aug": advanced_training.flip_aug,
+        }
+        TrainingEstimate("ti", dataset_components, headless=headless)
+        BucketSimulator(dataset_components, headless=headless)
+        BucketMaterializer(dataset_components, headless=headless)
+        CaptionAnalyzer(dataset_components, headless=headless)
+        DatasetConfigGenerator(dataset_components, headless=headless)
+        LatentCacheManager(dataset_components, headless=headless)
+
         global executor
         executor = CommandExecutor(headless=headless)
         
@@ -1264,6 +1285,12 @@ def ti_tab(
             metadata.metadata_title,
         ]
 
+        global config_schema
+        config_schema = ConfigSchema.from_save_configuration(
+            save_configuration, settings_list, config=config
+        )
+        configuration.defaults = config_schema.defaults()
+
         configuration.button_open_config.click(
             open_configuration,
             inputs=[dummy_db_true, configuration.config_file_name] + settings_list,
@@ -1292,6 +1319,12 @@ def ti_tab(
             outputs=[executor.button_run, executor.button_stop_training],
         )
 
+        run_state.change(
+            fn=executor.stream_output,
+            outputs=[executor.progress, executor.output],
+            show_progress=False,
+        )
+
         executor.button_run.click(
             train_model,
             inputs=[dummy_headless] + [dummy_db_false] + settings_list,
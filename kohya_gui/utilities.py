@@ -8,6 +8,8 @@ from .git_caption_gui import gradio_git_caption_gui_tab
 from .wd14_caption_gui import gradio_wd14_caption_gui_tab
 from .manual_caption_gui import gradio_manual_caption_gui_tab
 from .group_images_gui import gradio_group_images_gui_tab
+from .dedup_images_gui import gradio_dedup_images_gui_tab
+from .prepare_masks_gui import gradio_prepare_masks_gui_tab
 from .class_gui_config import KohyaSSGUIConfig
 
 
@@ -28,6 +30,8 @@ def utilities_tab(
         gradio_manual_caption_gui_tab(headless=headless)
     gradio_convert_model_tab(headless=headless)
     gradio_group_images_gui_tab(headless=headless)
+    gradio_dedup_images_gui_tab(headless=headless)
+    gradio_prepare_masks_gui_tab(headless=headless)
 
     return (
         train_data_dir_input,
@@ -9,6 +9,7 @@ from .common_gui import (
     create_refresh_button, setup_environment
 )
 
+from .class_lora_catalog import LORA_CATALOG_HEADERS, lora_catalog
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -71,7 +72,10 @@ def gradio_verify_lora_tab(headless=False):
     def list_models(path):
         nonlocal current_model_dir
         current_model_dir = path
-        return list(list_files(path, exts=[".pt", ".safetensors"], all=True))
+        lora_catalog.index(path)
+        return lora_catalog.choices(
+            list(list_files(path, exts=[".pt", ".safetensors"], all=True))
+        )
 
     with gr.Tab("Verify LoRA"):
         gr.Markdown(
@@ -116,6 +120,20 @@ def gradio_verify_lora_tab(headless=False):
                 show_progress=False,
             )
 
+        lora_model_details = gr.Dataframe(
+            headers=LORA_CATALOG_HEADERS,
+            label="Details (read from the safetensors header)",
+            interactive=False,
+            wrap=True,
+        )
+
+        lora_model.change(
+            fn=lora_catalog.details,
+            inputs=lora_model,
+            outputs=lora_model_details,
+            show_progress=False,
+        )
+
         lora_model_verif_output = gr.Textbox(
             label="Output",
             placeholder="Verification output",
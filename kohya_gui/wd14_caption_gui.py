@@ -1,5 +1,4 @@
 import gradio as gr
-import subprocess
 from .common_gui import (
     get_folder_path,
     add_pre_postfix,
@@ -10,6 +9,7 @@ from .common_gui import (
 from .class_gui_config import KohyaSSGUIConfig
 import os
 
+from .class_background_tasks import background_tasks
 from .custom_logging import setup_logging
 
 # Set up logging
@@ -123,18 +123,19 @@ def caption_images(
     command_to_run = " ".join(run_cmd)
     log.info(f"Executing command: {command_to_run}")
 
-    # Run the command in the sd-scripts folder context
-    subprocess.run(run_cmd, env=env)
+    def add_prefix(returncode):
+        # Add prefix and postfix
+        add_pre_postfix(
+            folder=train_data_dir,
+            caption_file_ext=caption_extension,
+            prefix=always_first_tags,
+            recursive=recursive,
+        )
 
-    # Add prefix and postfix
-    add_pre_postfix(
-        folder=train_data_dir,
-        caption_file_ext=caption_extension,
-        prefix=always_first_tags,
-        recursive=recursive,
-    )
+        log.info("...captioning done")
 
-    log.info("...captioning done")
+    # Run the command in the background, the prefix is added once captioning ended
+    background_tasks.submit("WD14 captioning", run_cmd, on_done=add_prefix, env=env)
 
 
 ###
@@ -5,6 +5,11 @@ import shutil
 import datetime
 import subprocess
 import re
+import tempfile
+import urllib.parse
+import urllib.request
+import configparser
+import importlib.metadata
 import pkg_resources
 
 log = logging.getLogger("sd")
@@ -153,10 +158,16 @@ def setup_logging():
 def install_requirements_inbulk(
     requirements_file, show_stdout=True, optional_parm="", upgrade=False
 ):
+    """
+    Install the requirements of a requirements file with a single pip (or uv) call.
+
+    Returns:
+    - bool: True if the installation succeeded.
+    """
     log.debug(f"Installing requirements in bulk from: {requirements_file}")
     if not os.path.exists(requirements_file):
         log.error(f"Could not find the requirements file in {requirements_file}.")
-        return
+        return False
 
     log.info(f"Installing/Validating requirements from {requirements_file}...")
 
@@ -192,9 +203,294 @@ def install_requirements_inbulk(
         _, stderr = process.communicate()
         if process.returncode != 0:
             log.error(f"Failed to install requirements: {stderr.strip()}")
+            return False
 
     except subprocess.CalledProcessError as e:
         log.error(f"An error occurred while installing requirements: {e}")
+        return False
+
+    return True
+
+
+def read_requirement_lines(requirements_file, seen=None):
+    """
+    Read the requirement lines of a requirements file, following `-r` includes.
+
+    Parameters:
+    - requirements_file (str): Path to the requirements file.
+
+    Returns:
+    - list: The requirement and option lines, without comments and empty lines.
+    """
+    seen = set() if seen is None else seen
+    requirements_file = os.path.abspath(requirements_file)
+    if requirements_file in seen:
+        return []
+    seen.add(requirements_file)
+
+    lines = []
+    with open(requirements_file, "r", encoding="utf8") as f:
+        for line in f:
+            line = re.sub(r"(^|\s)#.*$", "", line).strip()
+            if not line:
+                continue
+
+            match = re.match(r"^(-r|--requirement)\s*(\S+)$", line)
+            if match:
+                # pip resolves includes relative to the including file
+                included_file = os.path.join(
+                    os.path.dirname(requirements_file), match.group(2)
+                )
+                lines.extend(read_requirement_lines(included_file, seen))
+            else:
+                lines.append(line)
+    return lines
+
+
+def normalize_package_name(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def installed_versions():
+    """
+    Scan the metadata of the installed distributions once.
+
+    Returns:
+    - dict: The installed version of each distribution, by normalized name.
+    """
+    versions = {}
+    for distribution in importlib.metadata.distributions():
+        name = distribution.metadata["Name"]
+        if name:
+            versions.setdefault(normalize_package_name(name), distribution.version)
+    return versions
+
+
+def local_project_name(path):
+    """
+    Read the distribution name of a local project from its pyproject.toml, setup.cfg
+    or setup.py, without building it.
+
+    Returns:
+    - str: The distribution name, or None if it is not declared statically.
+    """
+    pyproject_file = os.path.join(path, "pyproject.toml")
+    if os.path.isfile(pyproject_file):
+        with open(pyproject_file, "r", encoding="utf8") as f:
+            section = re.search(r"^\[project\][^\[]*", f.read(), re.MULTILINE)
+        if section:
+            match = re.search(r"^name\s*=\s*[\"']([^\"']+)[\"']", section.group(0), re.MULTILINE)
+            if match:
+                return match.group(1)
+
+    setup_cfg_file = os.path.join(path, "setup.cfg")
+    if os.path.isfile(setup_cfg_file):
+        parser = configparser.ConfigParser()
+        try:
+            parser.read(setup_cfg_file, encoding="utf8")
+            if parser.has_option("metadata", "name"):
+                return parser.get("metadata", "name")
+        except configparser.Error:
+            pass
+
+    setup_py_file = os.path.join(path, "setup.py")
+    if os.path.isfile(setup_py_file):
+        with open(setup_py_file, "r", encoding="utf8") as f:
+            match = re.search(r"\bname\s*=\s*[\"']([^\"']+)[\"']", f.read())
+        if match:
+            return match.group(1)
+    return None
+
+
+def local_requirement_name(line):
+    """
+    Return the distribution name of an editable or local path requirement line.
+
+    Returns:
+    - str: The distribution name, or None if the line is not a local requirement or
+      its name can't be found.
+    """
+    target = re.sub(r"^(-e|--editable)(\s+|=)", "", line).strip()
+    match = re.search(r"#egg=([\w.\-]+)", target)
+    if match:
+        return match.group(1)
+    if target.startswith("file:"):
+        target = urllib.request.url2pathname(urllib.parse.urlparse(target).path)
+    if os.path.isdir(target):
+        return local_project_name(target)
+    return None
+
+
+def is_local_requirement(line):
+    return line.startswith(("-e", "--editable", ".", "/", "file:"))
+
+
+def is_option(line):
+    return line.startswith("--") and not line.startswith("--editable")
+
+
+def check_requirement(line, versions=None):
+    """
+    Check a requirement line against the metadata of the installed packages.
+
+    Parameters:
+    - line (str): The requirement line.
+    - versions (dict): Optional result of installed_versions(). Without it, the
+      metadata of the package is looked up directly.
+
+    Returns:
+    - bool: Whether the requirement is satisfied, or None if it can't be checked
+      without pip (URLs, local projects without a static name). Editable installs and
+      local paths are satisfied when a distribution of their name is installed, pip
+      can't tell whether their source changed either.
+    """
+    if is_local_requirement(line):
+        name = local_requirement_name(line)
+        if name is None:
+            return None
+        if versions is not None:
+            return normalize_package_name(name) in versions
+        try:
+            importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            return False
+        return True
+    if line.startswith("-"):
+        # Options like --extra-index-url don't need to be checked
+        return True
+
+    try:
+        requirement = pkg_resources.Requirement.parse(line)
+    except Exception:
+        return None
+
+    if requirement.url:
+        return None
+    if requirement.marker is not None and not requirement.marker.evaluate():
+        return True
+
+    if versions is not None:
+        version = versions.get(normalize_package_name(requirement.project_name))
+        if version is None:
+            return False
+    else:
+        try:
+            version = importlib.metadata.version(requirement.project_name)
+        except importlib.metadata.PackageNotFoundError:
+            return False
+
+    return requirement.specifier.contains(version, prereleases=True)
+
+
+def find_missing_requirements(lines):
+    """
+    Find the requirement lines which are not satisfied, with a single scan of the
+    installed packages metadata.
+
+    Returns:
+    - list: The lines to install. Options (index urls, find links...) are not included.
+    """
+    versions = installed_versions()
+    return [
+        line
+        for line in lines
+        if not is_option(line) and check_requirement(line, versions) is not True
+    ]
+
+
+def install_missing_requirements(
+    lines, show_stdout=False, wheelhouse=None, offline=False, upgrade=False
+):
+    """
+    Install the requirements which are missing or outdated with a single pip (or uv) call.
+
+    Parameters:
+    - lines (list): The requirement lines, as returned by read_requirement_lines.
+    - show_stdout (bool): If True, show the output of pip.
+    - wheelhouse (str): Optional folder of wheels to install from. Defaults to the
+      KOHYA_WHEELHOUSE environment variable.
+    - offline (bool): If True, only install from the wheelhouse, without using the package index.
+    - upgrade (bool): If True, pass --upgrade to pip.
+
+    Returns:
+    - bool: True if every requirement is satisfied after the installation.
+    """
+    missing = find_missing_requirements(lines)
+    if not missing:
+        log.info("All requirements are already satisfied.")
+        return True
+
+    log.info(f"Installing {len(missing)} missing or outdated requirements: {', '.join(missing)}")
+
+    wheelhouse = wheelhouse or os.environ.get("KOHYA_WHEELHOUSE")
+    options = [line for line in lines if is_option(line)]
+    optional_parm = ""
+    if wheelhouse:
+        if os.path.isdir(wheelhouse):
+            log.info(f"Using wheelhouse {wheelhouse}")
+            options.append(f"--find-links {os.path.abspath(wheelhouse)}")
+        else:
+            log.warning(f"Wheelhouse {wheelhouse} does not exist, ignoring it")
+    if offline:
+        options = [
+            option
+            for option in options
+            if not option.startswith(("--index-url", "--extra-index-url"))
+        ]
+        options.append("--no-index")
+        if any(is_local_requirement(line) for line in missing):
+            # Isolated builds of local projects fetch setuptools from the index
+            optional_parm = "--no-build-isolation"
+
+    # Markers and editable installs can't be passed safely as arguments, so the
+    # missing lines go through a temporary requirements file
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".txt", delete=False, encoding="utf8"
+    ) as f:
+        f.write("\n".join(options + missing) + "\n")
+        missing_requirements_file = f.name
+
+    try:
+        return install_requirements_inbulk(
+            missing_requirements_file,
+            show_stdout=show_stdout,
+            optional_parm=optional_parm,
+            upgrade=upgrade,
+        )
+    finally:
+        os.remove(missing_requirements_file)
+
+
+def build_wheelhouse(requirements_file, wheelhouse, show_stdout=True):
+    """
+    Build wheels for every requirement of a requirements file into a wheelhouse
+    folder, so offline nodes can be provisioned from it.
+
+    Returns:
+    - bool: True if all the wheels were built.
+    """
+    log.info(f"Building wheels for {requirements_file} into {wheelhouse}...")
+    os.makedirs(wheelhouse, exist_ok=True)
+    cmd = [
+        sys.executable,
+        "-m",
+        "pip",
+        "wheel",
+        "-r",
+        requirements_file,
+        "--wheel-dir",
+        wheelhouse,
+        "--find-links",
+        wheelhouse,
+    ]
+    if not show_stdout:
+        cmd.append("--quiet")
+
+    result = subprocess.run(cmd, check=False, env=os.environ)
+    if result.returncode != 0:
+        log.error(f"Failed to build the wheelhouse {wheelhouse}")
+        return False
+    return True
 
 
 def configure_accelerate(run_accelerate=False):
@@ -639,24 +935,14 @@ def install_requirements(
     action = "Verifying" if check_no_verify_flag else "Installing"
     log.info(f"{action} modules from {requirements_file}...")
 
-    with open(requirements_file, "r", encoding="utf8") as f:
-        lines = [
-            line.strip()
-            for line in f.readlines()
-            if line.strip() and not line.startswith("#") and "no_verify" not in line
-        ]
-
-    for line in lines:
-        if line.startswith("-r"):
-            included_file = line[2:].strip()
-            log.debug(f"Processing included requirements file: {included_file}")
-            install_requirements(
-                included_file,
-                check_no_verify_flag=check_no_verify_flag,
-                show_stdout=show_stdout,
-            )
-        else:
-            process_requirements_line(line, show_stdout=show_stdout)
+    # Resolve the missing packages in one metadata scan and install them with a
+    # single pip call, instead of one installed() check and pip call per line
+    lines = [
+        line
+        for line in read_requirement_lines(requirements_file)
+        if "no_verify" not in line
+    ]
+    install_missing_requirements(lines, show_stdout=show_stdout)
 
 
 def ensure_base_requirements():
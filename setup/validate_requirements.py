@@ -1,8 +1,14 @@
 import os
 import sys
+import site
 import shutil
+import hashlib
 import argparse
+import datetime
+import sysconfig
+import importlib.metadata
 import setup_common
+from concurrent.futures import ThreadPoolExecutor
 
 # Get the absolute path of the current file's directory (Kohua_SS project directory)
 project_directory = (
@@ -14,12 +20,19 @@ project_directory = (
 # Add the project directory to the beginning of the Python search path
 sys.path.insert(0, project_directory)
 
+from kohya_gui.class_json_cache import read_json, write_json
 from kohya_gui.custom_logging import setup_logging
 
 # Set up logging
 log = setup_logging()
 log.debug(f"Project directory set to: {project_directory}")
 
+# Result of the last successful validation, used to skip validating an unchanged environment
+VALIDATION_CACHE_FILE = os.path.join(
+    project_directory, "logs", "validate_requirements_cache.json"
+)
+VALIDATION_CACHE_VERSION = 1
+
 def check_path_with_space():
     """Check if the current working directory contains a space."""
     cwd = os.getcwd()
@@ -142,6 +155,136 @@ def log_xpu_info(torch, ipex):
             f"Torch detected GPU: {props.name} VRAM {round(props.total_memory / 1024 / 1024)}MB Compute Units {props.max_compute_units}"
         )
 
+def environment_fingerprint():
+    """
+    Describe the Python environment: interpreter and modification times of the
+    site-packages folders, which change whenever a package is installed or removed.
+    """
+    paths = sysconfig.get_paths()
+    folders = sorted(
+        {
+            paths["purelib"],
+            paths["platlib"],
+            *site.getsitepackages(),
+            site.getusersitepackages(),
+        }
+    )
+    return {
+        "python": sys.executable,
+        "version": sys.version,
+        "toolkit": detect_toolkit(),
+        "site_packages": {
+            folder: os.stat(folder).st_mtime_ns
+            for folder in folders
+            if os.path.isdir(folder)
+        },
+    }
+
+
+def check_requirements(lines, cached_results=None, max_workers=8):
+    """
+    Check requirement lines, reusing the lines already known to be satisfied.
+
+    Parameters:
+    - lines (list): The requirement lines.
+    - cached_results (dict): Results of a previous check in the same environment.
+    - max_workers (int): Number of parallel metadata lookups.
+
+    Returns:
+    - dict: The result of check_requirement for each line.
+    """
+    cached_results = cached_results or {}
+    results = {line: True for line in lines if cached_results.get(line) is True}
+    to_check = [line for line in lines if line not in results]
+
+    log.debug(f"Checking {len(to_check)} requirements ({len(results)} cached)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results.update(zip(to_check, pool.map(setup_common.check_requirement, to_check)))
+
+    for line in to_check:
+        if results[line] is False:
+            log.info(f"Requirement not satisfied: {line}")
+    return results
+
+
+def load_validation_cache():
+    cache = read_json(VALIDATION_CACHE_FILE, {})
+    if not isinstance(cache, dict) or cache.get("cache_version") != VALIDATION_CACHE_VERSION:
+        return {}
+    return cache
+
+
+def save_validation_cache(cache):
+    try:
+        write_json(VALIDATION_CACHE_FILE, cache, indent=2)
+    except OSError as e:
+        log.warning(f"Could not save the requirements validation cache: {e}")
+
+
+def validate_requirements(
+    requirements_file, use_cache=True, wheelhouse=None, offline=False
+):
+    """
+    Validate the requirements, installing them if needed, and skip the torch and
+    pip checks entirely when neither the requirements nor the environment changed
+    since the last successful validation.
+    """
+    if not os.path.exists(requirements_file):
+        log.error(f"Could not find the requirements file in {requirements_file}.")
+        return
+
+    lines = setup_common.read_requirement_lines(requirements_file)
+    requirements_hash = hashlib.sha256("\n".join(lines).encode("utf8")).hexdigest()
+    fingerprint = environment_fingerprint()
+
+    cache = load_validation_cache() if use_cache else {}
+    same_environment = cache.get("environment") == fingerprint
+    cached_results = cache.get("results", {}) if same_environment else {}
+
+    if same_environment and cache.get("requirements_hash") == requirements_hash:
+        log.info(
+            f"Requirements from {requirements_file} unchanged since the last validation on {cache.get('validated')}, skipping validation"
+        )
+        if cache.get("torch"):
+            log.info(f"Torch {cache['torch']}")
+        return
+
+    # Check if PyTorch is installed and log relevant information
+    log.debug("Checking if PyTorch is installed...")
+    check_torch()
+
+    results = check_requirements(lines, cached_results)
+    if all(result is True for result in results.values()):
+        log.info(f"All requirements from {requirements_file} are satisfied")
+        installed = True
+    else:
+        log.debug(f"Installing requirements from: {requirements_file}")
+        installed = setup_common.install_missing_requirements(
+            lines, show_stdout=True, wheelhouse=wheelhouse, offline=offline
+        )
+        if installed:
+            results = {line: True for line in lines}
+            # Installing packages changes the modification time of site-packages
+            fingerprint = environment_fingerprint()
+
+    try:
+        torch_version = importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        torch_version = None
+
+    save_validation_cache(
+        {
+            "cache_version": VALIDATION_CACHE_VERSION,
+            "requirements_file": os.path.abspath(requirements_file),
+            "requirements_hash": requirements_hash if installed else None,
+            "environment": fingerprint,
+            "results": {line: result for line, result in results.items() if result},
+            "torch": torch_version,
+            "validated": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    )
+
+
 def main():
     # Check the repository version to ensure compatibility
     log.debug("Checking repository version...")
@@ -159,27 +302,54 @@ def main():
         "-r", "--requirements", type=str, help="Path to the requirements file."
     )
     parser.add_argument("--debug", action="store_true", help="Debug on")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Validate the requirements even if the environment did not change since the last validation.",
+    )
+    parser.add_argument(
+        "--wheelhouse",
+        type=str,
+        default=None,
+        help="Folder of wheels to install missing requirements from. Defaults to the KOHYA_WHEELHOUSE environment variable.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only install missing requirements from the wheelhouse, without using the package index.",
+    )
+    parser.add_argument(
+        "--build-wheelhouse",
+        action="store_true",
+        help="Build wheels for every requirement into the wheelhouse folder and exit.",
+    )
     args = parser.parse_args()
 
     # Update git submodules if necessary
     log.debug("Updating git submodules...")
     setup_common.update_submodule()
 
-    # Check if PyTorch is installed and log relevant information
-    log.debug("Checking if PyTorch is installed...")
-    torch_ver = check_torch()
-
     # Check if the Python version is compatible
     log.debug("Checking Python version...")
     if not setup_common.check_python_version():
         sys.exit(1)
 
-    # Install required packages from the specified requirements file
+    # Check torch and install required packages from the specified requirements file
     requirements_file = args.requirements or "requirements_pytorch_windows.txt"
-    log.debug(f"Installing requirements from: {requirements_file}")
-    setup_common.install_requirements_inbulk(
-        requirements_file, show_stdout=True, 
-        # optional_parm="--index-url https://download.pytorch.org/whl/cu124"
+    if args.build_wheelhouse:
+        wheelhouse = args.wheelhouse or os.environ.get("KOHYA_WHEELHOUSE")
+        if not wheelhouse:
+            log.error("--build-wheelhouse requires --wheelhouse or the KOHYA_WHEELHOUSE environment variable.")
+            sys.exit(1)
+        if not setup_common.build_wheelhouse(requirements_file, wheelhouse):
+            sys.exit(1)
+        return
+
+    validate_requirements(
+        requirements_file,
+        use_cache=not args.no_cache,
+        wheelhouse=args.wheelhouse,
+        offline=args.offline,
     )
     
     # setup_common.install_requirements(requirements_file, check_no_verify_flag=True)
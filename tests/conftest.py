@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Same import paths as the GUI gives the tools, see common_gui.setup_environment
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [root, os.path.join(root, "tools"), os.path.join(root, "sd-scripts")]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
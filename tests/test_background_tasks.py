@@ -0,0 +1,69 @@
+import sys
+import time
+
+from kohya_gui.class_background_tasks import (
+    TASK_CANCELLED,
+    TASK_COMPLETED,
+    TASK_FAILED,
+    TASK_PENDING,
+    TASK_RUNNING,
+    BackgroundTaskRunner,
+    format_elapsed,
+)
+
+
+def python_command(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+def wait_for(condition, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def status(runner: BackgroundTaskRunner, task_id: int) -> str:
+    return runner.get_task(task_id)["status"]
+
+
+def test_tasks_report_their_return_code():
+    runner = BackgroundTaskRunner(max_concurrent=2)
+    done = []
+    ok = runner.submit("ok", python_command("print('merged')"), on_done=done.append, echo=False)
+    failed = runner.submit("failed", python_command("raise SystemExit(3)"), on_done=done.append, echo=False)
+    wait_for(lambda: len(done) == 2)
+
+    assert status(runner, ok) == TASK_COMPLETED
+    assert status(runner, failed) == TASK_FAILED
+    assert sorted(done) == [0, 3]
+    assert runner.tail(ok) == "merged"
+    rows = {row[0]: row for row in runner.list_tasks()}
+    assert rows[failed][4] == 3
+    assert [row[0] for row in runner.list_tasks()] == [failed, ok]
+
+
+def test_tasks_wait_for_a_free_slot_and_can_be_cancelled():
+    runner = BackgroundTaskRunner(max_concurrent=1)
+    done = []
+    running = runner.submit("running", python_command("import time; time.sleep(60)"), on_done=done.append, echo=False)
+    wait_for(lambda: status(runner, running) == TASK_RUNNING)
+    pending = runner.submit("pending", python_command("print('never')"), on_done=done.append, echo=False)
+    time.sleep(0.6)
+    assert status(runner, pending) == TASK_PENDING
+
+    assert runner.cancel(pending)
+    assert runner.cancel(running)
+    assert not runner.cancel(running)
+    wait_for(lambda: runner.get_task(running)["returncode"] is not None)
+    time.sleep(0.6)
+
+    assert status(runner, running) == TASK_CANCELLED
+    assert status(runner, pending) == TASK_CANCELLED
+    assert runner.get_task(pending)["started"] is None
+    assert done == []
+
+
+def test_format_elapsed():
+    assert format_elapsed(0) == "0:00:00"
+    assert format_elapsed(3725.9) == "1:02:05"
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from kohya_gui import class_bucket_materializer
+from kohya_gui.class_bucket_materializer import materialize_buckets
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    tasks = []
+    monkeypatch.setattr(
+        class_bucket_materializer.background_tasks,
+        "submit",
+        lambda name, run_cmd, **kwargs: tasks.append((name, run_cmd[2:])),
+    )
+    return tasks
+
+
+def test_materialize_train_and_reg_images(tmp_path, submitted):
+    (tmp_path / "train").mkdir()
+    (tmp_path / "reg").mkdir()
+    materialize_buckets(
+        train_data_dir=str(tmp_path / "train"),
+        reg_data_dir=str(tmp_path / "reg"),
+        max_resolution="1024,1024",
+        bucket_no_upscale=True,
+        output_dir=str(tmp_path / "out"),
+        image_format="webp",
+        quality=90.0,
+        mask_dir=str(tmp_path / "masks"),
+        mask_output_dir=str(tmp_path / "masks_out"),
+    )
+
+    options = [
+        "--resolution", "1024,1024",
+        "--min_bucket_reso", "256",
+        "--max_bucket_reso", "2048",
+        "--bucket_reso_steps", "64",
+        "--format", "webp",
+        "--quality", "90",
+        "--bucket_no_upscale",
+    ]
+    assert submitted == [
+        (
+            "Materialize buckets",
+            [str(tmp_path / "train"), str(tmp_path / "out")]
+            + options
+            + ["--mask_dir", str(tmp_path / "masks"), "--mask_output_dir", str(tmp_path / "masks_out")],
+        ),
+        (
+            "Materialize regularization buckets",
+            [str(tmp_path / "reg"), os.path.normpath(str(tmp_path / "out")) + "_reg"] + options,
+        ),
+    ]
+
+
+def test_missing_folders_are_not_materialized(tmp_path, submitted):
+    materialize_buckets(train_data_dir=str(tmp_path / "missing"), output_dir=str(tmp_path / "out"))
+    materialize_buckets(train_data_dir=str(tmp_path))
+    materialize_buckets(train_data_dir=str(tmp_path), output_dir=str(tmp_path / "out"), mask_dir="masks")
+    assert submitted == []
+
+
+def test_disabled_buckets(tmp_path, submitted):
+    materialize_buckets(train_data_dir=str(tmp_path), output_dir=str(tmp_path / "out"), enable_bucket=False)
+    assert "--disable_bucket" in submitted[0][1]
@@ -0,0 +1,48 @@
+import pytest
+from PIL import Image
+
+from kohya_gui.class_bucket_simulator import (
+    MIN_SUGGESTION_GAIN,
+    bucket_crop,
+    format_simulation,
+    simulate_from_settings,
+)
+
+
+def test_bucket_crop():
+    assert bucket_crop((1024, 1024), (512, 512)) == 0.0
+    # Resized to 704x352 to cover the bucket, then 32 rows are cropped
+    assert bucket_crop((1536, 768), (704, 320)) == pytest.approx(1 - 320 / 352)
+    assert bucket_crop((-1, -1), (512, 512)) == 0.0
+
+
+@pytest.fixture
+def train_data_dir(tmp_path):
+    image_dir = tmp_path / "3_concept"
+    image_dir.mkdir()
+    for number, size in enumerate([(1024, 1024), (1024, 1024), (1536, 768)]):
+        Image.new("RGB", size).save(image_dir / f"{number}.png")
+    return str(tmp_path)
+
+
+def test_simulate_batch_fill(train_data_dir):
+    report = simulate_from_settings(train_data_dir=train_data_dir, train_batch_size=2)
+    # 6 items in 512x512 and 3 in 704x320: 3 + 2 batches, the last one half empty
+    assert report["rows"] == [
+        [1, "512x512", 1.0, 2, 6, 3, "2/2", 0],
+        [1, "704x320", 2.2, 1, 3, 2, "1/2", 1],
+    ]
+    assert (report["items"], report["batches"], report["partial_batches"]) == (9, 5, 1)
+    assert report["waste"] == pytest.approx(10.0)
+    assert report["crop"] == pytest.approx(100 * (1 - 320 / 352) / 3)
+
+    gains = [suggestion["gain"] for suggestion in report["suggestions"]]
+    assert gains == sorted(gains, reverse=True)
+    assert all(gain >= MIN_SUGGESTION_GAIN for gain in gains)
+    assert "Wasted batch slots: 1 of 10 (10.0%)" in format_simulation(report)
+
+
+def test_no_suggestions_without_buckets(train_data_dir):
+    report = simulate_from_settings(train_data_dir=train_data_dir, enable_bucket=False)
+    assert report["suggestions"] == []
+    assert report["waste"] == 0.0
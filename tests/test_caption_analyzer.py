@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+from kohya_gui import class_caption_analyzer
+from kohya_gui.class_caption_analyzer import (
+    CaptionTokenCounts,
+    WhitespaceTokenizer,
+    analyze_captions,
+    clean_caption,
+    format_caption_report,
+    get_tokenizer,
+    list_captions,
+    percentile,
+    split_tags,
+)
+
+
+class CountingTokenizer(WhitespaceTokenizer):
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return super().count(text)
+
+
+def write_dataset(folder, captions: dict, uncaptioned: int = 0) -> None:
+    os.makedirs(folder, exist_ok=True)
+    for name, caption in captions.items():
+        with open(os.path.join(folder, f"{name}.png"), "wb"):
+            pass
+        with open(os.path.join(folder, f"{name}.txt"), "w", encoding="utf-8") as f:
+            f.write(caption)
+    for index in range(uncaptioned):
+        with open(os.path.join(folder, f"bare{index}.png"), "wb"):
+            pass
+
+
+def test_clean_caption():
+    assert clean_caption("  A &amp;amp; B\n\tC ") == "a & b c"
+
+
+def test_split_tags():
+    assert split_tags("1girl, solo,, smile\nblue sky ,") == ["1girl", "solo", "smile", "blue sky"]
+
+
+def test_whitespace_tokenizer():
+    tokenizer = WhitespaceTokenizer()
+    # Words, single digits and symbol runs count one token each
+    assert tokenizer.count("a cat, 12") == 5
+    # Long words count one more token per 7 letters
+    assert tokenizer.count("photorealistic") == 2
+
+
+def test_get_tokenizer_unknown():
+    with pytest.raises(ValueError):
+        get_tokenizer("unknown")
+
+
+def test_percentile():
+    assert percentile([], 0.5) == 0
+    assert percentile([1, 2, 3, 4], 0.5) == 3
+    assert percentile([1, 2, 3, 4], 0.99) == 4
+
+
+def test_list_captions(tmp_path):
+    write_dataset(tmp_path / "train" / "10_cat", {"a": "cat", "b": "cat"}, uncaptioned=1)
+    write_dataset(tmp_path / "train" / ".hidden", {"c": "cat"})
+    paths, missing = list_captions([str(tmp_path / "train"), "", str(tmp_path / "none")], ".txt")
+    assert [os.path.basename(path) for path in paths] == ["a.txt", "b.txt"]
+    assert missing == 1
+
+
+def test_caption_token_counts_cache(tmp_path):
+    write_dataset(tmp_path / "train", {"a": "cat, dog", "b": "sky"})
+    folders = [str(tmp_path / "train")]
+    paths, _ = list_captions(folders, ".txt")
+    cache_file = str(tmp_path / "cache.json")
+    tokenizer = CountingTokenizer()
+
+    counts, tags = CaptionTokenCounts(cache_file).analyze(paths, tokenizer, folders)
+    assert counts == [3, 1]
+    assert tags == [["cat", "dog"], ["sky"]]
+    assert tokenizer.calls == 2
+
+    # A new cache reading the same file only tokenizes the modified caption
+    with open(paths[1], "w", encoding="utf-8") as f:
+        f.write("blue sky")
+    cache = CaptionTokenCounts(cache_file)
+    counts, _ = cache.analyze(paths, tokenizer, folders)
+    assert counts == [3, 2]
+    assert tokenizer.calls == 3
+
+    # Captions removed from the scanned folders are forgotten
+    os.remove(paths[1])
+    cache.analyze(paths[:1], tokenizer, folders)
+    reloaded = CaptionTokenCounts(cache_file)
+    reloaded.load()
+    assert list(reloaded.entries) == [paths[0]]
+
+
+def test_analyze_captions_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        class_caption_analyzer,
+        "caption_token_counts",
+        CaptionTokenCounts(str(tmp_path / "cache.json")),
+    )
+    long_caption = ", ".join(["tag"] * 50)
+    write_dataset(
+        tmp_path / "train",
+        {"a": "style, " + long_caption, "b": "style, cat", "c": "style, dog"},
+        uncaptioned=2,
+    )
+    report = analyze_captions(
+        str(tmp_path / "train"),
+        max_token_length=75,
+        shuffle_caption=True,
+        tokenizer="whitespace",
+    )
+    assert report["captions"] == 3
+    assert report["missing"] == 2
+    assert report["counts"] == [3, 3, 101]
+    assert report["truncation"][75] == {"captions": 1, "tokens": 26}
+    assert report["truncation"][150] == {"captions": 0, "tokens": 0}
+    assert report["histogram"][0] == ["0-24", 2]
+    assert report["first_tag"] == ("style", 3)
+    assert report["top_tags"][0] == ("tag", 50)
+
+    text = format_caption_report(report)
+    assert "Max token length 75 (current): 1 captions truncated" in text
+    assert "Suggested max token length: 150" in text
+    assert "Shuffle caption is on" in text
+    assert "'style' starts 100% of the captions" in text
+
+
+def test_format_caption_report_without_captions():
+    report = {"captions": 0, "missing": 4}
+    assert format_caption_report(report) == "No captions found, 4 images without caption."
@@ -0,0 +1,100 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from kohya_gui import class_config_schema
+from kohya_gui.class_config_schema import ConfigSchema
+
+NAMES = ["epoch", "learning_rate", "flip_aug", "network_dim", "output_name", "network_weights"]
+
+
+@pytest.fixture
+def schema():
+    # Components only read for their value: the types come from PARAMETER_TYPES or the value
+    values = [1, 1e-4, False, 16, None, None]
+    return ConfigSchema(NAMES, [SimpleNamespace(value=value) for value in values])
+
+
+@pytest.fixture
+def unchanged(monkeypatch):
+    monkeypatch.setattr(class_config_schema.gr, "update", lambda: "unchanged")
+    return "unchanged"
+
+
+def test_names_must_match_components():
+    with pytest.raises(ValueError):
+        ConfigSchema(["epoch"], [])
+
+
+def test_coerce_to_the_parameter_types(schema):
+    assert schema.coerce("epoch", "3.0") == 3
+    assert schema.coerce("learning_rate", "5e-5") == 5e-5
+    assert schema.coerce("flip_aug", "True") is True
+    assert schema.coerce("flip_aug", "no") is False
+    assert schema.coerce("network_dim", 32.0) == 32
+    # Invalid values fall back to the default
+    assert schema.coerce("epoch", "many") == 1
+
+
+def test_defaults_skip_unknown_values(schema):
+    assert schema.defaults() == {"epoch": 1, "learning_rate": 1e-4, "flip_aug": False, "network_dim": 16}
+
+
+def test_code_defaults_replace_the_config_values():
+    config = SimpleNamespace(code_default=lambda name, default: 10 if name == "epoch" else default)
+    schema = ConfigSchema(["epoch"], [SimpleNamespace(value=4)], config=config)
+    assert schema.defaults() == {"epoch": 10}
+
+
+def test_normalize_migrates_and_coerces(schema):
+    data = {
+        "epoch": "2",
+        "lora_network_weights": "old.safetensors",
+        "learning_rate": None,
+        "unknown": "kept",
+    }
+    assert schema.normalize(data) == {
+        "epoch": 2,
+        "network_weights": "old.safetensors",
+        "unknown": "kept",
+    }
+
+
+def test_dump_round_trip(schema):
+    parameters = [
+        ("epoch", 5.0),
+        ("learning_rate", "2e-4"),
+        ("flip_aug", 1),
+        ("network_dim", 8),
+        ("output_name", "last"),
+        ("network_weights", None),
+        ("file_path", "ignored.json"),
+    ]
+    saved = schema.dump(parameters)
+    assert saved == {
+        "epoch": 5,
+        "learning_rate": 2e-4,
+        "flip_aug": True,
+        "network_dim": 8,
+        "output_name": "last",
+        "network_weights": None,
+    }
+    assert list(saved) == NAMES
+    assert schema.normalize(json.loads(json.dumps(saved))) == {
+        name: value for name, value in saved.items() if value is not None
+    }
+
+
+def test_updates_only_push_changed_values(schema, unchanged):
+    parameters = [("epoch", 3), ("learning_rate", 1e-4), ("flip_aug", True), ("network_dim", 16)]
+    settings = {"learning_rate": 1e-4, "network_dim": 32}
+    # Missing settings reset to their default
+    assert schema.updates(settings, parameters, keep_missing=False) == [1, unchanged, False, 32]
+    # or keep their value for presets applied on top of the current settings
+    assert schema.updates(settings, parameters, keep_missing=True) == [
+        unchanged,
+        unchanged,
+        unchanged,
+        32,
+    ]
@@ -0,0 +1,55 @@
+from kohya_gui.dataset_balancing_gui import plan_repeats
+
+
+def concept(images: int, weight: float = 1.0, counted: int = None) -> dict:
+    return {
+        "images": images,
+        "counted": images if counted is None else counted,
+        "weight": weight,
+    }
+
+
+def items(concepts: list, repeats: list) -> int:
+    return sum(count * concept["images"] for count, concept in zip(repeats, concepts))
+
+
+def test_equal_weights_give_equal_shares():
+    concepts = [concept(10), concept(20), concept(40)]
+    repeats = plan_repeats(concepts, 1200)
+    assert repeats == [40, 20, 10]
+    assert items(concepts, repeats) == 1200
+
+
+def test_weights_scale_the_shares():
+    concepts = [concept(10, weight=3), concept(10, weight=1)]
+    assert plan_repeats(concepts, 400) == [30, 10]
+
+
+def test_budget_is_filled_by_largest_remainder():
+    concepts = [concept(7), concept(11), concept(13)]
+    # Ideal repeats 47.6, 30.3 and 25.6, rounded down to 984 items: the 16 items left
+    # go to the largest remainder that fits, the third concept
+    repeats = plan_repeats(concepts, 1000)
+    assert repeats == [47, 30, 26]
+    assert items(concepts, repeats) == 997
+
+
+def test_small_shares_get_at_least_one_repeat():
+    concepts = [concept(100), concept(10, weight=0.01)]
+    # The second concept is clamped to 1 repeat, the budget left goes to the first
+    assert plan_repeats(concepts, 1000) == [9, 1]
+
+
+def test_concepts_without_images_or_weight_are_not_trained():
+    concepts = [concept(10), concept(10, weight=0), concept(10, counted=0)]
+    repeats = plan_repeats(concepts, 100)
+    assert repeats == [10, 0, 0]
+
+
+def test_balance_on_counted_images():
+    # The share of a concept is spread over the images it is balanced on: only half of
+    # the first concept is captioned, its captioned images get the repeats of the second
+    concepts = [concept(20, counted=10), concept(10)]
+    repeats = plan_repeats(concepts, 400)
+    assert repeats == [13, 14]
+    assert items(concepts, repeats) == 400
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from kohya_gui.class_dataset_config_generator import build_dataset_config, shard_datasets
+from kohya_gui.class_training_estimator import bucket_settings
+
+
+def metadata_dataset(tmp_path, resos: list, batch_size: int, name: str = "metadata") -> dict:
+    # Fine tuning metadata gives the bucket of every image without reading image files
+    metadata_file = tmp_path / f"{name}.json"
+    metadata_file.write_text(
+        json.dumps(
+            {
+                str(tmp_path / f"{name}_{number}.png"): {"train_resolution": list(reso)}
+                for number, reso in enumerate(resos)
+            }
+        )
+    )
+    subset = {"image_dir": "", "metadata_file": str(metadata_file), "num_repeats": 1, "is_reg": False}
+    return {"batch_size": batch_size, "bucket": bucket_settings("512,512"), "subsets": [subset]}
+
+
+def test_build_dataset_config_groups_subsets_by_resolution():
+    rows = [
+        ["/data/10_cat", False, 10, "cat", "", ".txt", ""],
+        ["/data/1_cat", "true", 1, "cat", "", "", "1"],
+        ["/data/5_dog", False, "5.0", "", "768,768", ".caption", ""],
+        ["", False, 1, "", "", "", ""],
+    ]
+    assert build_dataset_config(rows) == {
+        "datasets": [
+            {
+                "subsets": [
+                    {"image_dir": "/data/10_cat", "num_repeats": 10, "class_tokens": "cat", "caption_extension": ".txt"},
+                    {"image_dir": "/data/1_cat", "num_repeats": 1, "is_reg": True, "class_tokens": "cat", "keep_tokens": 1},
+                ]
+            },
+            {
+                "resolution": [768, 768],
+                "subsets": [{"image_dir": "/data/5_dog", "num_repeats": 5, "caption_extension": ".caption"}],
+            },
+        ]
+    }
+
+
+def test_shard_datasets_pads_the_last_round(tmp_path):
+    # 6 and 5 items in batches of 2: 3 + 3 batches, the last one of the second bucket partial
+    resos = [(512, 512)] * 6 + [(640, 384)] * 5
+    report = shard_datasets([metadata_dataset(tmp_path, resos, 2)], 4)
+    assert report["steps"] == 2
+    assert report["padding"] == 2
+    assert report["partial"] == 1
+    assert [rank[2] for rank in report["ranks"]] == [0, 0, 1, 1]
+    assert report["ranks"][0][3] == pytest.approx(2 * 11 / 6, abs=0.05)
+    assert [row[:5] for row in report["buckets"]] == [
+        [1, "512x512", 6, 3, 0],
+        [1, "640x384", 5, 3, 1],
+    ]
+    # Four batches drawn out of two buckets of three always mix the resolutions
+    assert report["mixed"] == pytest.approx(2.0)
+
+
+def test_shard_datasets_expected_mixed_steps(tmp_path):
+    resos = [(512, 512)] * 6 + [(640, 384)] * 5
+    report = shard_datasets([metadata_dataset(tmp_path, resos, 2)], 2)
+    # Two batches of the same bucket: 2 * (3/6 * 2/5), over 3 steps
+    assert report["steps"] == 3
+    assert report["padding"] == 0
+    assert report["mixed"] == pytest.approx(3 * (1 - 0.4))
+
+
+def test_shard_datasets_single_rank_or_resolution(tmp_path):
+    dataset = metadata_dataset(tmp_path, [(512, 512)] * 6 + [(640, 384)] * 5, 2)
+    assert shard_datasets([dataset], 1)["mixed"] == 0.0
+    assert shard_datasets([dataset], 1)["steps"] == 6
+
+    same = metadata_dataset(tmp_path, [(512, 512)] * 8, 2, name="same")
+    assert shard_datasets([same], 4)["mixed"] == pytest.approx(0.0)
@@ -0,0 +1,86 @@
+import zipfile
+
+import pytest
+from PIL import Image
+
+from kohya_gui.class_dataset_ingest import (
+    INGEST_CORRUPT,
+    INGEST_DOWNSCALED,
+    INGEST_OK,
+    DatasetIngestor,
+    check_image,
+    is_ingestible,
+)
+
+
+def save_image(path, size=(64, 32)) -> str:
+    Image.new("RGB", size, "red").save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "name, result",
+    [
+        ("cat.PNG", True),
+        ("photos/cat.jpg", True),
+        ("photos/", False),
+        (".hidden.png", False),
+        ("__MACOSX/._cat.png", False),
+        ("notes.txt", False),
+    ],
+)
+def test_is_ingestible(name, result):
+    assert is_ingestible(name) is result
+
+
+def test_check_image(tmp_path):
+    image = save_image(tmp_path / "cat.jpg", size=(400, 200))
+    assert check_image(image, max_side=400) == (image, INGEST_OK, "")
+    assert check_image(image, max_side=100) == (image, INGEST_DOWNSCALED, "")
+    with Image.open(image) as f:
+        assert f.size == (100, 50)
+
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"\x89PNG not really")
+    assert check_image(str(broken))[1] == INGEST_CORRUPT
+
+
+def test_ingest_files_and_zips(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    archive = uploads / "images.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.write(save_image(uploads / "cat.png"), "set/cat.png")
+        zip_file.write(save_image(uploads / "dog.png", size=(300, 300)), "set/dog.png")
+        zip_file.writestr("set/broken.png", b"not an image")
+        zip_file.writestr("__MACOSX/set/._cat.png", b"resource fork")
+    notes = uploads / "notes.txt"
+    notes.write_text("skipped")
+
+    target = tmp_path / "dataset"
+    target.mkdir()
+    save_image(target / "Cat.png")
+    done = []
+    ingestor = DatasetIngestor(str(target), max_side=128, max_workers=2)
+    stats = ingestor.ingest(
+        [str(archive), str(uploads / "cat.png"), str(notes)],
+        progress=lambda done_count, total, name: done.append((done_count, total)),
+    )
+
+    assert stats["images"] == 3
+    assert stats["renamed"] == 2
+    assert stats[INGEST_DOWNSCALED] == 1
+    assert stats[INGEST_CORRUPT] == 1
+    assert stats["skipped"] == 1
+    assert sorted(path.name for path in target.iterdir()) == ["Cat.png", "cat_1.png", "cat_2.png", "dog.png"]
+    with Image.open(target / "dog.png") as f:
+        assert f.size == (128, 128)
+    assert done[-1] == (4, 4)
+
+
+def test_invalid_zip_is_reported(tmp_path):
+    archive = tmp_path / "broken.zip"
+    archive.write_bytes(b"not a zip")
+    ingestor = DatasetIngestor(str(tmp_path / "dataset"))
+    assert ingestor.plan([str(archive)]) == []
+    assert ingestor.messages == ["Error: broken.zip is not a valid zip file."]
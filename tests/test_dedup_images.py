@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import dedup_images
+from dedup_images import build_groups, find_near_duplicates, hamming
+
+
+def brute_force_pairs(hashes: np.ndarray, max_distance: int) -> list:
+    distances = hamming(hashes[:, None], hashes[None, :])
+    return sorted(
+        (a, b, int(distances[a, b]))
+        for a in range(len(hashes))
+        for b in range(a + 1, len(hashes))
+        if distances[a, b] <= max_distance
+    )
+
+
+def flip_bits(value: int, bits: list) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def clustered_hashes(seed: int, clusters: int = 40, size: int = 6) -> np.ndarray:
+    # Clusters of hashes a few bits apart, so that every distance threshold finds pairs
+    rng = np.random.default_rng(seed)
+    values = []
+    for _ in range(clusters):
+        center = int(rng.integers(0, 1 << 63)) << 1 | int(rng.integers(0, 2))
+        for _ in range(size):
+            flips = rng.choice(64, size=int(rng.integers(0, 10)), replace=False)
+            values.append(flip_bits(center, [int(bit) for bit in flips]))
+    return np.array(values, dtype=np.uint64)
+
+
+def test_hamming():
+    a = np.array([0, 0xFF, (1 << 64) - 1], dtype=np.uint64)
+    b = np.array([0, 0x0F, 0], dtype=np.uint64)
+    assert hamming(a, b).tolist() == [0, 4, 64]
+
+
+@pytest.mark.parametrize("max_distance", [0, 2, 4, 8, 12])
+def test_multi_index_search_matches_brute_force(max_distance):
+    hashes = clustered_hashes(max_distance)
+    valid = np.ones(len(hashes), dtype=bool)
+    found = sorted(find_near_duplicates(hashes, max_distance, valid))
+    assert found == brute_force_pairs(hashes, max_distance)
+
+
+def test_multi_index_search_slices_large_buckets(monkeypatch):
+    # Identical high bits put every hash in one bucket, compared in slices of a few rows
+    rng = np.random.default_rng(0)
+    hashes = np.array(
+        [flip_bits(0, [int(bit) for bit in rng.choice(16, size=3, replace=False)]) for _ in range(50)],
+        dtype=np.uint64,
+    )
+    monkeypatch.setattr(dedup_images, "MAX_COMPARE_PAIRS", 120)
+    valid = np.ones(len(hashes), dtype=bool)
+    assert sorted(find_near_duplicates(hashes, 4, valid)) == brute_force_pairs(hashes, 4)
+
+
+def test_multi_index_search_skips_invalid_hashes():
+    hashes = np.array([0, 1, 3], dtype=np.uint64)
+    valid = np.array([True, False, True])
+    assert find_near_duplicates(hashes, 2, valid) == [(0, 2, 2)]
+
+
+def test_build_groups_does_not_chain_near_pairs():
+    # a is near b and b is near c, but a and c are too far apart to be duplicates
+    hashes = np.array([0, 0b1111, 0b11111111], dtype=np.uint64)
+    paths = ["a.png", "b.png", "c.png"]
+    sizes = [300, 200, 100]
+    areas = [3000, 2000, 1000]
+    near_pairs = [(0, 1, 4), (1, 2, 4)]
+    groups = build_groups(paths, sizes, areas, [], near_pairs, hashes, max_distance=4)
+    assert groups == [
+        {"keep": "a.png", "duplicates": [{"path": "b.png", "kind": "near", "distance": 4}]}
+    ]
+
+
+def test_build_groups_keeps_the_largest_image():
+    # The byte identical small images and the larger near duplicate form one group
+    hashes = np.array([0b11, 0, 0b11], dtype=np.uint64)
+    paths = ["small.png", "large.png", "copy.png"]
+    groups = build_groups(
+        paths, [10, 40, 10], [100, 400, 100], [[0, 2]], [(0, 1, 2)], hashes, max_distance=2
+    )
+    assert groups == [
+        {
+            "keep": "large.png",
+            "duplicates": [
+                {"path": "small.png", "kind": "near", "distance": 2},
+                {"path": "copy.png", "kind": "near", "distance": 2},
+            ],
+        }
+    ]
+
+
+def test_build_groups_exact_duplicates_without_hashes():
+    paths = ["a.png", "b.png", "c.png"]
+    groups = build_groups(paths, [10, 10, 10], [100, 100, 100], [[0, 2]], [])
+    assert len(groups) == 1
+    assert groups[0]["duplicates"][0]["kind"] == "exact"
+    assert {groups[0]["keep"], groups[0]["duplicates"][0]["path"]} == {"a.png", "c.png"}
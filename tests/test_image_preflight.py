@@ -0,0 +1,89 @@
+import io
+import os
+
+from PIL import Image
+
+from kohya_gui import class_image_preflight
+from kohya_gui.class_image_preflight import (
+    EXIF_ORIENTATION,
+    PREFLIGHT_ERROR,
+    PREFLIGHT_OK,
+    PREFLIGHT_WARNING,
+    ImagePreflight,
+    dataset_config_folders,
+    preflight_training_images,
+    verify_image,
+)
+
+
+def save_image(path, mode="RGB", size=(64, 64), **kwargs) -> str:
+    Image.new(mode, size).save(path, **kwargs)
+    return str(path)
+
+
+def test_verify_image(tmp_path):
+    assert verify_image(save_image(tmp_path / "ok.png")) == {"status": PREFLIGHT_OK, "issues": []}
+
+    result = verify_image(save_image(tmp_path / "alpha.png", mode="RGBA"))
+    assert result["status"] == PREFLIGHT_WARNING
+    assert "transparency" in result["issues"][0]
+
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    result = verify_image(save_image(tmp_path / "rotated.jpg", exif=exif))
+    assert result["status"] == PREFLIGHT_WARNING
+    assert "EXIF orientation 6" in result["issues"][0]
+
+
+def test_verify_broken_images(tmp_path):
+    (tmp_path / "empty.png").write_bytes(b"")
+    assert verify_image(str(tmp_path / "empty.png")) == {"status": PREFLIGHT_ERROR, "issues": ["empty file"]}
+
+    data = io.BytesIO()
+    Image.effect_noise((256, 256), 64).convert("RGB").save(data, format="JPEG")
+    (tmp_path / "truncated.jpg").write_bytes(data.getvalue()[: len(data.getvalue()) // 2])
+    assert verify_image(str(tmp_path / "truncated.jpg"))["status"] == PREFLIGHT_ERROR
+
+
+def test_scan_only_checks_new_or_modified_images(tmp_path, monkeypatch):
+    # One image per chunk, so the images are checked in the process pool
+    monkeypatch.setattr(class_image_preflight, "PREFLIGHT_CHUNK_SIZE", 1)
+    images = tmp_path / "images"
+    (images / "sub").mkdir(parents=True)
+    save_image(images / "a.png")
+    save_image(images / "sub" / "b.png", mode="RGBA")
+    (images / "c.png").write_bytes(b"")
+    preflight = ImagePreflight(str(tmp_path / "cache.json"))
+
+    report = preflight.scan([str(images)], max_workers=2)
+    assert (report["images"], report["checked"]) == (3, 3)
+    assert list(report["errors"]) == [str(images / "c.png")]
+    assert list(report["warnings"]) == [str(images / "sub" / "b.png")]
+
+    save_image(images / "c.png")
+    os.remove(images / "sub" / "b.png")
+    report = ImagePreflight(preflight.file).scan([str(images)])
+    assert (report["images"], report["checked"]) == (2, 1)
+    assert report["errors"] == {} and report["warnings"] == {}
+
+
+def test_dataset_config_folders(tmp_path):
+    config = tmp_path / "dataset.toml"
+    config.write_text("[[datasets]]\n[[datasets.subsets]]\nimage_dir = 'a'\n[[datasets.subsets]]\nnum_repeats = 2\n")
+    assert dataset_config_folders(str(config)) == ["a"]
+    assert dataset_config_folders(str(tmp_path / "missing.toml")) == []
+
+
+def test_preflight_stops_on_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(class_image_preflight, "image_preflight", ImagePreflight(str(tmp_path / "cache.json")))
+    messages = []
+    monkeypatch.setattr(class_image_preflight, "output_message", lambda msg, headless: messages.append(msg))
+    images = tmp_path / "images"
+    images.mkdir()
+    save_image(images / "a.png", mode="CMYK", format="JPEG")
+    assert preflight_training_images(str(images), headless=True)
+    assert messages == []
+
+    (images / "b.png").write_bytes(b"broken")
+    assert not preflight_training_images(str(images), headless=True)
+    assert messages[0].startswith("1 images cannot be decoded")
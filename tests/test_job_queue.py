@@ -0,0 +1,87 @@
+import pytest
+
+from kohya_gui.class_job_queue import (
+    JOB_INTERRUPTED,
+    JOB_PENDING,
+    JOB_RUNNING,
+    JobQueue,
+    parse_gpu_ids,
+)
+
+
+def start_job(self, job: dict) -> None:
+    # Jobs are marked as running instead of starting a training process
+    job.update(status=JOB_RUNNING, started=self._now())
+    self.save()
+
+
+@pytest.fixture
+def job_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(JobQueue, "_start_job", start_job)
+    return JobQueue(journal_file=str(tmp_path / "job_queue.json"), max_concurrent_jobs=3)
+
+
+def running_names(job_queue: JobQueue) -> list:
+    return sorted(job["name"] for job in job_queue.jobs if job["status"] == JOB_RUNNING)
+
+
+def test_parse_gpu_ids():
+    assert parse_gpu_ids(" 0, 1,,2 ") == {"0", "1", "2"}
+    assert parse_gpu_ids("") == set()
+    assert parse_gpu_ids(None) == set()
+
+
+def test_jobs_start_by_priority_then_age(job_queue):
+    job_queue.set_limits(max_concurrent_jobs=1, max_jobs_per_gpu=1)
+    job_queue.add_job("low", ["train"], priority=0)
+    job_queue.add_job("first", ["train"], priority=5)
+    job_queue.add_job("second", ["train"], priority=5)
+    assert [row[1] for row in job_queue.list_jobs()] == ["first", "second", "low"]
+
+    job_queue.schedule()
+    assert running_names(job_queue) == ["first"]
+
+
+def test_waiting_jobs_reserve_their_gpus(job_queue):
+    job_queue.add_job("running", ["train"], priority=20, gpu_ids="0")
+    job_queue.schedule()
+
+    # The high priority job waits for GPU 0, lower priority jobs may not take GPU 1
+    # from it but can use GPU 2
+    job_queue.add_job("waiting", ["train"], priority=10, gpu_ids="0,1")
+    job_queue.add_job("blocked", ["train"], priority=0, gpu_ids="1")
+    job_queue.add_job("free", ["train"], priority=0, gpu_ids="2")
+    job_queue.schedule()
+    assert running_names(job_queue) == ["free", "running"]
+
+
+def test_all_gpu_jobs_do_not_share(job_queue):
+    job_queue.add_job("pinned", ["train"], gpu_ids="0")
+    job_queue.add_job("all", ["train"])
+    job_queue.schedule()
+    assert running_names(job_queue) == ["pinned"]
+
+
+def test_jobs_share_gpus_up_to_the_limit(job_queue):
+    job_queue.set_limits(max_concurrent_jobs=3, max_jobs_per_gpu=2)
+    for name in ["a", "b", "c"]:
+        job_queue.add_job(name, ["train"], gpu_ids="0")
+    job_queue.schedule()
+    assert running_names(job_queue) == ["a", "b"]
+
+
+def test_reload_marks_running_jobs_interrupted(job_queue):
+    job_queue.add_job("running", ["train"], metadata={"sweep": "s"})
+    job_queue.add_job("pending", ["train"])
+    job_queue.schedule()
+
+    reloaded = JobQueue(journal_file=job_queue.journal_file)
+    statuses = {job["name"]: job["status"] for job in reloaded.jobs}
+    assert statuses == {"running": JOB_INTERRUPTED, "pending": JOB_PENDING}
+    assert reloaded.get_job(1)["ended"]
+    assert reloaded.get_job(1)["metadata"] == {"sweep": "s"}
+    assert reloaded.add_job("next", ["train"]) == 3
+
+    # Interrupted jobs are only queued again on request
+    assert reloaded.retry_job(1)
+    assert reloaded.get_job(1)["status"] == JOB_PENDING
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+
+from kohya_gui import class_latent_cache
+from kohya_gui.class_latent_cache import (
+    CACHE_HIT,
+    CACHE_OUTDATED,
+    CACHE_STALE,
+    CACHE_UNVERIFIED,
+    LatentCacheIndex,
+    check_latents,
+    latent_cache_arguments,
+    latent_cache_path,
+    preflight_latent_cache,
+)
+
+
+def test_latent_cache_path_prefers_the_older_format(tmp_path):
+    image = str(tmp_path / "cat.png")
+    assert latent_cache_path(image, (1024, 768), "SDXL") == str(tmp_path / "cat_1024x0768_sdxl.npz")
+    assert latent_cache_path(image, (512, 512), "SD2") == str(tmp_path / "cat_0512x0512_sd.npz")
+
+    (tmp_path / "cat.npz").write_bytes(b"")
+    assert latent_cache_path(image, (1024, 768), "SDXL") == str(tmp_path / "cat.npz")
+
+
+def test_check_latents_of_the_newer_format(tmp_path):
+    # Bucket 512x768 (width x height): latents of 96x64 (height x width)
+    cache = str(tmp_path / "cat_1024x1536_sdxl.npz")
+    np.savez(cache, latents_96x64=np.zeros((4, 96, 64)), original_size_96x64=np.array([1024, 1536]))
+    assert check_latents(cache, (1024, 1536), (512, 768), flip_aug=False) == ("", "")
+    assert check_latents(cache, (1024, 1536), (512, 768), flip_aug=True)[0] == CACHE_OUTDATED
+    assert check_latents(cache, (1024, 1536), (768, 512), flip_aug=False)[0] == CACHE_OUTDATED
+
+
+def test_check_latents_of_the_older_format(tmp_path):
+    cache = str(tmp_path / "cat.npz")
+    np.savez(
+        cache,
+        latents=np.zeros((4, 64, 64)),
+        latents_flipped=np.zeros((4, 64, 64)),
+        original_size=np.array([1024, 1024]),
+    )
+    assert check_latents(cache, (1024, 1024), (512, 512), flip_aug=True) == ("", "")
+    # The older format is not named after the image size, a resized image reuses it
+    status, problem = check_latents(cache, (2048, 2048), (512, 512), flip_aug=False)
+    assert status == CACHE_STALE
+    assert "1024x1024" in problem
+
+
+def test_check_latents_of_an_unreadable_file(tmp_path):
+    cache = tmp_path / "cat.npz"
+    cache.write_bytes(b"not a zip file")
+    assert check_latents(str(cache), (512, 512), (512, 512), flip_aug=False)[0] == CACHE_OUTDATED
+
+
+def test_index_classifies_caches_by_vae_and_image(tmp_path):
+    image = tmp_path / "cat.png"
+    image.write_bytes(b"image")
+    cache = tmp_path / "cat_0512x0512_sd.npz"
+    index = LatentCacheIndex(str(tmp_path / "index.json"))
+    index.load()
+
+    assert index.classify(str(cache), str(image), "vae.safetensors", {}) == (CACHE_UNVERIFIED, "")
+
+    # Written by the training after the preflight expected it
+    index.expect(str(cache), str(image), "vae.safetensors")
+    cache.write_bytes(b"latents")
+    assert index.classify(str(cache), str(image), "vae.safetensors", {}) == (CACHE_HIT, "")
+    assert index.classify(str(cache), str(image), "other.safetensors", {})[0] == CACHE_STALE
+
+    # Touching the image keeps the cache, changing it makes the cache stale
+    os.utime(image, ns=(0, 10**18))
+    assert index.classify(str(cache), str(image), "vae.safetensors", {}) == (CACHE_HIT, "")
+    image.write_bytes(b"edited image")
+    assert index.classify(str(cache), str(image), "vae.safetensors", {}) == (
+        CACHE_STALE,
+        "image modified since caching",
+    )
+
+
+def test_latent_cache_arguments():
+    parameters = [
+        ("cache_latents_to_disk", True),
+        ("train_data_dir", "/data"),
+        ("sdxl", True),
+        ("learning_rate", 1e-4),
+    ]
+    assert latent_cache_arguments(parameters) == {"train_data_dir": "/data", "sdxl": True}
+    assert latent_cache_arguments([("cache_latents_to_disk", False), ("sdxl", True)]) == {}
+
+
+@pytest.mark.parametrize("arguments", [{}, None])
+def test_preflight_without_disk_cache_does_nothing(arguments, monkeypatch):
+    monkeypatch.setattr(class_latent_cache, "scan_latent_cache", lambda *args: pytest.fail())
+    preflight_latent_cache(arguments)
@@ -0,0 +1,100 @@
+import json
+import struct
+
+import pytest
+
+from kohya_gui.class_lora_catalog import (
+    LoRACatalog,
+    detect_network_module,
+    detect_target_model,
+    inspect_lora,
+    is_compatible,
+)
+
+
+def write_lora(path, shapes: dict, metadata: dict = None) -> str:
+    # Only the header is read, the tensor data is left out
+    header = {"__metadata__": metadata or {}}
+    for key, shape in shapes.items():
+        header[key] = {"dtype": "F16", "shape": shape, "data_offsets": [0, 0]}
+    data = json.dumps(header).encode("utf-8")
+    path.write_bytes(struct.pack("<Q", len(data)) + data)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "keys, metadata, target",
+    [
+        ([], {"ss_base_model_version": "sdxl_base_v1-0"}, "SDXL"),
+        (["lora_unet_double_blocks_0_img_attn.lora_down.weight"], {}, "FLUX1"),
+        (["lora_te1_text_model.lora_down.weight"], {}, "SDXL"),
+        (["lora_unet_down_blocks_0.lora_down.weight"], {}, "SD1"),
+        (["lora_unet_down_blocks_0.lora_down.weight"], {"ss_v2": "True"}, "SD2"),
+        (["unknown.weight"], {}, ""),
+    ],
+)
+def test_detect_target_model(keys, metadata, target):
+    assert detect_target_model(keys, metadata) == target
+
+
+def test_detect_network_module():
+    assert detect_network_module([], {"ss_network_module": "lycoris.kohya"}) == "lycoris.kohya"
+    assert detect_network_module(["a.hada_w1_a"], {}) == "lycoris (LoHa)"
+    assert detect_network_module(["a.lora_down.weight"], {}) == "networks.lora"
+    assert detect_network_module(["a.weight"], {}) == ""
+
+
+def test_inspect_lora_uses_the_most_common_rank(tmp_path):
+    path = write_lora(
+        tmp_path / "style.safetensors",
+        {
+            "lora_te_a.lora_down.weight": [8, 768],
+            "lora_te_b.lora_down.weight": [8, 768],
+            "lora_te_c.lora_down.weight": [4, 768],
+            "lora_te_a.alpha": [],
+        },
+        {"ss_network_alpha": "4", "ss_output_name": "style"},
+    )
+    entry = inspect_lora(path)
+    assert entry["target"] == "SD1"
+    assert entry["network_dim"] == "8"
+    assert entry["network_alpha"] == "4"
+    assert entry["parameters"] == 20 * 768 + 1
+    assert entry["output_name"] == "style"
+
+
+def test_catalog_choices_filter_by_target(tmp_path):
+    sd1 = write_lora(tmp_path / "sd1.safetensors", {"lora_te_a.lora_down.weight": [16, 768]})
+    sdxl = write_lora(tmp_path / "sdxl.safetensors", {"lora_te1_a.lora_down.weight": [32, 768]})
+    other = tmp_path / "notes.txt"
+    other.write_text("not a LoRA")
+    catalog = LoRACatalog(str(tmp_path / "catalog.json"))
+
+    assert catalog.choices([sd1, sdxl, str(other)], target="SD2") == [
+        (f"{sd1} [SD1, dim 16]", sd1),
+        str(other),
+    ]
+    assert [value for _, value in catalog.choices([sd1, sdxl], target="SDXL")] == [sdxl]
+
+
+def test_catalog_index_forgets_removed_files(tmp_path):
+    models = tmp_path / "models"
+    models.mkdir()
+    write_lora(models / "a.safetensors", {"lora_te_a.lora_down.weight": [4, 768]})
+    removed = write_lora(models / "b.safetensors", {"lora_te_a.lora_down.weight": [4, 768]})
+    (models / "broken.safetensors").write_bytes(b"\x00")
+    catalog = LoRACatalog(str(tmp_path / "catalog.json"))
+    assert len(catalog.index(str(models))) == 2
+
+    (models / "b.safetensors").unlink()
+    reloaded = LoRACatalog(catalog.file)
+    assert [entry["path"] for entry in reloaded.index(str(models / "a.safetensors"))] == [
+        str(models / "a.safetensors")
+    ]
+    assert removed not in reloaded.entries
+
+
+def test_is_compatible():
+    assert is_compatible("SD1", "SD2")
+    assert is_compatible("SDXL", "SDXL")
+    assert not is_compatible("SDXL", "SD1")
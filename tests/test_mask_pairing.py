@@ -0,0 +1,69 @@
+from PIL import Image
+
+from kohya_gui.class_mask_preflight import mask_subsets, validate_masks
+from kohya_gui.mask_pairing import pair_masks
+
+
+def save_image(path, size=(64, 64), mode="RGB") -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new(mode, size).save(path)
+    return str(path)
+
+
+def test_pair_masks_by_name_without_extension(tmp_path):
+    images, masks = tmp_path / "images", tmp_path / "masks"
+    cat = save_image(images / "cat.jpg")
+    dog = save_image(images / "dog.png")
+    bird = save_image(images / "bird.webp")
+    (images / "cat.txt").write_text("a cat")
+    cat_mask = save_image(masks / "cat.png")
+    dog_mask = save_image(masks / "dog-0000.png")
+    orphan = save_image(masks / "fish.png")
+
+    assert pair_masks(str(images), str(masks)) == {
+        "pairs": [(cat, cat_mask)],
+        "missing": [bird],
+        "misnamed": {dog: dog_mask},
+        "orphans": [orphan],
+    }
+
+
+def test_pair_masks_without_mask_folder(tmp_path):
+    image = save_image(tmp_path / "images" / "cat.png")
+    report = pair_masks(str(tmp_path / "images"), str(tmp_path / "masks"))
+    assert report["pairs"] == []
+    assert report["missing"] == [image]
+
+
+def test_mask_subsets_of_a_dataset_config(tmp_path):
+    config = tmp_path / "dataset.toml"
+    config.write_text(
+        "[[datasets]]\n"
+        "[[datasets.subsets]]\n"
+        "image_dir = 'a'\n"
+        "conditioning_data_dir = 'a_masks'\n"
+        "[[datasets.subsets]]\n"
+        "image_dir = 'b'\n"
+        "alpha_mask = true\n"
+        "[[datasets.subsets]]\n"
+        "image_dir = 'c'\n"
+    )
+    assert mask_subsets(str(config)) == [("a", "a_masks"), ("b", "")]
+
+
+def test_validate_masks(tmp_path):
+    images, masks = tmp_path / "images", tmp_path / "masks"
+    save_image(images / "cat.png")
+    small = save_image(images / "small.png")
+    save_image(masks / "cat.png")
+    save_image(masks / "small.png", size=(32, 32))
+    alpha = tmp_path / "alpha"
+    save_image(alpha / "rgba.png", mode="RGBA")
+    rgb = save_image(alpha / "rgb.png")
+
+    report = validate_masks([(str(images), str(masks)), (str(alpha), "")])
+    assert report["pairs"] == 2
+    assert report["alpha"] == 2
+    assert set(report["errors"]) == {small, rgb}
+    assert "does not match the image 64x64" in report["errors"][small][0]
+    assert "no alpha channel" in report["errors"][rgb][0]
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from kohya_gui.merge_lora_gui import GradioMergeLoRaTab
+
+
+@pytest.fixture
+def tab():
+    # add_to_plan does not use the Gradio components built by the constructor
+    tab = GradioMergeLoRaTab.__new__(GradioMergeLoRaTab)
+    tab.headless = True
+    return tab
+
+
+def add(tab, plan_file, sd_model="base.safetensors", sdxl_model=False, models=("a.safetensors",), save_to="out.safetensors"):
+    models = list(models) + [""] * (4 - len(models))
+    tab.add_to_plan(str(plan_file), sd_model, sdxl_model, *models, 0.8, 0.6, 0.4, 0.2, save_to, "float", "fp16")
+
+
+def test_add_to_plan(tab, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    add(tab, plan_file, sdxl_model=True, models=["a.safetensors", "", "c.safetensors"])
+    add(tab, plan_file, sd_model="", models=["a.safetensors", "b.safetensors"], save_to="ab.safetensors")
+
+    assert json.loads(plan_file.read_text()) == {
+        "merges": [
+            {
+                "sd_model": "base.safetensors",
+                "models": ["a.safetensors", "c.safetensors"],
+                "ratios": [0.8, 0.4],
+                "save_to": "out.safetensors",
+                "precision": "float",
+                "save_precision": "fp16",
+                "model_type": "SDXL",
+            },
+            {
+                "sd_model": "",
+                "models": ["a.safetensors", "b.safetensors"],
+                "ratios": [0.8, 0.6],
+                "save_to": "ab.safetensors",
+                "precision": "float",
+                "save_precision": "fp16",
+            },
+        ]
+    }
+
+
+def test_add_to_a_list_plan(tab, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    plan_file.write_text(json.dumps([{"models": ["x", "y"], "save_to": "xy"}]))
+    add(tab, plan_file)
+    assert len(json.loads(plan_file.read_text())["merges"]) == 2
+
+
+def test_invalid_merges_are_not_added(tab, tmp_path):
+    plan_file = tmp_path / "plan.json"
+    add(tab, plan_file, sd_model="", models=["a.safetensors"])
+    add(tab, plan_file, save_to="")
+    assert not plan_file.exists()
+
+    plan_file.write_text(json.dumps({"merges": "not a list"}))
+    add(tab, plan_file)
+    assert json.loads(plan_file.read_text()) == {"merges": "not a list"}
@@ -0,0 +1,79 @@
+import pytest
+
+# The plan executor runs with the sd-scripts merge functions
+torch = pytest.importorskip("torch")
+pytest.importorskip("networks.merge_lora")
+
+from merge_lora_plan import group_specs, merge_arguments, normalize_spec  # noqa: E402
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for name in ["base", "a", "b"]:
+        paths[name] = tmp_path / f"{name}.safetensors"
+        paths[name].write_bytes(b"")
+    return {name: str(path) for name, path in paths.items()}
+
+
+def test_normalize_spec_fills_the_defaults(files):
+    spec = normalize_spec(
+        {"sd_model": files["base"], "model_type": "SDXL", "models": [files["a"], ""], "save_to": "out.safetensors"}
+    )
+    assert spec == {
+        "sd_model": files["base"],
+        "model_type": "SDXL",
+        "models": [files["a"]],
+        "ratios": [1.0],
+        "save_to": "out.safetensors",
+        "precision": "float",
+        "save_precision": "fp16",
+    }
+
+
+@pytest.mark.parametrize(
+    "spec, error",
+    [
+        ({"models": ["a", "b"]}, "save_to is missing"),
+        ({"models": ["a", "b"], "ratios": [1.0], "save_to": "out"}, "2 models but 1 ratios"),
+        ({"models": ["a"], "save_to": "out"}, "at least two LoRAs"),
+        ({"models": ["a", "missing"], "save_to": "out"}, "missing is not a file"),
+        ({"sd_model": "base", "model_type": "FLUX1", "models": ["a"], "save_to": "out"}, "unsupported"),
+    ],
+)
+def test_normalize_spec_errors(files, spec, error):
+    spec = dict(spec)
+    if "sd_model" in spec:
+        spec["sd_model"] = files[spec["sd_model"]]
+    spec["models"] = [files.get(model, model) for model in spec["models"]]
+    with pytest.raises(ValueError, match=error):
+        normalize_spec(spec)
+
+
+def test_group_specs_by_base_model(files):
+    plan = [
+        {"sd_model": files["base"], "model_type": "SD1", "models": [files["a"]], "save_to": "1"},
+        {"models": [files["a"], files["b"]], "save_to": "2"},
+        {"models": [files["a"]], "save_to": "3"},
+        {"sd_model": files["base"], "model_type": "SD1", "models": [files["b"]], "save_to": "4"},
+    ]
+    report = []
+    groups = group_specs(plan, report)
+    assert {base: [spec["save_to"] for spec, _ in specs] for base, specs in groups.items()} == {
+        (files["base"], "SD1"): ["1", "4"],
+        ("", ""): ["2"],
+    }
+    assert [entry["status"] for entry in report] == ["pending", "pending", "skipped", "pending"]
+
+
+def test_merge_arguments_follow_the_sd_scripts_signature():
+    spec = {"models": ["a"], "ratios": [0.5], "precision": "float"}
+
+    def merge_with_block_weights(models, ratios, lbws, merge_dtype):
+        pass
+
+    def merge(models, ratios, merge_dtype):
+        pass
+
+    assert merge_arguments(merge_with_block_weights, spec) == [["a"], [0.5], None, torch.float]
+    assert merge_arguments(merge, spec) == [["a"], [0.5], torch.float]
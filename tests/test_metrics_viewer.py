@@ -0,0 +1,133 @@
+import struct
+
+import pytest
+
+from kohya_gui.class_metrics_viewer import EventFileReader, lttb, parse_event
+
+
+def varint(value: int) -> bytes:
+    data = b""
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data += bytes([byte | 0x80])
+        else:
+            return data + bytes([byte])
+
+
+def field(number: int, wire_type: int, payload) -> bytes:
+    key = varint(number << 3 | wire_type)
+    if wire_type == 0:
+        return key + varint(payload)
+    if wire_type == 2:
+        return key + varint(len(payload)) + payload
+    return key + payload
+
+
+def simple_value(tag: str, value: float) -> bytes:
+    return field(1, 2, field(1, 2, tag.encode()) + field(2, 5, struct.pack("<f", value)))
+
+
+def tensor_value(tag: str, value: float, dtype: int = 1) -> bytes:
+    if dtype == 1:
+        tensor = field(1, 0, 1) + field(5, 5, struct.pack("<f", value))
+    else:
+        tensor = field(1, 0, 2) + field(6, 1, struct.pack("<d", value))
+    return field(1, 2, field(1, 2, tag.encode()) + field(8, 2, tensor))
+
+
+def event(step: int, wall_time: float, values: list) -> bytes:
+    return (
+        field(1, 1, struct.pack("<d", wall_time))
+        + field(2, 0, step)
+        + field(5, 2, b"".join(values))
+    )
+
+
+def record(data: bytes) -> bytes:
+    # The reader does not check the crcs
+    return struct.pack("<Q", len(data)) + b"\0" * 4 + data + b"\0" * 4
+
+
+def test_parse_event_simple_values():
+    step, wall_time, scalars = parse_event(
+        event(42, 1700000000.5, [simple_value("loss/current", 0.25), simple_value("lr/unet", 1e-4)])
+    )
+    assert step == 42
+    assert wall_time == 1700000000.5
+    assert [tag for tag, _ in scalars] == ["loss/current", "lr/unet"]
+    assert scalars[0][1] == pytest.approx(0.25)
+    assert scalars[1][1] == pytest.approx(1e-4)
+
+
+def test_parse_event_tensor_values():
+    _, _, scalars = parse_event(
+        event(1, 0.0, [tensor_value("loss", 0.5), tensor_value("lr", 0.125, dtype=2)])
+    )
+    assert scalars == [("loss", pytest.approx(0.5)), ("lr", 0.125)]
+
+
+def test_parse_event_without_summary():
+    # The first event of a file only holds the file version
+    assert parse_event(field(1, 1, struct.pack("<d", 1.0)) + field(3, 2, b"brain.Event:2")) == (
+        0,
+        1.0,
+        [],
+    )
+
+
+def test_parse_event_unsupported_wire_type():
+    with pytest.raises(ValueError):
+        parse_event(varint(1 << 3 | 3))
+
+
+def test_event_file_reader_reads_appended_records(tmp_path):
+    path = tmp_path / "events.out.tfevents.1"
+    first = record(event(1, 1.0, [simple_value("loss", 1.0)]))
+    second = record(event(2, 2.0, [simple_value("loss", 0.5)]))
+    path.write_bytes(first + second[:10])
+
+    reader = EventFileReader(str(path))
+    assert reader.update() == 1
+    # The incomplete record is left for the next update
+    assert reader.offset == len(first)
+
+    path.write_bytes(first + second)
+    assert reader.update() == 1
+    assert reader.update() == 0
+    assert reader.series["loss"] == [(1, 1.0, 1.0), (2, 0.5, 2.0)]
+
+
+def test_event_file_reader_restarts_on_truncation(tmp_path):
+    path = tmp_path / "events.out.tfevents.1"
+    path.write_bytes(record(event(1, 1.0, [simple_value("loss", 1.0)])) * 2)
+    reader = EventFileReader(str(path))
+    assert reader.update() == 2
+
+    path.write_bytes(record(event(5, 5.0, [simple_value("loss", 0.5)])))
+    assert reader.update() == 1
+    assert reader.series["loss"] == [(5, 0.5, 5.0)]
+
+
+def test_lttb_keeps_short_series():
+    points = [(x, x * x) for x in range(10)]
+    assert lttb(points, 10) == points
+    assert lttb(points, 2) == points
+
+
+def test_lttb_downsamples_to_threshold():
+    points = [(x, (x % 7) * 1.5) for x in range(1000)]
+    sampled = lttb(points, 100)
+    assert len(sampled) == 100
+    assert sampled[0] == points[0]
+    assert sampled[-1] == points[-1]
+    xs = [x for x, _ in sampled]
+    assert xs == sorted(set(xs))
+    assert set(sampled) <= set(points)
+
+
+def test_lttb_keeps_spikes():
+    points = [(x, 0.0) for x in range(1000)]
+    points[500] = (500, 100.0)
+    assert (500, 100.0) in lttb(points, 50)
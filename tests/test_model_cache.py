@@ -0,0 +1,70 @@
+from kohya_gui.class_model_cache import ModelCache, estimate_object_size
+
+MB = 1024 * 1024
+
+
+class FakeTensor:
+    def __init__(self, size: int):
+        self.size = size
+
+    def numel(self) -> int:
+        return self.size
+
+    def element_size(self) -> int:
+        return 1
+
+
+class FakeModule:
+    def __init__(self, *sizes):
+        self.tensors = [FakeTensor(size) for size in sizes]
+
+    def parameters(self):
+        return iter(self.tensors[:1])
+
+    def buffers(self):
+        return iter(self.tensors[1:])
+
+
+def test_estimate_object_size():
+    assert estimate_object_size(None) == 0
+    assert estimate_object_size(FakeTensor(10)) == 10
+    assert estimate_object_size(FakeModule(10, 5)) == 15
+    assert estimate_object_size((FakeModule(10), {"tensor": FakeTensor(3)}, "processor")) == 13
+
+
+def test_cache_hits_are_keyed_by_dtype_and_device():
+    cache = ModelCache(max_memory_mb=16)
+    loads = []
+
+    def loader(name):
+        return lambda: loads.append(name) or FakeTensor(MB)
+
+    first = cache.get("blip", loader("fp16"), dtype="float16", device="cuda")
+    assert cache.get("blip", loader("again"), dtype="float16", device="cuda") is first
+    cache.get("blip", loader("fp32"), dtype="float32", device="cuda")
+    assert loads == ["fp16", "fp32"]
+    assert cache.memory_used() == 2 * MB
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ModelCache(max_memory_mb=2)
+    cache.get("a", lambda: FakeTensor(MB))
+    cache.get("b", lambda: FakeTensor(MB))
+    cache.get("a", lambda: FakeTensor(MB))
+    cache.get("c", lambda: FakeTensor(MB))
+    assert [row[0] for row in cache.list_entries()] == ["a", "c"]
+
+    # An entry above the budget is kept alone
+    cache.get("large", lambda: FakeTensor(3 * MB))
+    assert [row[0] for row in cache.list_entries()] == ["large"]
+
+
+def test_unload_matching_entries():
+    cache = ModelCache(max_memory_mb=16)
+    cache.get("a", lambda: FakeTensor(MB), device="cuda")
+    cache.get("b", lambda: FakeTensor(MB), device="cuda")
+    cache.get("b", lambda: FakeTensor(MB), device="cpu")
+    assert cache.unload(model_id="b") == 2
+    assert cache.unload(device="cpu") == 0
+    assert cache.clear() == 1
+    assert cache.memory_used() == 0
@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from kohya_gui.class_preset_index import (
+    PresetIndex,
+    detect_preset_model,
+    matches_filter,
+    parse_query,
+)
+
+
+def write_config(path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def test_parse_query():
+    terms, filters = parse_query("Portrait optimizer:adamw8bit dim>=64 lr<1e-4 unknown:value")
+    assert terms == ["portrait", "unknown:value"]
+    assert filters == [("optimizer", ":", "adamw8bit"), ("dim", ">=", "64"), ("lr", "<", "1e-4")]
+    assert parse_query("") == ([], [])
+
+
+@pytest.mark.parametrize(
+    "value, operator, expected, result",
+    [
+        ("AdamW8bit", ":", "adamw", True),
+        ("Prodigy", ":", "adamw", False),
+        (64, ":", "64.0", True),
+        (64, ":", "high", False),
+        (64, ">=", "64", True),
+        (32, ">", "32", False),
+        (1e-5, "<", "1e-4", True),
+        ("", "<", "1e-4", False),
+        ("64", "<=", "128", True),
+    ],
+)
+def test_matches_filter(value, operator, expected, result):
+    assert matches_filter(value, operator, expected) is result
+
+
+def test_detect_preset_model():
+    assert detect_preset_model({"sdxl": True, "flux1_checkbox": True}) == "FLUX1"
+    assert detect_preset_model({"sdxl": False, "v2": True}) == "SD2"
+    assert detect_preset_model({"sdxl": False, "v2": False}) == "SD1"
+    assert detect_preset_model({"no_half_vae": True}) == "SDXL"
+    assert detect_preset_model({}) == ""
+
+
+def test_search_with_filters_and_defaults(tmp_path):
+    presets = tmp_path / "presets"
+    write_config(presets / "sdxl" / "portrait.json", {"sdxl": True, "optimizer": "AdamW8bit", "network_dim": 64})
+    write_config(presets / "sd15.json", {"sdxl": False, "optimizer": "Prodigy", "network_dim": 16, "learning_rate": 1.0})
+    (presets / "broken.json").write_text("{not json")
+    index = PresetIndex(str(tmp_path / "index.json"))
+
+    def names(query: str, defaults: dict = None) -> list:
+        entries = index.search(str(presets), query, defaults)
+        return [Path(entry["path"]).relative_to(presets).as_posix() for entry in entries]
+
+    assert len(names("")) == 2
+    assert names("model:sdxl dim>=32") == ["sdxl/portrait.json"]
+    assert names("prodigy") == ["sd15.json"]
+    # The learning rate missing from the SDXL preset takes the tab default
+    assert names("lr<0.01", defaults={"learning_rate": 1e-4}) == ["sdxl/portrait.json"]
+
+
+def test_refresh_reparses_changed_and_forgets_removed_configs(tmp_path, monkeypatch):
+    presets = tmp_path / "presets"
+    write_config(presets / "a.json", {"optimizer": "AdamW"})
+    write_config(presets / "b.json", {"optimizer": "Lion"})
+    index = PresetIndex(str(tmp_path / "index.json"))
+    index.refresh(str(presets))
+
+    parsed = []
+    parse = PresetIndex.parse
+    monkeypatch.setattr(PresetIndex, "parse", lambda self, path, stat: parsed.append(path) or parse(self, path, stat))
+    write_config(presets / "a.json", {"optimizer": "AdamW8bit", "network_dim": 8})
+    (presets / "b.json").unlink()
+
+    reloaded = PresetIndex(index.file)
+    entries = reloaded.refresh(str(presets))
+    assert parsed == [str(presets / "a.json")]
+    assert [entry["fields"] for entry in entries] == [{"optimizer": "AdamW8bit", "network_dim": 8}]
+    assert list(reloaded.entries) == [str(presets / "a.json")]
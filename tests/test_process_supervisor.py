@@ -0,0 +1,69 @@
+import sys
+
+from kohya_gui.class_process_supervisor import (
+    ProcessSupervisor,
+    format_progress,
+    parse_progress_line,
+)
+
+
+def test_parse_tqdm_progress_line():
+    line = "steps:  10%|█         | 100/1000 [01:40<15:00,  2.50it/s, avr_loss=0.0856, lr=1e-4]"
+    assert parse_progress_line(line) == {
+        "step": 100,
+        "total": 1000,
+        "percent": 10.0,
+        "elapsed": "01:40",
+        "eta": "15:00",
+        "it_per_sec": 2.5,
+        "avr_loss": 0.0856,
+        "lr": 1e-4,
+        "loss": 0.0856,
+    }
+
+
+def test_parse_seconds_per_iteration():
+    metrics = parse_progress_line("steps:   0%|  | 1/400 [00:04<26:36,  4.00s/it]")
+    assert metrics["it_per_sec"] == 0.25
+    assert "loss" not in metrics
+
+
+def test_parse_unknown_rate():
+    metrics = parse_progress_line("steps:   0%|  | 0/400 [00:00<?, ?it/s]")
+    assert metrics["step"] == 0
+    assert metrics["eta"] == "?"
+    assert "it_per_sec" not in metrics
+
+
+def test_parse_epoch_and_other_lines():
+    assert parse_progress_line("epoch 2/10") == {"epoch": 2, "epochs": 10}
+    assert parse_progress_line("loading model from disk") == {}
+
+
+def test_format_progress():
+    metrics = dict(parse_progress_line("epoch 2/10"))
+    metrics.update(parse_progress_line("steps: 50%| | 5/10 [00:05<00:05, 1.00it/s, avr_loss=0.1]"))
+    assert format_progress(metrics) == (
+        "epoch 2/10 | step 5/10 (50.0%) | loss 0.1 | 1.0 it/s | ETA 00:05"
+    )
+    assert format_progress({}) == ""
+
+
+def test_supervisor_parses_carriage_return_progress(tmp_path):
+    # tqdm rewrites its line with "\r", the last update wins
+    script = (
+        "import sys\n"
+        "sys.stdout.write('epoch 1/1\\n')\n"
+        "for step in range(1, 4):\n"
+        "    sys.stdout.write(f'\\rsteps: | {step}/3 [00:0{step}<00:00, 1.00it/s, avr_loss=0.{step}]')\n"
+        "sys.stdout.write('\\ndone\\n')\n"
+    )
+    log_file = tmp_path / "job.log"
+    supervisor = ProcessSupervisor([sys.executable, "-c", script], log_file=str(log_file), echo=False)
+    supervisor.start()
+    assert supervisor.wait(timeout=30) == 0
+
+    metrics = supervisor.get_metrics()
+    assert (metrics["epoch"], metrics["step"], metrics["total"], metrics["loss"]) == (1, 3, 3, 0.3)
+    assert supervisor.tail(1) == "done"
+    assert "avr_loss=0.2" in log_file.read_text(encoding="utf-8")
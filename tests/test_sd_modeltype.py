@@ -0,0 +1,103 @@
+import json
+import math
+import os
+import struct
+
+import pytest
+
+from kohya_gui.sd_modeltype import (
+    KeyPrefixTrie,
+    ModelType,
+    ModelTypeCache,
+    analyze_safetensors,
+    detect_model_type,
+    format_parameter_count,
+)
+
+
+def write_safetensors_header(path, tensors: dict) -> None:
+    # Only the header is read, the tensor data is left out
+    header = {"__metadata__": {"format": "pt"}}
+    offset = 0
+    for name, (dtype, shape) in tensors.items():
+        size = 2 * math.prod(shape)
+        header[name] = {"dtype": dtype, "shape": shape, "data_offsets": [offset, offset + size]}
+        offset += size
+    data = json.dumps(header).encode("utf-8")
+    path.write_bytes(struct.pack("<Q", len(data)) + data)
+
+
+def detect(keys: list) -> ModelType:
+    return detect_model_type(set(keys), KeyPrefixTrie(keys))
+
+
+def test_trie_prefix_queries():
+    trie = KeyPrefixTrie(["model.diffusion_model.input_blocks.0.weight", "conditioner.embedders.0"])
+    assert trie.has_prefix("model.")
+    assert trie.has_prefix("model.diff")
+    assert trie.has_prefix("model.diffusion_model.input_blocks.")
+    assert trie.has_prefix("cond")
+    assert not trie.has_prefix("cond_stage_model.")
+    assert not trie.has_prefix("model.first_stage")
+    assert not KeyPrefixTrie().has_prefix("model.")
+
+
+@pytest.mark.parametrize(
+    "keys, model_type",
+    [
+        (["model.diffusion_model.x_embedder.proj.weight", "model.x"], ModelType.SD3),
+        (["double_blocks.0.img_attn.norm.key_norm.scale"], ModelType.FLUX1),
+        (["conditioner.embedders.0.transformer.x", "model.diffusion_model.x"], ModelType.SDXL),
+        (["cond_stage_model.model.transformer.x", "model.diffusion_model.x"], ModelType.SD2),
+        (["cond_stage_model.transformer.x", "model.diffusion_model.x"], ModelType.SD1),
+        (["lora_unet_down_blocks_0.alpha"], ModelType.UNKNOWN),
+    ],
+)
+def test_detect_model_type(keys, model_type):
+    assert detect(keys) == model_type
+
+
+def test_analyze_safetensors(tmp_path):
+    path = tmp_path / "model.safetensors"
+    write_safetensors_header(
+        path,
+        {
+            "conditioner.embedders.0.weight": ("F16", [4, 8]),
+            "model.diffusion_model.bias": ("F32", [8]),
+        },
+    )
+    assert analyze_safetensors(str(path)) == {
+        "model_type": "SDXL",
+        "parameters": 40,
+        "dtypes": {"F16": 32, "F32": 8},
+    }
+
+
+def test_model_type_cache_is_invalidated_by_changes(tmp_path, monkeypatch):
+    path = tmp_path / "model.safetensors"
+    write_safetensors_header(path, {"model.diffusion_model.bias": ("F16", [8])})
+    cache = ModelTypeCache(str(tmp_path / "cache.json"))
+    assert cache.get(str(path))["model_type"] == "SD1"
+
+    # A fresh cache reads the entry from its file without analyzing the model again
+    reloaded = ModelTypeCache(cache.file)
+    monkeypatch.setattr("kohya_gui.sd_modeltype.analyze_safetensors", lambda path: pytest.fail())
+    assert reloaded.get(str(path))["model_type"] == "SD1"
+    monkeypatch.undo()
+
+    write_safetensors_header(path, {"conditioner.embedders.0.weight": ("F16", [16])})
+    os.utime(path, ns=(0, 10**18))
+    assert reloaded.get(str(path))["model_type"] == "SDXL"
+
+
+def test_invalid_files_are_unknown(tmp_path):
+    path = tmp_path / "broken.safetensors"
+    path.write_bytes(b"\xff" * 16)
+    cache = ModelTypeCache(str(tmp_path / "cache.json"))
+    assert cache.get(str(path))["model_type"] == "UNKNOWN"
+
+
+def test_format_parameter_count():
+    assert format_parameter_count(2_567_000_000) == "2.6B"
+    assert format_parameter_count(860_000_000) == "860.0M"
+    assert format_parameter_count(999) == "999"
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+# The setup scripts import their sibling modules from the setup folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "setup"))
+
+import setup_common  # noqa: E402
+
+VERSIONS = {"toml": "0.10.2", "rich": "13.7.1", "my-package": "1.0"}
+
+
+@pytest.mark.parametrize(
+    "line, result",
+    [
+        ("toml==0.10.2", True),
+        ("toml>=0.11", False),
+        ("Rich>=13,<14", True),
+        ("numpy", False),
+        ("my_package", True),
+        ("numpy; python_version < '3'", True),
+        ("--extra-index-url https://example.com/simple", True),
+        ("pkg @ https://example.com/pkg.whl", None),
+        ("-e ./missing_folder", None),
+        ("-e git+https://example.com/repo.git#egg=my-package", True),
+    ],
+)
+def test_check_requirement(line, result):
+    assert setup_common.check_requirement(line, VERSIONS) is result
+
+
+def test_local_requirement_names(tmp_path):
+    pyproject = tmp_path / "pyproject"
+    pyproject.mkdir()
+    (pyproject / "pyproject.toml").write_text("[tool.x]\nname = 'wrong'\n[project]\nname = \"from-pyproject\"\n")
+    setup_cfg = tmp_path / "setup_cfg"
+    setup_cfg.mkdir()
+    (setup_cfg / "setup.cfg").write_text("[metadata]\nname = from-setup-cfg\n")
+    setup_py = tmp_path / "setup_py"
+    setup_py.mkdir()
+    (setup_py / "setup.py").write_text("setup(name='from-setup-py', version='1')\n")
+
+    assert setup_common.local_requirement_name(f"-e {pyproject}") == "from-pyproject"
+    assert setup_common.local_requirement_name(f"--editable={setup_cfg}") == "from-setup-cfg"
+    assert setup_common.local_requirement_name(str(setup_py)) == "from-setup-py"
+    assert setup_common.local_requirement_name(str(tmp_path)) is None
+
+
+def test_install_only_the_missing_requirements(tmp_path, monkeypatch):
+    monkeypatch.setattr(setup_common, "installed_versions", lambda: dict(VERSIONS))
+    installed = []
+
+    def install_requirements_inbulk(requirements_file, **kwargs):
+        with open(requirements_file, encoding="utf8") as f:
+            installed.append((f.read().splitlines(), kwargs["optional_parm"]))
+        return True
+
+    monkeypatch.setattr(setup_common, "install_requirements_inbulk", install_requirements_inbulk)
+    (tmp_path / "wheels").mkdir()
+    lines = ["--extra-index-url https://example.com/simple", "toml==0.10.2", "numpy", "rich>=14"]
+
+    assert setup_common.install_missing_requirements(lines)
+    assert installed[-1] == (["--extra-index-url https://example.com/simple", "numpy", "rich>=14"], "")
+
+    # Offline installs only use the wheelhouse
+    assert setup_common.install_missing_requirements(
+        lines, wheelhouse=str(tmp_path / "wheels"), offline=True
+    )
+    assert installed[-1][0] == [
+        f"--find-links {tmp_path / 'wheels'}",
+        "--no-index",
+        "numpy",
+        "rich>=14",
+    ]
+
+    # Nothing to install
+    assert setup_common.install_missing_requirements(["toml"])
+    assert len(installed) == 2
@@ -0,0 +1,50 @@
+import importlib
+import sys
+
+import pytest
+
+from kohya_gui.class_lazy_tab import import_builder
+from kohya_gui.class_startup_profiler import StartupProfiler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    (tmp_path / "profiled_outer.py").write_text("import time\nimport profiled_inner\ntime.sleep(0.02)\n")
+    (tmp_path / "profiled_inner.py").write_text("import time\ntime.sleep(0.05)\nVALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    profiler = StartupProfiler()
+    profiler.enable()
+    yield profiler
+    profiler.disable()
+    for name in ["profiled_outer", "profiled_inner"]:
+        sys.modules.pop(name, None)
+
+
+def test_imports_are_timed_with_their_self_time(profiler):
+    importlib.import_module("profiled_outer")
+    outer_cumulative, outer_self = profiler.imports["profiled_outer"]
+    inner_cumulative, inner_self = profiler.imports["profiled_inner"]
+    assert inner_cumulative >= 0.05
+    assert outer_cumulative >= inner_cumulative + 0.02
+    assert outer_self == pytest.approx(outer_cumulative - inner_cumulative)
+    # The module imported through the timing finder works as usual
+    assert sys.modules["profiled_inner"].VALUE == 1
+
+
+def test_disable_removes_the_finder(profiler):
+    finder = profiler.finder
+    profiler.disable()
+    assert finder not in sys.meta_path
+    importlib.import_module("profiled_inner")
+    assert "profiled_inner" not in profiler.imports
+
+
+def test_sections_are_only_measured_when_enabled():
+    profiler = StartupProfiler()
+    with profiler.measure("Tab"):
+        pass
+    assert profiler.sections == []
+
+
+def test_import_builder():
+    assert import_builder("class_startup_profiler", "StartupProfiler") is StartupProfiler
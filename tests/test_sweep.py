@@ -0,0 +1,78 @@
+import pytest
+
+from kohya_gui.class_sweep import (
+    expand_sweep,
+    parse_sweep_axes,
+    parse_sweep_axis,
+    read_final_loss,
+    sweep_run_name,
+)
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ("1e-4, 5e-5", [1e-4, 5e-5]),
+        ("range(4)", [0, 1, 2, 3]),
+        ("range(8, 33, 8)", [8, 16, 24, 32]),
+        ("range(3, 0, -1)", [3, 2, 1]),
+        ("range(0.1, 0.35, 0.1)", [0.1, 0.2, 0.3]),
+        ("linspace(1, 16, 3)", [1, 8.5, 16]),
+        ("linspace(0, 8, 5)", [0, 2, 4, 6, 8]),
+        ("linspace(2, 4, 1)", [2]),
+    ],
+)
+def test_parse_sweep_axis(values, expected):
+    assert parse_sweep_axis(values) == pytest.approx(expected)
+
+
+def test_parse_sweep_axis_keeps_strings_and_bools():
+    assert parse_sweep_axis("AdamW8bit, 'Prodigy', true") == ["AdamW8bit", "Prodigy", True]
+
+
+@pytest.mark.parametrize(
+    "values", ["range(1, 2, 0)", "range()", "range(a, b)", "linspace(1, 2)", "linspace(1, 2, x)"]
+)
+def test_parse_sweep_axis_errors(values):
+    with pytest.raises(ValueError):
+        parse_sweep_axis(values)
+
+
+def test_parse_sweep_axes():
+    text = """
+    # Learning rates
+    learning_rate = 1e-4, 5e-5
+    network_dim = range(8, 17, 8)
+    """
+    assert parse_sweep_axes(text, allowed_names=["learning_rate", "network_dim"]) == {
+        "learning_rate": [1e-4, 5e-5],
+        "network_dim": [8, 16],
+    }
+    with pytest.raises(ValueError, match="Unknown training parameter"):
+        parse_sweep_axes("epoch = 1, 2", allowed_names=["learning_rate"])
+    with pytest.raises(ValueError, match="expected 'name = values'"):
+        parse_sweep_axes("learning_rate 1e-4")
+    with pytest.raises(ValueError, match="has no values"):
+        parse_sweep_axes("learning_rate = ,")
+
+
+def test_expand_sweep():
+    runs = expand_sweep({"learning_rate": [1e-4, 5e-5], "network_dim": [8, 16, 32]})
+    assert len(runs) == 6
+    assert runs[0] == {"learning_rate": 1e-4, "network_dim": 8}
+    assert runs[-1] == {"learning_rate": 5e-5, "network_dim": 32}
+    assert expand_sweep({}) == [{}]
+
+
+def test_sweep_run_name():
+    assert (
+        sweep_run_name("my lora", {"optimizer": "Adam W", "learning_rate": 0.0001})
+        == "my_lora_optimizer-Adam_W_learning_rate-0.0001"
+    )
+
+
+def test_read_final_loss(tmp_path):
+    log_file = tmp_path / "job.log"
+    log_file.write_text("steps: 10%| avr_loss=0.52\nsteps: 20%| avr_loss=0.125\ndone\n")
+    assert read_final_loss(str(log_file)) == 0.125
+    assert read_final_loss(str(tmp_path / "missing.log")) is None
@@ -0,0 +1,101 @@
+import json
+
+from PIL import Image
+
+from kohya_gui.class_training_estimator import bucket_items, bucket_settings
+
+
+def metadata_subset(tmp_path, name: str, resos: list, repeats: int, is_reg: bool = False) -> dict:
+    # Fine tuning metadata gives the bucket of every image without reading image files
+    metadata_file = tmp_path / f"{name}.json"
+    metadata_file.write_text(
+        json.dumps(
+            {
+                str(tmp_path / f"{name}_{number}.png"): {"train_resolution": list(reso)}
+                for number, reso in enumerate(resos)
+            }
+        )
+    )
+    return {
+        "image_dir": "",
+        "metadata_file": str(metadata_file),
+        "num_repeats": repeats,
+        "is_reg": is_reg,
+    }
+
+
+def dataset(subsets: list) -> dict:
+    return {"batch_size": 1, "bucket": bucket_settings("512,512"), "subsets": subsets}
+
+
+def test_train_items_are_counted_with_their_repeats(tmp_path):
+    counts = bucket_items(
+        dataset(
+            [
+                metadata_subset(tmp_path, "a", [(512, 512), (512, 512), (640, 384)], 3),
+                metadata_subset(tmp_path, "b", [(640, 384)], 2),
+            ]
+        )
+    )
+    assert counts["buckets"] == {(512, 512): 6, (640, 384): 5}
+    assert counts["bucket_images"] == {(512, 512): 2, (640, 384): 2}
+    assert counts["images"] == 4
+    assert counts["items"] == 11
+    assert counts["reg_images"] == 0
+    assert counts["reg_items"] == 0
+
+
+def test_reg_images_are_cycled_up_to_the_train_items(tmp_path):
+    # 6 train items: the 4 reg images are registered once, then the first two get one
+    # more repeat, as sd-scripts balances them
+    resos = [(512, 512), (640, 384), (384, 640), (448, 576)]
+    counts = bucket_items(
+        dataset(
+            [
+                metadata_subset(tmp_path, "train", [(512, 512), (512, 512)], 3),
+                metadata_subset(tmp_path, "reg", resos, 1, is_reg=True),
+            ]
+        )
+    )
+    assert counts["items"] == 6
+    assert counts["reg_images"] == 4
+    assert counts["reg_items"] == 6
+    assert counts["buckets"] == {
+        (512, 512): 6 + 2,
+        (640, 384): 2,
+        (384, 640): 1,
+        (448, 576): 1,
+    }
+
+
+def test_extra_reg_images_are_not_registered(tmp_path):
+    resos = [(640, 384)] * 2 + [(384, 640)] * 3
+    counts = bucket_items(
+        dataset(
+            [
+                metadata_subset(tmp_path, "train", [(512, 512)], 2),
+                metadata_subset(tmp_path, "reg", resos, 1, is_reg=True),
+            ]
+        )
+    )
+    assert counts["reg_items"] == 2
+    assert counts["buckets"] == {(512, 512): 2, (640, 384): 2}
+
+
+def test_reg_images_without_train_images(tmp_path):
+    counts = bucket_items(
+        dataset([metadata_subset(tmp_path, "reg", [(512, 512)], 1, is_reg=True)])
+    )
+    assert counts["reg_items"] == 0
+    assert counts["buckets"] == {}
+
+
+def test_image_folders_are_bucketed_by_aspect_ratio(tmp_path):
+    image_dir = tmp_path / "10_concept"
+    image_dir.mkdir()
+    for number, size in enumerate([(1024, 1024), (1024, 1024), (1536, 768)]):
+        Image.new("RGB", size).save(image_dir / f"{number}.png")
+    counts = bucket_items(
+        dataset([{"image_dir": str(image_dir), "num_repeats": 10, "is_reg": False}])
+    )
+    assert counts["buckets"] == {(512, 512): 20, (704, 320): 10}
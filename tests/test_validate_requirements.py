@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+# The setup scripts import their sibling modules from the setup folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "setup"))
+
+import setup_common  # noqa: E402
+import validate_requirements  # noqa: E402
+
+
+def test_read_requirement_lines_follows_includes(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "requirements.txt").write_text(
+        "# Base requirements\n"
+        "toml==0.10.2  # pinned\n"
+        "\n"
+        "-r sub/extra.txt\n"
+        "--extra-index-url https://example.com/simple\n"
+    )
+    # Includes are relative to the including file, and a cycle is only read once
+    (tmp_path / "sub" / "extra.txt").write_text("rich>=13\n-r ../requirements.txt\n--requirement more.txt\n")
+    (tmp_path / "sub" / "more.txt").write_text("numpy\n")
+    assert setup_common.read_requirement_lines(str(tmp_path / "requirements.txt")) == [
+        "toml==0.10.2",
+        "rich>=13",
+        "numpy",
+        "--extra-index-url https://example.com/simple",
+    ]
+
+
+@pytest.fixture
+def validation(tmp_path, monkeypatch):
+    state = {"environment": {"python": "python", "site_packages": {}}, "checked": [], "torch": 0}
+    monkeypatch.setattr(validate_requirements, "VALIDATION_CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(validate_requirements, "environment_fingerprint", lambda: dict(state["environment"]))
+    monkeypatch.setattr(validate_requirements, "check_torch", lambda: state.update(torch=state["torch"] + 1))
+    monkeypatch.setattr(setup_common, "check_requirement", lambda line: state["checked"].append(line) or True)
+    requirements_file = tmp_path / "requirements.txt"
+    requirements_file.write_text("toml\nrich\n")
+    state["file"] = str(requirements_file)
+    return state
+
+
+def test_unchanged_requirements_skip_the_validation(validation):
+    validate_requirements.validate_requirements(validation["file"])
+    assert sorted(validation["checked"]) == ["rich", "toml"]
+    assert validation["torch"] == 1
+
+    validate_requirements.validate_requirements(validation["file"])
+    assert len(validation["checked"]) == 2
+    assert validation["torch"] == 1
+
+    # Without the cache everything is checked again
+    validate_requirements.validate_requirements(validation["file"], use_cache=False)
+    assert len(validation["checked"]) == 4
+
+
+def test_changed_requirements_only_check_the_new_lines(validation):
+    validate_requirements.validate_requirements(validation["file"])
+    with open(validation["file"], "a") as f:
+        f.write("numpy\n")
+
+    validate_requirements.validate_requirements(validation["file"])
+    assert validation["checked"][2:] == ["numpy"]
+    assert validation["torch"] == 2
+
+
+def test_changed_environment_checks_every_line(validation):
+    validate_requirements.validate_requirements(validation["file"])
+    validation["environment"]["site_packages"] = {"site-packages": 1}
+
+    validate_requirements.validate_requirements(validation["file"])
+    assert sorted(validation["checked"][2:]) == ["rich", "toml"]
+
+
+def test_unreadable_cache_is_ignored(validation):
+    with open(validate_requirements.VALIDATION_CACHE_FILE, "w") as f:
+        f.write("{not json")
+    assert validate_requirements.load_validation_cache() == {}
+
+    validate_requirements.validate_requirements(validation["file"])
+    assert validate_requirements.load_validation_cache()["results"] == {"toml": True, "rich": True}
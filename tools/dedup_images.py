@@ -0,0 +1,448 @@
+"""
+Find exact and near duplicate images in a dataset.
+
+Exact duplicates are found by content hash, only hashing files which share their size
+with another file. Near duplicates are found with a 64 bit perceptual hash (dHash or
+pHash, computed in NumPy for a batch of images at once) and a multi-index search: the
+hash is split in radius + 1 blocks, any two hashes within the Hamming radius share at
+least one block, so only the images sharing a block are compared.
+
+Each group of duplicates keeps its largest image, and only holds the images within the
+radius of that image. The groups are written to a JSON report, and the other images, with
+their captions, can be moved to a quarantine folder.
+
+The search is fast for small radii. Blocks get shorter as the radius grows, at 16 they
+are 4 bits long and most images share a block, the search then compares nearly all
+pairs of images.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from library.utils import setup_logging
+
+# Set up logging
+setup_logging()
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+CAPTION_EXTENSIONS = (".txt", ".caption", ".cap")
+
+HASH_BITS = 64
+# Images decoded and hashed per worker call
+HASH_BATCH_SIZE = 256
+# Hash pairs compared at once, buckets of images sharing a block are compared in
+# slices of rows so that about this many distances are computed per slice
+MAX_COMPARE_PAIRS = 1 << 22
+# Radius above which the blocks are too short to narrow the search much
+FAST_SEARCH_MAX_DISTANCE = 8
+
+# Number of set bits of each byte value
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def get_args():
+    parser = argparse.ArgumentParser("dedup_images")
+    parser.add_argument("folder", help="Dataset folder, searched recursively", type=str)
+    parser.add_argument(
+        "--hash",
+        help="Perceptual hash used for near duplicates",
+        choices=["dhash", "phash", "none"],
+        default="dhash",
+    )
+    parser.add_argument(
+        "--max_distance",
+        help="Largest Hamming distance between the hashes of near duplicates (0 to 16)",
+        default=4,
+        type=int,
+    )
+    parser.add_argument(
+        "--report",
+        help="JSON report file, defaults to dedup_report.json in the folder",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--quarantine",
+        help="Move the duplicates and their captions to this folder, keeping their relative path",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of hashing processes, defaults to the CPU count",
+        default=None,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+def list_images(folder: str, exclude: str = None) -> list:
+    images = []
+    exclude = os.path.abspath(exclude) if exclude else None
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [
+            name
+            for name in dirs
+            if not name.startswith(".")
+            and os.path.abspath(os.path.join(root, name)) != exclude
+        ]
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(os.path.join(root, name))
+    return sorted(images)
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_exact_duplicates(paths: list, sizes: list) -> list:
+    """
+    Group byte identical files. Only the files sharing their size with another file
+    are read.
+
+    Returns:
+    - list: Groups of indexes into paths.
+    """
+    by_size = {}
+    for index, size in enumerate(sizes):
+        by_size.setdefault(size, []).append(index)
+
+    groups = []
+    for indexes in by_size.values():
+        if len(indexes) < 2:
+            continue
+        by_hash = {}
+        for index in indexes:
+            try:
+                by_hash.setdefault(content_hash(paths[index]), []).append(index)
+            except OSError as e:
+                log.warning(f"Could not read {paths[index]}: {e}")
+        groups.extend(group for group in by_hash.values() if len(group) > 1)
+    return groups
+
+
+def dct_matrix(size: int) -> np.ndarray:
+    k = np.arange(size)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+DCT_32 = dct_matrix(32)
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """
+    Pack (N, 64) booleans into N unsigned 64 bit hashes.
+    """
+    return np.packbits(bits.reshape(len(bits), HASH_BITS), axis=1).view(">u8")[:, 0]
+
+
+def dhash(pixels: np.ndarray) -> np.ndarray:
+    """
+    Difference hash of (N, 8, 9) grayscale images: whether each pixel is brighter
+    than its left neighbour.
+    """
+    return pack_bits(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+
+def phash(pixels: np.ndarray) -> np.ndarray:
+    """
+    Perceptual hash of (N, 32, 32) grayscale images: whether each of the 8x8 lowest
+    frequency DCT coefficients is above their median, the DC term excluded.
+    """
+    dct = np.einsum("ij,njk,lk->nil", DCT_32, pixels, DCT_32)[:, :8, :8]
+    coefficients = dct.reshape(len(dct), HASH_BITS)
+    median = np.median(coefficients[:, 1:], axis=1)
+    return pack_bits(coefficients > median[:, None])
+
+
+HASH_FUNCTIONS = {
+    "dhash": (dhash, (9, 8)),
+    "phash": (phash, (32, 32)),
+}
+
+
+def hash_images(paths: list, method: str) -> tuple:
+    """
+    Decode a batch of images to small grayscale thumbnails and hash them at once.
+    Runs in the worker processes.
+
+    Returns:
+    - tuple: The hashes, the pixel counts (0 for unreadable images) and errors by path.
+    """
+    function, size = HASH_FUNCTIONS[method]
+    pixels = np.zeros((len(paths), size[1], size[0]), dtype=np.float32)
+    areas = np.zeros(len(paths), dtype=np.int64)
+    errors = {}
+    for index, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                areas[index] = image.width * image.height
+                # Let the JPEG decoder downscale, the thumbnail only needs a few pixels
+                image.draft("L", (size[0] * 8, size[1] * 8))
+                image = image.convert("L").resize(size, Image.BILINEAR)
+                pixels[index] = np.asarray(image, dtype=np.float32)
+        except Exception as e:
+            areas[index] = 0
+            errors[path] = str(e)
+    return function(pixels), areas, errors
+
+
+def compute_hashes(paths: list, method: str, workers: int = None) -> tuple:
+    batches = [
+        paths[start : start + HASH_BATCH_SIZE]
+        for start in range(0, len(paths), HASH_BATCH_SIZE)
+    ]
+    hashes, areas, errors = [], [], {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, (batch_hashes, batch_areas, batch_errors) in enumerate(
+            pool.map(hash_images, batches, [method] * len(batches)), start=1
+        ):
+            hashes.append(batch_hashes)
+            areas.append(batch_areas)
+            errors.update(batch_errors)
+            if done % 20 == 0 or done == len(batches):
+                log.info(f"Hashed {min(done * HASH_BATCH_SIZE, len(paths))}/{len(paths)} images")
+    if not batches:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64), errors
+    return (
+        np.concatenate(hashes).astype(np.uint64),
+        np.concatenate(areas),
+        errors,
+    )
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Hamming distances between two broadcastable arrays of 64 bit hashes.
+    """
+    xor = np.bitwise_xor(a, b)
+    if hasattr(np, "bitwise_count"):
+        # NumPy 2 counts the bits natively, without an intermediate byte array
+        return np.bitwise_count(xor).astype(np.int32)
+    return POPCOUNT[xor[..., None].view(np.uint8)].sum(axis=-1, dtype=np.int32)
+
+
+def find_near_duplicates(hashes: np.ndarray, max_distance: int, valid: np.ndarray) -> list:
+    """
+    Find the pairs of hashes within max_distance with a multi-index search.
+
+    Returns:
+    - list: (index, index, distance) of each pair.
+    """
+    blocks = max_distance + 1
+    bounds = np.linspace(0, HASH_BITS, blocks + 1).astype(int)
+    candidates = np.flatnonzero(valid)
+    pairs = {}
+
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << (high - low)) - 1)
+        keys = (hashes[candidates] >> np.uint64(low)) & mask
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(sorted_keys)]
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            bucket = candidates[order[start:end]]
+            # Compare each row with the following ones of the bucket, in slices of rows
+            # sized so that huge buckets stay within memory
+            step = max(1, MAX_COMPARE_PAIRS // len(bucket))
+            for slice_start in range(0, len(bucket) - 1, step):
+                rows = bucket[slice_start : slice_start + step]
+                columns = bucket[slice_start + 1 :]
+                distances = hamming(hashes[rows][:, None], hashes[columns][None, :])
+                for i, j in zip(*np.nonzero(distances <= max_distance)):
+                    # Column j is the bucket position slice_start + 1 + j
+                    if j < i:
+                        continue
+                    a, b = sorted((int(rows[i]), int(columns[j])))
+                    pairs[(a, b)] = int(distances[i, j])
+    return [(a, b, distance) for (a, b), distance in pairs.items()]
+
+
+class DisjointSet:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, index: int) -> int:
+        while self.parent[index] != index:
+            self.parent[index] = self.parent[self.parent[index]]
+            index = self.parent[index]
+        return index
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+def build_groups(paths, sizes, areas, exact_groups, near_pairs, hashes=None, max_distance=0) -> list:
+    """
+    Group exact and near duplicates, each group keeping its largest image.
+
+    Near pairs chain (A near B near C, with A far from C), so the images connected by
+    pairs are only candidates: the largest candidate is kept with the candidates within
+    max_distance of it, or byte identical to it, and the remaining candidates are
+    grouped again the same way.
+    """
+    sets = DisjointSet(len(paths))
+    exact_ids = {}
+    for number, group in enumerate(exact_groups):
+        for index in group:
+            sets.union(group[0], index)
+            exact_ids[index] = number
+    for a, b, _ in near_pairs:
+        sets.union(a, b)
+
+    members = {}
+    for index in set(exact_ids) | {index for a, b, _ in near_pairs for index in (a, b)}:
+        members.setdefault(sets.find(index), []).append(index)
+
+    def match(keep: int, index: int) -> tuple:
+        if keep in exact_ids and exact_ids.get(index) == exact_ids[keep]:
+            return "exact", 0
+        if hashes is not None and areas[keep] > 0 and areas[index] > 0:
+            distance = int(hamming(hashes[keep], hashes[index]))
+            if distance <= max_distance:
+                return "near", distance
+        return None
+
+    groups = []
+    for indexes in members.values():
+        remaining = sorted(
+            indexes,
+            key=lambda index: (areas[index], sizes[index], -len(paths[index])),
+            reverse=True,
+        )
+        while len(remaining) > 1:
+            keep, candidates = remaining[0], remaining[1:]
+            duplicates, remaining = [], []
+            for index in candidates:
+                found = match(keep, index)
+                if found is None:
+                    remaining.append(index)
+                else:
+                    duplicates.append((index, found))
+            if duplicates:
+                groups.append(
+                    {
+                        "keep": paths[keep],
+                        "duplicates": [
+                            {"path": paths[index], "kind": kind, "distance": distance}
+                            for index, (kind, distance) in sorted(duplicates)
+                        ],
+                    }
+                )
+    return sorted(groups, key=lambda group: group["keep"])
+
+
+def quarantine(folder: str, quarantine_dir: str, groups: list, paths: list) -> int:
+    """
+    Move the duplicates and their caption files to the quarantine folder.
+
+    A caption is shared by the images of the same name (a.png and a.jpg both use a.txt),
+    the caption of a duplicate whose name is also used by an image staying in the
+    dataset is copied instead of moved.
+    """
+    quarantined = {
+        duplicate["path"] for group in groups for duplicate in group["duplicates"]
+    }
+    kept_bases = {os.path.splitext(path)[0] for path in paths if path not in quarantined}
+
+    moved = 0
+    for group in groups:
+        for duplicate in group["duplicates"]:
+            path = duplicate["path"]
+            base = os.path.splitext(path)[0]
+            for source in [path] + [base + ext for ext in CAPTION_EXTENSIONS]:
+                if not os.path.exists(source):
+                    continue
+                target = os.path.join(quarantine_dir, os.path.relpath(source, folder))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if source != path and base in kept_bases:
+                    shutil.copy2(source, target)
+                else:
+                    shutil.move(source, target)
+            duplicate["quarantined"] = os.path.join(
+                quarantine_dir, os.path.relpath(path, folder)
+            )
+            moved += 1
+    return moved
+
+
+def main():
+    args = get_args()
+    start = time.perf_counter()
+    max_distance = max(0, min(16, args.max_distance))
+    report_file = args.report or os.path.join(args.folder, "dedup_report.json")
+
+    paths = list_images(args.folder, exclude=args.quarantine)
+    sizes = [os.path.getsize(path) for path in paths]
+    log.info(f"Found {len(paths)} images in {args.folder}")
+
+    exact_groups = find_exact_duplicates(paths, sizes)
+    log.info(f"Found {len(exact_groups)} groups of exact duplicates")
+
+    near_pairs, errors, hashes = [], {}, None
+    areas = np.zeros(len(paths), dtype=np.int64)
+    if args.hash != "none" and paths:
+        if max_distance > FAST_SEARCH_MAX_DISTANCE:
+            log.warning(
+                f"Searching within distance {max_distance} compares most pairs of images, "
+                f"distances up to {FAST_SEARCH_MAX_DISTANCE} are much faster on large datasets"
+            )
+        hashes, areas, errors = compute_hashes(paths, args.hash, args.workers)
+        near_pairs = find_near_duplicates(hashes, max_distance, areas > 0)
+        log.info(f"Found {len(near_pairs)} pairs of images within distance {max_distance}")
+
+    groups = build_groups(
+        paths, sizes, areas, exact_groups, near_pairs, hashes, max_distance
+    )
+    duplicates = sum(len(group["duplicates"]) for group in groups)
+
+    moved = 0
+    if args.quarantine:
+        moved = quarantine(args.folder, args.quarantine, groups, paths)
+
+    report = {
+        "folder": os.path.abspath(args.folder),
+        "hash": args.hash,
+        "max_distance": max_distance,
+        "images": len(paths),
+        "duplicates": duplicates,
+        "quarantined": moved,
+        "seconds": round(time.perf_counter() - start, 3),
+        "unreadable": errors,
+        "groups": groups,
+    }
+    tmp_file = f"{report_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_file, report_file)
+
+    log.info(
+        f"{duplicates} duplicates in {len(groups)} groups among {len(paths)} images, "
+        f"{moved} moved to quarantine, report saved to {report_file}"
+    )
+
+
+if __name__ == "__main__":
+    main()
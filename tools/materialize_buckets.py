@@ -0,0 +1,337 @@
+"""
+Materialize a dataset at its bucket resolutions.
+
+Every image of the source folder is resized and center cropped to the bucket sd-scripts
+assigns it with the given bucket settings, and written to a mirrored folder. Training on
+the mirrored folder with the same settings assigns every image to the same bucket but
+decodes a small image instead of the original, which also speeds up latent caching.
+
+Captions are copied next to their image, masks are resized and cropped the same way as
+their image. The run is incremental: a manifest in the output folder records the source
+size and mtime and the settings of every output, only new or changed images are processed
+again and the outputs of removed sources are deleted.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from library.utils import setup_logging
+from library.train_util import BucketManager
+
+from kohya_gui.mask_pairing import pair_masks
+
+# Set up logging
+setup_logging()
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+CAPTION_EXTENSIONS = (".txt", ".caption", ".cap")
+OUTPUT_EXTENSIONS = {"jpg": ".jpg", "webp": ".webp", "png": ".png"}
+MANIFEST_FILE = ".materialize_manifest.json"
+
+
+def get_args():
+    parser = argparse.ArgumentParser("materialize_buckets")
+    parser.add_argument("source", help="Source dataset folder", type=str)
+    parser.add_argument("output", help="Mirrored dataset folder", type=str)
+    parser.add_argument(
+        "--resolution",
+        help="Training resolution, width,height or a single size",
+        default="512,512",
+        type=str,
+    )
+    parser.add_argument(
+        "--disable_bucket",
+        help="Crop every image to the training resolution, as without --enable_bucket",
+        action="store_true",
+    )
+    parser.add_argument("--min_bucket_reso", default=256, type=int)
+    parser.add_argument("--max_bucket_reso", default=2048, type=int)
+    parser.add_argument("--bucket_reso_steps", default=64, type=int)
+    parser.add_argument("--bucket_no_upscale", action="store_true")
+    parser.add_argument(
+        "--format",
+        help="Output image format",
+        choices=list(OUTPUT_EXTENSIONS),
+        default="jpg",
+    )
+    parser.add_argument(
+        "--quality", help="JPEG and WebP quality", default=95, type=int
+    )
+    parser.add_argument(
+        "--mask_dir",
+        help="Mask folder, masks share the relative folder and the name of their image",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--mask_output_dir",
+        help="Mirrored mask folder, required with --mask_dir",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of resizing processes, defaults to the CPU count",
+        default=None,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+def parse_resolution(value: str) -> tuple:
+    parts = [int(part) for part in value.replace("x", ",").split(",") if part.strip()]
+    return parts[0], parts[-1]
+
+
+def make_bucket_manager(args) -> BucketManager:
+    """
+    Create the bucket manager the way the sd-scripts datasets do.
+    """
+    resolution = parse_resolution(args.resolution)
+    if args.disable_bucket:
+        bucket_manager = BucketManager(False, resolution, None, None, None)
+        bucket_manager.set_predefined_resos([resolution])
+        return bucket_manager
+
+    bucket_manager = BucketManager(
+        args.bucket_no_upscale,
+        resolution,
+        args.min_bucket_reso,
+        args.max_bucket_reso,
+        args.bucket_reso_steps,
+    )
+    if not args.bucket_no_upscale:
+        bucket_manager.make_buckets()
+    return bucket_manager
+
+
+def settings_key(args) -> str:
+    settings = [
+        args.resolution,
+        args.disable_bucket,
+        args.min_bucket_reso,
+        args.max_bucket_reso,
+        args.bucket_reso_steps,
+        args.bucket_no_upscale,
+        args.format,
+        args.quality,
+    ]
+    return hashlib.sha1(json.dumps(settings).encode()).hexdigest()[:16]
+
+
+def resize_and_crop(image: Image.Image, resized_size: tuple, reso: tuple) -> Image.Image:
+    """
+    Resize to the bucket resized size and center crop to the bucket, like sd-scripts does
+    without random_crop.
+    """
+    if image.size != tuple(resized_size):
+        image = image.resize(tuple(resized_size), Image.LANCZOS)
+    left = (resized_size[0] - reso[0]) // 2
+    top = (resized_size[1] - reso[1]) // 2
+    return image.crop((left, top, left + reso[0], top + reso[1]))
+
+
+def materialize(job: dict) -> dict:
+    """
+    Resize one image and its mask to their bucket. Runs in the worker processes.
+    """
+    try:
+        with Image.open(job["source"]) as image:
+            bucket_manager = job["bucket_manager"]
+            reso, resized_size, _ = bucket_manager.select_bucket(*image.size)
+            # Let the JPEG decoder downscale by a power of two, still larger than needed
+            image.draft("RGB", tuple(resized_size))
+            image = image.convert("RGB")
+            output = resize_and_crop(image, resized_size, reso)
+
+        os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+        options = {} if job["format"] == "png" else {"quality": job["quality"]}
+        output.save(
+            job["output"],
+            format={"jpg": "JPEG", "webp": "WEBP", "png": "PNG"}[job["format"]],
+            **options,
+        )
+
+        if job.get("mask"):
+            # Masks have the aspect ratio of their image, they follow the same resize and crop
+            with Image.open(job["mask"]) as mask:
+                mask = resize_and_crop(mask.convert("L"), resized_size, reso)
+            os.makedirs(os.path.dirname(job["mask_output"]), exist_ok=True)
+            mask.save(job["mask_output"], format="PNG")
+
+        return {"source": job["source"], "reso": list(reso)}
+    except Exception as e:
+        return {"source": job["source"], "error": str(e)}
+
+
+def copy_if_newer(source: str, target: str) -> None:
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copy2(source, target)
+
+
+def load_manifest(output: str) -> dict:
+    try:
+        with open(os.path.join(output, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output: str, manifest: dict) -> None:
+    manifest_file = os.path.join(output, MANIFEST_FILE)
+    tmp_file = f"{manifest_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, manifest_file)
+
+
+def remove_output(output: str, entry: dict, mask_output_dir: str, captions: bool = True) -> None:
+    for path in [os.path.join(output, entry["output"])] + [
+        os.path.join(output, caption) for caption in (entry.get("captions", []) if captions else [])
+    ]:
+        if os.path.isfile(path):
+            os.remove(path)
+    if entry.get("mask") and mask_output_dir:
+        mask_path = os.path.join(mask_output_dir, entry["mask"])
+        if os.path.isfile(mask_path):
+            os.remove(mask_path)
+
+
+def main():
+    args = get_args()
+    if args.mask_dir and not args.mask_output_dir:
+        raise SystemExit("--mask_output_dir is required with --mask_dir")
+    if os.path.abspath(args.source) == os.path.abspath(args.output):
+        raise SystemExit("The output folder must differ from the source folder")
+
+    start = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    bucket_manager = make_bucket_manager(args)
+    key = settings_key(args)
+    extension = OUTPUT_EXTENSIONS[args.format]
+    manifest = load_manifest(args.output)
+    seen, outputs, jobs, pending = set(), {}, [], {}
+
+    for root, dirs, files in os.walk(args.source):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        masks = (
+            dict(
+                pair_masks(
+                    root, os.path.join(args.mask_dir, os.path.relpath(root, args.source))
+                )["pairs"]
+            )
+            if args.mask_dir
+            else {}
+        )
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            relative_path = os.path.relpath(source, args.source)
+            relative_stem = os.path.splitext(relative_path)[0]
+            output = relative_stem + extension
+            if output in outputs:
+                log.warning(
+                    f"Skipping {relative_path}, {outputs[output]} already writes {output}"
+                )
+                continue
+            outputs[output] = relative_path
+            seen.add(relative_path)
+
+            captions = []
+            for caption_ext in CAPTION_EXTENSIONS:
+                caption = os.path.join(args.source, relative_stem + caption_ext)
+                if os.path.isfile(caption):
+                    copy_if_newer(caption, os.path.join(args.output, relative_stem + caption_ext))
+                    captions.append(relative_stem + caption_ext)
+
+            mask = masks.get(source)
+            stat = os.stat(source)
+            signature = [stat.st_size, stat.st_mtime_ns, key]
+            if mask:
+                mask_stat = os.stat(mask)
+                signature += [mask_stat.st_size, mask_stat.st_mtime_ns]
+
+            entry = manifest.get(relative_path)
+            if (
+                entry is not None
+                and entry["signature"] == signature
+                and os.path.isfile(os.path.join(args.output, entry["output"]))
+            ):
+                entry["captions"] = captions
+                continue
+
+            # Recorded in the manifest once the image is written
+            pending[relative_path] = {
+                "signature": signature,
+                "output": output,
+                "captions": captions,
+                "mask": relative_stem + ".png" if mask else None,
+            }
+            jobs.append(
+                {
+                    "source": source,
+                    "output": os.path.join(args.output, output),
+                    "bucket_manager": bucket_manager,
+                    "format": args.format,
+                    "quality": args.quality,
+                    "mask": mask,
+                    "mask_output": (
+                        os.path.join(args.mask_output_dir, relative_stem + ".png")
+                        if mask
+                        else None
+                    ),
+                }
+            )
+
+    removed = [path for path in manifest if path not in seen]
+    for path in removed:
+        remove_output(args.output, manifest.pop(path), args.mask_output_dir)
+    # Changed images are processed again, their previous output is removed so that an image
+    # which fails to materialize does not leave it behind. Their captions are already copied.
+    for path in pending:
+        if path in manifest:
+            remove_output(args.output, manifest.pop(path), args.mask_output_dir, captions=False)
+
+    log.info(
+        f"{len(seen)} images, {len(jobs)} to materialize, {len(seen) - len(jobs)} up to date, {len(removed)} removed"
+    )
+
+    failed = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for done, result in enumerate(pool.map(materialize, jobs, chunksize=8), start=1):
+                relative_path = os.path.relpath(result["source"], args.source)
+                if "error" in result:
+                    failed += 1
+                    log.error(f"Could not materialize {relative_path}: {result['error']}")
+                else:
+                    manifest[relative_path] = {
+                        **pending[relative_path],
+                        "reso": result["reso"],
+                    }
+                if done % 100 == 0 or done == len(jobs):
+                    log.info(f"Materialized {done}/{len(jobs)} images")
+                    # Save progress so an interrupted run resumes where it stopped
+                    save_manifest(args.output, manifest)
+
+    save_manifest(args.output, manifest)
+    log.info(
+        f"Done in {time.perf_counter() - start:.1f}s, {failed} failed. Train on {args.output} "
+        "with the same resolution and bucket settings."
+    )
+
+
+if __name__ == "__main__":
+    main()
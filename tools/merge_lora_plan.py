@@ -0,0 +1,352 @@
+"""
+Apply many LoRA merges described in one JSON plan.
+
+The plan is a list of merge specs, or an object with a "merges" list:
+
+    {
+        "merges": [
+            {
+                "sd_model": "models/base.safetensors",
+                "models": ["lora/a.safetensors", "lora/b.safetensors"],
+                "ratios": [0.8, 0.5],
+                "save_to": "outputs/base_ab.safetensors",
+                "precision": "float",
+                "save_precision": "fp16"
+            }
+        ]
+    }
+
+"sd_model" is optional, without it the LoRAs are merged together. "model_type" (SD1, SD2
+or SDXL) is optional too and detected from the base model header when missing.
+
+Specs sharing a base model are grouped so each base is loaded once. Between two outputs
+the base weights are restored from a single CPU copy, so memory stays bounded to two
+copies of the base whatever the number of outputs. A JSON report with the timing, size
+and sha256 of every output is written next to the plan, or to --report.
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+
+import torch
+
+from library.utils import setup_logging
+from library import model_util, sai_model_spec, sdxl_model_util, train_util
+from networks import merge_lora, sdxl_merge_lora
+
+from kohya_gui.sd_modeltype import SDModelType
+
+# Initialize logging
+setup_logging()
+logger = logging.getLogger(__name__)
+
+SUPPORTED_MODEL_TYPES = ["SD1", "SD2", "SDXL"]
+
+
+def get_args():
+    parser = argparse.ArgumentParser("merge_lora_plan")
+    parser.add_argument("plan", help="JSON merge plan", type=str)
+    parser.add_argument(
+        "--report",
+        help="JSON report file, defaults to the plan file with a .report.json extension",
+        default=None,
+        type=str,
+    )
+    return parser.parse_args()
+
+
+def load_plan(plan_file: str) -> list:
+    with open(plan_file, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if isinstance(plan, dict):
+        plan = plan.get("merges", [])
+    if not isinstance(plan, list):
+        raise ValueError(f"{plan_file} is not a merge plan")
+    return plan
+
+
+def normalize_spec(spec: dict) -> dict:
+    """
+    Check a merge spec and fill its defaults, raising ValueError when it cannot run.
+    """
+    models = [model for model in spec.get("models", []) if model]
+    ratios = [float(ratio) for ratio in spec.get("ratios", [1.0] * len(models))]
+    sd_model = spec.get("sd_model") or ""
+    save_to = spec.get("save_to") or ""
+
+    if not save_to:
+        raise ValueError("save_to is missing")
+    if len(ratios) != len(models):
+        raise ValueError(f"{len(models)} models but {len(ratios)} ratios")
+    if not models or (not sd_model and len(models) < 2):
+        raise ValueError(
+            "provide at least one LoRA with sd_model or at least two LoRAs without it"
+        )
+    for model in [sd_model] + models:
+        if model and not os.path.isfile(model):
+            raise ValueError(f"{model} is not a file")
+
+    model_type = spec.get("model_type") or ""
+    if sd_model and not model_type:
+        model_type = SDModelType(sd_model).model_type.name
+    if sd_model and model_type not in SUPPORTED_MODEL_TYPES:
+        raise ValueError(f"unsupported base model type {model_type}")
+
+    return {
+        "sd_model": sd_model,
+        "model_type": model_type,
+        "models": models,
+        "ratios": ratios,
+        "save_to": save_to,
+        "precision": spec.get("precision", "float"),
+        "save_precision": spec.get("save_precision", "fp16"),
+    }
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def merge_arguments(function, spec: dict) -> list:
+    # Recent sd-scripts versions take per-LoRA block weights before the dtype
+    args = [spec["models"], spec["ratios"]]
+    if "lbws" in inspect.signature(function).parameters:
+        args.append(None)
+    return args + [merge_lora.str_to_dtype(spec["precision"])]
+
+
+def call_merge_to_sd_model(function, models: list, spec: dict) -> None:
+    function(*models, *merge_arguments(function, spec))
+
+
+class BaseModel:
+    """
+    A base model loaded once, restored to its original weights before each merge.
+    """
+
+    def __init__(self, sd_model: str, model_type: str, keep_original: bool):
+        self.sd_model = sd_model
+        self.model_type = model_type
+
+        logger.info(f"Loading base model {sd_model}...")
+        if model_type == "SDXL":
+            (
+                text_model1,
+                text_model2,
+                self.vae,
+                unet,
+                self.logit_scale,
+                self.ckpt_info,
+            ) = sdxl_model_util.load_models_from_sdxl_checkpoint(
+                sdxl_model_util.MODEL_VERSION_SDXL_BASE_V1_0, sd_model, "cpu"
+            )
+            self.models = [text_model1, text_model2, unet]
+        else:
+            text_encoder, self.vae, unet = (
+                model_util.load_models_from_stable_diffusion_checkpoint(
+                    model_type == "SD2", sd_model
+                )
+            )
+            self.models = [text_encoder, unet]
+
+        self.original = None
+        if keep_original:
+            self.original = [
+                {key: value.detach().clone() for key, value in model.state_dict().items()}
+                for model in self.models
+            ]
+        self.dirty = False
+
+    def restore(self) -> None:
+        if not self.dirty:
+            return
+        for model, original in zip(self.models, self.original):
+            model.load_state_dict(original)
+        self.dirty = False
+
+    def merge_and_save(self, spec: dict) -> None:
+        self.restore()
+        self.dirty = True
+        save_dtype = merge_lora.str_to_dtype(spec["save_precision"])
+
+        if self.model_type == "SDXL":
+            call_merge_to_sd_model(sdxl_merge_lora.merge_to_sd_model, self.models, spec)
+            text_model1, text_model2, unet = self.models
+            sdxl_model_util.save_stable_diffusion_checkpoint(
+                spec["save_to"],
+                text_model1,
+                text_model2,
+                unet,
+                0,
+                0,
+                self.ckpt_info,
+                self.vae,
+                self.logit_scale,
+                None,
+                save_dtype,
+            )
+        else:
+            call_merge_to_sd_model(merge_lora.merge_to_sd_model, self.models, spec)
+            text_encoder, unet = self.models
+            model_util.save_stable_diffusion_checkpoint(
+                self.model_type == "SD2",
+                spec["save_to"],
+                text_encoder,
+                unet,
+                self.sd_model,
+                0,
+                0,
+                None,
+                save_dtype,
+                self.vae,
+            )
+
+
+def merge_loras(spec: dict) -> None:
+    """
+    Merge LoRA files into one, with the metadata the merge_lora.py command line writes.
+    """
+    save_dtype = merge_lora.str_to_dtype(spec["save_precision"])
+    state_dict, metadata, *rest = merge_lora.merge_lora_models(
+        *merge_arguments(merge_lora.merge_lora_models, spec)
+    )
+    v2 = bool(rest) and rest[0] is True
+
+    model_hash, legacy_hash = train_util.precalculate_safetensors_hashes(state_dict, metadata)
+    metadata["sshs_model_hash"] = model_hash
+    metadata["sshs_legacy_hash"] = legacy_hash
+
+    title = os.path.splitext(os.path.basename(spec["save_to"]))[0]
+    metadata.update(
+        sai_model_spec.build_metadata(
+            state_dict,
+            v2,
+            v2,
+            False,
+            True,
+            False,
+            time.time(),
+            title=title,
+            merged_from=sai_model_spec.build_merged_from(spec["models"]),
+        )
+    )
+    merge_lora.save_to_file(spec["save_to"], state_dict, state_dict, save_dtype, metadata)
+
+
+def group_specs(plan: list, report: list) -> dict:
+    """
+    Group the valid specs by base model, keeping the plan order. LoRA only merges are
+    grouped under an empty base.
+    """
+    groups = {}
+    for index, spec in enumerate(plan):
+        entry = {"index": index, "save_to": spec.get("save_to", ""), "status": "pending"}
+        report.append(entry)
+        try:
+            spec = normalize_spec(spec)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Skipping merge {index}: {e}")
+            entry.update(status="skipped", error=str(e))
+            continue
+        groups.setdefault((spec["sd_model"], spec["model_type"]), []).append(
+            (spec, entry)
+        )
+    return groups
+
+
+def run_spec(spec: dict, entry: dict, base: BaseModel = None) -> None:
+    logger.info(f"Merging {', '.join(spec['models'])} into {spec['save_to']}...")
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(spec["save_to"])), exist_ok=True)
+        if base is not None:
+            base.merge_and_save(spec)
+        else:
+            merge_loras(spec)
+        entry.update(
+            status="completed",
+            seconds=round(time.perf_counter() - start, 3),
+            size=os.path.getsize(spec["save_to"]),
+            sha256=file_sha256(spec["save_to"]),
+        )
+    except Exception as e:
+        logger.error(f"Merge {entry['index']} failed: {e}")
+        entry.update(
+            status="failed", seconds=round(time.perf_counter() - start, 3), error=str(e)
+        )
+    entry.update(
+        sd_model=spec["sd_model"],
+        models=spec["models"],
+        ratios=spec["ratios"],
+    )
+
+
+def save_report(report_file: str, report: dict) -> None:
+    tmp_file = f"{report_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_file, report_file)
+
+
+@torch.no_grad()
+def main():
+    args = get_args()
+    report_file = args.report or f"{os.path.splitext(args.plan)[0]}.report.json"
+
+    start = time.perf_counter()
+    outputs = []
+    report = {"plan": os.path.abspath(args.plan), "bases": [], "outputs": outputs}
+    groups = group_specs(load_plan(args.plan), outputs)
+
+    for (sd_model, model_type), specs in groups.items():
+        if not sd_model:
+            for spec, entry in specs:
+                run_spec(spec, entry)
+            save_report(report_file, report)
+            continue
+
+        load_start = time.perf_counter()
+        try:
+            base = BaseModel(sd_model, model_type, keep_original=len(specs) > 1)
+        except Exception as e:
+            logger.error(f"Could not load {sd_model}: {e}")
+            for _, entry in specs:
+                entry.update(status="failed", error=f"could not load the base model: {e}")
+            save_report(report_file, report)
+            continue
+
+        report["bases"].append(
+            {
+                "sd_model": sd_model,
+                "model_type": model_type,
+                "outputs": len(specs),
+                "load_seconds": round(time.perf_counter() - load_start, 3),
+            }
+        )
+        for spec, entry in specs:
+            run_spec(spec, entry, base)
+        # Write the report after each base so a long plan can be followed
+        save_report(report_file, report)
+
+        del base
+
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    save_report(report_file, report)
+
+    completed = sum(1 for entry in outputs if entry["status"] == "completed")
+    logger.info(
+        f"Merge plan done: {completed}/{len(outputs)} outputs in {report['seconds']}s, report saved to {report_file}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Validate and precompute the masks of a masked loss dataset.
+
+Every image of the image folder is paired with the mask named like it (with any image
+extension, or the <name>-0000.png and <name>.mask names left by depth map tools) in the
+same subfolder of the mask folder, as sd-scripts pairs conditioning images. The pairs are checked in parallel: missing masks and masks whose size differs
+from their image are reported, as sd-scripts only finds them in its data loader.
+
+Valid masks are written to the output folder as compact single channel PNGs named like
+their image, ready to be used as conditioning_data_dir: the red channel sd-scripts reads
+as the mask, as 8 bit grayscale or thresholded to 1 bit. With --bucket, masks are also
+resized and cropped to the bucket of their image, to pair with images materialized at
+their bucket by tools/materialize_buckets.py with the same settings.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from library.utils import setup_logging
+
+from kohya_gui.mask_pairing import pair_masks
+
+# Set up logging
+setup_logging()
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+MANIFEST_FILE = ".prepare_masks.json"
+
+
+def get_args():
+    parser = argparse.ArgumentParser("prepare_masks")
+    parser.add_argument("image_dir", help="Image folder, searched recursively", type=str)
+    parser.add_argument(
+        "mask_dir",
+        help="Mask folder, masks share the relative folder and the name of their image",
+        type=str,
+    )
+    parser.add_argument(
+        "--output_dir",
+        help="Folder of the prepared masks, only validate when not set",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--bits",
+        help="8 bit grayscale masks, or 1 bit masks thresholded at half intensity",
+        choices=[1, 8],
+        default=8,
+        type=int,
+    )
+    parser.add_argument(
+        "--bucket",
+        help="Resize and crop the masks to the bucket of their image, as materialize_buckets does",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--resolution",
+        help="Training resolution, width,height or a single size",
+        default="512,512",
+        type=str,
+    )
+    parser.add_argument("--min_bucket_reso", default=256, type=int)
+    parser.add_argument("--max_bucket_reso", default=2048, type=int)
+    parser.add_argument("--bucket_reso_steps", default=64, type=int)
+    parser.add_argument("--bucket_no_upscale", action="store_true")
+    parser.add_argument(
+        "--report",
+        help="JSON report of the problems found",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of processes, defaults to the CPU count",
+        default=None,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+def make_bucket_manager(args):
+    # Imported here, only --bucket needs torch and the sd-scripts datasets
+    from library.train_util import BucketManager
+
+    parts = [int(part) for part in args.resolution.replace("x", ",").split(",") if part.strip()]
+    resolution = (parts[0], parts[-1])
+    bucket_manager = BucketManager(
+        args.bucket_no_upscale,
+        resolution,
+        args.min_bucket_reso,
+        args.max_bucket_reso,
+        args.bucket_reso_steps,
+    )
+    if not args.bucket_no_upscale:
+        bucket_manager.make_buckets()
+    return bucket_manager
+
+
+def prepare_mask(job: dict) -> dict:
+    """
+    Check a mask against its image and write its compact version. Runs in the worker
+    processes.
+    """
+    try:
+        with Image.open(job["image"]) as image:
+            image_size = image.size
+        with Image.open(job["mask"]) as mask:
+            if mask.size != image_size:
+                return {
+                    "image": job["image"],
+                    "error": f"mask {mask.size[0]}x{mask.size[1]} does not match the image "
+                    f"{image_size[0]}x{image_size[1]}",
+                }
+            if not job.get("output"):
+                return {"image": job["image"]}
+            # sd-scripts loads masks as RGB and uses the red channel
+            mask = mask.convert("RGB").getchannel("R")
+
+        if job.get("bucket_manager") is not None:
+            reso, resized_size, _ = job["bucket_manager"].select_bucket(*image_size)
+            if mask.size != tuple(resized_size):
+                mask = mask.resize(tuple(resized_size), Image.LANCZOS)
+            left = (resized_size[0] - reso[0]) // 2
+            top = (resized_size[1] - reso[1]) // 2
+            mask = mask.crop((left, top, left + reso[0], top + reso[1]))
+
+        extrema = mask.getextrema()
+        if job["bits"] == 1:
+            mask = mask.point(lambda value: 255 if value >= 128 else 0).convert("1")
+
+        os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+        mask.save(job["output"], format="PNG", optimize=True)
+        result = {"image": job["image"]}
+        if extrema[1] == 0:
+            result["warning"] = "mask is empty, the image does not contribute to the loss"
+        elif extrema[0] == 255:
+            result["warning"] = "mask is full, masked loss has no effect on the image"
+        return result
+    except Exception as e:
+        return {"image": job["image"], "error": f"cannot read: {e}"}
+
+
+def settings_key(args) -> str:
+    settings = [args.bits, args.bucket]
+    if args.bucket:
+        settings += [
+            args.resolution,
+            args.min_bucket_reso,
+            args.max_bucket_reso,
+            args.bucket_reso_steps,
+            args.bucket_no_upscale,
+        ]
+    return hashlib.sha1(json.dumps(settings).encode()).hexdigest()[:16]
+
+
+def is_up_to_date(output: str, sources: list) -> bool:
+    if not os.path.isfile(output):
+        return False
+    mtime = os.path.getmtime(output)
+    return all(os.path.getmtime(source) <= mtime for source in sources)
+
+
+def main():
+    args = get_args()
+    start = time.perf_counter()
+    bucket_manager = make_bucket_manager(args) if args.bucket and args.output_dir else None
+
+    rewrite = False
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        manifest_file = os.path.join(args.output_dir, MANIFEST_FILE)
+        key = settings_key(args)
+        try:
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                rewrite = json.load(f).get("settings") != key
+        except (OSError, ValueError):
+            rewrite = True
+
+    report = {"images": 0, "missing": [], "misnamed": {}, "errors": {}, "warnings": {}}
+    jobs, up_to_date = [], 0
+    for root, dirs, files in os.walk(args.image_dir):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        paired = pair_masks(
+            root, os.path.join(args.mask_dir, os.path.relpath(root, args.image_dir))
+        )
+        masks = dict(paired["pairs"])
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            image = os.path.join(root, name)
+            relative_path = os.path.relpath(image, args.image_dir)
+            report["images"] += 1
+            mask = masks.get(image) or paired["misnamed"].get(image)
+            if mask is None:
+                report["missing"].append(image)
+                continue
+            if image not in masks:
+                report["misnamed"][image] = mask
+
+            output = (
+                os.path.join(args.output_dir, os.path.splitext(relative_path)[0] + ".png")
+                if args.output_dir
+                else None
+            )
+            if output and not rewrite and is_up_to_date(output, [image, mask]):
+                up_to_date += 1
+                continue
+            jobs.append(
+                {
+                    "image": image,
+                    "mask": mask,
+                    "output": output,
+                    "bits": args.bits,
+                    "bucket_manager": bucket_manager,
+                }
+            )
+
+    log.info(
+        f"{report['images']} images, {len(report['missing'])} without mask, "
+        f"{len(jobs)} masks to check, {up_to_date} already prepared"
+    )
+    if jobs:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for done, result in enumerate(pool.map(prepare_mask, jobs, chunksize=16), start=1):
+                if "error" in result:
+                    report["errors"][result["image"]] = result["error"]
+                elif "warning" in result:
+                    report["warnings"][result["image"]] = result["warning"]
+                if done % 500 == 0 or done == len(jobs):
+                    log.info(f"Checked {done}/{len(jobs)} masks")
+
+    if args.output_dir:
+        with open(manifest_file, "w", encoding="utf-8") as f:
+            json.dump({"settings": key}, f)
+
+    for image in report["missing"][:20]:
+        log.warning(f"No mask for {image}")
+    for image, mask in list(report["misnamed"].items())[:20]:
+        log.warning(
+            f"Mask {mask} of {image} is not named like the image, sd-scripts does not pair it"
+            + (", its prepared mask is named like the image" if args.output_dir else "")
+        )
+    for image, error in list(report["errors"].items())[:20]:
+        log.error(f"{image}: {error}")
+    for image, warning in list(report["warnings"].items())[:20]:
+        log.warning(f"{image}: {warning}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    log.info(
+        f"Done in {time.perf_counter() - start:.1f}s: {len(report['missing'])} missing, "
+        f"{len(report['misnamed'])} misnamed, {len(report['errors'])} invalid, "
+        f"{len(report['warnings'])} empty or full masks"
+        + (f". Use {args.output_dir} as conditioning_data_dir." if args.output_dir else "")
+    )
+
+
+if __name__ == "__main__":
+    main()